@@ -0,0 +1,504 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Assembly Analyzer
+# - parses KernelWriterAssembly output the way the assembler would: .set
+#   symbols, .macro expansion and .if/.else/.endif
+# - reports register high-water marks, declared LDS, instruction mix and
+#   theoretical occupancy (waves per SIMD) for the target ISA
+# - BenchmarkProblems uses it to reject kernels before they are assembled
+################################################################################
+import re
+import sys
+import argparse
+from math import ceil
+
+from Common import globalParameters, printExit, HR
+from SolutionStructs import Solution, reject
+from SolutionMemo import getSolutionMemo
+
+
+################################################################################
+# Per-ISA Resource Limits
+# - Vgprs/Sgprs are allocated in granules; ExtraSgprs is VCC which the
+#   hardware allocates on top of the sgprs the kernel declares
+# - LDS is allocated in 128-dword granules
+################################################################################
+isaResourceLimits = {}
+for isa in [(8,0,3), (9,0,0), (9,0,6)]:
+  isaResourceLimits[isa] = {
+      "SimdsPerCU": 4,
+      "MaxWavesPerSimd": 10,
+      "MaxWorkGroupsPerCU": 16,
+      "MaxVgprs": 256,
+      "VgprGranule": 4,
+      "MaxSgprs": 102,
+      "SgprsPerSimd": 800,
+      "SgprGranule": 16,
+      "ExtraSgprs": 2,
+      "LdsGranule": 512,
+      }
+
+def alignUp(value, granule):
+  return ((value + granule - 1) / granule) * granule
+
+
+################################################################################
+# Occupancy
+# returns (waves per SIMD, limiting resource) for a kernel launched with
+# numThreads work-items per work-group
+################################################################################
+def getOccupancy(isa, numThreads, vgprs, sgprs, ldsBytes):
+  limits = isaResourceLimits[tuple(isa)]
+  simdsPerCU = limits["SimdsPerCU"]
+  maxWavesPerSimd = limits["MaxWavesPerSimd"]
+  wavesPerWorkGroup = max(1, int(ceil(numThreads \
+      / float(globalParameters["WavefrontWidth"]))))
+
+  vgprWaves = maxWavesPerSimd
+  if vgprs > limits["MaxVgprs"]:
+    vgprWaves = 0
+  elif vgprs > 0:
+    vgprWaves = min(maxWavesPerSimd, \
+        limits["MaxVgprs"] / alignUp(vgprs, limits["VgprGranule"]))
+
+  totalSgprs = sgprs + limits["ExtraSgprs"]
+  sgprWaves = min(maxWavesPerSimd, \
+      limits["SgprsPerSimd"] / alignUp(totalSgprs, limits["SgprGranule"]))
+  if totalSgprs > limits["MaxSgprs"]:
+    sgprWaves = 0
+
+  # work-groups per CU allowed by each resource; every wave of a work-group
+  # lives on the same CU, spread over its SIMDs
+  workGroups = [
+      ("Vgprs", vgprWaves*simdsPerCU / wavesPerWorkGroup),
+      ("Sgprs", sgprWaves*simdsPerCU / wavesPerWorkGroup),
+      ("Waves", maxWavesPerSimd*simdsPerCU / wavesPerWorkGroup),
+      ("WorkGroups", limits["MaxWorkGroupsPerCU"]) ]
+  if ldsBytes > 0:
+    workGroups.append(("LDS", globalParameters["DeviceLDS"] \
+        / alignUp(ldsBytes, limits["LdsGranule"])))
+  (limiter, numWorkGroups) = workGroups[0]
+  for (name, value) in workGroups[1:]:
+    if value < numWorkGroups:
+      (limiter, numWorkGroups) = (name, value)
+  waves = int(ceil(numWorkGroups * wavesPerWorkGroup / float(simdsPerCU)))
+  return (min(maxWavesPerSimd, waves), limiter)
+
+
+################################################################################
+# Instruction Categories
+################################################################################
+def getInstructionCategory(mnemonic):
+  if mnemonic.startswith("ds_"):
+    return "LDS"
+  if mnemonic.startswith(("buffer_", "flat_", "global_", "image_")):
+    return "VMEM"
+  if mnemonic.startswith(("s_load", "s_buffer_load", "s_store", \
+      "s_buffer_store", "s_dcache")):
+    return "SMEM"
+  if mnemonic.startswith(("s_branch", "s_cbranch", "s_setpc", "s_swappc")):
+    return "Branch"
+  if mnemonic in ["s_waitcnt", "s_barrier", "s_nop", "s_sleep", \
+      "s_setprio", "s_endpgm"]:
+    return "Control"
+  if mnemonic.startswith("v_"):
+    return "VALU"
+  if mnemonic.startswith("s_"):
+    return "SALU"
+  return "Other"
+
+instructionCategories = [ "VALU", "SALU", "VMEM", "SMEM", "LDS", "Branch", \
+    "Control", "Other" ]
+
+
+################################################################################
+# Assembly Resources
+# result of analyzing one kernel's assembly text
+################################################################################
+class AssemblyResources:
+  def __init__(self):
+    self.kernelName = None
+    self.isa = None
+    self.codeProperties = {} # .amd_kernel_code_t key = value
+    self.vgprHighWater = 0   # 1 + highest vgpr referenced
+    self.sgprHighWater = 0   # 1 + highest sgpr referenced
+    self.instructionCounts = {} # mnemonic -> static count
+    self.errors = []         # things the analyzer could not resolve
+
+  def declaredVgprs(self):
+    return self.codeProperties.get("workitem_vgpr_count", 0)
+
+  def declaredSgprs(self):
+    return self.codeProperties.get("wavefront_sgpr_count", 0)
+
+  def ldsBytes(self):
+    return self.codeProperties.get("workgroup_group_segment_byte_size", 0)
+
+  def numInstructions(self):
+    return sum(self.instructionCounts.values())
+
+  def categoryCounts(self):
+    counts = dict([(category, 0) for category in instructionCategories])
+    for mnemonic in self.instructionCounts:
+      counts[getInstructionCategory(mnemonic)] += \
+          self.instructionCounts[mnemonic]
+    return counts
+
+  # registers the hardware allocates: the larger of declared and used
+  def vgprs(self):
+    return max(self.declaredVgprs(), self.vgprHighWater)
+
+  def sgprs(self):
+    return max(self.declaredSgprs(), self.sgprHighWater)
+
+  def occupancy(self, numThreads, isa=None):
+    return getOccupancy(isa if isa else self.isa, numThreads, self.vgprs(), \
+        self.sgprs(), self.ldsBytes())
+
+  ########################################
+  # reasons this kernel can't run, or runs below minOccupancy waves/SIMD
+  def check(self, numThreads, minOccupancy=0, isa=None):
+    isa = tuple(isa if isa else self.isa)
+    limits = isaResourceLimits[isa]
+    problems = list(self.errors)
+    if self.vgprHighWater > self.declaredVgprs():
+      problems.append("uses %u vgprs but declares %u" \
+          % (self.vgprHighWater, self.declaredVgprs()))
+    if self.sgprHighWater > self.declaredSgprs():
+      problems.append("uses %u sgprs but declares %u" \
+          % (self.sgprHighWater, self.declaredSgprs()))
+    if self.vgprs() > limits["MaxVgprs"]:
+      problems.append("%u vgprs > %u" % (self.vgprs(), limits["MaxVgprs"]))
+    if self.sgprs() + limits["ExtraSgprs"] > limits["MaxSgprs"]:
+      problems.append("%u+%u sgprs > %u" % (self.sgprs(), \
+          limits["ExtraSgprs"], limits["MaxSgprs"]))
+    if self.ldsBytes() > globalParameters["MaxLDS"]:
+      problems.append("%u lds bytes > %u" % (self.ldsBytes(), \
+          globalParameters["MaxLDS"]))
+    (waves, limiter) = self.occupancy(numThreads, isa)
+    if waves == 0:
+      problems.append("no work-group fits on a CU (%s)" % limiter)
+    elif waves < minOccupancy:
+      problems.append("occupancy %u < %u waves/simd (%s limited)" \
+          % (waves, minOccupancy, limiter))
+    return problems
+
+  def report(self, numThreads, isa=None):
+    (waves, limiter) = self.occupancy(numThreads, isa)
+    s = ""
+    s += "%s (gfx%s)\n" % (self.kernelName, \
+        "".join(["%u"%i for i in (isa if isa else self.isa)]))
+    s += "  vgprs: %u used, %u declared\n" \
+        % (self.vgprHighWater, self.declaredVgprs())
+    s += "  sgprs: %u used, %u declared\n" \
+        % (self.sgprHighWater, self.declaredSgprs())
+    s += "  lds:   %u bytes\n" % self.ldsBytes()
+    s += "  occupancy: %u waves/simd with %u threads/wg (%s limited)\n" \
+        % (waves, numThreads, limiter)
+    counts = self.categoryCounts()
+    s += "  instructions: %u (%s)\n" % (self.numInstructions(), \
+        ", ".join(["%s=%u" % (c, counts[c]) for c in instructionCategories \
+        if counts[c]]))
+    for error in self.errors:
+      s += "  error: %s\n" % error
+    return s
+
+
+################################################################################
+# Parser
+################################################################################
+tokenRegex = re.compile(r"\s*(0x[0-9a-fA-F]+|\d+|[A-Za-z_.$][\w.$]*|<<|>>|\S)")
+registerRegex = re.compile(r"(?<![\w.$\\])([vs])(?:(\d+)\b|\[([^\]]+)\])")
+macroArgRegex = re.compile(r"\\(\w+)(\\\(\))?")
+
+class AssemblyParser:
+  maxMacroDepth = 16
+
+  def __init__(self):
+    self.resources = AssemblyResources()
+    self.symbols = {}
+    self.macros = {} # name -> (parameters, defaults, body lines)
+    self.macroName = None
+    self.conditions = [] # stack of (active, taken) for .if blocks
+    self.inCodeProperties = False
+
+  ########################################
+  # integer value of an assembler expression
+  def evaluate(self, expression):
+    tokens = tokenRegex.findall(expression)
+    pyExpression = ""
+    for token in tokens:
+      if token[0].isalpha() or token[0] in "_.$":
+        if token not in self.symbols:
+          raise KeyError(token)
+        pyExpression += "(%d)" % self.symbols[token]
+      elif token[0].isdigit():
+        pyExpression += "(%d)" % int(token, 0)
+      elif token in ["+", "-", "*", "/", "%", "(", ")", "<<", ">>", "&", \
+          "|", "^", "~"]:
+        pyExpression += token
+      else:
+        raise ValueError(expression)
+    return int(eval(pyExpression, {"__builtins__": None}, {}))
+
+  def active(self):
+    return not self.conditions or self.conditions[-1][0]
+
+  ########################################
+  def parse(self, text):
+    # strip block comments, keeping line structure irrelevant
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    for line in text.split("\n"):
+      self.parseLine(line, 0)
+    if self.conditions:
+      self.resources.errors.append("unterminated .if")
+    return self.resources
+
+  def parseLine(self, line, depth):
+    commentIdx = line.find("//")
+    if commentIdx >= 0:
+      line = line[:commentIdx]
+    line = line.strip()
+    if not line:
+      return
+
+    # collecting a macro body
+    if self.macroName is not None:
+      if line.split()[0] == ".endm":
+        self.macroName = None
+      else:
+        self.macros[self.macroName][2].append(line)
+      return
+
+    fields = line.split(None, 1)
+    first = fields[0]
+    rest = fields[1] if len(fields) > 1 else ""
+
+    # conditional assembly
+    if first == ".if":
+      if self.active():
+        taken = self.evaluateOr(rest, 1) != 0
+        self.conditions.append([taken, taken])
+      else:
+        self.conditions.append([False, True])
+      return
+    if first == ".else":
+      if self.conditions:
+        condition = self.conditions[-1]
+        parentActive = len(self.conditions) < 2 or self.conditions[-2][0]
+        condition[0] = parentActive and not condition[1]
+        condition[1] = True
+      return
+    if first == ".endif":
+      if self.conditions:
+        self.conditions.pop()
+      return
+    if not self.active():
+      return
+
+    if first == ".macro":
+      parameters = []
+      defaults = {}
+      for parameter in re.split(r"[,\s]+", rest.strip())[1:]:
+        if "=" in parameter:
+          (parameter, default) = parameter.split("=", 1)
+          defaults[parameter] = default
+        if parameter:
+          parameters.append(parameter)
+      self.macroName = re.split(r"[,\s]+", rest.strip())[0]
+      self.macros[self.macroName] = (parameters, defaults, [])
+      return
+    if first == ".set":
+      (name, expression) = rest.split(",", 1)
+      self.symbols[name.strip()] = self.evaluateOr(expression, 0)
+      return
+    if first == ".amd_kernel_code_t":
+      self.inCodeProperties = True
+      return
+    if first == ".end_amd_kernel_code_t":
+      self.inCodeProperties = False
+      return
+    if self.inCodeProperties:
+      if "=" in line:
+        (key, value) = line.split("=", 1)
+        self.resources.codeProperties[key.strip()] = self.evaluateOr(value, 0)
+      return
+    if first == ".hsa_code_object_isa":
+      self.resources.isa = tuple([int(v) for v in rest.split(",")[:3]])
+      return
+    if first == ".amdgpu_hsa_kernel":
+      self.resources.kernelName = rest.strip()
+      return
+    if first.startswith(".") or first.endswith(":"):
+      return # other directives and labels
+
+    if first in self.macros:
+      self.expandMacro(first, rest, depth)
+      return
+    self.instruction(first, rest)
+
+  def evaluateOr(self, expression, default):
+    try:
+      return self.evaluate(expression)
+    except Exception:
+      self.resources.errors.append("cannot evaluate '%s'" % expression.strip())
+      return default
+
+  ########################################
+  def expandMacro(self, name, argString, depth):
+    if depth >= self.maxMacroDepth:
+      self.resources.errors.append("macro %s nested too deeply" % name)
+      return
+    for bodyLine in self.macroBody(name, argString):
+      self.parseLine(bodyLine, depth+1)
+
+  # body lines of a macro invocation with the arguments substituted
+  def macroBody(self, name, argString):
+    (parameters, defaults, body) = self.macros[name]
+    args = [a for a in re.split(r"[,\s]+", argString.strip()) if a != ""]
+    values = dict(defaults)
+    for i in range(0, min(len(args), len(parameters))):
+      values[parameters[i]] = args[i]
+    def substitute(match):
+      return values.get(match.group(1), match.group(0))
+    return [macroArgRegex.sub(substitute, bodyLine) for bodyLine in body]
+
+  ########################################
+  def instruction(self, mnemonic, operands):
+    counts = self.resources.instructionCounts
+    counts[mnemonic] = counts.get(mnemonic, 0) + 1
+    for match in registerRegex.finditer(operands):
+      try:
+        if match.group(2) is not None:
+          last = int(match.group(2))
+        else:
+          last = self.evaluate(match.group(3).split(":")[-1])
+      except Exception:
+        self.resources.errors.append("cannot resolve register %s in '%s %s'" \
+            % (match.group(0), mnemonic, operands))
+        continue
+      if match.group(1) == "v":
+        self.resources.vgprHighWater = max(self.resources.vgprHighWater, last+1)
+      else:
+        self.resources.sgprHighWater = max(self.resources.sgprHighWater, last+1)
+
+
+def analyzeAssembly(text):
+  return AssemblyParser().parse(text)
+
+
+################################################################################
+# Analyze Kernel
+# generate the assembly for an assembly kernel and analyze it
+# returns (resources, problems); problems is empty if the kernel may be built
+################################################################################
+def analyzeKernel(kernel, minOccupancy=0):
+  (error, text) = generateAssembly(kernel)
+  resources = analyzeAssembly(text)
+  problems = []
+  if error:
+    problems.append("kernel writer overflowed resources")
+  isa = resources.isa if resources.isa in isaResourceLimits else kernel["ISA"]
+  problems += resources.check(kernel["NumThreads"], minOccupancy, isa)
+  return (resources, problems)
+
+# (error, assembly text) of a kernel, without assembling it
+def generateAssembly(kernel):
+  # KernelWriter uses AssemblyPeephole, which builds on this parser
+  from KernelWriterAssembly import KernelWriterAssembly
+  kernelWriter = KernelWriterAssembly(Solution.getMinNaming([kernel]), \
+      Solution.getSerialNaming([kernel]))
+  tensorParametersA = {}
+  tensorParametersB = {}
+  kernelWriter.initKernel(kernel, tensorParametersA, tensorParametersB)
+  text = kernelWriter.kernelBodyPrefix(kernel, tensorParametersA, \
+      tensorParametersB)
+  (error, body) = kernelWriter.kernelBody(kernel, tensorParametersA, \
+      tensorParametersB)
+  text += body
+  text += kernelWriter.kernelBodySuffix(kernel, tensorParametersA, \
+      tensorParametersB)
+  return (error, text)
+
+# False if any of the solution's assembly kernels fails analysis
+def validKernelResources(solution):
+  memo = getSolutionMemo()
+  rejection = memo.getResources(solution) if memo is not None else None
+  if rejection is None:
+    rejection = ""
+    for kernel in solution.getKernels():
+      if kernel["KernelLanguage"] != "Assembly":
+        continue
+      (resources, problems) = analyzeKernel(kernel, \
+          globalParameters["MinOccupancy"])
+      if problems:
+        rejection = "%s: %s" % (resources.kernelName, "; ".join(problems))
+        break
+    if memo is not None:
+      memo.putResources(solution, rejection)
+  if rejection:
+    reject(None, rejection)
+    return False
+  return True
+
+
+################################################################################
+# Main
+################################################################################
+def AssemblyAnalyzer(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="report register, LDS, instruction mix and occupancy of " \
+      "Tensile assembly kernels")
+  argParser.add_argument("files", nargs="+", help="assembly (.s) files")
+  argParser.add_argument("--threads", type=int, default=256, \
+      help="work-items per work-group (not recorded in the assembly)")
+  argParser.add_argument("--isa", default=None, \
+      help="override target isa, eg 9,0,6")
+  argParser.add_argument("--min-occupancy", type=int, default=0, \
+      help="fail if a kernel runs fewer waves per simd")
+  args = argParser.parse_args(userArgs)
+  isa = tuple([int(v) for v in args.isa.split(",")]) if args.isa else None
+  if isa is not None and isa not in isaResourceLimits:
+    printExit("no resource limits for isa %s" % str(isa))
+
+  numFailed = 0
+  print HR
+  for fileName in args.files:
+    resources = analyzeAssembly(open(fileName, "r").read())
+    if resources.kernelName is None:
+      resources.kernelName = fileName
+    kernelIsa = isa if isa else resources.isa
+    if kernelIsa not in isaResourceLimits:
+      printExit("%s: no resource limits for isa %s" % (fileName, kernelIsa))
+    sys.stdout.write(resources.report(args.threads, kernelIsa))
+    problems = resources.check(args.threads, args.min_occupancy, kernelIsa)
+    for problem in problems:
+      print "  FAILED: %s" % problem
+    if problems:
+      numFailed += 1
+  print HR
+  return 1 if numFailed else 0
+
+def main():
+  sys.exit(AssemblyAnalyzer(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
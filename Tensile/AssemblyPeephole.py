@@ -0,0 +1,616 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Assembly Peephole
+# - optional pass over the assembly KernelWriterAssembly emits; each phase
+#   writes its code on its own, which leaves redundant waits and moves at the
+#   seams between phases
+# - rules only look within a basic block: labels, directives, branches,
+#   barriers, exec writes and anything the pass cannot model end a block
+# - macros are expanded to find what an invocation reads and writes
+# - rewritten instructions keep their comment, removed ones are dropped
+################################################################################
+import re
+import sys
+import argparse
+
+from Common import HR
+from AssemblyAnalyzer import AssemblyParser, registerRegex
+
+
+################################################################################
+# Rules
+# IdentityOp       - x*1, x+0, x<<0, ... become moves, which later rules fold
+# FoldMove         - a move whose destination is read and overwritten by the
+#                    next instruction is folded into that instruction
+# SelfMove         - moves of a register onto itself
+# DeadMove         - moves overwritten before they are read
+# MergeWaitcnt     - back-to-back s_waitcnt become one
+# RedundantWaitcnt - s_waitcnt already satisfied by an earlier wait with no
+#                    memory instruction issued in between
+################################################################################
+ruleNames = ["IdentityOp", "FoldMove", "SelfMove", "DeadMove", \
+    "MergeWaitcnt", "RedundantWaitcnt"]
+
+# mnemonic -> (identity values, operand positions which may hold one)
+identityOperations = {
+    "s_mul_i32":     ([1], [1, 2]),
+    "v_mul_lo_u32":  ([1], [1, 2]),
+    "v_add_u32":     ([0], [1, 2]),
+    "v_or_b32":      ([0], [1, 2]),
+    "v_xor_b32":     ([0], [1, 2]),
+    "v_and_b32":     ([-1, 0xffffffff], [1, 2]),
+    "v_sub_u32":     ([0], [2]),
+    "v_subrev_u32":  ([0], [1]),
+    "v_lshlrev_b32": ([0], [1]),
+    "v_lshrrev_b32": ([0], [1]),
+    "v_ashrrev_i32": ([0], [1]),
+    }
+
+moveMnemonics = ["s_mov_b32", "s_mov_b64", "v_mov_b32"]
+
+# scalar instructions a scalar move may be folded into
+foldableScalarRegex = re.compile(r"^s_(add|sub|addc|subb|mul|lshl|lshr|ashr" \
+    r"|and|or|xor|andn2|orn2|nand|nor|xnor|min|max|cselect|absdiff)_[ubi]32$")
+
+# instructions that end a basic block
+blockEndRegex = re.compile(r"^s_(branch|cbranch\w*|endpgm|setpc_b64" \
+    r"|swappc_b64|barrier|trap|sethalt)$")
+
+# instructions the pass does not model
+unmodelledRegex = re.compile(r"^(s_set_gpr_idx\w*|s_setreg\w*|s_movrel\w*" \
+    r"|v_movrel\w*|s_rfe\w*|s_cbranch_i_fork|s_cbranch_join|s_setvskip" \
+    r"|v_interp\w*|s_icache\w*)$")
+
+# instructions that only write part of their destination
+readsDestinationRegex = re.compile(r"^(v_mac_\w*|v_fmac_\w*|s_cmov\w*" \
+    r"|v_mad_mix(lo|hi)\w*|v_writelane\w*|v_(?!pk_)\w*_[fiub]16)$")
+
+# instructions with a carry-out destination as their second operand
+carryOutRegex = re.compile(r"^v_(add|sub|subrev|addc|subb|subbrev)_co_u32$" \
+    r"|^v_div_scale_f(32|64)$|^v_mad_(u64_u32|i64_i32)$")
+carryOutLegacyRegex = re.compile(r"^v_(add|sub|subrev|addc|subb|subbrev)_u32$")
+
+specialRegisterRegex = re.compile(r"(?<![\w.$\\])(vcc|exec|m0|scc)(_lo|_hi)?\b")
+literalRegex = re.compile(r"^-?(0x[0-9a-fA-F]+|\d+)$")
+registerOperandRegex = re.compile(r"^[vs](\d+|\[[^\]]+\])$")
+waitcntRegex = re.compile(r"(\w+)\((\d+)\)")
+waitcntOrder = ["lgkmcnt", "vmcnt", "expcnt"]
+
+def isLiteral(operand):
+  return literalRegex.match(operand) is not None
+
+def isInlineConstant(operand):
+  return isLiteral(operand) and -16 <= int(operand, 0) <= 64
+
+# split operands on commas outside of brackets and parentheses
+def splitOperands(operandString):
+  operands = []
+  depth = 0
+  start = 0
+  for i in range(0, len(operandString)):
+    c = operandString[i]
+    if c in "[(":
+      depth += 1
+    elif c in "])":
+      depth -= 1
+    elif c == "," and depth == 0:
+      operands.append(operandString[start:i].strip())
+      start = i+1
+  last = operandString[start:].strip()
+  if last or operands:
+    operands.append(last)
+  return operands
+
+# {counter: count} of an s_waitcnt, or None if it cannot be parsed
+def parseWaitcnt(operandString):
+  counts = {}
+  for (counter, count) in waitcntRegex.findall(operandString):
+    if counter not in waitcntOrder or counter in counts:
+      return None
+    counts[counter] = int(count)
+  if not counts or waitcntRegex.sub("", operandString).strip(" &,"):
+    return None
+  return counts
+
+def formatWaitcnt(counts):
+  return " & ".join(["%s(%u)" % (counter, counts[counter]) \
+      for counter in waitcntOrder if counter in counts])
+
+# wait counters a memory instruction increments, None for other instructions
+def memoryCounters(mnemonic):
+  if mnemonic.startswith("ds_"):
+    return set(["lgkmcnt"])
+  if mnemonic.startswith(("s_load", "s_buffer_load", "s_store", \
+      "s_buffer_store", "s_scratch", "s_memtime", "s_memrealtime", "s_dcache", \
+      "s_atc_probe", "s_sendmsg")):
+    return set(["lgkmcnt"])
+  if mnemonic.startswith("flat_"):
+    return set(["vmcnt", "lgkmcnt"])
+  if mnemonic.startswith(("buffer_", "tbuffer_", "global_", "scratch_", \
+      "image_")):
+    if "store" in mnemonic:
+      return set(["vmcnt", "expcnt"])
+    return set(["vmcnt"])
+  return None
+
+
+################################################################################
+# Effects
+# what an instruction, or every instruction of a macro invocation, does
+################################################################################
+class Effects:
+  def __init__(self):
+    self.reads = set()      # ("v", 3), ("s", 7), "vcc", ...
+    self.writes = set()
+    self.counters = set()   # wait counters incremented
+    self.known = True       # False if the pass cannot model it
+    self.endsBlock = False
+    self.numInstructions = 0
+
+  def add(self, effects):
+    self.reads |= effects.reads
+    self.writes |= effects.writes
+    self.counters |= effects.counters
+    self.known = self.known and effects.known
+    self.endsBlock = self.endsBlock or effects.endsBlock
+    self.numInstructions += effects.numInstructions
+
+
+################################################################################
+# Statement
+# one line of assembly; mnemonic is None for anything but an instruction
+################################################################################
+class Statement:
+  def __init__(self, text, code=None):
+    self.text = text
+    self.mnemonic = None
+    self.operandString = ""
+    self.operands = []
+    self.comment = None
+    self.effects = None
+    self.removed = False
+    if code:
+      fields = code.split(None, 1)
+      self.mnemonic = fields[0]
+      self.operandString = fields[1].strip() if len(fields) > 1 else ""
+      self.operands = splitOperands(self.operandString)
+      commentIdx = text.find("//")
+      if commentIdx >= 0:
+        self.comment = text[commentIdx+2:].strip()
+
+  def rewrite(self, mnemonic, operandString):
+    self.mnemonic = mnemonic
+    self.operandString = operandString
+    self.operands = splitOperands(operandString)
+    code = "%s %s" % (mnemonic, operandString)
+    if self.comment is not None:
+      self.text = "%-50s // %s" % (code, self.comment)
+    else:
+      self.text = code
+
+
+################################################################################
+# Peephole Optimizer
+################################################################################
+class PeepholeOptimizer:
+  maxMacroDepth = 16
+  maxDeadMoveDistance = 32
+
+  def __init__(self):
+    self.parser = AssemblyParser()
+    self.effectsCache = {}
+    self.numInstructions = 0
+    self.counts = {}
+    for rule in ruleNames:
+      self.counts[rule] = 0
+
+  ########################################
+  # optimize a whole kernel; returns the optimized text
+  def optimize(self, text):
+    lines = []
+    block = []
+    inBlockComment = False
+    for line in text.split("\n"):
+      code = line
+      if inBlockComment:
+        if "*/" not in code:
+          block.append(Statement(line))
+          continue
+        code = code[code.find("*/")+2:]
+        inBlockComment = False
+      code = re.sub(r"/\*.*?\*/", "", code)
+      if "/*" in code:
+        code = code[:code.find("/*")]
+        inBlockComment = True
+      commentIdx = code.find("//")
+      if commentIdx >= 0:
+        code = code[:commentIdx]
+      code = code.strip()
+
+      if self.parser.macroName is not None or not self.parser.active() \
+          or self.parser.inCodeProperties \
+          or code.startswith(".") or code.endswith(":"):
+        # macro definitions, directives, kernel code properties, labels and
+        # disabled code
+        self.flush(block, lines)
+        lines.append(line)
+        self.parser.parseLine(line, 0)
+        if code.startswith(".set"):
+          self.effectsCache = {}
+        continue
+      if not code:
+        block.append(Statement(line))
+        continue
+
+      statement = Statement(line, code)
+      statement.effects = self.effects(statement.mnemonic, \
+          statement.operandString, 0)
+      self.numInstructions += statement.effects.numInstructions
+      block.append(statement)
+      if statement.effects.endsBlock or not statement.effects.known:
+        self.flush(block, lines)
+    self.flush(block, lines)
+    return "\n".join(lines)
+
+  # apply the rules to one basic block and append it to the output
+  def flush(self, block, lines):
+    statements = [s for s in block if s.mnemonic is not None]
+    if statements:
+      self.identityOperations(statements)
+      self.foldMoves(statements)
+      self.selfMoves(statements)
+      self.deadMoves(statements)
+      self.mergeWaitcnts(statements)
+      self.redundantWaitcnts(statements)
+    for statement in block:
+      if not statement.removed:
+        lines.append(statement.text)
+    del block[:]
+
+  def remove(self, statement, rule):
+    statement.removed = True
+    self.counts[rule] += statement.effects.numInstructions
+
+  ########################################
+  # registers named by an operand; None if they cannot be resolved
+  def registers(self, operand):
+    registers = set()
+    for match in registerRegex.finditer(operand):
+      try:
+        if match.group(2) is not None:
+          first = last = int(match.group(2))
+        else:
+          bounds = match.group(3).split(":")
+          first = self.parser.evaluate(bounds[0])
+          last = self.parser.evaluate(bounds[-1])
+      except Exception:
+        return None
+      for i in range(first, last+1):
+        registers.add((match.group(1), i))
+    for match in specialRegisterRegex.finditer(operand):
+      registers.add(match.group(1))
+    return registers
+
+  def effects(self, mnemonic, operandString, depth):
+    key = (mnemonic, operandString)
+    if key in self.effectsCache:
+      return self.effectsCache[key]
+    effects = Effects()
+    if mnemonic in self.parser.macros:
+      if depth >= self.maxMacroDepth:
+        effects.known = False
+      else:
+        for bodyLine in self.parser.macroBody(mnemonic, operandString):
+          code = bodyLine.split("//")[0].strip()
+          if not code:
+            continue
+          if code.startswith("."):
+            effects.known = False
+            continue
+          fields = code.split(None, 1)
+          effects.add(self.effects(fields[0], \
+              fields[1] if len(fields) > 1 else "", depth+1))
+    else:
+      self.instructionEffects(mnemonic, splitOperands(operandString), effects)
+    self.effectsCache[key] = effects
+    return effects
+
+  def instructionEffects(self, mnemonic, operands, effects):
+    effects.numInstructions = 1
+    if blockEndRegex.match(mnemonic):
+      effects.endsBlock = True
+    if mnemonic in ["s_waitcnt", "s_nop"]:
+      return
+    counters = memoryCounters(mnemonic)
+    if unmodelledRegex.match(mnemonic) or (counters is None \
+        and not (mnemonic.startswith("s_") or mnemonic.startswith("v_"))):
+      effects.known = False
+      return
+    registers = []
+    for operand in operands:
+      operandRegisters = self.registers(operand)
+      if operandRegisters is None:
+        effects.known = False
+        return
+      registers.append(operandRegisters)
+
+    if counters is not None:
+      # memory instructions: every operand may be read, the first written
+      effects.counters = counters
+      for operandRegisters in registers:
+        effects.reads |= operandRegisters
+      if registers:
+        effects.writes |= registers[0]
+      effects.reads.add("m0")
+      return
+
+    numDestinations = 1
+    if carryOutRegex.match(mnemonic) \
+        or (carryOutLegacyRegex.match(mnemonic) and len(operands) >= 4):
+      numDestinations = 2
+    if mnemonic.startswith("v_cmp") or mnemonic.startswith("s_cmp") \
+        or mnemonic.startswith("s_bitcmp"):
+      numDestinations = 0 if mnemonic.startswith("s_") else 1
+    for operandRegisters in registers[:numDestinations]:
+      effects.writes |= operandRegisters
+    for operandRegisters in registers[numDestinations:]:
+      effects.reads |= operandRegisters
+    modifiers = re.sub(r"\[[^\]]*\]", "", " ".join(operands[1:]))
+    if registers and (readsDestinationRegex.match(mnemonic) \
+        or ":" in modifiers):
+      effects.reads |= registers[0]
+    if mnemonic.startswith("v_cndmask") and len(operands) == 3:
+      effects.reads.add("vcc")
+    if mnemonic.startswith("v_cmpx"):
+      effects.writes.add("exec")
+    if "exec" in effects.writes:
+      effects.endsBlock = True
+
+  ########################################
+  # IdentityOp
+  def identityOperations(self, statements):
+    for statement in statements:
+      if statement.mnemonic not in identityOperations \
+          or len(statement.operands) != 3:
+        continue
+      (values, positions) = identityOperations[statement.mnemonic]
+      for position in positions:
+        operand = statement.operands[position]
+        if isLiteral(operand) and int(operand, 0) in values:
+          source = statement.operands[3-position]
+          if " " in source:
+            break
+          moveMnemonic = "s_mov_b32" if statement.mnemonic.startswith("s_") \
+              else "v_mov_b32"
+          statement.rewrite(moveMnemonic, "%s, %s" \
+              % (statement.operands[0], source))
+          statement.effects = self.effects(statement.mnemonic, \
+              statement.operandString, 0)
+          self.counts["IdentityOp"] += 1
+          break
+
+  ########################################
+  # FoldMove
+  def foldMoves(self, statements):
+    live = [s for s in statements if not s.removed]
+    for i in range(0, len(live)-1):
+      move = live[i]
+      user = live[i+1]
+      if move.mnemonic not in ["s_mov_b32", "v_mov_b32"] \
+          or len(move.operands) != 2 or move.removed:
+        continue
+      if not user.effects.known or user.effects.endsBlock:
+        continue
+      destination = move.effects.writes
+      if len(destination) != 1 or not isinstance(list(destination)[0], tuple):
+        continue
+      source = move.operands[1]
+      sourceRegisters = self.registers(source)
+
+      if move.mnemonic == "v_mov_b32":
+        # any vgpr operand may be replaced by another vgpr
+        if not registerOperandRegex.match(source) or len(sourceRegisters) != 1 \
+            or list(sourceRegisters)[0][0] != "v":
+          continue
+        if not user.mnemonic.startswith("v_") \
+            and user.mnemonic not in self.parser.macros:
+          continue
+      else:
+        if not foldableScalarRegex.match(user.mnemonic):
+          continue
+        if registerOperandRegex.match(source):
+          if len(sourceRegisters) != 1:
+            continue
+        elif isLiteral(source):
+          # scalar instructions take a single literal
+          if not isInlineConstant(source) and len([o for o in user.operands \
+              if isLiteral(o) and not isInlineConstant(o)]):
+            continue
+        else:
+          continue
+
+      # user must overwrite the destination and read it as whole operands
+      if not destination <= user.effects.writes \
+          or not destination & user.effects.reads:
+        continue
+      operands = list(user.operands)
+      for j in range(1, len(operands)):
+        operandRegisters = self.registers(operands[j])
+        if operandRegisters & destination:
+          if operandRegisters != destination \
+              or not registerOperandRegex.match(operands[j]):
+            operands = None
+            break
+          operands[j] = source
+      if operands is None:
+        continue
+      operandString = ", ".join(operands)
+      effects = self.effects(user.mnemonic, operandString, 0)
+      if not effects.known or effects.reads & destination \
+          or effects.writes != user.effects.writes \
+          or (effects.numInstructions > 1 and sourceRegisters & effects.writes):
+        continue
+      user.rewrite(user.mnemonic, operandString)
+      user.effects = effects
+      self.remove(move, "FoldMove")
+
+  ########################################
+  # SelfMove
+  def selfMoves(self, statements):
+    for statement in statements:
+      if statement.removed or statement.mnemonic not in moveMnemonics \
+          or len(statement.operands) != 2:
+        continue
+      (destination, source) = statement.operands
+      if registerOperandRegex.match(destination) \
+          and registerOperandRegex.match(source) \
+          and self.registers(destination) == self.registers(source):
+        self.remove(statement, "SelfMove")
+
+  ########################################
+  # DeadMove
+  def deadMoves(self, statements):
+    live = [s for s in statements if not s.removed]
+    for i in range(0, len(live)):
+      move = live[i]
+      if move.mnemonic not in moveMnemonics or len(move.operands) != 2:
+        continue
+      destination = move.effects.writes
+      if not destination or [r for r in destination \
+          if not isinstance(r, tuple)]:
+        continue
+      for user in live[i+1:i+1+self.maxDeadMoveDistance]:
+        if user.removed:
+          continue
+        if not user.effects.known or user.effects.reads & destination:
+          break
+        if not user.effects.counters and destination <= user.effects.writes:
+          self.remove(move, "DeadMove")
+          break
+        if user.effects.endsBlock:
+          break
+
+  ########################################
+  # MergeWaitcnt
+  def mergeWaitcnts(self, statements):
+    previous = None
+    for statement in statements:
+      if statement.removed:
+        continue
+      if statement.mnemonic == "s_waitcnt" and previous is not None \
+          and previous.mnemonic == "s_waitcnt":
+        previousCounts = parseWaitcnt(previous.operandString)
+        counts = parseWaitcnt(statement.operandString)
+        if previousCounts is not None and counts is not None:
+          for counter in previousCounts:
+            counts[counter] = min(counts.get(counter, previousCounts[counter]), \
+                previousCounts[counter])
+          previous.rewrite("s_waitcnt", formatWaitcnt(counts))
+          self.remove(statement, "MergeWaitcnt")
+          continue
+      previous = statement
+
+  ########################################
+  # RedundantWaitcnt
+  def redundantWaitcnts(self, statements):
+    guaranteed = {} # counter -> value it is known to be at most
+    for statement in statements:
+      if statement.removed:
+        continue
+      if statement.mnemonic == "s_waitcnt":
+        counts = parseWaitcnt(statement.operandString)
+        if counts is None:
+          guaranteed = {}
+          continue
+        redundant = True
+        for counter in counts:
+          if counts[counter] < guaranteed.get(counter, counts[counter]+1):
+            redundant = False
+            guaranteed[counter] = counts[counter]
+        if redundant:
+          self.remove(statement, "RedundantWaitcnt")
+        continue
+      for counter in statement.effects.counters:
+        if counter in guaranteed:
+          del guaranteed[counter]
+
+  ########################################
+  def stats(self):
+    stats = dict(self.counts)
+    stats["Instructions"] = self.numInstructions
+    # IdentityOp only rewrites; the moves it makes are removed by later rules
+    stats["Removed"] = sum([stats[rule] for rule in ruleNames \
+        if rule != "IdentityOp"])
+    return stats
+
+
+################################################################################
+# Peephole Assembly
+# returns (optimized text, stats); stats holds the macro-expanded instruction
+# count before the pass, the number removed, and how often each rule fired
+################################################################################
+def peepholeAssembly(text):
+  optimizer = PeepholeOptimizer()
+  optimizedText = optimizer.optimize(text)
+  return (optimizedText, optimizer.stats())
+
+def peepholeReport(kernelName, stats):
+  rules = ", ".join(["%s %u" % (rule, stats[rule]) for rule in ruleNames \
+      if stats[rule]])
+  return "Peephole %s: %u -> %u instructions%s" % (kernelName, \
+      stats["Instructions"], stats["Instructions"] - stats["Removed"], \
+      " (%s)" % rules if rules else "")
+
+
+################################################################################
+# Main
+################################################################################
+def AssemblyPeephole(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="apply the peephole pass to assembly kernels and report " \
+      "the instructions it saves")
+  argParser.add_argument("files", nargs="+", help="assembly (.s) files")
+  argParser.add_argument("--in-place", action="store_true", \
+      help="overwrite each file with its optimized assembly")
+  args = argParser.parse_args(userArgs)
+
+  print HR
+  totals = {}
+  for fileName in args.files:
+    text = open(fileName, "r").read()
+    (optimizedText, stats) = peepholeAssembly(text)
+    print peepholeReport(fileName, stats)
+    for key in stats:
+      totals[key] = totals.get(key, 0) + stats[key]
+    if args.in_place:
+      optimizedFile = open(fileName, "w")
+      optimizedFile.write(optimizedText)
+      optimizedFile.close()
+  if len(args.files) > 1:
+    print peepholeReport("total", totals)
+  print HR
+  return 0
+
+def main():
+  sys.exit(AssemblyPeephole(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
@@ -25,16 +25,21 @@ import shutil
 from shutil import copy as shutil_copy
 import filecmp
 import csv
-from subprocess import Popen
 import time
 
 from BenchmarkStructs import BenchmarkProcess
-from Common import globalParameters, HR, pushWorkingPath, popWorkingPath, print1, print2, printExit, printWarning, ensurePath, startTime, ProgressBar
+from Common import globalParameters, HR, RunContext, print1, print2, printExit, printWarning, ensurePath, startTime, ProgressBar
 from SolutionStructs import Solution, ProblemType
 from SolutionWriter import SolutionWriter
 from KernelWriterSource import KernelWriterSource
 from KernelWriterAssembly import KernelWriterAssembly
-from ClientWriter import writeRunScript, writeClientParameters
+from AssemblyAnalyzer import validKernelResources
+from PerformanceModel import getPerformanceModel, pruneSolutions
+from SolutionMemo import saveSolutionMemo
+from Trace import Span, addRunScriptSpans
+from JobServer import runJob
+from Pipeline import DeviceRun, PipelineExecutor, runSequentially
+from ClientWriter import writeRunScript, writeClientParameters, writeClientSolutionTable, writeClientData, writeProblemSizesFile
 from TensileCreateLibrary import writeSolutionsAndKernels, writeCMake
 import YAMLIO
 
@@ -42,9 +47,22 @@ import YAMLIO
 
 ################################################################################
 # Benchmark Problem Type
+# returns (resultsFileBaseFinal, benchmarkTestFails)
 ################################################################################
 def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
-    problemSizeGroupIdx ):
+    problemSizeGroupIdx, context=None ):
+  return runSequentially([benchmarkProblemTypeSteps(problemTypeConfig, \
+      problemSizeGroupConfig, problemSizeGroupIdx, context)])[0]
+
+################################################################################
+# Benchmark Problem Type Steps
+# pipeline (see Pipeline.py) of one problem size group: yields a DeviceRun
+# for the client of each step, then (resultsFileBaseFinal, benchmarkTestFails)
+################################################################################
+def benchmarkProblemTypeSteps( problemTypeConfig, problemSizeGroupConfig, \
+    problemSizeGroupIdx, context=None ):
+  if context is None:
+    context = RunContext()
 
   benchmarkTestFails = 0
 
@@ -54,13 +72,14 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
   print1("# Converting Config to BenchmarkProcess Object")
   print1(HR)
   print1("")
-  benchmarkProcess = BenchmarkProcess( problemTypeConfig, \
-      problemSizeGroupConfig )
+  with Span("BenchmarkProcess"):
+    benchmarkProcess = BenchmarkProcess( problemTypeConfig, \
+        problemSizeGroupConfig )
 
   problemTypeName = str(benchmarkProcess.problemType)
   problemSizeGroupName = "%s_%02u" % (problemTypeName, problemSizeGroupIdx)
-  pushWorkingPath(problemSizeGroupName)
-  ensurePath(os.path.join(globalParameters["WorkingPath"],"Data"))
+  groupContext = context.child(problemSizeGroupName)
+  ensurePath(groupContext.path("Data"))
 
   totalBenchmarkSteps = len(benchmarkProcess)
   resultsFileBaseFinal = None
@@ -92,6 +111,7 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
     numHardcoded = len(benchmarkStep.hardcodedParameters)
     stepName = str(benchmarkStep)
     shortName = benchmarkStep.abbreviation()
+    stepSpan = Span("BenchmarkStep", "Stage", {"Step": shortName}).begin()
     print1("\n")
     print1(HR)
     currentTime = time.time()
@@ -119,15 +139,14 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
             Solution.getNameMin(paramDict, hardcodedMinNaming), \
             Solution.getNameFull(winningParameters) ))
         paramDictIdx += 1
-    pushWorkingPath(shortName)
+    stepContext = groupContext.child(shortName)
 
     ############################################################################
     # Copy Files to Benchmark Source Directory
     ############################################################################
-    sourceDir = \
-      os.path.join(globalParameters["WorkingPath"], "source" )
+    sourceDir = stepContext.path("source")
     ensurePath(sourceDir)
-    pushWorkingPath("sourceTmp")
+    sourceTmpContext = stepContext.child("sourceTmp")
     filesToCopy = [
         "SolutionMapper.h",
         "Client.cpp",
@@ -140,6 +159,8 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
         "TensileTypes.h",
         "KernelHeader.h",
         "ReferenceCPU.h",
+        "BenchmarkConvergence.h",
+        "ProblemSizesFile.h",
         "SolutionHelper.cpp",
         "SolutionHelper.h",
         "Tools.cpp",
@@ -148,19 +169,19 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
 
     for f in filesToCopy:
       shutil_copy(
-          os.path.join(globalParameters["SourcePath"], f),
-          globalParameters["WorkingPath"] )
-    if globalParameters["RuntimeLanguage"] == "OCL":
+          os.path.join(context["SourcePath"], f),
+          sourceTmpContext.workingPath )
+    if context["RuntimeLanguage"] == "OCL":
       shutil_copy(
-          os.path.join(globalParameters["SourcePath"], "FindOpenCL.cmake"),
-          globalParameters["WorkingPath"] )
+          os.path.join(context["SourcePath"], "FindOpenCL.cmake"),
+          sourceTmpContext.workingPath )
     else:
       shutil_copy(
-          os.path.join(globalParameters["SourcePath"], "FindHIP.cmake"),
-          globalParameters["WorkingPath"] )
+          os.path.join(context["SourcePath"], "FindHIP.cmake"),
+          sourceTmpContext.workingPath )
       shutil_copy(
-          os.path.join(globalParameters["SourcePath"], "FindHCC.cmake"),
-          globalParameters["WorkingPath"] )
+          os.path.join(context["SourcePath"], "FindHCC.cmake"),
+          sourceTmpContext.workingPath )
 
     ############################################################################
     # Enumerate Benchmark Permutations
@@ -189,9 +210,13 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
     # Enumerate Solutions = Hardcoded * Benchmark
     ############################################################################
     print1("# Enumerating Solutions")
-    if globalParameters["PrintLevel"] >= 1:
+    enumerateSpan = Span("Enumerate").begin()
+    if context["PrintLevel"] >= 1:
       progressBar = ProgressBar(maxPossibleSolutions)
     solutionSet = set() # avoid duplicates for nlca=-1, 1
+    analyzeResources = context["AnalyzeKernelResources"] \
+        or context["MinOccupancy"] > 0
+    numResourceRejects = 0
     for hardcodedIdx in range(0, numHardcoded):
       solutions.append([])
       hardcodedParamDict = benchmarkStep.hardcodedParameters[hardcodedIdx]
@@ -217,13 +242,36 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
         if solutionObject["Valid"]:
           if solutionObject not in solutionSet:
             solutionSet.add(solutionObject)
-            solutions[hardcodedIdx].append(solutionObject)
+            # reject from the generated assembly before building anything
+            if analyzeResources and not validKernelResources(solutionObject):
+              numResourceRejects += 1
+            else:
+              solutions[hardcodedIdx].append(solutionObject)
         else:
-          if globalParameters["PrintSolutionRejectionReason"]:
+          if context["PrintSolutionRejectionReason"]:
             print1("rejecting solution %s" % str(solutionObject))
-        if globalParameters["PrintLevel"] >= 1:
+        if context["PrintLevel"] >= 1:
           progressBar.increment()
 
+    if analyzeResources:
+      print1("# Kernel resource analysis rejected %u solutions" \
+          % numResourceRejects)
+    saveSolutionMemo()
+
+    # drop solutions predicted to lose to another of their hardcoded group
+    if context["PerformanceModel"]:
+      model = getPerformanceModel(context["PerformanceModel"], \
+          context["CurrentISA"])
+      numPruned = 0
+      for hardcodedIdx in range(0, numHardcoded):
+        numSolutions = len(solutions[hardcodedIdx])
+        solutions[hardcodedIdx] = pruneSolutions(model, \
+            solutions[hardcodedIdx], benchmarkStep.problemSizes, \
+            context["PerformanceModelMargin"])
+        numPruned += numSolutions - len(solutions[hardcodedIdx])
+      print1("# Performance model pruned %u solutions" % numPruned)
+    enumerateSpan.end()
+
     # remove hardcoded that don't have any valid benchmarks
     removeHardcoded = []
     for hardcodedIdx in range(0, numHardcoded):
@@ -238,7 +286,7 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
     if removesExist:
       print1("# Updating winners since enumeration removed unused hardcoded solutions.  removeHardcoded=%u winners=%u" %(len(removeHardcoded), len(winners.winners)))
       winners.wpdUpdate( benchmarkStep.hardcodedParameters )
-      if globalParameters["PrintLevel"] >= 1:
+      if context["PrintLevel"] >= 1:
         print1("")
       numHardcoded = len(benchmarkStep.hardcodedParameters )
       # remove from solution 2D list also
@@ -263,12 +311,12 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
         solutionList.append(solution)
     if len(solutionList) == 0:
         msg = "Your parameters resulted in 0 valid solutions."
-        if globalParameters["PrintSolutionRejectionReason"]:
+        if context["PrintSolutionRejectionReason"]:
             msg += "\nExamine reject and backtrace messages above to see why and where solutions were rejected."
         else:
             msg += "\nYou should re-run with \"PrintSolutionRejectionReason: True\" to see why each parameter combination was rejected."
         printExit(msg)
-    if globalParameters["PrintLevel"] >= 1:
+    if context["PrintLevel"] >= 1:
       for i in range(0, len(solutions)):
         solutionsForHardcoded = solutions[i]
         for j in range(0, len(solutionsForHardcoded)):
@@ -278,10 +326,11 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
       print2(HR)
 
     # write benchmarkFiles
-    writeBenchmarkFiles(solutionList, benchmarkStep.problemSizes, \
-        shortName, filesToCopy)
+    with Span("WriteBenchmarkFiles"):
+      writeBenchmarkFiles(solutionList, benchmarkStep.problemSizes, \
+          shortName, filesToCopy, sourceTmpContext)
 
-    sourceTmp = globalParameters["WorkingPath"]
+    sourceTmp = sourceTmpContext.workingPath
     files = os.listdir(sourceTmp)
     for f in files:
       f0 = os.path.join(sourceTmp, f)
@@ -296,34 +345,46 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
         shutil.copy( f0, f1 )
     #shutil.rmtree( sourceTmp, True )
 
-    popWorkingPath() # source
+    # host client shared by all steps of this problem size group
+    prebuiltClientPath = None
+    if context["PrebuiltClient"]:
+      prebuiltClientPath = groupContext.path("PrebuiltClient")
+      syncPrebuiltClientSource(sourceDir, \
+          os.path.join(prebuiltClientPath, "source"), filesToCopy)
 
     ############################################################################
     # Run Benchmark Script
     ############################################################################
-    resultsFileBase = os.path.normpath(os.path.join( \
-        globalParameters["WorkingPath"], "../Data", shortName))
+    resultsFileBase = groupContext.path("Data", shortName)
     if benchmarkStep.isFinal():
       resultsFileBaseFinal = resultsFileBase
     resultsFileName = resultsFileBase + ".csv"
     solutionsFileName = resultsFileBase + ".yaml"
     if not os.path.exists(resultsFileName) or \
-        globalParameters["ForceRedoBenchmarkProblems"]:
-      pushWorkingPath("build")
+        context["ForceRedoBenchmarkProblems"]:
+      buildContext = stepContext.child("build")
 
       # write runScript
       libraryLogicPath = None
-      path = globalParameters["WorkingPath"]
+      path = buildContext.workingPath
       forBenchmark = True
-      runScriptName = writeRunScript(path, libraryLogicPath, forBenchmark)
+      runScriptName = writeRunScript(path, libraryLogicPath, forBenchmark, \
+          prebuiltClientPath, buildContext)
 
-      # run runScript
-      process = Popen(runScriptName, cwd=globalParameters["WorkingPath"])
-      process.communicate()
-      if process.returncode:
+      # build on the cpu, then wait for the device to run the client
+      if os.name == "nt":
+        returnCode = yield DeviceRun(runScriptName, path)
+      else:
+        with Span("BuildBenchmark", "Subprocess"):
+          returnCode = runJob([runScriptName, "build"], "BuildBenchmark", \
+              path)
+        addRunScriptSpans(path)
+        if not returnCode:
+          returnCode = yield DeviceRun([runScriptName, "client"], path)
+      addRunScriptSpans(path)
+      if returnCode:
         benchmarkTestFails += 1
-        printWarning("BenchmarkProblems: Benchmark Process exited with code %u" % process.returncode)
-      popWorkingPath() # build
+        printWarning("BenchmarkProblems: Benchmark Process exited with code %u" % returnCode)
     else:
       print1("# Already benchmarked; skipping.")
 
@@ -331,7 +392,8 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
     ############################################################################
     # Winners -> Determined Parameters
     ############################################################################
-    results = getResults(resultsFileName, solutions)
+    with Span("ParseResults"):
+      results = getResults(resultsFileName, solutions)
     print2("CSV Results: %s" % results)
     winners.addResults(benchmarkStep.hardcodedParameters, \
         benchmarkPermutations, solutions, results)
@@ -343,15 +405,14 @@ def benchmarkProblemType( problemTypeConfig, problemSizeGroupConfig, \
         solutions )
 
     # End Iteration
-    popWorkingPath() # stepName
+    stepSpan.end()
     currentTime = time.time()
     elapsedTime = currentTime - startTime
     print1("%s\n# %s\n# %s: End - %.3fs\n%s\n" \
         % (HR, problemSizeGroupName, shortName, elapsedTime, HR))
 
-  popWorkingPath() # ProblemType
-  return (resultsFileBaseFinal, benchmarkTestFails)
-# End benchmarkProblemType()
+  yield (resultsFileBaseFinal, benchmarkTestFails)
+# End benchmarkProblemTypeSteps()
 
 
 ################################################################################
@@ -405,10 +466,13 @@ def getResults(resultsFileName, solutions):
 ################################################################################
 # Write Benchmark Files
 ################################################################################
-def writeBenchmarkFiles(solutions, problemSizes, stepName, filesToCopy):
-  if not globalParameters["MergeFiles"]:
-    ensurePath(os.path.join(globalParameters["WorkingPath"], "Solutions"))
-    ensurePath(os.path.join(globalParameters["WorkingPath"], "Kernels"))
+def writeBenchmarkFiles(solutions, problemSizes, stepName, filesToCopy, \
+    context=None):
+  if context is None:
+    context = RunContext()
+  if not context["MergeFiles"]:
+    ensurePath(context.path("Solutions"))
+    ensurePath(context.path("Kernels"))
 
   ##############################################################################
   # Min Naming
@@ -439,20 +503,45 @@ def writeBenchmarkFiles(solutions, problemSizes, stepName, filesToCopy):
 
   # write solution, kernels and CMake
   writeSolutionsAndKernels( \
-      globalParameters["WorkingPath"], solutions, kernels, kernelsBetaOnly, \
-      solutionWriter, kernelWriterSource, kernelWriterAssembly )
+      context.workingPath, solutions, kernels, kernelsBetaOnly, \
+      solutionWriter, kernelWriterSource, kernelWriterAssembly, context )
 
   ##############################################################################
   # Write CMake
   ##############################################################################
 
   clientName = "TensileBenchmark_%s" % stepName
-  writeCMake(globalParameters["WorkingPath"], solutions, kernels, filesToCopy, \
+  writeCMake(context.workingPath, solutions, kernels, filesToCopy, \
       clientName)
 
   forBenchmark = True
   writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
-      filesToCopy)
+      filesToCopy, context)
+
+  if context["PrebuiltClient"] \
+      or context["BinaryProblemSizes"]:
+    writeProblemSizesFile(context.path("ProblemSizes.bin"), problemSizes, \
+        solutions[0]["ProblemType"]["TotalIndices"])
+  if context["PrebuiltClient"]:
+    writeClientSolutionTable(solutions, context)
+    writeClientData(solutions, stepName, context)
+
+
+################################################################################
+# Sync Prebuilt Client Source
+# only copy files which changed so the host client build stays up to date
+################################################################################
+def syncPrebuiltClientSource(sourceDir, prebuiltSourceDir, filesToCopy):
+  ensurePath(prebuiltSourceDir)
+  hostFiles = filesToCopy + ["ClientParameters.h"]
+  for f in ["FindOpenCL.cmake", "FindHIP.cmake", "FindHCC.cmake"]:
+    if os.path.exists(os.path.join(sourceDir, f)):
+      hostFiles.append(f)
+  for f in hostFiles:
+    f0 = os.path.join(sourceDir, f)
+    f1 = os.path.join(prebuiltSourceDir, f)
+    if not os.path.exists(f1) or not filecmp.cmp(f0, f1):
+      shutil.copy( f0, f1 )
 
 
 ################################################################################
@@ -671,12 +760,15 @@ class WinningParameterDict:
 ################################################################################
 # Main
 ################################################################################
-def main( config ):
-  dataPath = os.path.join(globalParameters["WorkingPath"], \
-      globalParameters["BenchmarkDataPath"])
-  pushWorkingPath(globalParameters["BenchmarkProblemsPath"])
+def main( config, context=None ):
+  if context is None:
+    context = RunContext()
+  dataPath = context.path(context["BenchmarkDataPath"])
+  problemsContext = context.child(context["BenchmarkProblemsPath"])
   ensurePath(dataPath)
   totalTestFails = 0
+  pipelines = []
+  resultsFileNames = []
   for benchmarkProblemTypeConfig in config:
     problemTypeConfig = benchmarkProblemTypeConfig[0]
     if len(benchmarkProblemTypeConfig) < 2:
@@ -687,7 +779,8 @@ def main( config ):
       problemSizeGroupConfig = problemSizeGroupConfigs[problemSizeGroupIdx]
       print2("ProblemTypeConfig: %s" % problemTypeConfig)
       problemTypeObj = ProblemType(problemTypeConfig)
-      globalParameters["EnableHalf"] = problemTypeObj["DataType"].isHalf()
+      groupContext = problemsContext.override( \
+          EnableHalf=problemTypeObj["DataType"].isHalf())
 
       # results files will be named
       newResultsFileName = os.path.join(dataPath, "%s_%02u.csv" \
@@ -696,25 +789,33 @@ def main( config ):
           % (str(problemTypeObj), problemSizeGroupIdx) )
 
       # skip if possible
-      if globalParameters["ForceRedoBenchmarkProblems"] or \
+      if context["ForceRedoBenchmarkProblems"] or \
           not os.path.exists(newResultsFileName):
 
         # Benchmark Problem Size Group
-        (resultsFileBaseFinal, benchmarkErrors) = benchmarkProblemType(problemTypeConfig, \
-            problemSizeGroupConfig, problemSizeGroupIdx)
-        totalTestFails += benchmarkErrors
-        print "totalTestFails=", totalTestFails
-
-        # Copy Data
-        resultsFileBase = resultsFileBaseFinal
-        resultsFileName = "%s.csv" % (resultsFileBase)
-        solutionsFileName = "%s.yaml" % (resultsFileBase)
-        shutil_copy( resultsFileName, newResultsFileName )
-        shutil_copy( solutionsFileName, newSolutionsFileName )
+        pipelines.append(benchmarkProblemTypeSteps(problemTypeConfig, \
+            problemSizeGroupConfig, problemSizeGroupIdx, groupContext))
+        resultsFileNames.append((newResultsFileName, newSolutionsFileName))
       else:
         print1("# %s_%02u already benchmarked; skipping." % (str(problemTypeObj), problemSizeGroupIdx) )
 
-  popWorkingPath()
-
-  if globalParameters["ExitOnFails"] and totalTestFails:
+  # copy the data of each size group as it finishes
+  def copyData(idx, result):
+    (resultsFileBaseFinal, benchmarkErrors) = result
+    (newResultsFileName, newSolutionsFileName) = resultsFileNames[idx]
+    resultsFileBase = resultsFileBaseFinal
+    resultsFileName = "%s.csv" % (resultsFileBase)
+    solutionsFileName = "%s.yaml" % (resultsFileBase)
+    shutil_copy( resultsFileName, newResultsFileName )
+    shutil_copy( solutionsFileName, newSolutionsFileName )
+
+  # later size groups generate and build while earlier ones benchmark
+  executor = PipelineExecutor()
+  results = executor.run(pipelines, copyData)
+  executor.report()
+  for (resultsFileBaseFinal, benchmarkErrors) in results:
+    totalTestFails += benchmarkErrors
+  print "totalTestFails=", totalTestFails
+
+  if context["ExitOnFails"] and totalTestFails:
     sys.exit(1)
@@ -18,14 +18,16 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
 # CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 ################################################################################
-from Common import globalParameters, HR, pushWorkingPath, popWorkingPath, print1, CHeader, printWarning
+from Common import globalParameters, HR, RunContext, print1, CHeader, printWarning
 from Common import writeSolutionAssertionCheckHeader,writeSolutionAssertionChecks
 from SolutionStructs import Solution
 from SolutionWriter import SolutionWriter
+from Trace import Span, runScriptMarker, addRunScriptSpans
+from JobServer import runJob
 import YAMLIO
 
 import os
-from subprocess import Popen
+import struct
 from shutil import copy as shutil_copy
 from shutil import rmtree
 
@@ -33,16 +35,17 @@ from shutil import rmtree
 ################################################################################
 # Main
 ################################################################################
-def main( config ):
-  libraryLogicPath = os.path.join(globalParameters["WorkingPath"], \
-      globalParameters["LibraryLogicPath"])
-  pushWorkingPath(globalParameters["LibraryClientPath"])
+def main( config, context=None ):
+  if context is None:
+    context = RunContext()
+  libraryLogicPath = context.path(context["LibraryLogicPath"])
+  clientContext = context.child(context["LibraryClientPath"])
 
 
   ##############################################################################
   # Copy Source Files
   ##############################################################################
-  pushWorkingPath("source")
+  sourceContext = clientContext.child("source")
   filesToCopy = [
       "SolutionMapper.h",
       "Client.cpp",
@@ -50,6 +53,8 @@ def main( config ):
       "DeviceStats.h",
       "ReferenceCPU.h",
       "TensorUtils.h",
+      "BenchmarkConvergence.h",
+      "ProblemSizesFile.h",
       "MathTemplates.cpp",
       "MathTemplates.h",
       "KernelHeader.h",
@@ -61,19 +66,19 @@ def main( config ):
 
   for f in filesToCopy:
     shutil_copy(
-        os.path.join(globalParameters["SourcePath"], f),
-        globalParameters["WorkingPath"] )
-  if globalParameters["RuntimeLanguage"] == "OCL":
+        os.path.join(context["SourcePath"], f),
+        sourceContext.workingPath )
+  if context["RuntimeLanguage"] == "OCL":
     shutil_copy(
-        os.path.join(globalParameters["SourcePath"], "FindOpenCL.cmake"),
-        globalParameters["WorkingPath"] )
+        os.path.join(context["SourcePath"], "FindOpenCL.cmake"),
+        sourceContext.workingPath )
   else:
     shutil_copy(
-        os.path.join(globalParameters["SourcePath"], "FindHIP.cmake"),
-        globalParameters["WorkingPath"] )
+        os.path.join(context["SourcePath"], "FindHIP.cmake"),
+        sourceContext.workingPath )
     shutil_copy(
-        os.path.join(globalParameters["SourcePath"], "FindHCC.cmake"),
-        globalParameters["WorkingPath"] )
+        os.path.join(context["SourcePath"], "FindHCC.cmake"),
+        sourceContext.workingPath )
 
   ##############################################################################
   # Read Logic Files
@@ -94,7 +99,8 @@ def main( config ):
         enableHalf = True
     functions.append((scheduleName, problemType))
     functionNames.append("tensile_%s" % (problemType))
-  globalParameters["EnableHalf"] = enableHalf
+  clientContext = clientContext.override(EnableHalf=enableHalf)
+  sourceContext = sourceContext.override(EnableHalf=enableHalf)
 
   ##############################################################################
   # Write Generated Header
@@ -104,139 +110,197 @@ def main( config ):
   problemSizes = None
   stepName = None
   writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
-      functions)
-  popWorkingPath() # source
+      functions, sourceContext)
 
   ##############################################################################
   # Run Build Script
   ##############################################################################
   # if redo=true, clobber the build directory
-  if globalParameters["ForceRedoLibraryClient"]:
-    rmtree(os.path.join(globalParameters["WorkingPath"], "build"), \
-        ignore_errors=True)
-  pushWorkingPath("build")
+  if context["ForceRedoLibraryClient"]:
+    rmtree(clientContext.path("build"), ignore_errors=True)
+  buildContext = clientContext.child("build")
 
   # write runScript
-  path = globalParameters["WorkingPath"]
+  path = buildContext.workingPath
   forBenchmark = False
-  runScriptName = writeRunScript(path, libraryLogicPath, forBenchmark)
+  runScriptName = writeRunScript(path, libraryLogicPath, forBenchmark, \
+      None, buildContext)
 
   # run runScript
-  process = Popen(runScriptName, cwd=globalParameters["WorkingPath"])
-  process.communicate()
-  if process.returncode:
-    printWarning("ClientWriter Benchmark Process exited with code %u" % process.returncode)
-  popWorkingPath() # build
+  with Span("RunLibraryClient", "Subprocess"):
+    returnCode = runJob(runScriptName, "RunLibraryClient", path)
+  addRunScriptSpans(path)
+  if returnCode:
+    printWarning("ClientWriter Benchmark Process exited with code %u" % returnCode)
 
-  popWorkingPath() # LibraryClient
-
-  return process.returncode
+  return returnCode
 
 
 ################################################################################
 # Write Run Script
 ################################################################################
-def writeRunScript(path, libraryLogicPath, forBenchmark):
+def getCMakeArgs(libraryLogicPath, forBenchmark, context=None):
+  if context is None:
+    context = RunContext()
+  s = ""
+  # runtime and kernel language
+  s += " -DTensile_RUNTIME_LANGUAGE=%s" \
+      % context["RuntimeLanguage"]
+  if context["EnableHalf"]:
+    s += " -DTensile_ENABLE_HALF=ON"
+  if forBenchmark:
+    # for benchmark client
+    s += " -DTensile_CLIENT_BENCHMARK=ON"
+  else:
+    # for library client
+    s += " -DTensile_ROOT=%s" \
+        % os.path.join(context["ScriptPath"], "..")
+    s += " -DTensile_CLIENT_BENCHMARK=OFF"
+    s += " -DTensile_LOGIC_PATH=%s" % libraryLogicPath
+    s += " -DTensile_LIBRARY_PRINT_DEBUG=%s" \
+        % ("ON" if context["LibraryPrintDebug"] else "OFF")
+    s += " -DTensile_SHORT_FILE_NAMES=%s" \
+        % ("ON" if context["ShortNames"] else "OFF")
+    s += " -DTensile_HASHED_NAMES=%s" \
+        % ("ON" if context["HashedNames"] else "OFF")
+  if context["CMakeCXXFlags"]:
+    s += "  -DCMAKE_CXX_FLAGS=%s" \
+        % context["CMakeCXXFlags"]
+  if context["CMakeCFlags"]:
+    s += "  -DCMAKE_C_FLAGS=%s" \
+        % context["CMakeCFlags"]
+  s += "  -DCMAKE_BUILD_TYPE=%s" \
+      % (context["CMakeBuildType"])
+  # for both
+  if os.name == "nt":
+    s += " -DCMAKE_GENERATOR_PLATFORM=x64"
+  s += " -DTensile_MERGE_FILES=%s" \
+      % ("ON" if context["MergeFiles"] else "OFF")
+  return s
+
+
+# prebuiltClientPath: benchmark only; directory holding the source and build
+# of the host client shared by all steps of a problem size group
+def writeRunScript(path, libraryLogicPath, forBenchmark, \
+    prebuiltClientPath=None, context=None):
+  if context is None:
+    context = RunContext(path)
   # create run.bat or run.sh which builds and runs
   runScriptName = os.path.join(path, \
     "run.%s" % ("bat" if os.name == "nt" else "sh") )
   runScriptFile = open(runScriptName, "w")
   echoLine = "@echo." if os.name == "nt" else "echo"
+  # benchmark scripts take a phase so the build and client can run apart
+  phases = forBenchmark and os.name != "nt"
   if os.name != "nt":
     runScriptFile.write("#!/bin/sh\n")
+    # under the job server make takes its jobs from MAKEFLAGS
+    runScriptFile.write("if [ -z \"$MAKEFLAGS\" ]; then MAKE_JOBS=\"-j 8\"; fi\n")
+  if phases:
+    runScriptFile.write("PHASE=${1:-all} # build, client or all\n")
+    runScriptFile.write("if [ \"$PHASE\" != \"client\" ]; then\n")
   q = "" if os.name == "nt" else "\""
-  runScriptFile.write("%s && echo %s%s%s && echo %s# Configuring CMake for Client%s && echo %s%s%s\n" \
-      % (echoLine, q, HR, q, q, q, q, HR, q))
-  runScriptFile.write("cmake")
-  # runtime and kernel language
-  runScriptFile.write(" -DTensile_RUNTIME_LANGUAGE=%s" \
-      % globalParameters["RuntimeLanguage"])
-  if globalParameters["EnableHalf"]:
-    runScriptFile.write(" -DTensile_ENABLE_HALF=ON")
-  if forBenchmark:
-    # for benchmark client
-    runScriptFile.write(" -DTensile_CLIENT_BENCHMARK=ON")
+  cmakeArgs = getCMakeArgs(libraryLogicPath, forBenchmark, context)
+  if prebuiltClientPath:
+    cmakeArgs += " -DTensile_CLIENT_PREBUILT=ON"
+    prebuiltBuildPath = os.path.join(prebuiltClientPath, "build")
+    runScriptMarker(runScriptFile, "CMakeConfigure")
+    runScriptFile.write("%s && echo %s%s%s && echo %s# Configuring CMake for Client Solutions%s && echo %s%s%s\n" \
+        % (echoLine, q, HR, q, q, q, q, HR, q))
+    runScriptFile.write("cmake%s ../source\n" % cmakeArgs)
+    runScriptMarker(runScriptFile, "CMakeBuild")
+    runScriptFile.write("%s && echo %s%s%s && echo %s# Building Client Solutions%s && echo %s%s%s\n" \
+        % (echoLine, q, HR, q, q, q, q, HR, q))
+    runScriptFile.write("cmake --build . --config %s --target TensileClientSolutions -- $MAKE_JOBS\n" \
+        % context["CMakeBuildType"])
+    # host client is only configured once per problem size group
+    runScriptMarker(runScriptFile, "PrebuiltClientBuild")
+    runScriptFile.write("%s && echo %s%s%s && echo %s# Building Prebuilt Client%s && echo %s%s%s\n" \
+        % (echoLine, q, HR, q, q, q, q, HR, q))
+    runScriptFile.write("mkdir -p %s\n" % prebuiltBuildPath)
+    runScriptFile.write("if [ ! -f %s ]; then (cd %s && cmake%s ../source); fi\n" \
+        % (os.path.join(prebuiltBuildPath, "CMakeCache.txt"), \
+        prebuiltBuildPath, cmakeArgs))
+    runScriptFile.write("(cd %s && cmake --build . --config %s --target client -- $MAKE_JOBS)\n" \
+        % (prebuiltBuildPath, context["CMakeBuildType"]))
   else:
-    # for library client
-    runScriptFile.write(" -DTensile_ROOT=%s" \
-        % os.path.join(globalParameters["ScriptPath"], "..") )
-    runScriptFile.write(" -DTensile_CLIENT_BENCHMARK=OFF")
-    runScriptFile.write(" -DTensile_LOGIC_PATH=%s" % libraryLogicPath)
-    runScriptFile.write(" -DTensile_LIBRARY_PRINT_DEBUG=%s" \
-        % ("ON" if globalParameters["LibraryPrintDebug"] else "OFF"))
-    runScriptFile.write(" -DTensile_SHORT_FILE_NAMES=%s" \
-        % ("ON" if globalParameters["ShortNames"] else "OFF"))
-  if globalParameters["CMakeCXXFlags"]:
-    runScriptFile.write("  -DCMAKE_CXX_FLAGS=%s" \
-        % globalParameters["CMakeCXXFlags"] )
-  if globalParameters["CMakeCFlags"]:
-    runScriptFile.write("  -DCMAKE_C_FLAGS=%s" \
-        % globalParameters["CMakeCFlags"] )
-  runScriptFile.write("  -DCMAKE_BUILD_TYPE=%s" \
-      % (globalParameters["CMakeBuildType"]))
-  # for both
-  if os.name == "nt":
-    runScriptFile.write(" -DCMAKE_GENERATOR_PLATFORM=x64")
-  runScriptFile.write(" -DTensile_MERGE_FILES=%s" \
-      % ("ON" if globalParameters["MergeFiles"] else "OFF"))
-  runScriptFile.write(" ../source\n")
-  runScriptFile.write("%s && echo %s%s%s && echo %s# Building Client%s && echo %s%s%s\n" \
-      % (echoLine, q, HR, q, q, q, q, HR, q))
-  runScriptFile.write("cmake --build . --config %s%s\n" \
-      % (globalParameters["CMakeBuildType"], " -- -j 8" \
-      if os.name != "nt" else "") )
+    runScriptMarker(runScriptFile, "CMakeConfigure")
+    runScriptFile.write("%s && echo %s%s%s && echo %s# Configuring CMake for Client%s && echo %s%s%s\n" \
+        % (echoLine, q, HR, q, q, q, q, HR, q))
+    runScriptFile.write("cmake%s ../source\n" % cmakeArgs)
+    runScriptMarker(runScriptFile, "CMakeBuild")
+    runScriptFile.write("%s && echo %s%s%s && echo %s# Building Client%s && echo %s%s%s\n" \
+        % (echoLine, q, HR, q, q, q, q, HR, q))
+    runScriptFile.write("cmake --build . --config %s%s\n" \
+        % (context["CMakeBuildType"], " -- $MAKE_JOBS" \
+        if os.name != "nt" else "") )
+  if phases:
+    runScriptFile.write("ERR=$?\n")
+    runScriptFile.write("fi\n")
+  runScriptMarker(runScriptFile, "Client")
+  if phases:
+    runScriptFile.write("if [ \"$PHASE\" = \"build\" ]; then exit $ERR; fi\n")
   if forBenchmark:
     if os.name == "nt":
-      runScriptFile.write(os.path.join(globalParameters["CMakeBuildType"], \
+      runScriptFile.write(os.path.join(context["CMakeBuildType"], \
           "client.exe") )
     else:
-      if globalParameters["PinClocks"] and globalParameters["ROCmSMIPath"]:
-        runScriptFile.write("%s -d 0 --setfan 255 --setsclk 7\n" % globalParameters["ROCmSMIPath"])
+      if context["PinClocks"] and context["ROCmSMIPath"]:
+        runScriptFile.write("%s -d 0 --setfan 255 --setsclk 7\n" % context["ROCmSMIPath"])
         runScriptFile.write("sleep 1\n")
-        runScriptFile.write("%s -d 0 -a\n" % globalParameters["ROCmSMIPath"])
-      runScriptFile.write("./client")
-
-    if globalParameters["DataInitTypeA"] == -1 :
-        globalParameters["DataInitTypeA"] = globalParameters["DataInitTypeAB"]
-    if globalParameters["DataInitTypeB"] == -1 :
-        globalParameters["DataInitTypeB"] = globalParameters["DataInitTypeAB"]
+        runScriptFile.write("%s -d 0 -a\n" % context["ROCmSMIPath"])
+      if prebuiltClientPath:
+        runScriptFile.write("%s --solutions-library ./libTensileClientSolutions.so --client-data ../source/ClientData.txt" \
+            % os.path.join(prebuiltClientPath, "build", "client"))
+      else:
+        runScriptFile.write("./client")
+
+    # -1 uses DataInitTypeAB
+    initA = context["DataInitTypeA"]
+    if initA == -1:
+      initA = context["DataInitTypeAB"]
+    initB = context["DataInitTypeB"]
+    if initB == -1:
+      initB = context["DataInitTypeAB"]
     clp = ""
-    clp += " --platform-idx %u" % globalParameters["Platform"]
-    clp += " --device-idx %u" % globalParameters["Device"]
-    clp += " --init-alpha %u" % globalParameters["DataInitTypeAlpha"]
-    clp += " --init-beta %u" % globalParameters["DataInitTypeBeta"]
-    clp += " --init-c %u" % globalParameters["DataInitTypeC"]
-    clp += " --init-a %u" % globalParameters["DataInitTypeA"]
-    clp += " --init-b %u" % globalParameters["DataInitTypeB"]
-    clp += " --print-valids %u" % globalParameters["ValidationPrintValids"]
-    clp += " --print-max %u" % globalParameters["ValidationMaxToPrint"]
-    clp += " --num-benchmarks %u" % globalParameters["NumBenchmarks"]
-    clp += " --num-elements-to-validate %u" % globalParameters["NumElementsToValidate"]
-    clp += " --num-enqueues-per-sync %u" % globalParameters["EnqueuesPerSync"]
-    clp += " --num-syncs-per-benchmark %u" % globalParameters["SyncsPerBenchmark"]
-    clp += " --use-gpu-timer %u" % globalParameters["KernelTime"]
-    clp += " --sleep-percent %u" % globalParameters["SleepPercent"]
+    clp += " --platform-idx %u" % context["Platform"]
+    clp += " --device-idx %u" % context.device
+    clp += " --init-alpha %u" % context["DataInitTypeAlpha"]
+    clp += " --init-beta %u" % context["DataInitTypeBeta"]
+    clp += " --init-c %u" % context["DataInitTypeC"]
+    clp += " --init-a %u" % initA
+    clp += " --init-b %u" % initB
+    clp += " --print-valids %u" % context["ValidationPrintValids"]
+    clp += " --print-max %u" % context["ValidationMaxToPrint"]
+    clp += " --num-benchmarks %u" % context["NumBenchmarks"]
+    clp += " --num-elements-to-validate %u" % context["NumElementsToValidate"]
+    clp += " --num-enqueues-per-sync %u" % context["EnqueuesPerSync"]
+    clp += " --num-syncs-per-benchmark %u" % context["SyncsPerBenchmark"]
+    clp += " --use-gpu-timer %u" % context["KernelTime"]
+    clp += " --sleep-percent %u" % context["SleepPercent"]
     if "ClientArgs" in globalParameters:
-      clientParams = globalParameters["ClientArgs"]
+      clientParams = context["ClientArgs"]
       if clientParams:
-        clp += " " + globalParameters["ClientArgs"]
+        clp += " " + context["ClientArgs"]
     runScriptFile.write(clp)
     runScriptFile.write("\n")
     runScriptFile.write("ERR=$?\n")
+    runScriptMarker(runScriptFile, "End")
     if os.name != "nt":
-      if globalParameters["PinClocks"] and globalParameters["ROCmSMIPath"]:
-        runScriptFile.write("%s -d 0 --resetclocks\n" % globalParameters["ROCmSMIPath"])
-        runScriptFile.write("%s -d 0 --setfan 50\n" % globalParameters["ROCmSMIPath"])
+      if context["PinClocks"] and context["ROCmSMIPath"]:
+        runScriptFile.write("%s -d 0 --resetclocks\n" % context["ROCmSMIPath"])
+        runScriptFile.write("%s -d 0 --setfan 50\n" % context["ROCmSMIPath"])
   else:
-    executablePath = os.path.join(globalParameters["WorkingPath"])
+    executablePath = path
     if os.name == "nt":
       executablePath = os.path.join(executablePath, \
-          globalParameters["CMakeBuildType"], \
+          context["CMakeBuildType"], \
           "client.exe")
     else:
       executablePath = os.path.join(executablePath, "client")
     runScriptFile.write("%s && echo %s%s%s && echo %s# Library Client:%s && echo %s# %s%s && %s\n" \
         % (echoLine, q, HR, q, q, q, q, executablePath, q, executablePath) )
+    runScriptMarker(runScriptFile, "End")
   if os.name != "nt":
     runScriptFile.write("exit $ERR\n")
   runScriptFile.close()
@@ -249,43 +313,210 @@ def toCppBool(yamlBool):
   return "true" if yamlBool else "false"
 
 
+################################################################################
+# Benchmark Client Helpers
+################################################################################
+def getResultsFileName(stepName, context=None):
+  if context is None:
+    context = RunContext()
+  return context.path("../../Data", "%s.csv" % stepName)
+
+
+def getSolutionIncludes(solutions, solutionWriter):
+  s = ""
+  if globalParameters["MergeFiles"]:
+    s += "#include \"Solutions.h\"\n"
+  else:
+    for solution in solutions:
+      solutionName = solutionWriter.getSolutionName(solution)
+      s += "#include \"" + solutionName + ".h\"\n"
+  return s
+
+
+def getSolutionFunctionPointerTypedef(problemType, solutionWriter):
+  s = "typedef TensileStatus (*SolutionFunctionPointer)(\n"
+  argList = solutionWriter.getArgList(problemType, True, True, True)
+  for i in range(0, len(argList)):
+    s += "  %s %s%s" % (argList[i][0], argList[i][1], \
+        ",\n" if i < len(argList)-1 else ");\n\n")
+  return s
+
+
+def getClientSolutionInfo(solutions, solutionWriter, runtimeProblemSizes):
+  s = ""
+  # Problem Type Indices
+  s += "const unsigned int maxNumSolutions = %u;\n" % len(solutions)
+  if runtimeProblemSizes:
+    s += "std::vector<std::vector<float> > solutionPerf; // milliseconds\n"
+  else:
+    s += "float solutionPerf[numProblems][maxNumSolutions]; // milliseconds\n"
+  s += "\n"
+
+  s += "static const ClientSolutionInfo solutions[maxNumSolutions] = {\n"
+  for i in range(0, len(solutions)):
+    solution = solutions[i]
+    solutionName = solutionWriter.getSolutionName(solution)
+    # add trailing ~ for some reason to the function name
+    s += "  {%s, \"%s~\", %d, %d, %d}" % \
+      (solutionName, solutionName,
+        solution["AssertSummationElementMultiple"],
+        solution["AssertFree0ElementMultiple"],
+        solution["AssertFree1ElementMultiple"])
+    if i < len(solutions)-1:
+      s += ","
+    s += "\n"
+  s += " };\n"
+  s += "\n"
+  return s
+
+
+def getBenchmarkSolutionWriter(solutions):
+  kernels = []
+  for solution in solutions:
+    solutionKernels = solution.getKernels()
+    for kernel in solutionKernels:
+      if kernel not in kernels:
+        kernels.append(kernel)
+
+  solutionSerialNaming = Solution.getSerialNaming(solutions)
+  kernelSerialNaming = Solution.getSerialNaming(kernels)
+  solutionMinNaming = Solution.getMinNaming(solutions)
+  kernelMinNaming = Solution.getMinNaming(kernels)
+  return SolutionWriter( \
+      solutionMinNaming, solutionSerialNaming, \
+      kernelMinNaming, kernelSerialNaming)
+
+
+################################################################################
+# Write Problem Sizes File
+# - binary problem sizes mmap'd by the client (Source/ProblemSizesFile.h)
+#   instead of a compiled-in size table
+# - rows are streamed in chunks so large size lists never become one string
+################################################################################
+problemSizesFileVersion = 1
+problemSizesFileChunkRows = 4096
+
+def getProblemSizesFileName(context=None):
+  if context is None:
+    context = RunContext()
+  # written into sourceTmp, read by the client from the step's source dir
+  return os.path.normpath(context.path("..", "source", "ProblemSizes.bin"))
+
+
+def writeProblemSizesFile(fileName, problemSizes, totalIndices):
+  minStrides = [ problemSizes.minStrides[i] \
+      if i < len(problemSizes.minStrides) else 0 \
+      for i in range(0, totalIndices) ]
+  problemSizesFile = open(fileName, "wb")
+  problemSizesFile.write(struct.pack("<4sIIIQQQQ", "TPSZ", \
+      problemSizesFileVersion, totalIndices, 0, \
+      problemSizes.totalProblemSizes, \
+      problemSizes.maxC, problemSizes.maxA, problemSizes.maxB))
+  problemSizesFile.write(struct.pack("<%uI" % totalIndices, *minStrides))
+  chunk = []
+  numRows = 0
+  for problemSize in problemSizes:
+    chunk.extend(problemSize[0:totalIndices])
+    numRows += 1
+    if numRows == problemSizesFileChunkRows:
+      problemSizesFile.write(struct.pack("<%uI" % len(chunk), *chunk))
+      chunk = []
+      numRows = 0
+  if chunk:
+    problemSizesFile.write(struct.pack("<%uI" % len(chunk), *chunk))
+  problemSizesFile.close()
+
+
+################################################################################
+# Write Prebuilt Client Solution Table
+# - compiled with the step's solutions into a shared library which the
+#   prebuilt client dlopens
+################################################################################
+def writeClientSolutionTable(solutions, context=None):
+  if context is None:
+    context = RunContext()
+  solutionWriter = getBenchmarkSolutionWriter(solutions)
+  s = ""
+  s += getSolutionIncludes(solutions, solutionWriter)
+  s += "\n"
+  s += getSolutionFunctionPointerTypedef(solutions[0]["ProblemType"], \
+      solutionWriter)
+  s += "extern \"C\" {\n"
+  s += "extern const unsigned int tensileClientNumSolutions = %u;\n" \
+      % len(solutions)
+  s += "extern const SolutionFunctionPointer tensileClientSolutionFunctions[%u] = {\n" \
+      % len(solutions)
+  for i in range(0, len(solutions)):
+    s += "  %s%s\n" % (solutionWriter.getSolutionName(solutions[i]), \
+        "," if i < len(solutions)-1 else "")
+  s += "  };\n"
+  s += "}\n"
+
+  solutionTableFile = open(context.path("ClientSolutionTable.cpp"), "w")
+  solutionTableFile.write(CHeader)
+  solutionTableFile.write(s)
+  solutionTableFile.close()
+
+
+################################################################################
+# Write Prebuilt Client Data
+# - problem sizes, solution names and results file read by the prebuilt client
+################################################################################
+def writeClientData(solutions, stepName, context=None):
+  if context is None:
+    context = RunContext()
+  solutionWriter = getBenchmarkSolutionWriter(solutions)
+  s = ""
+  s += "# Tensile benchmark client data: %s\n" % stepName
+  s += "ResultsFile %s\n" % os.path.normpath(getResultsFileName(stepName, context))
+  s += "ProblemSizesFile %s\n" % getProblemSizesFileName(context)
+  s += "Solutions %u\n" % len(solutions)
+  for solution in solutions:
+    # add trailing ~ to match the compiled-in solution names
+    s += "%s~ %d %d %d\n" % (solutionWriter.getSolutionName(solution), \
+        solution["AssertSummationElementMultiple"], \
+        solution["AssertFree0ElementMultiple"], \
+        solution["AssertFree1ElementMultiple"])
+
+  clientDataFile = open(context.path("ClientData.txt"), "w")
+  clientDataFile.write(s)
+  clientDataFile.close()
+
+
 
 ################################################################################
 # Write Generated Benchmark Parameters
 ################################################################################
 def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
-    functionList):
+    functionList, context=None):
+  if context is None:
+    context = RunContext()
   h = ""
+  # prebuilt benchmark client loads solutions and problem sizes at runtime,
+  # so this header must not depend on the benchmark step
+  prebuilt = forBenchmark and context["PrebuiltClient"]
+  # problem sizes read from a binary file at runtime rather than compiled in
+  runtimeProblemSizes = forBenchmark \
+      and (prebuilt or context["BinaryProblemSizes"])
 
   ##############################################################################
   # Min Naming
   ##############################################################################
   if forBenchmark:
-    kernels = []
-    for solution in solutions:
-      solutionKernels = solution.getKernels()
-      for kernel in solutionKernels:
-        if kernel not in kernels:
-          kernels.append(kernel)
-
-    solutionSerialNaming = Solution.getSerialNaming(solutions)
-    kernelSerialNaming = Solution.getSerialNaming(kernels)
-    solutionMinNaming = Solution.getMinNaming(solutions)
-    kernelMinNaming = Solution.getMinNaming(kernels)
-    solutionWriter = SolutionWriter( \
-        solutionMinNaming, solutionSerialNaming, \
-        kernelMinNaming, kernelSerialNaming)
+    solutionWriter = getBenchmarkSolutionWriter(solutions)
 
-  if forBenchmark:
-    if globalParameters["MergeFiles"]:
-      h += "#include \"Solutions.h\"\n"
-    else:
-      for solution in solutions:
-        solutionName = solutionWriter.getSolutionName(solution)
-        h += "#include \"" + solutionName + ".h\"\n"
+  if prebuilt:
+    h += "#include <vector>\n"
+    h += "\n"
+  elif forBenchmark:
+    h += getSolutionIncludes(solutions, solutionWriter)
     h += "\n"
   else:
     h += "#include \"Tensile.h\"\n"
+  if runtimeProblemSizes:
+    h += "#include \"ProblemSizesFile.h\"\n"
+    h += "#define Tensile_BINARY_PROBLEM_SIZES 1\n"
+    h += "\n"
 
 
   h += "typedef enum {\n"
@@ -302,18 +533,18 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   h += "\n"
 
   h += "// Debug Params\n";
-  h += "const unsigned printTensorA=%x;\n" % int(globalParameters["PrintTensorA"])
-  h += "const unsigned printTensorB=%x;\n" % int(globalParameters["PrintTensorB"])
-  h += "const unsigned printTensorC=%x;\n" % int(globalParameters["PrintTensorC"])
+  h += "const unsigned printTensorA=%x;\n" % int(context["PrintTensorA"])
+  h += "const unsigned printTensorB=%x;\n" % int(context["PrintTensorB"])
+  h += "const unsigned printTensorC=%x;\n" % int(context["PrintTensorC"])
 
-  h += "const bool printWinnersOnly=%s;\n" % toCppBool(globalParameters["PrintWinnersOnly"])
+  h += "const bool printWinnersOnly=%s;\n" % toCppBool(context["PrintWinnersOnly"])
   h += "\n";
 
   h += "const char indexChars[%u] = \"%s" \
-      % (len(globalParameters["IndexChars"])+1, \
-      globalParameters["IndexChars"][0])
-  for i in range(1, len(globalParameters["IndexChars"])):
-    h += globalParameters["IndexChars"][i]
+      % (len(context["IndexChars"])+1, \
+      context["IndexChars"][0])
+  for i in range(1, len(context["IndexChars"])):
+    h += context["IndexChars"][i]
   h += "\";\n"
 
   h += "unsigned int functionIdx;\n"
@@ -532,15 +763,24 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   for problemTypeIdx in range(1, numProblemTypes):
       h += ", %u" % problemTypes[problemTypeIdx]["TotalIndices"]
   h += " };\n"
-  if forBenchmark:
+  if runtimeProblemSizes:
+    h += "unsigned int numProblems = 0;\n"
+    h += "const unsigned int (*problemSizes)[%u] = NULL;\n" \
+        % problemTypes[0]["TotalIndices"]
+    h += "unsigned int minStrides[%u];\n" % problemTypes[0]["TotalIndices"]
+    if not prebuilt:
+      problemSizesFileName = getProblemSizesFileName(context).replace("\\", "\\\\")
+      h += "const char *defaultProblemSizesFileName = \"%s\";\n" \
+          % problemSizesFileName
+  elif forBenchmark:
     h += "const unsigned int numProblems = %u;\n" \
         % problemSizes.totalProblemSizes
     h += "const unsigned int problemSizes[numProblems][%u] = {\n" \
         % problemTypes[0]["TotalIndices"]
-    for i in range(0, problemSizes.totalProblemSizes):
-      line = "  {%5u" %problemSizes.sizes[i][0]
+    for (i, problemSize) in enumerate(problemSizes):
+      line = "  {%5u" %problemSize[0]
       for j in range(1, problemTypes[0]["TotalIndices"]):
-        line += ",%5u" % problemSizes.sizes[i][j]
+        line += ",%5u" % problemSize[j]
       line += " }"
       h += line
       if i < problemSizes.totalProblemSizes-1:
@@ -604,7 +844,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   ##############################################################################
   # Max Problem Sizes
   ##############################################################################
-  if forBenchmark:
+  if forBenchmark and not runtimeProblemSizes:
     h += "size_t maxSizeC = %u;\n" % (problemSizes.maxC)
     h += "size_t maxSizeA = %u;\n" % (problemSizes.maxA)
     h += "size_t maxSizeB = %u;\n" % (problemSizes.maxB)
@@ -629,11 +869,8 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   ##############################################################################
   if forBenchmark:
     # Solution Ptrs
-    h += "typedef TensileStatus (*SolutionFunctionPointer)(\n"
-    argList = solutionWriter.getArgList(solutions[0]["ProblemType"], True, True, True)
-    for i in range(0, len(argList)):
-      h += "  %s %s%s" % (argList[i][0], argList[i][1], \
-          ",\n" if i < len(argList)-1 else ");\n\n")
+    h += getSolutionFunctionPointerTypedef(solutions[0]["ProblemType"], \
+        solutionWriter)
 
     h += "struct ClientSolutionInfo {\n"
     h += "  SolutionFunctionPointer functionPtr;\n"
@@ -646,26 +883,14 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
     h += "};\n";
 
     h += "/* solutions */\n"
-    # Problem Type Indices
-    h += "const unsigned int maxNumSolutions = %u;\n" % len(solutions)
-    h += "float solutionPerf[numProblems][maxNumSolutions]; // milliseconds\n"
-    h += "\n"
-
-    h += "static const ClientSolutionInfo solutions[maxNumSolutions] = {\n"
-    for i in range(0, len(solutions)):
-      solution = solutions[i]
-      solutionName = solutionWriter.getSolutionName(solution)
-      # add trailing ~ for some reason to the function name
-      h += "  {%s, \"%s~\", %d, %d, %d}" % \
-        (solutionName, solutionName,
-          solution["AssertSummationElementMultiple"],
-          solution["AssertFree0ElementMultiple"],
-          solution["AssertFree1ElementMultiple"])
-      if i < len(solutions)-1:
-        h += ","
+    if prebuilt:
+      h += "unsigned int maxNumSolutions = 0;\n"
+      h += "const ClientSolutionInfo *solutions = NULL;\n"
+      h += "std::vector<std::vector<float> > solutionPerf; // milliseconds\n"
       h += "\n"
-    h += " };\n"
-    h += "\n"
+    else:
+      h += getClientSolutionInfo(solutions, solutionWriter, \
+          runtimeProblemSizes)
 
   else:
     # Function Names
@@ -687,7 +912,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   ##############################################################################
   h += "/* runtime structures */\n"
   h += "TensileStatus status;\n"
-  if globalParameters["RuntimeLanguage"] == "OCL":
+  if context["RuntimeLanguage"] == "OCL":
     h += "cl_platform_id platform;\n"
     h += "cl_device_id device;\n"
     h += "cl_context context;\n"
@@ -719,6 +944,17 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   #    % globalParameters["ValidationMaxToPrint"]
   #h += "bool validationPrintValids = %s;\n" \
   #    % ("true" if globalParameters["ValidationPrintValids"] else "false")
+  if forBenchmark:
+    h += "const bool benchmarkConvergence = %s;\n" \
+        % toCppBool(context["BenchmarkConvergence"])
+    h += "const double convergenceTargetRelativeCI = %f;\n" \
+        % context["BenchmarkTargetRelativeCI"]
+    h += "const double convergenceMaxTimeMs = %f;\n" \
+        % context["BenchmarkMaxTimeMs"]
+    h += "const unsigned int convergenceMinSamples = %u;\n" \
+        % context["BenchmarkMinSamples"]
+    h += "const unsigned int convergenceMaxSamples = %u;\n" \
+        % context["BenchmarkMaxSamples"]
   h += "size_t validationStride;\n"
   if problemType["HighPrecisionAccumulate"]:
     h += "static bool useHighPrecisionAccumulate = true;\n"
@@ -785,7 +1021,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
     h += "    DataType alpha,\n"
     h += "    DataType beta, \n"
     h += "    unsigned int numEvents = 0, \n"
-    if globalParameters["RuntimeLanguage"] == "OCL":
+    if context["RuntimeLanguage"] == "OCL":
       h += "    cl_event *event_wait_list = NULL,\n"
       h += "    cl_event *outputEvent = NULL ) {\n"
     else:
@@ -794,7 +1030,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
 
     h += "  // calculate parameters assuming packed data\n"
     # strides
-    indexChars = globalParameters["IndexChars"]
+    indexChars = context["IndexChars"]
     firstStride = 1
     if problemType["UseInitialStrides"]:
       firstStride = 0
@@ -849,7 +1085,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
 
     h += "  // call solution function\n"
     h += "  auto f = solutions[solutionIdx].functionPtr;\n"
-    if globalParameters["RuntimeLanguage"] == "OCL":
+    if context["RuntimeLanguage"] == "OCL":
       h += "  return f( static_cast<cl_mem>(deviceC), static_cast<cl_mem>(deviceA), static_cast<cl_mem>(deviceB),\n"
     else:
       typeName = dataTypes[0].toCpp()
@@ -871,7 +1107,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
     for i in range(0, problemType["TotalIndices"]):
       h += "      size%s,\n" % indexChars[i]
     h += "      stream,\n"
-    if globalParameters["RuntimeLanguage"] == "OCL":
+    if context["RuntimeLanguage"] == "OCL":
        h += "      numEvents, event_wait_list, outputEvent ); // events\n"
     else:
        h += "      numEvents, startEvent, stopEvent); // events\n"
@@ -897,7 +1133,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
       h += "    unsigned int strideC, \n"
       h += "    unsigned int numEvents = 0, \n"
 
-      if globalParameters["RuntimeLanguage"] == "OCL":
+      if context["RuntimeLanguage"] == "OCL":
         h += "    cl_event *event_wait_list = NULL,\n"
         h += "    cl_event *outputEvent = NULL );\n\n"
       else:
@@ -926,7 +1162,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
         h += "    unsigned int strideC, \n"
         h += "    unsigned int numEvents, \n"
 
-        if globalParameters["RuntimeLanguage"] == "OCL":
+        if context["RuntimeLanguage"] == "OCL":
           h += "    cl_event *event_wait_list,\n"
           h += "    cl_event *outputEvent ) {\n\n"
         else:
@@ -949,7 +1185,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
                   % functionIdx
 
           # strides
-          indexChars = globalParameters["IndexChars"]
+          indexChars = context["IndexChars"]
           firstStride = 1
           if problemType["UseInitialStrides"]:
             firstStride = 0
@@ -988,7 +1224,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
           h += "    // call solution function\n"
           h += "    return %s_%s(\n" % (functionName, problemType)
           if enqueue:
-            if globalParameters["RuntimeLanguage"] == "OCL":
+            if context["RuntimeLanguage"] == "OCL":
               h += "        static_cast<cl_mem>(deviceC),\n"
               h += "        static_cast<cl_mem>(deviceA),\n"
               h += "        static_cast<cl_mem>(deviceB),\n"
@@ -1012,7 +1248,7 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
             h += "        size%s,\n" % indexChars[i]
           h += "        stream"
           if enqueue:
-            if globalParameters["RuntimeLanguage"] == "OCL":
+            if context["RuntimeLanguage"] == "OCL":
                h += ",\n        numEvents, event_wait_list, outputEvent"
             else:
                h += ",\n        numEvents, startEvent, stopEvent"
@@ -1025,18 +1261,19 @@ def writeClientParameters(forBenchmark, solutions, problemSizes, stepName, \
   ##############################################################################
   # Results File Name
   ##############################################################################
-  if forBenchmark:
+  if prebuilt:
+    h += "/* results file name */\n"
+    h += "const char *resultsFileName = NULL;\n"
+  elif forBenchmark:
     h += "/* results file name */\n"
-    resultsFileName = os.path.join(globalParameters["WorkingPath"], \
-        "../../Data","%s.csv" % stepName)
+    resultsFileName = getResultsFileName(stepName, context)
     resultsFileName = resultsFileName.replace("\\", "\\\\")
     h += "const char *resultsFileName = \"%s\";\n" % resultsFileName
 
   ##############################################################################
   # Write File
   ##############################################################################
-  clientParametersFile = open(os.path.join(globalParameters["WorkingPath"], \
-      "ClientParameters.h"), "w")
+  clientParametersFile = open(context.path("ClientParameters.h"), "w")
   clientParametersFile.write(CHeader)
   clientParametersFile.write(h)
   clientParametersFile.close()
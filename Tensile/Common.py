@@ -27,6 +27,9 @@ from subprocess import Popen, PIPE
 import time
 import platform
 import math
+import hashlib
+import json
+import tempfile
 
 startTime = time.time()
 
@@ -54,6 +57,13 @@ globalParameters["NumBenchmarks"] = 1             # how many benchmark data poin
 globalParameters["SyncsPerBenchmark"] = 1         # how iterations of the stream synchronization for-loop to do per benchmark data point
 globalParameters["EnqueuesPerSync"] = 1           # how many solution enqueues to perform per synchronization
 globalParameters["SleepPercent"] = 300            # how long to sleep after every data point: 25 means 25% of solution time. Sleeping lets gpu cool down more.
+globalParameters["BenchmarkConvergence"] = False  # T=repeat each timing sample (SyncsPerBenchmark*EnqueuesPerSync enqueues) until the 95% confidence interval of the mean is within BenchmarkTargetRelativeCI; achieved CI is written to the csv. F=time exactly one sample
+globalParameters["BenchmarkTargetRelativeCI"] = 0.02  # stop sampling once the CI half-width is within this fraction of the mean kernel time
+globalParameters["BenchmarkMaxTimeMs"] = 1000     # stop sampling a solution after this much wall time even if not converged
+globalParameters["BenchmarkMinSamples"] = 3       # minimum number of timing samples per solution before checking convergence (at least 2)
+globalParameters["BenchmarkMaxSamples"] = 100     # maximum number of timing samples per solution
+globalParameters["PrebuiltClient"] = False        # T=build the benchmark client host code once per problem size group and load each step's solutions library and problem sizes at runtime, F=compile a new client for every benchmark step
+globalParameters["BinaryProblemSizes"] = False    # T=benchmark client mmaps problem sizes from a binary file written per step (always on for PrebuiltClient), F=compile problem sizes into ClientParameters.h
 # validation
 globalParameters["NumElementsToValidate"] = 128   # number of elements to validate, 128 will be evenly spaced out (with prime number stride) across C tensor
 globalParameters["ValidationMaxToPrint"] = 4      # maximum number of mismatches to print
@@ -69,6 +79,8 @@ globalParameters["ShowProgressBar"] = True     # if False and library client alr
 globalParameters["WavefrontWidth"] = 64     # if False and library client already built, then building library client will be skipped when tensile is re-run
 globalParameters["ExitOnFails"] = 1     # Exit if failures detected.
 globalParameters["CpuThreads"] = -1  # How many CPU threads to use for kernel generation.  0=no threading, -1 == nproc, N=min(nproc,N)
+globalParameters["PipelineDepth"] = 1  # size groups whose kernels and clients are generated and built while another benchmarks on the device. 0=strictly one after the other
+globalParameters["JobTokens"] = -1  # jobs at once across kernel generation, assembler, make and clients; passed to make as a GNU make jobserver. -1 == nproc, 0=no job server (each tool picks its own parallelism)
 
 ########################################
 # less common
@@ -110,8 +122,19 @@ globalParameters["Device"] = 0                    # select hip device or opencl
 # shouldn't need to change
 globalParameters["DeviceLDS"] = 65536             # LDS bytes per CU, for computing occupancy
 globalParameters["MaxLDS"] = 65536                # max LDS a kernel should attempt to use
+globalParameters["AnalyzeKernelResources"] = False # T=generate and statically analyze assembly kernels while enumerating solutions; reject those exceeding register/LDS limits before assembling
+globalParameters["MinOccupancy"] = 0              # reject assembly kernels whose analyzed occupancy is below this many waves/SIMD; >0 turns on the analysis of AnalyzeKernelResources by itself
+globalParameters["PeepholeAssembly"] = False       # T=apply the peephole pass (redundant waitcnts, dead/foldable moves) to assembly kernels before assembling them
+globalParameters["PerformanceModel"] = None        # None=benchmark every valid solution; "Roofline" (or module.Class) prunes solutions predicted to lose before benchmarking them
+globalParameters["PerformanceModelMargin"] = 0.5  # keep solutions predicted within this fraction of the best of their hardcoded group on some problem size
+globalParameters["PerformanceModelCalibration"] = None # yaml of per-arch model parameters written by tensileCalibratePerformanceModel
+globalParameters["SolutionMemoPath"] = None        # directory memoizing derived solution parameters and rejections across runs; None=derive every solution
+globalParameters["ProbeCachePath"] = os.path.join(os.environ.get("XDG_CACHE_HOME", \
+    os.path.join(os.path.expanduser("~"), ".cache")), "tensile") # startup gpu/assembler probes are cached here, keyed on the tools found; None=probe every run
+globalParameters["Trace"] = False                 # T=record nested spans of each stage, worker and subprocess; write Trace.json (chrome://tracing, Perfetto) and print where the time went
 globalParameters["MaxDepthU"] = 256               # max DepthU value to allow
 globalParameters["ShortNames"] = False            # on windows kernel names can get too long; =True will convert solution/kernel names to serial ids
+globalParameters["HashedNames"] = False           # T=solution/kernel names are digests of their full names (short, stable symbols); HashedNames.txt maps them back
 globalParameters["MergeFiles"] = True             # F=store every solution and kernel in separate file; T=store all solutions in single file
 globalParameters["SupportedISA"] = [(8,0,3), (9,0,0), (9,0,6)]             # assembly kernels writer supports these architectures
 globalParameters["BenchmarkProblemsPath"] = "1_BenchmarkProblems" # subdirectory for benchmarking phases
@@ -142,33 +165,96 @@ globalParameters["EnableHalf"] = False
 globalParameters["ClientArgs"] = ""
 
 ################################################################################
-# Enumerate Valid Solution Parameters
+# Valid Values
+# domain of a solution parameter that is too large to list: membership is a
+# predicate and iterating enumerates the values lazily, in the order the
+# lists they replace had
 ################################################################################
-validWorkGroups = []
-for numThreads in range(64, 1025, 64):
-  for nsg in [ 1, 2, 4, 8, 16, 32, 64, 96, 128, 256 ]:
-    for sg0 in range(1, numThreads/nsg+1):
-      sg1 = numThreads/nsg/sg0
-      if sg0*sg1*nsg == numThreads:
-          workGroup = [sg0, sg1, nsg]
-          validWorkGroups.append(workGroup)
+class ValidValues:
+  def __init__(self, contains, enumerate, description):
+    self.contains = contains
+    self.enumerate = enumerate
+    self.description = description
+    self.numValues = None
+
+  def __contains__(self, value):
+    try:
+      return self.contains(value)
+    except (TypeError, ValueError):
+      return False
+
+  def __iter__(self):
+    return self.enumerate()
+
+  def __len__(self):
+    if self.numValues is None:
+      self.numValues = sum(1 for value in self.enumerate())
+    return self.numValues
+
+  def __repr__(self):
+    return self.description
+
+def isInteger(value):
+  return isinstance(value, (int, long, float)) and value == int(value)
+
+# integers in [start, stop) outside of the excluded [excludeStart, excludeStop)
+def validRange(start, stop, excludeStart=0, excludeStop=0):
+  def contains(value):
+    return isInteger(value) and start <= value < stop \
+        and not excludeStart <= value < excludeStop
+  def enumerate():
+    for value in xrange(start, stop):
+      if not excludeStart <= value < excludeStop:
+        yield value
+  description = "range(%d, %d)" % (start, stop)
+  if excludeStart < excludeStop:
+    description += " without range(%d, %d)" % (excludeStart, excludeStop)
+  return ValidValues(contains, enumerate, description)
+
+# pairs [a, b] with a and b from sides
+def validPairs(sides):
+  sideSet = set(sides)
+  def contains(value):
+    return isinstance(value, list) and len(value) == 2 \
+        and value[0] in sideSet and value[1] in sideSet
+  def enumerate():
+    for i in sides:
+      for j in sides:
+        yield [i, j]
+  return ValidValues(contains, enumerate, "[a, b] for a, b in %s" % sides)
+
+# [sg0, sg1, LocalSplitU]: a multiple of 64 threads, up to 1024
+validLocalSplitUs = [ 1, 2, 4, 8, 16, 32, 64, 96, 128, 256 ]
+def validWorkGroupContains(value):
+  if not isinstance(value, list) or len(value) != 3:
+    return False
+  (sg0, sg1, nsg) = value
+  if not (isInteger(sg0) and isInteger(sg1) and sg0 >= 1 and sg1 >= 1) \
+      or nsg not in validLocalSplitUs:
+    return False
+  numThreads = sg0 * sg1 * nsg
+  return 64 <= numThreads <= 1024 and numThreads % 64 == 0
 
+def validWorkGroupEnumerate():
+  for numThreads in range(64, 1025, 64):
+    for nsg in validLocalSplitUs:
+      for sg0 in range(1, numThreads/nsg+1):
+        sg1 = numThreads/nsg/sg0
+        if sg0*sg1*nsg == numThreads:
+          yield [sg0, sg1, nsg]
+
+validWorkGroups = ValidValues(validWorkGroupContains, validWorkGroupEnumerate, \
+    "[sg0, sg1, LocalSplitU in %s] with 64..1024 threads in steps of 64" \
+    % validLocalSplitUs)
 
 validThreadTileSides = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]
-validThreadTiles = []
-for i in validThreadTileSides:
-  for j in validThreadTileSides:
-    validThreadTiles.append([i, j])
+validThreadTiles = validPairs(validThreadTileSides)
 
 validMacroTileSides = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 6, 12, 24, 48, 96, 192, 384, 768 ]
-validMacroTiles = []
+validMacroTiles = validPairs(validMacroTileSides)
 validISA = [(0,0,0)]
 validISA.extend(globalParameters["SupportedISA"])
-depthUs = range(-16, 0)
-depthUs.extend(range(2,512+1,1))
-for i in validMacroTileSides:
-  for j in validMacroTileSides:
-    validMacroTiles.append([i, j])
+depthUs = validRange(-16, 512+1, 0, 2)
 validParameters = {
     "LoopDoWhile":                [ False, True ], # Source. True=DoWhile, False=For loop
     "LoopTail":                   [ False, True ], # tail loop handles non multiples of unrolled summation loop
@@ -203,7 +289,7 @@ validParameters = {
     # GSUWGMRR=False means workgroup 0,1,2,3 will all work on the same tile; =True means workgroup 0, N-1, 2N-1, 3N-1 will all work on the same tile
     # GSUSARR=False means the 4 workgroups do whole chunks of the summation: k=0 -> K/4-1, k=K/4 -> 2K/4-1, k=2K/4 -> 3K/4-1, k=3K/4 -> 4K/4-1
     # GSUSARR=True means the 4 workgroups round robin split up the chunks of the summation: k=0 -> DU-1, 4DU -> 5DU-1, ...; k=1DU -> 2DU-1, 5DU -> 6DU-1...; ...
-    "GlobalSplitU":               range(1, 1024+1),
+    "GlobalSplitU":               validRange(1, 1024+1),
     "GlobalSplitUWorkGroupMappingRoundRobin":     [ False, True ],
     "GlobalSplitUSummationAssignmentRoundRobin":  [ False, True ],
 
@@ -296,9 +382,9 @@ validParameters = {
     # 0   : Use hardware-assigned wg number with no remapping.
     # N   : WG block width.  "Wrap" to a new wg1 "row" assignment after N WGs assigned in that row.
     # < 0 : Swaps the position of wg0 and wg1.
-    "WorkGroupMapping":           range(-1024,1024+1),  # change a workgroup's id so that the all the workgroups on the gpu at a time are hitting L2 cache the best
+    "WorkGroupMapping":           validRange(-1024,1024+1),  # change a workgroup's id so that the all the workgroups on the gpu at a time are hitting L2 cache the best
     "WorkGroupMappingType":       ["B", "Z"],           # Blocking, Z-order (not any faster than blocking, especially for the arithmetic it requires)
-    "MaxOccupancy":               range(1, 40+1),       # wg / CU; if cache thrashing is hurting performance, this allocates extra lds to artificially limit occupancy
+    "MaxOccupancy":               validRange(1, 40+1),       # wg / CU; if cache thrashing is hurting performance, this allocates extra lds to artificially limit occupancy
     "WorkGroup":                  validWorkGroups,      # ( wg0 x wg1 x LocalSplitU ) dimensions of the workgroup which will operate on a tile and share lds
     "ThreadTile":                 validThreadTiles,     # ( tt0 x tt1 ) dimensions of the C tile that each thread works on, TT=4 and VW=4 means a thread will work on a tight 4x4 tile of C, where VW=1 means the tile will work on 16 spread out values
     "MacroTile":                  validMacroTiles,      # MT0 = wg0*tt0, MT1 = wg1*tt1
@@ -356,8 +442,8 @@ validParameters = {
 
     # place upper and lower limits on the skinny-ness of macro tiles; shape=1 means square tile, like 64x64. shape=4 means 4x64 or 64x4 or 128x8...
     # these will just mark some kernels as invalid so that fewer kernels will be checked
-    "MacroTileShapeMin":          range(1, 256+1),
-    "MacroTileShapeMax":          range(1, 256+1),
+    "MacroTileShapeMin":          validRange(1, 256+1),
+    "MacroTileShapeMax":          validRange(1, 256+1),
 
     # when loading all the data from global into lds requires multiple load instructions, these parameters govern which
     # loads will pull which rectangle of data from global into lds
@@ -365,8 +451,8 @@ validParameters = {
     # NLC=-1 looks for the largest number of reads along the coalesced dimension which results in the least ammount of coalescing;
     # however in this case the stride between one load and another is a static value, therefore buffer loads only need one set of registers
     # whereas the =1 case has a stride which is a multiple of a kernel argument and therefore needs one address per load in the perpendicular dimension
-    "NumLoadsCoalescedA":         range(-1, 64+1),
-    "NumLoadsCoalescedB":         range(-1, 64+1),
+    "NumLoadsCoalescedA":         validRange(-1, 64+1),
+    "NumLoadsCoalescedB":         validRange(-1, 64+1),
 
     # DepthU, LocalSplitU (which is the 3rd number in WorkGroup), and LoopUnroll are closely related
     # LoopUnroll=4 means there are 4 subiterations within the loop, 4 actual iterations written in the code.
@@ -387,8 +473,8 @@ validParameters = {
     "LdsPadB":                     [ -1, 0, 1, 2, 3, 4, 8],
 
     # tinkered with adding extra syncs or waits in the assembly kernels to see if it would improve the sequencing between workgroups, "fully synchronous scheduling" is WAY more promising; this can be deprecated
-    "PerformanceSyncLocation":    range(-1, 16*16+1),
-    "PerformanceWaitLocation":    range(-1, 16*16+1),
+    "PerformanceSyncLocation":    validRange(-1, 16*16+1),
+    "PerformanceWaitLocation":    validRange(-1, 16*16+1),
     "PerformanceWaitCount":       range(-1, 16),
 
     # add gls or slc after global memory read/writes to change cacheing, not cacheing the writes is promising and improved performance a tiny bit
@@ -731,6 +817,144 @@ def tryAssembler(isaVersion, asmString):
   return 1 # syntax works
 
 
+################################################################################
+# Probe Toolchain
+# the subprocesses assignGlobalParameters needs: the local gpu isa, the
+# assembler's capabilities per isa and the installed hcc package version
+################################################################################
+asmCapProbes = OrderedDict([
+    ("SupportedIsa", ""),
+    ("HasExplicitCO", "v_add_co_u32 v0,vcc,v0,v0"),
+    ("HasDirectToLds", "buffer_load_dword v40, v36, s[24:27], s28 offen offset:0 lds"),
+    ("HasAddLshl", "v_add_lshl_u32 v47, v36, v34, 0x2"),
+    ("HasSMulHi", "s_mul_hi_u32 s47, s36, s34"),
+    ])
+
+def probeToolchain():
+  probes = {"CurrentISA": (0,0,0), "HccVersion": "0,0,0", "AsmCaps": {}}
+
+  # read current gfx version
+  if os.name != "nt" and globalParameters["CurrentISA"] == (0,0,0) and globalParameters["ROCmAgentEnumeratorPath"]:
+    process = Popen([globalParameters["ROCmAgentEnumeratorPath"], "-t", "GPU"], stdout=PIPE)
+    line = process.stdout.readline()
+    while line != "":
+      gfxIdx = line.find("gfx")
+      if gfxIdx >= 0:
+        major = int(line[gfxIdx+3:gfxIdx+4])
+        minor = int(line[gfxIdx+4:gfxIdx+5])
+        step  = int(line[gfxIdx+5:gfxIdx+6])
+        if (major,minor,step) in globalParameters["SupportedISA"]:
+          print1("# Detected local GPU with ISA: gfx%u%u%u"%(major, minor, step))
+          probes["CurrentISA"] = (major, minor, step)
+        line = process.stdout.readline()
+    if probes["CurrentISA"] == (0,0,0):
+      printWarning("Did not detect SupportedISA: %s; cannot benchmark assembly kernels." % globalParameters["SupportedISA"])
+    if process.returncode:
+      printWarning("%s exited with code %u" % (globalParameters["ROCmAgentEnumeratorPath"], process.returncode))
+
+  # Determine assembler capabilities:
+  # Try to assemble the new explicit co syntax:
+  for (v) in globalParameters["SupportedISA"]:
+    probes["AsmCaps"][v] = {}
+    isaVersion = "gfx" + "".join(map(str,v))
+    for (cap, asmString) in asmCapProbes.items():
+      probes["AsmCaps"][v][cap] = tryAssembler(isaVersion, asmString)
+
+  # For ubuntu platforms, call dpkg to grep the version of hcc.  This check is platform specific, and in the future
+  # additional support for yum, dnf zypper may need to be added.  On these other platforms, the default version of
+  # '0.0.0' will persist
+  if platform.linux_distribution()[0] == "Ubuntu":
+    process = Popen(["dpkg", "-l", "hcc"], stdout=PIPE)
+    if process.returncode:
+      printWarning("%s looking for package %s exited with code %u" % ('dpkg', 'hcc', process.returncode))
+
+    line = process.stdout.readline()
+    while line != "":
+      packageIdx = line.find("hcc")
+      if packageIdx >= 0:
+        probes["HccVersion"] = line.split()[2]
+        break
+      line = process.stdout.readline()
+  return probes
+
+################################################################################
+# Probe Cache
+# probes are stored per fingerprint of what they depend on: the located
+# tools (path, size, mtime), the dpkg database, the gpu nodes the kernel
+# driver lists and the probes themselves; anything changing reprobes
+################################################################################
+probeCacheFileName = "ProbeCache.json"
+
+def fileFingerprint(filePath):
+  if filePath is None or not os.path.exists(filePath):
+    return None
+  fileStat = os.stat(filePath)
+  return [os.path.realpath(filePath), fileStat.st_size, fileStat.st_mtime]
+
+def probeFingerprint():
+  gpuIds = []
+  topologyPath = "/sys/class/kfd/kfd/topology/nodes"
+  if os.path.isdir(topologyPath):
+    for node in sorted(os.listdir(topologyPath)):
+      try:
+        with open(os.path.join(topologyPath, node, "gpu_id"), "r") as gpuIdFile:
+          gpuIds.append(gpuIdFile.read().strip())
+      except IOError:
+        pass
+  fingerprint = [ __version__, os.name, globalParameters["CurrentISA"], \
+      globalParameters["SupportedISA"], asmCapProbes.items(), gpuIds, \
+      fileFingerprint("/var/lib/dpkg/status") ]
+  for tool in ["ROCmAgentEnumeratorPath", "AssemblerPath", "ROCmSMIPath"]:
+    fingerprint.append(fileFingerprint(globalParameters[tool]))
+  return hashlib.sha1(repr(fingerprint)).hexdigest()
+
+# json has no tuples; isas are stored as "9,0,0"
+def readProbeCache(probeCachePath, fingerprint):
+  if not probeCachePath:
+    return None
+  try:
+    with open(os.path.join(probeCachePath, probeCacheFileName), "r") as cacheFile:
+      cache = json.load(cacheFile)
+  except (IOError, ValueError):
+    return None
+  if fingerprint not in cache:
+    return None
+  probes = cache[fingerprint]
+  asmCaps = {}
+  for isa in probes["AsmCaps"]:
+    caps = {}
+    for cap in probes["AsmCaps"][isa]:
+      caps[str(cap)] = probes["AsmCaps"][isa][cap]
+    asmCaps[tuple([int(i) for i in isa.split(",")])] = caps
+  return { "CurrentISA": tuple(probes["CurrentISA"]), \
+      "HccVersion": str(probes["HccVersion"]), "AsmCaps": asmCaps }
+
+def writeProbeCache(probeCachePath, fingerprint, probes):
+  if not probeCachePath:
+    return
+  cacheFileName = os.path.join(probeCachePath, probeCacheFileName)
+  try:
+    cache = {}
+    if os.path.exists(cacheFileName):
+      try:
+        with open(cacheFileName, "r") as cacheFile:
+          cache = json.load(cacheFile)
+      except ValueError:
+        pass
+    asmCaps = {}
+    for isa in probes["AsmCaps"]:
+      asmCaps[",".join(map(str, isa))] = probes["AsmCaps"][isa]
+    cache[fingerprint] = { "CurrentISA": list(probes["CurrentISA"]), \
+        "HccVersion": probes["HccVersion"], "AsmCaps": asmCaps }
+    ensurePath(probeCachePath)
+    (fileHandle, tempFileName) = tempfile.mkstemp(dir=probeCachePath)
+    with os.fdopen(fileHandle, "w") as cacheFile:
+      json.dump(cache, cacheFile, indent=2, sort_keys=True)
+    os.rename(tempFileName, cacheFileName)
+  except (IOError, OSError) as e:
+    print2("# Cannot write probe cache %s: %s" % (cacheFileName, e))
+
+
 ################################################################################
 # Assign Global Parameters
 # each global parameter has a default parameter, and the user
@@ -763,38 +987,26 @@ def assignGlobalParameters( config ):
   globalParameters["AssemblerPath"] = locateExe("/opt/rocm/bin", "hcc")
   globalParameters["ROCmSMIPath"] = locateExe("/opt/rocm/bin", "rocm-smi")
 
-  # read current gfx version
-  if os.name != "nt" and globalParameters["CurrentISA"] == (0,0,0) and globalParameters["ROCmAgentEnumeratorPath"]:
-    process = Popen([globalParameters["ROCmAgentEnumeratorPath"], "-t", "GPU"], stdout=PIPE)
-    line = process.stdout.readline()
-    while line != "":
-      gfxIdx = line.find("gfx")
-      if gfxIdx >= 0:
-        major = int(line[gfxIdx+3:gfxIdx+4])
-        minor = int(line[gfxIdx+4:gfxIdx+5])
-        step  = int(line[gfxIdx+5:gfxIdx+6])
-        if (major,minor,step) in globalParameters["SupportedISA"]:
-          print1("# Detected local GPU with ISA: gfx%u%u%u"%(major, minor, step))
-          globalParameters["CurrentISA"] = (major, minor, step)
-        line = process.stdout.readline()
-    if globalParameters["CurrentISA"] == (0,0,0):
-      printWarning("Did not detect SupportedISA: %s; cannot benchmark assembly kernels." % globalParameters["SupportedISA"])
-    if process.returncode:
-      printWarning("%s exited with code %u" % (globalParameters["ROCmAgentEnumeratorPath"], process.returncode))
+  # probe the gpu and toolchain, or reuse the probes of an identical setup
+  probeCachePath = config["ProbeCachePath"] if "ProbeCachePath" in config \
+      else globalParameters["ProbeCachePath"]
+  fingerprint = probeFingerprint()
+  probes = readProbeCache(probeCachePath, fingerprint)
+  if probes is None:
+    probes = probeToolchain()
+    writeProbeCache(probeCachePath, fingerprint, probes)
+  else:
+    print2("# Toolchain probes read from %s" % probeCachePath)
+  if globalParameters["CurrentISA"] == (0,0,0):
+    globalParameters["CurrentISA"] = probes["CurrentISA"]
+  globalParameters["HccVersion"] = probes["HccVersion"]
 
-  # Determine assembler capabilities:
-  # Try to assemble the new explicit co syntax:
   globalParameters["AsmCaps"] = {}
   globalParameters["ArchCaps"] = {}
   for (v) in globalParameters["SupportedISA"]:
-    globalParameters["AsmCaps"][v] = {}
+    globalParameters["AsmCaps"][v] = probes["AsmCaps"][v]
     globalParameters["ArchCaps"][v] = {}
     isaVersion = "gfx" + "".join(map(str,v))
-    globalParameters["AsmCaps"][v]["SupportedIsa"] = tryAssembler(isaVersion, "")
-    globalParameters["AsmCaps"][v]["HasExplicitCO"] = tryAssembler(isaVersion, "v_add_co_u32 v0,vcc,v0,v0")
-    globalParameters["AsmCaps"][v]["HasDirectToLds"] = tryAssembler(isaVersion, "buffer_load_dword v40, v36, s[24:27], s28 offen offset:0 lds")
-    globalParameters["AsmCaps"][v]["HasAddLshl"] = tryAssembler(isaVersion, "v_add_lshl_u32 v47, v36, v34, 0x2")
-    globalParameters["AsmCaps"][v]["HasSMulHi"] = tryAssembler(isaVersion, "s_mul_hi_u32 s47, s36, s34")
     caps = ""
     for k in globalParameters["AsmCaps"][v]:
       caps += " %s=%u" % (k, globalParameters["AsmCaps"][v][k])
@@ -803,28 +1015,16 @@ def assignGlobalParameters( config ):
     globalParameters["ArchCaps"][v]["HasEccHalf"] = (v==(9,0,6))
     print1 ("# Arch caps for %s:%s" % (isaVersion, globalParameters["ArchCaps"][v]))
 
-  # For ubuntu platforms, call dpkg to grep the version of hcc.  This check is platform specific, and in the future
-  # additional support for yum, dnf zypper may need to be added.  On these other platforms, the default version of
-  # '0.0.0' will persist
-  if platform.linux_distribution()[0] == "Ubuntu":
-    process = Popen(["dpkg", "-l", "hcc"], stdout=PIPE)
-    if process.returncode:
-      printWarning("%s looking for package %s exited with code %u" % ('dpkg', 'hcc', process.returncode))
-
-    line = process.stdout.readline()
-    while line != "":
-      packageIdx = line.find("hcc")
-      if packageIdx >= 0:
-        globalParameters["HccVersion"] = line.split()[2]
-        break
-      line = process.stdout.readline()
-
   for key in config:
     value = config[key]
     if key not in globalParameters:
       printWarning("Global parameter %s = %s unrecognised." % ( key, value ))
     globalParameters[key] = value
 
+  if globalParameters["PrebuiltClient"] and os.name == "nt":
+    printWarning("PrebuiltClient requires dlopen; building a client per benchmark step instead.")
+    globalParameters["PrebuiltClient"] = False
+
 
 
 ################################################################################
@@ -846,19 +1046,66 @@ def assignParameterRequired(destinationDictionary, key, sourceDictionary):
     printExit("Parameter \"%s\" must be defined in dictionary %s" % (key, sourceDictionary) )
 
 
+################################################################################
+# Run Context
+# where a pipeline writes its files and the parameters and device it runs
+# with; child() returns a new context for a subdirectory rather than changing
+# shared state, so problem types, size groups and steps can run concurrently
+# - parameters are globalParameters overlaid with the context's overrides
+################################################################################
+class RunContext:
+
+  def __init__(self, workingPath=None, overrides=None, device=None):
+    self.workingPath = globalParameters["WorkingPath"] \
+        if workingPath is None else workingPath
+    self.overrides = dict(overrides) if overrides else {}
+    if device is not None:
+      self.overrides["Device"] = device
+
+  def __getitem__(self, key):
+    if key == "WorkingPath":
+      return self.workingPath
+    if key in self.overrides:
+      return self.overrides[key]
+    return globalParameters[key]
+
+  def __contains__(self, key):
+    return key == "WorkingPath" or key in self.overrides \
+        or key in globalParameters
+
+  @property
+  def device(self):
+    return self["Device"]
+
+  def path(self, *names):
+    return os.path.join(self.workingPath, *names)
+
+  # context for a subdirectory, which is created
+  def child(self, folderName):
+    return RunContext(ensurePath(self.path(folderName)), self.overrides)
+
+  def parent(self):
+    return RunContext(os.path.split(self.workingPath)[0], self.overrides)
+
+  # context with parameters overridden for its pipeline only
+  def override(self, **parameters):
+    overrides = dict(self.overrides)
+    overrides.update(parameters)
+    return RunContext(self.workingPath, overrides)
+
+  def __str__(self):
+    return "RunContext(%s, %s)" % (self.workingPath, self.overrides)
+
+
 ################################################################################
 # Push / Pop Working Path
-# store a WorkingPath where to write files (like benchmark files)
+# store a WorkingPath where to write files (like benchmark files); wraps
+# RunContext for callers of the global API, which is not thread-safe
 ################################################################################
 def pushWorkingPath( foldername ):
-  # Warning: this is not thread-safe, modifies the global WorkingPath!
-  globalParameters["WorkingPath"] = \
-      os.path.join(globalParameters["WorkingPath"], foldername )
-  ensurePath( globalParameters["WorkingPath"] )
+  globalParameters["WorkingPath"] = RunContext().child(foldername).workingPath
 def popWorkingPath():
-  # Warning: this is not thread-safe, modifies the global WorkingPath!
-  globalParameters["WorkingPath"] = \
-      os.path.split(globalParameters["WorkingPath"])[0]
+  globalParameters["WorkingPath"] = RunContext().parent().workingPath
 def ensurePath( path ):
   if not os.path.exists(path):
     os.makedirs(path)
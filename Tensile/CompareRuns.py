@@ -0,0 +1,337 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Compare Runs
+# - diffs two tuning runs, each given as 2_BenchmarkData csv/yaml pairs or
+#   library logic yaml files, joined on problem type, problem size and a
+#   canonical key of each solution's parameters
+# - per size the winners are compared: a change is significant only beyond
+#   the larger of --noise and the combined 95% confidence intervals the
+#   client wrote with BenchmarkConvergence
+# - predicts the library-level impact as the change in time to run every
+#   common size once, weighted by its flops
+# - exits non-zero when a size is significantly slower by more than
+#   --threshold or the predicted library time grows by more than it
+################################################################################
+import os
+import sys
+import csv
+import argparse
+from math import sqrt, log, exp
+
+from Common import printExit, printWarning, HR
+from SolutionStructs import ProblemType
+import YAMLIO
+
+
+################################################################################
+# Canonical Solution Key
+# hashable form of a solution's parameters, ignoring the fields which only
+# number or name it within one run
+################################################################################
+solutionKeyIgnoredFields = ["SolutionIndex", "SolutionNameMin"]
+
+def freeze(value):
+  if isinstance(value, dict):
+    return tuple(sorted([(k, freeze(v)) for (k, v) in value.items()]))
+  if isinstance(value, list):
+    return ("list",) + tuple([freeze(v) for v in value])
+  return value
+
+def solutionKey(state):
+  return freeze(dict([(k, v) for (k, v) in state.items() \
+      if k not in solutionKeyIgnoredFields]))
+
+
+################################################################################
+# Run Results
+# results[(problemTypeName, size)][solutionKey] = (gflops, relativeCI or None)
+# names[solutionKey] = name to report the solution by
+################################################################################
+class RunResults:
+
+  def __init__(self):
+    self.results = {}
+    self.names = {}
+
+  # repeated measurements of a solution keep the fastest
+  def add(self, problemTypeName, size, key, name, gflops, relativeCI=None):
+    if gflops <= 0:
+      return # invalid
+    self.names[key] = name
+    sizeResults = self.results.setdefault((problemTypeName, size), {})
+    if key not in sizeResults or gflops > sizeResults[key][0]:
+      sizeResults[key] = (gflops, relativeCI)
+
+  def winner(self, sizeKey):
+    sizeResults = self.results.get(sizeKey, {})
+    if len(sizeResults) == 0:
+      return None
+    return max(sizeResults.items(), key=lambda item: item[1][0])
+
+# csv written by the benchmark client and the solutions yaml beside it
+def readBenchmarkData(run, dataFileName):
+  solutionsFileName = os.path.splitext(dataFileName)[0] + ".yaml"
+  if not os.path.exists(solutionsFileName):
+    printWarning("%s doesn't exist for %s" % (solutionsFileName, dataFileName))
+    return
+  states = YAMLIO.readConfig(solutionsFileName)[2:]
+  if len(states) == 0:
+    return
+  problemType = ProblemType(states[0]["ProblemType"])
+  name = str(problemType)
+  numIndices = problemType["TotalIndices"]
+  keys = [solutionKey(state) for state in states]
+  solutionStartIdx = 1 + numIndices + 1
+  ciStartIdx = solutionStartIdx + len(states)
+  with open(dataFileName, "r") as dataFile:
+    rows = csv.reader(dataFile)
+    header = [column.strip() for column in rows.next()]
+    for row in rows:
+      if len(row) < ciStartIdx:
+        continue
+      size = tuple([int(row[i]) for i in range(1, 1+numIndices)])
+      hasCI = len(row) >= ciStartIdx + len(states)
+      for i in range(0, len(states)):
+        run.add(name, size, keys[i], header[solutionStartIdx+i], \
+            float(row[solutionStartIdx+i]), \
+            float(row[ciStartIdx+i]) if hasCI else None)
+
+# exact logic of a library logic file; range logic was never measured
+def readLibraryLogic(run, data):
+  name = str(ProblemType(data[4]))
+  states = data[5]
+  keys = [solutionKey(state) for state in states]
+  for (size, (solutionIdx, gflops)) in data[7]:
+    run.add(name, tuple(size), keys[solutionIdx], \
+        states[solutionIdx].get("SolutionNameMin", str(solutionIdx)), gflops)
+
+def isLibraryLogic(data):
+  return isinstance(data, list) and len(data) >= 9 \
+      and isinstance(data[0], dict) and "MinimumRequiredVersion" in data[0] \
+      and isinstance(data[5], list) and isinstance(data[7], list)
+
+# a run from csv or logic files, or directories of them
+def readRun(paths):
+  run = RunResults()
+  fileNames = []
+  for path in paths:
+    if os.path.isdir(path):
+      fileNames += [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    else:
+      fileNames.append(path)
+  dataFileNames = set([f for f in fileNames \
+      if os.path.splitext(f)[1] == ".csv"])
+  for fileName in fileNames:
+    (base, extension) = os.path.splitext(fileName)
+    if extension == ".csv":
+      readBenchmarkData(run, fileName)
+    elif extension == ".yaml" and base + ".csv" not in dataFileNames:
+      data = YAMLIO.readConfig(fileName)
+      if isLibraryLogic(data):
+        readLibraryLogic(run, data)
+  return run
+
+
+################################################################################
+# Compare
+################################################################################
+# relative change of a ratio beyond which it is not noise
+def noiseThreshold(baselineCI, candidateCI, noise):
+  combined = sqrt((baselineCI or 0)**2 + (candidateCI or 0)**2)
+  return max(noise, combined)
+
+def estimatedFlops(size):
+  flops = 2
+  for index in size:
+    flops *= index
+  return flops
+
+class SizeComparison:
+
+  def __init__(self, sizeKey, baseline, candidate, noise):
+    (self.problemTypeName, self.size) = sizeKey
+    (self.baselineWinner, (self.baselineGFlops, baselineCI)) = baseline
+    (self.candidateWinner, (self.candidateGFlops, candidateCI)) = candidate
+    self.speedup = self.candidateGFlops / self.baselineGFlops
+    self.threshold = noiseThreshold(baselineCI, candidateCI, noise)
+    self.significant = abs(log(self.speedup)) > log(1 + self.threshold)
+    self.winnerChanged = self.baselineWinner != self.candidateWinner
+    self.flops = estimatedFlops(self.size)
+
+  def isRegression(self, threshold):
+    return self.significant and self.speedup < 1.0 / (1 + threshold)
+
+class Comparison:
+
+  def __init__(self, baseline, candidate, noise):
+    self.names = dict(baseline.names)
+    self.names.update(candidate.names)
+    self.sizes = []
+    self.baselineOnly = 0
+    self.candidateOnly = 0
+    for sizeKey in sorted(set(baseline.results) | set(candidate.results)):
+      baselineWinner = baseline.winner(sizeKey)
+      candidateWinner = candidate.winner(sizeKey)
+      if baselineWinner is None:
+        self.candidateOnly += 1
+      elif candidateWinner is None:
+        self.baselineOnly += 1
+      else:
+        self.sizes.append(SizeComparison(sizeKey, baselineWinner, \
+            candidateWinner, noise))
+
+    # the same solution on the same size in both runs
+    self.numSolutionPairs = 0
+    self.numSolutionsSlower = 0
+    self.numSolutionsFaster = 0
+    for sizeKey in set(baseline.results) & set(candidate.results):
+      candidateResults = candidate.results[sizeKey]
+      for (key, (gflops, ci)) in baseline.results[sizeKey].items():
+        if key not in candidateResults:
+          continue
+        (candidateGFlops, candidateCI) = candidateResults[key]
+        change = log(candidateGFlops / gflops)
+        self.numSolutionPairs += 1
+        if abs(change) > log(1 + noiseThreshold(ci, candidateCI, noise)):
+          if change < 0:
+            self.numSolutionsSlower += 1
+          else:
+            self.numSolutionsFaster += 1
+
+  def geometricMeanSpeedup(self):
+    if len(self.sizes) == 0:
+      return 1.0
+    return exp(sum([log(s.speedup) for s in self.sizes]) / len(self.sizes))
+
+  # ratio of the time to run every common size once, baseline / candidate
+  def librarySpeedup(self):
+    baselineTime = sum([s.flops / s.baselineGFlops for s in self.sizes])
+    candidateTime = sum([s.flops / s.candidateGFlops for s in self.sizes])
+    return baselineTime / candidateTime if candidateTime > 0 else 1.0
+
+  def regressions(self, threshold):
+    return [s for s in self.sizes if s.isRegression(threshold)]
+
+  def passes(self, threshold):
+    return len(self.regressions(threshold)) == 0 \
+        and self.librarySpeedup() >= 1.0 / (1 + threshold)
+
+
+################################################################################
+# Report
+################################################################################
+def sizeLine(comparison, s):
+  winner = comparison.names[s.candidateWinner]
+  if s.winnerChanged:
+    winner = "%s (was %s)" % (winner, comparison.names[s.baselineWinner])
+  return "# %-24s %-24s %10.2f %10.2f %8.3f %7.1f%%  %s" % (s.problemTypeName, \
+      "x".join([str(i) for i in s.size]), s.baselineGFlops, \
+      s.candidateGFlops, s.speedup, 100*s.threshold, winner)
+
+def report(comparison, threshold, top):
+  sizes = comparison.sizes
+  slower = sorted([s for s in sizes if s.significant and s.speedup < 1], \
+      key=lambda s: s.speedup)
+  faster = sorted([s for s in sizes if s.significant and s.speedup > 1], \
+      key=lambda s: -s.speedup)
+  header = "# %-24s %-24s %10s %10s %8s %8s  %s" % ("ProblemType", "Size", \
+      "BaseGF", "NewGF", "Speedup", "Noise", "Winner")
+  lines = [HR]
+  lines.append("# Sizes compared: %u (%u only in baseline, %u only in candidate)" \
+      % (len(sizes), comparison.baselineOnly, comparison.candidateOnly))
+  lines.append("# Significantly slower: %u, faster: %u, within noise: %u" \
+      % (len(slower), len(faster), len(sizes) - len(slower) - len(faster)))
+  lines.append("# Winners changed: %u" \
+      % len([s for s in sizes if s.winnerChanged]))
+  lines.append("# Same solution, same size: %u pairs, %u slower, %u faster" \
+      % (comparison.numSolutionPairs, comparison.numSolutionsSlower, \
+      comparison.numSolutionsFaster))
+  lines.append("# Geometric mean speedup: %.3f" \
+      % comparison.geometricMeanSpeedup())
+  lines.append("# Predicted library speedup: %.3f" \
+      % comparison.librarySpeedup())
+  for (title, table) in [("Slowdowns", slower), ("Speedups", faster)]:
+    if len(table) > 0:
+      lines.append(HR)
+      lines.append("# %s%s" % (title, \
+          " (top %u)" % top if len(table) > top else ""))
+      lines.append(header)
+      lines += [sizeLine(comparison, s) for s in table[:top]]
+  lines.append(HR)
+  regressions = comparison.regressions(threshold)
+  if comparison.passes(threshold):
+    lines.append("# PASSED: no regressions beyond %.1f%%" % (100*threshold))
+  else:
+    lines.append("# FAILED: %u sizes regressed beyond %.1f%%, library time %+.1f%%" \
+        % (len(regressions), 100*threshold, \
+        100*(1/comparison.librarySpeedup() - 1)))
+  lines.append(HR)
+  return "\n".join(lines)
+
+def writeComparisonCSV(fileName, comparison):
+  with open(fileName, "w") as csvFile:
+    writer = csv.writer(csvFile)
+    writer.writerow(["ProblemType", "Size", "BaselineGFlops", \
+        "CandidateGFlops", "Speedup", "Noise", "Significant", \
+        "BaselineWinner", "CandidateWinner"])
+    for s in comparison.sizes:
+      writer.writerow([s.problemTypeName, "x".join([str(i) for i in s.size]), \
+          s.baselineGFlops, s.candidateGFlops, s.speedup, s.threshold, \
+          int(s.significant), comparison.names[s.baselineWinner], \
+          comparison.names[s.candidateWinner]])
+
+
+################################################################################
+# Main
+################################################################################
+def CompareRuns(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="compare the performance of two tuning runs")
+  argParser.add_argument("baseline", \
+      help="2_BenchmarkData or library logic directory (or file) of the old run")
+  argParser.add_argument("candidate", \
+      help="2_BenchmarkData or library logic directory (or file) of the new run")
+  argParser.add_argument("--noise", type=float, default=0.02, \
+      help="relative change always treated as noise")
+  argParser.add_argument("--threshold", type=float, default=0.05, \
+      help="fail on a significant slowdown of more than this fraction")
+  argParser.add_argument("--top", type=int, default=20, \
+      help="sizes to list per table")
+  argParser.add_argument("--csv", default=None, \
+      help="write every compared size to this csv")
+  args = argParser.parse_args(userArgs)
+
+  baseline = readRun([args.baseline])
+  candidate = readRun([args.candidate])
+  if len(baseline.results) == 0 or len(candidate.results) == 0:
+    printExit("no results in %s" % (args.candidate \
+        if len(baseline.results) else args.baseline))
+  comparison = Comparison(baseline, candidate, args.noise)
+  print report(comparison, args.threshold, args.top)
+  if args.csv:
+    writeComparisonCSV(args.csv, comparison)
+  return 0 if comparison.passes(args.threshold) else 1
+
+def main():
+  sys.exit(CompareRuns(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,445 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Host Validation
+# - builds HIP source kernels and their solution functions with a plain C++
+#   compiler against Source/HostRuntime.h and checks every solution against
+#   tensileReferenceCPU on each problem size, so generator changes can be
+#   validated on machines without a GPU
+# - one validation executable per solution; a make file builds and runs them
+#   all, taking its parallel jobs from the job server
+# - assembly kernels have no host build and are skipped
+################################################################################
+import os
+import re
+import sys
+import argparse
+import multiprocessing
+from subprocess import STDOUT
+
+from Common import RunContext, print1, printWarning, printExit, HR, \
+    CHeader, ensurePath, writeSolutionAssertionCheckHeader, \
+    writeSolutionAssertionChecksForSolution
+from JobServer import getJobServer, runJob
+from KernelWriterSource import KernelWriterSource
+from SolutionStructs import Solution
+from SolutionWriter import SolutionWriter
+import YAMLIO
+
+resultPattern = re.compile( \
+    r"^HostValidation (\S+): (\d+) passed, (\d+) failed, (\d+) skipped")
+
+################################################################################
+# Host Validation Result
+################################################################################
+class HostValidationResult:
+
+  def __init__(self, solutionName, built, numPassed=0, numFailed=0, \
+      numSkipped=0, completed=False):
+    self.solutionName = solutionName
+    # False when make could not build the validation executable
+    self.built = built
+    self.numPassed = numPassed
+    self.numFailed = numFailed
+    self.numSkipped = numSkipped
+    # False when the validation did not build or crashed
+    self.completed = completed
+
+  def passed(self):
+    return self.completed and self.numFailed == 0
+
+
+################################################################################
+# Write Host Validation
+# writes kernels, solutions, one driver per solution and the make file;
+# returns the names of the solutions it will validate
+################################################################################
+def writeHostValidation(path, solutions, problemSizes, context=None):
+  if context is None:
+    context = RunContext(path)
+  ensurePath(path)
+  hostSolutions = []
+  for solution in solutions:
+    if solution["KernelLanguage"] != "Source":
+      continue
+    # other types need device vector types and builtins in the kernels and
+    # their arithmetic in the reference
+    dataType = solution["ProblemType"]["DataType"]
+    if not (dataType.isSingle() or dataType.isDouble()):
+      continue
+    hostSolutions.append(solution)
+  if len(hostSolutions) < len(solutions):
+    printWarning("HostValidation: no host build of %u of %u solutions " \
+        "(only float and double source kernels)" \
+        % (len(solutions) - len(hostSolutions), len(solutions)))
+  if not hostSolutions:
+    return []
+
+  # the writers build for HIP, one file per kernel and solution
+  context = context.override(RuntimeLanguage="HIP", MergeFiles=False)
+  kernels = []
+  kernelsBetaOnly = []
+  for solution in hostSolutions:
+    for kernel in solution.getKernels():
+      if kernel not in kernels:
+        kernels.append(kernel)
+    for kernel in solution.getKernelsBetaOnly():
+      if kernel not in kernelsBetaOnly:
+        kernelsBetaOnly.append(kernel)
+  if context["ShortNames"]:
+    solutionSerialNaming = Solution.getSerialNaming(hostSolutions)
+    kernelSerialNaming = Solution.getSerialNaming(kernels)
+  else:
+    solutionSerialNaming = None
+    kernelSerialNaming = None
+  kernelMinNaming = Solution.getMinNaming(kernels)
+  solutionWriter = SolutionWriter(Solution.getMinNaming(hostSolutions), \
+      solutionSerialNaming, kernelMinNaming, kernelSerialNaming, context)
+  kernelWriter = KernelWriterSource(kernelMinNaming, kernelSerialNaming, \
+      context)
+
+  kernelsWithBuildErrs = {}
+  for kernel in kernels:
+    kernelName = kernelWriter.getKernelName(kernel)
+    (err, src) = kernelWriter.getSourceFileString(kernel)
+    if err:
+      kernelsWithBuildErrs[kernelName] = err
+    writeFile(path, kernelName + ".cpp", CHeader + src)
+    writeFile(path, kernelName + ".h", kernelWriter.getHeaderFileString(kernel))
+  for kernel in kernelsBetaOnly:
+    kernelName = kernelWriter.getKernelNameBetaOnly(kernel)
+    (err, src) = kernelWriter.getSourceFileStringBetaOnly(kernel)
+    writeFile(path, kernelName + ".cpp", CHeader + src)
+    writeFile(path, kernelName + ".h", \
+        kernelWriter.getHeaderFileStringBetaOnly(kernel))
+
+  solutionNames = []
+  objects = {}
+  for solution in hostSolutions:
+    solutionName = solutionWriter.getSolutionName(solution)
+    writeFile(path, solutionName + ".cpp", CHeader \
+        + solutionWriter.getSourceFileString(solution, kernelsWithBuildErrs))
+    writeFile(path, solutionName + ".h", CHeader \
+        + solutionWriter.getHeaderFileString(solution))
+    writeFile(path, "Validate_%s.cpp" % solutionName, CHeader \
+        + hostValidationDriver(solution, solutionName, solutionWriter, \
+        problemSizes, context))
+    solutionNames.append(solutionName)
+    objects[solutionName] = [solutionName] \
+        + [kernelWriter.getKernelName(k) for k in solution.getKernels()] \
+        + [kernelWriter.getKernelNameBetaOnly(k) \
+        for k in solution.getKernelsBetaOnly()]
+
+  writeFile(path, "Makefile", \
+      hostValidationMakefile(solutionNames, objects, context))
+  return solutionNames
+
+def writeFile(path, fileName, text):
+  with open(os.path.join(path, fileName), "w") as f:
+    f.write(text)
+
+
+################################################################################
+# Driver
+# calls the solution on every problem size with packed strides and compares
+# C with tensileReferenceCPU; A, B and C hold small integers so every
+# summation order gives the same result
+################################################################################
+def hostValidationDriver(solution, solutionName, solutionWriter, problemSizes, \
+    context):
+  problemType = solution["ProblemType"]
+  indexChars = context["IndexChars"]
+  indexAssignmentsA = problemType["IndexAssignmentsA"]
+  indexAssignmentsB = problemType["IndexAssignmentsB"]
+  numIndicesAB = len(indexAssignmentsA)
+  sizes = [tuple(problemSize) for problemSize in problemSizes]
+
+  s = ""
+  s += "#include \"%s.h\"\n" % solutionName
+  s += "#include \"ReferenceCPU.h\"\n"
+  s += "#include <cstdio>\n"
+  s += "#include <limits>\n"
+  s += "#include <vector>\n"
+  s += "\n"
+  s += "typedef %s DataType;\n" % problemType["DataType"].toCpp()
+  s += "typedef %s DestDataType;\n" % problemType["DestDataType"].toCpp()
+  s += "const unsigned int totalIndices = %u;\n" % problemType["TotalIndices"]
+  s += "const unsigned int numIndicesC = %u;\n" % problemType["NumIndicesC"]
+  s += "const unsigned int numIndicesAB = %u;\n" % numIndicesAB
+  s += "const unsigned int indexAssignmentsA[numIndicesAB] = { %s };\n" \
+      % ", ".join([str(i) for i in indexAssignmentsA])
+  s += "const unsigned int indexAssignmentsB[numIndicesAB] = { %s };\n" \
+      % ", ".join([str(i) for i in indexAssignmentsB])
+  s += "const bool complexConjugateA = %s;\n" \
+      % ("true" if problemType["ComplexConjugateA"] else "false")
+  s += "const bool complexConjugateB = %s;\n" \
+      % ("true" if problemType["ComplexConjugateB"] else "false")
+  s += "const unsigned int numProblems = %u;\n" % len(sizes)
+  s += "const unsigned int problemSizes[numProblems][totalIndices] = {\n"
+  s += ",\n".join(["  { %s }" % ", ".join([str(i) for i in size]) \
+      for size in sizes])
+  s += " };\n"
+  s += "\n"
+
+  # call with packed strides
+  s += "TensileStatus callSolution(const unsigned int *sizes,\n"
+  s += "    DestDataType *dataC, const DataType *dataA, const DataType *dataB,\n"
+  s += "    DestDataType alpha, DestDataType beta) {\n"
+  for i in range(0, problemType["NumIndicesC"]):
+    s += "  unsigned int strideC%u%s = 1%s;\n" % (i, indexChars[i], \
+        "".join(["*sizes[%u]" % j for j in range(0, i)]))
+  for (tensor, assignments) in [("A", indexAssignmentsA), \
+      ("B", indexAssignmentsB)]:
+    for i in range(0, numIndicesAB):
+      s += "  unsigned int stride%s%u%s = 1%s;\n" % (tensor, i, \
+          indexChars[assignments[i]], \
+          "".join(["*sizes[%u]" % assignments[j] for j in range(0, i)]))
+  for i in range(0, problemType["TotalIndices"]):
+    s += "  unsigned int size%s = sizes[%u];\n" % (indexChars[i], i)
+  s += "  unsigned int offsetC = 0, offsetA = 0, offsetB = 0;\n"
+  s += "  hipStream_t stream = nullptr;\n"
+  s += "  unsigned int numInputEvents = 0;\n"
+  s += "  hipEvent_t *inputEvents = nullptr, *outputEvent = nullptr;\n"
+  assertions = writeSolutionAssertionChecksForSolution(solution)
+  if assertions:
+    s += writeSolutionAssertionCheckHeader(problemType)
+    s += "  if (!(%s)) {\n" % assertions
+    s += "    return tensileStatusAssertFailure;\n"
+    s += "  }\n"
+  if not problemType["UseBeta"]:
+    s += "  (void)beta;\n"
+  argList = solutionWriter.getArgList(problemType, True, True, True)
+  s += "  return %s(%s);\n" % (solutionName, \
+      ", ".join([name for (argType, name) in argList]))
+  s += "}\n"
+  s += "\n"
+
+  s += "int main() {\n"
+  s += "  unsigned int numPassed = 0, numFailed = 0, numSkipped = 0;\n"
+  s += "  std::vector<unsigned int> minStrides(totalIndices, 0);\n"
+  s += "  for (unsigned int p = 0; p < numProblems; p++) {\n"
+  s += "    const unsigned int *sizes = problemSizes[p];\n"
+  s += "    size_t numElementsC = 1, numElementsA = 1, numElementsB = 1;\n"
+  s += "    for (unsigned int i = 0; i < numIndicesC; i++) {\n"
+  s += "      numElementsC *= sizes[i];\n"
+  s += "    }\n"
+  s += "    for (unsigned int i = 0; i < numIndicesAB; i++) {\n"
+  s += "      numElementsA *= sizes[indexAssignmentsA[i]];\n"
+  s += "      numElementsB *= sizes[indexAssignmentsB[i]];\n"
+  s += "    }\n"
+  s += "    std::vector<DataType> dataA(numElementsA), dataB(numElementsB);\n"
+  s += "    std::vector<DestDataType> dataC(numElementsC), referenceC(numElementsC);\n"
+  s += "    for (size_t i = 0; i < numElementsA; i++) {\n"
+  s += "      dataA[i] = tensileGetTypeForInt<DataType>(i % 7);\n"
+  s += "    }\n"
+  s += "    for (size_t i = 0; i < numElementsB; i++) {\n"
+  s += "      dataB[i] = tensileGetTypeForInt<DataType>(i % 5);\n"
+  s += "    }\n"
+  s += "    for (size_t i = 0; i < numElementsC; i++) {\n"
+  s += "      dataC[i] = tensileGetTypeForInt<DestDataType>(i % 3);\n"
+  s += "      referenceC[i] = dataC[i];\n"
+  s += "    }\n"
+  s += "    DestDataType alpha = tensileGetTypeForInt<DestDataType>(2);\n"
+  s += "    DestDataType beta = tensileGetTypeForInt<DestDataType>(%u);\n" \
+      % (3 if problemType["UseBeta"] else 0)
+  s += "    unsigned int noStride = std::numeric_limits<unsigned int>::max();\n"
+  s += "    tensileReferenceCPU(referenceC.data(), dataA.data(), dataB.data(),\n"
+  s += "        noStride, noStride, noStride, alpha, beta, totalIndices, sizes,\n"
+  s += "        minStrides.data(), numIndicesC, numIndicesAB, indexAssignmentsA,\n"
+  s += "        indexAssignmentsB, complexConjugateA, complexConjugateB, 1, false);\n"
+  s += "    TensileStatus status = callSolution(sizes, dataC.data(), dataA.data(),\n"
+  s += "        dataB.data(), alpha, beta);\n"
+  s += "    printf(\"%s\", \"size\");\n"
+  s += "    for (unsigned int i = 0; i < totalIndices; i++) {\n"
+  s += "      printf(\" %u\", sizes[i]);\n"
+  s += "    }\n"
+  s += "    if (status == tensileStatusAssertFailure) {\n"
+  s += "      printf(\": SKIPPED (solution assertions)\\n\");\n"
+  s += "      numSkipped++;\n"
+  s += "      continue;\n"
+  s += "    }\n"
+  s += "    size_t numInvalid = 0;\n"
+  s += "    for (size_t i = 0; i < numElementsC; i++) {\n"
+  s += "      if (!tensileAlmostEqual(dataC[i], referenceC[i])) {\n"
+  s += "        if (numInvalid < %u) {\n" % context["ValidationMaxToPrint"]
+  s += "          printf(\"\\n  C[%zu] = %s, reference %s\", i,\n"
+  s += "              tensileToString(dataC[i]).c_str(),\n"
+  s += "              tensileToString(referenceC[i]).c_str());\n"
+  s += "        }\n"
+  s += "        numInvalid++;\n"
+  s += "      }\n"
+  s += "    }\n"
+  s += "    if (status != tensileStatusSuccess || numInvalid) {\n"
+  s += "      printf(\"\\n  FAILED: status %d, %zu of %zu elements invalid\\n\",\n"
+  s += "          status, numInvalid, numElementsC);\n"
+  s += "      numFailed++;\n"
+  s += "    } else {\n"
+  s += "      printf(\": PASSED\\n\");\n"
+  s += "      numPassed++;\n"
+  s += "    }\n"
+  s += "  }\n"
+  s += "  printf(\"HostValidation %s: %%u passed, %%u failed, %%u skipped\\n\",\n" \
+      % solutionName
+  s += "      numPassed, numFailed, numSkipped);\n"
+  s += "  return numFailed ? 1 : 0;\n"
+  s += "}\n"
+  return s
+
+
+################################################################################
+# Make File
+# all: one log per solution; runs are single threaded because make already
+# runs one per job
+################################################################################
+def hostValidationMakefile(solutionNames, objects, context):
+  sourcePath = context["SourcePath"]
+  s = ""
+  s += "CXXFLAGS = -std=c++11 -O1 -pthread -Wno-unknown-pragmas \\\n"
+  s += "    -DTensile_RUNTIME_LANGUAGE_HOST=1 -I. -I%s\n" % sourcePath
+  s += "\n"
+  s += "all: %s\n" % " ".join(["Validate_%s.log" % name \
+      for name in solutionNames])
+  s += "\n"
+  s += "%.o: %.cpp\n"
+  s += "\t$(CXX) $(CXXFLAGS) -c $< -o $@\n"
+  s += "\n"
+  s += "MathTemplates.o: %s\n" % os.path.join(sourcePath, "MathTemplates.cpp")
+  s += "\t$(CXX) $(CXXFLAGS) -c $< -o $@\n"
+  s += "\n"
+  for name in solutionNames:
+    s += "Validate_%s: Validate_%s.o %s MathTemplates.o\n" % (name, name, \
+        " ".join(["%s.o" % o for o in objects[name]]))
+    s += "\t$(CXX) -pthread $^ -o $@\n"
+    s += "\n"
+  # a failing solution writes its log and the others still run
+  s += "Validate_%.log: Validate_%\n"
+  s += "\t-TENSILE_HOST_THREADS=1 ./$< > $@ 2>&1\n"
+  s += "\n"
+  s += ".PHONY: all\n"
+  return s
+
+
+################################################################################
+# Run Host Validation
+################################################################################
+def runHostValidation(path, solutionNames):
+  # an executable or log left by an earlier run must not pass for this one
+  for solutionName in solutionNames:
+    for fileName in ["Validate_%s" % solutionName, \
+        "Validate_%s.log" % solutionName]:
+      if os.path.isfile(os.path.join(path, fileName)):
+        os.remove(os.path.join(path, fileName))
+  command = ["make", "-k"]
+  if getJobServer() is None:
+    command.append("-j%u" % multiprocessing.cpu_count())
+  with open(os.path.join(path, "make.log"), "w") as makeLog:
+    returnCode = runJob(command, "HostValidation", path, makeLog, STDOUT)
+  # failed validations do not fail make, so this is a build that failed
+  if returnCode:
+    printWarning("HostValidation: make exited with code %u, see %s" \
+        % (returnCode, os.path.join(path, "make.log")))
+  results = []
+  for solutionName in solutionNames:
+    built = returnCode == 0 \
+        or os.path.isfile(os.path.join(path, "Validate_%s" % solutionName))
+    result = HostValidationResult(solutionName, built)
+    logFileName = os.path.join(path, "Validate_%s.log" % solutionName)
+    if built and os.path.isfile(logFileName):
+      for line in open(logFileName):
+        match = resultPattern.match(line)
+        if match and match.group(1) == solutionName:
+          result = HostValidationResult(solutionName, built, \
+              int(match.group(2)), int(match.group(3)), int(match.group(4)), \
+              True)
+    results.append(result)
+  return results
+
+def reportHostValidation(path, results):
+  print1(HR)
+  print1("# HostValidation: %u solutions, %u passed" \
+      % (len(results), len([r for r in results if r.passed()])))
+  for result in results:
+    if result.passed():
+      continue
+    if not result.built:
+      print1("#   %s: FAILED to build" % result.solutionName)
+    elif result.completed:
+      print1("#   %s: FAILED %u of %u sizes" % (result.solutionName, \
+          result.numFailed, result.numPassed + result.numFailed))
+    else:
+      print1("#   %s: FAILED to run, see %s" % (result.solutionName, \
+          os.path.join(path, "Validate_%s.log" % result.solutionName)))
+  if not all([r.built for r in results]):
+    print1("# make output (%s):" % os.path.join(path, "make.log"))
+    print1(open(os.path.join(path, "make.log")).read().rstrip())
+  print1(HR)
+
+# returns the results of the solutions it validated
+def validateOnHost(path, solutions, problemSizes, context=None):
+  solutionNames = writeHostValidation(path, solutions, problemSizes, context)
+  if not solutionNames:
+    return []
+  results = runHostValidation(path, solutionNames)
+  reportHostValidation(path, results)
+  return results
+
+
+################################################################################
+# Main
+# validates the source kernel solutions of solution files written by a
+# benchmark (2_BenchmarkData/*.yaml) on their own or the given sizes
+################################################################################
+def TensileHostValidation(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="validate HIP source kernels on the CPU")
+  argParser.add_argument("files", nargs="+", help="solution (.yaml) files")
+  argParser.add_argument("--output", default="host_validation", \
+      help="directory for sources, executables and logs")
+  argParser.add_argument("--size", action="append", default=[], \
+      help="problem size to validate instead of the file's, eg 64,64,1,64")
+  args = argParser.parse_args(userArgs)
+
+  numFailed = 0
+  numNotBuilt = 0
+  for fileName in args.files:
+    (problemSizes, solutions) = YAMLIO.readSolutions(fileName)
+    if args.size:
+      problemSizes = [tuple([int(i) for i in size.split(",")]) \
+          for size in args.size]
+    for size in problemSizes:
+      if len(size) != solutions[0]["ProblemType"]["TotalIndices"]:
+        printExit("%s: size %s does not match the problem type" \
+            % (fileName, list(size)))
+    path = os.path.join(os.path.abspath(args.output), \
+        os.path.splitext(os.path.basename(fileName))[0])
+    results = validateOnHost(path, solutions, problemSizes)
+    numFailed += len([r for r in results if r.built and not r.passed()])
+    numNotBuilt += len([r for r in results if not r.built])
+  if numNotBuilt:
+    printWarning("HostValidation: %u solutions did not build" % numNotBuilt)
+  if numFailed:
+    printWarning("HostValidation: %u solutions failed validation" % numFailed)
+  return 1 if numFailed or numNotBuilt else 0
+
+def main():
+  sys.exit(TensileHostValidation(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
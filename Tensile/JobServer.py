@@ -0,0 +1,270 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Job Server
+# - one budget of globalParameters["JobTokens"] shared by the kernel code
+#   generation workers and every tool Tensile runs (cmake, make, assembler,
+#   clients), so no phase starves or oversubscribes the machine
+# - GNU make jobserver protocol: tokens are bytes in a pipe whose fds are
+#   handed to children in MAKEFLAGS, so make (also under cmake --build) takes
+#   its parallel jobs from the same budget; when Tensile itself runs under
+#   make -j it joins that make's jobserver instead of creating one
+# - a job holds one token while it runs; jobs nested in a job of the same
+#   thread (the assembler called while generating a kernel) reuse its token;
+#   the token make started Tensile with stays with the process, forked
+#   workers always take theirs from the pipe
+# - forked workers hand their jobs back with workerJobs()/addJobs();
+#   reportJobs() prints the jobs per category and how busy the tokens were
+################################################################################
+import os
+import re
+import errno
+import threading
+import time
+import multiprocessing
+from subprocess import Popen
+
+from Common import globalParameters, print1, printWarning, HR
+
+class JobServer:
+
+  # tokens are put into a new pipe unless joining a jobserver's fds
+  def __init__(self, tokens, fds=None, makeFlags=None):
+    self.tokens = tokens
+    self.lock = threading.Lock()
+    self.local = threading.local()
+    self.jobs = [] # (category, queued, start, end, pid, nested)
+    if fds is None:
+      (self.readFd, self.writeFd) = os.pipe()
+      os.write(self.writeFd, "+" * tokens)
+      self.implicitTokens = 0
+      self.makeFlags = "-j --jobserver-fds=%u,%u --jobserver-auth=%u,%u" \
+          % (self.readFd, self.writeFd, self.readFd, self.writeFd)
+    else:
+      (self.readFd, self.writeFd) = fds
+      # make started this process with one token of the budget
+      self.implicitTokens = 1
+      self.makeFlags = makeFlags
+    # forked workers inherit implicitTokens but not the token behind it
+    self.pid = os.getpid()
+
+  ##############################################################################
+  # join the jobserver of a make running Tensile, if any
+  ##############################################################################
+  @staticmethod
+  def fromMakeFlags(makeFlags):
+    match = re.search(r"--jobserver-(?:auth|fds)=(\S+)", makeFlags)
+    if not match:
+      return None
+    auth = match.group(1)
+    try:
+      if auth.startswith("fifo:"):
+        fifo = os.open(auth[5:], os.O_RDWR)
+        fds = (fifo, fifo)
+      else:
+        fds = tuple([int(fd) for fd in auth.split(",")])
+        for fd in fds:
+          os.fstat(fd)
+    except (OSError, ValueError):
+      printWarning("make jobserver %s unavailable (prefix the recipe with +); using own job tokens" % auth)
+      return None
+    jobs = re.search(r"(?:^|\s)-j(\d+)", makeFlags)
+    tokens = int(jobs.group(1)) if jobs else multiprocessing.cpu_count()
+    return JobServer(tokens, fds, makeFlags)
+
+  ##############################################################################
+  # tokens
+  ##############################################################################
+  # returns whether the calling thread already held a token
+  def acquire(self):
+    depth = getattr(self.local, "depth", 0)
+    if depth == 0:
+      token = None
+      with self.lock:
+        if self.implicitTokens and os.getpid() == self.pid:
+          self.implicitTokens -= 1
+        else:
+          token = ""
+      if token is not None:
+        token = self.readToken()
+      self.local.token = token
+    self.local.depth = depth + 1
+    return depth > 0
+
+  def release(self):
+    self.local.depth -= 1
+    if self.local.depth == 0:
+      if self.local.token is None:
+        with self.lock:
+          self.implicitTokens += 1
+      else:
+        # make wants back the byte it handed out
+        os.write(self.writeFd, self.local.token)
+
+  def readToken(self):
+    while True:
+      try:
+        return os.read(self.readFd, 1)
+      except OSError as e:
+        if e.errno != errno.EINTR:
+          raise
+
+  ##############################################################################
+  # jobs
+  ##############################################################################
+  def job(self, category):
+    return Job(self, category)
+
+  # run a command holding a token; children see the jobserver in MAKEFLAGS
+  def run(self, command, category, cwd=None, env=None, stdout=None, \
+      stderr=None):
+    with self.job(category):
+      process = Popen(command, cwd=cwd, env=self.environment(env), \
+          stdout=stdout, stderr=stderr)
+      process.communicate()
+    return process.returncode
+
+  def environment(self, env=None):
+    env = dict(os.environ if env is None else env)
+    env["MAKEFLAGS"] = self.makeFlags
+    return env
+
+  def record(self, category, queued, start, end, nested):
+    with self.lock:
+      self.jobs.append((category, queued, start, end, os.getpid(), nested))
+
+  # jobs a forked worker ran, to send to the parent
+  def workerJobs(self):
+    pid = os.getpid()
+    return [job for job in self.jobs if job[4] == pid]
+
+  def addJobs(self, jobs):
+    with self.lock:
+      self.jobs.extend(jobs)
+
+  ##############################################################################
+  # utilization
+  ##############################################################################
+  # (tokens busy / tokens available, most tokens busy at once) over the
+  # time from the first job queueing to the last one ending
+  def utilization(self):
+    outer = [job for job in self.jobs if not job[5]]
+    if not outer:
+      return (0.0, 0)
+    elapsed = max([job[3] for job in outer]) - min([job[1] for job in outer])
+    busy = sum([job[3] - job[2] for job in outer])
+    edges = sorted([(job[2], 1) for job in outer] \
+        + [(job[3], -1) for job in outer])
+    running = 0
+    peak = 0
+    for (t, change) in edges:
+      running += change
+      peak = max(peak, running)
+    return (busy / (self.tokens * elapsed) if elapsed > 0 else 1.0, peak)
+
+  # category: (jobs, seconds running, seconds waiting for a token)
+  def summarize(self):
+    summary = {}
+    for (category, queued, start, end, pid, nested) in self.jobs:
+      (count, running, waiting) = summary.get(category, (0, 0.0, 0.0))
+      summary[category] = (count + 1, running + end - start, \
+          waiting + start - queued)
+    return summary
+
+  def report(self):
+    if not self.jobs:
+      return
+    (utilization, peak) = self.utilization()
+    print1(HR)
+    print1("# Job server: %u tokens, %u jobs, %.1f%% utilization, peak %u running" \
+        % (self.tokens, len(self.jobs), 100 * utilization, peak))
+    print1("# %-20s %8s %12s %12s" % ("Category", "Jobs", "Running(s)", "Waiting(s)"))
+    summary = self.summarize()
+    for category in sorted(summary, key=lambda c: -summary[c][1]):
+      (count, running, waiting) = summary[category]
+      print1("# %-20s %8u %12.2f %12.2f" % (category, count, running, waiting))
+    print1(HR)
+
+
+################################################################################
+# Job
+# with Job(jobServer, "Assemble"): holds a token for the block; without a job
+# server the block just runs
+################################################################################
+class Job:
+
+  def __init__(self, jobServer, category):
+    self.jobServer = jobServer
+    self.category = category
+
+  def __enter__(self):
+    if self.jobServer:
+      self.queued = time.time()
+      self.nested = self.jobServer.acquire()
+      self.start = time.time()
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    if self.jobServer:
+      end = time.time()
+      self.jobServer.release()
+      self.jobServer.record(self.category, self.queued, self.start, end, \
+          self.nested)
+    return False
+
+
+################################################################################
+# Process Job Server
+# created on first use, after the config set JobTokens, and before code
+# generation forks its workers so they share the tokens
+################################################################################
+jobServer = None
+jobServerChecked = False
+
+def getJobServer():
+  global jobServer, jobServerChecked
+  if not jobServerChecked and os.name != "nt":
+    jobServerChecked = True
+    jobServer = JobServer.fromMakeFlags(os.environ.get("MAKEFLAGS", ""))
+    tokens = globalParameters["JobTokens"]
+    if jobServer is None and tokens:
+      jobServer = JobServer(multiprocessing.cpu_count() if tokens < 0 \
+          else tokens)
+  return jobServer
+
+# run a command under the job server, or directly if there is none
+def runJob(command, category, cwd=None, stdout=None, stderr=None):
+  server = getJobServer()
+  if server:
+    return server.run(command, category, cwd, stdout=stdout, stderr=stderr)
+  process = Popen(command, cwd=cwd, stdout=stdout, stderr=stderr)
+  process.communicate()
+  return process.returncode
+
+def workerJobs():
+  return jobServer.workerJobs() if jobServer else []
+
+def addJobs(jobs):
+  if jobServer:
+    jobServer.addJobs(jobs)
+
+def reportJobs():
+  if jobServer:
+    jobServer.report()
@@ -20,12 +20,56 @@
 ################################################################################
 
 from SolutionStructs import Solution
-from Common import globalParameters, CHeader
+from Common import globalParameters, CHeader, RunContext, print2
+from AssemblyPeephole import peepholeAssembly, peepholeReport
+from Trace import Span
+from JobServer import runJob
 import abc
 import os
 from os import path, chmod
 from os import name as osname
-from subprocess import Popen
+
+################################################################################
+# Code Emitter
+# - accumulates generated code as a list of chunks; "kStr += code" appends
+#   instead of copying the whole kernel string each time
+# - mark()/insert() splice code in at an earlier position, eg the function
+#   signature which depends on the final register counts
+# - writeTo(file) streams the chunks to the output without joining them
+################################################################################
+class CodeEmitter:
+  def __init__(self, code=""):
+    self.chunks = []
+    if code:
+      self.chunks.append(code)
+
+  def __iadd__(self, code):
+    if isinstance(code, CodeEmitter):
+      self.chunks.extend(code.chunks)
+    elif code:
+      self.chunks.append(code)
+    return self
+
+  def __len__(self):
+    return sum([len(chunk) for chunk in self.chunks])
+
+  def __str__(self):
+    return self.getvalue()
+
+  def mark(self):
+    return len(self.chunks)
+
+  def insert(self, mark, code):
+    self.chunks.insert(mark, code)
+
+  def getvalue(self):
+    if len(self.chunks) > 1:
+      self.chunks = ["".join(self.chunks)]
+    return self.chunks[0] if self.chunks else ""
+
+  def writeTo(self, outputFile):
+    outputFile.writelines(self.chunks)
+
 
 ################################################################################
 # Kernel Writer
@@ -36,10 +80,15 @@ class KernelWriter:
   ##############################################################################
   # Init
   ##############################################################################
-  def __init__( self, kernelMinNaming, kernelSerialNaming ):
+  # context: runtime language and file layout the kernels are written for
+  def __init__( self, kernelMinNaming, kernelSerialNaming, context=None ):
+    if context is None:
+      context = RunContext()
+    self.context = context
     self.kernelMinNaming = kernelMinNaming
     self.kernelSerialNaming = kernelSerialNaming
     self.overflowedResources = 0
+    self.asmPath = None # assembly directory of the run writing this kernel
 
 
 
@@ -47,11 +96,19 @@ class KernelWriter:
   # Kernel Body
   ##############################################################################
   def kernelBody( self, kernel, tensorParametersA, tensorParametersB ):
+    kStr = CodeEmitter()
+    error = self.emitKernelBody(kStr, kernel, tensorParametersA, \
+        tensorParametersB)
+    return (error, kStr.getvalue())
 
+  ##############################################################################
+  # Emit Kernel Body
+  # appends the kernel body to CodeEmitter kStr, returns error
+  ##############################################################################
+  def emitKernelBody( self, kStr, kernel, tensorParametersA, tensorParametersB ):
 
     ####################################
     # Begin String
-    kStr = ""
     kStr += self.openString(kernel)
 
     ####################################
@@ -64,8 +121,7 @@ class KernelWriter:
     ####################################
     kStr += self.comment3("Begin Kernel")
     kStr += self.functionSignaturePrefix(kernel)
-    beforeFunctionSignature = kStr
-    kStr = ""
+    functionSignatureMark = kStr.mark()
     kStr += self.functionSignatureSuffix(kernel)
     kStr += self.functionBegin(kernel)
 
@@ -745,13 +801,12 @@ class KernelWriter:
     kStr += self.functionSuffix(kernel)
 
     kStr += self.closeString(kernel)
-    afterFunctionSignature = kStr
 
     error = self.overflowedResources
 
     # function signature last since it needs to know how many gprs were actually used
-    kStr = beforeFunctionSignature + self.functionSignature(kernel) + afterFunctionSignature
-    return (error,kStr)
+    kStr.insert(functionSignatureMark, self.functionSignature(kernel))
+    return error
 
 
 
@@ -830,7 +885,7 @@ class KernelWriter:
       print "\nKernelWriter enable:", self.enable
 
     if kernel["KernelLanguage"] == "Source":
-      self.language = globalParameters["RuntimeLanguage"]
+      self.language = self.context["RuntimeLanguage"]
     else:
       self.language = "ASM"
     self.indexChars = []
@@ -1720,7 +1775,9 @@ class KernelWriter:
   # get kernel name
   ##############################################################################
   def getKernelName(self, kernel):
-    if globalParameters["ShortNames"]:
+    if globalParameters["HashedNames"]:
+      kernelName = Solution.getNameHashed(kernel)
+    elif globalParameters["ShortNames"]:
       kernelName = Solution.getNameSerial(kernel, self.kernelSerialNaming)
     else:
       kernelName = Solution.getNameMin(kernel, self.kernelMinNaming)
@@ -1732,28 +1789,32 @@ class KernelWriter:
   ##############################################################################
   def getSourceFileString(self, kernel):
 
-    fileString = ""
+    fileString = CodeEmitter()
     tensorParametersA = {}
     tensorParametersB = {}
     self.initKernel(kernel, tensorParametersA, tensorParametersB )
     fileString += self.kernelBodyPrefix( kernel, tensorParametersA, \
         tensorParametersB )
     self.stringIdx = 0
-    (error, kb) = self.kernelBody( kernel, tensorParametersA, tensorParametersB)
-
-    fileString += kb
+    error = self.emitKernelBody( fileString, kernel, tensorParametersA, \
+        tensorParametersB )
     fileString += self.kernelBodySuffix( kernel, tensorParametersA, \
         tensorParametersB )
 
     if kernel["KernelLanguage"] == "Assembly":
-      asmPath = os.path.join(globalParameters["WorkingPath"], "assembly")
+      asmPath = self.asmPath \
+          or os.path.join(globalParameters["WorkingPath"], "assembly")
       # write assembly file to assembly directory
       kernelName = self.getKernelName(kernel)
+      if globalParameters["PeepholeAssembly"]:
+        (peepholeString, peepholeStats) = peepholeAssembly(fileString.getvalue())
+        fileString = CodeEmitter(peepholeString)
+        print2("# %s" % peepholeReport(kernelName, peepholeStats))
       fileBase = path.join(asmPath, kernelName )
       assemblyFileName = "%s.s" % fileBase
       codeObjectFileName = "%s.co" % fileBase
       assemblyFile = open(assemblyFileName, "w")
-      assemblyFile.write(fileString)
+      fileString.writeTo(assemblyFile)
       assemblyFile.close()
       #sys.stderr.write("Wrote asm file to %s\n" % assemblyFileName)
 
@@ -1835,12 +1896,11 @@ class KernelWriter:
       # run assembler
       assemblerCommand = [assemblerFileName, kernelName, asmOptions]
       #print("# Assembling %s: %s" % (kernelName, assemblerCommand) )
-      assemblerProcess = Popen(assemblerCommand, \
-          cwd=asmPath )
-      assemblerProcess.communicate()
+      with Span("Assemble", "Subprocess"):
+        assemblerReturnCode = runJob(assemblerCommand, "Assemble", asmPath)
 
-      fileString = ""
-      if assemblerProcess.returncode:
+      fileString = CodeEmitter()
+      if assemblerReturnCode:
         error = -1
       else:
         # read code object file
@@ -1865,7 +1925,7 @@ class KernelWriter:
 
     # read code-object file and convert to c++ representable uchar*
     # return string of code-object byte array
-    return (error, fileString)
+    return (error, fileString.getvalue())
 
 
   ##############################################################################
@@ -1875,12 +1935,11 @@ class KernelWriter:
     kernelName = self.getKernelName(kernel)
     fileString = "" # CHeader
     if self.language == "HIP" or self.language == "OCL":
-      if not globalParameters["MergeFiles"]:
+      if not self.context["MergeFiles"]:
         fileString += CHeader
         fileString += "#pragma once\n\n"
         if self.language == "HIP":
-          fileString += "#include <hip/hip_runtime.h>\n"
-          fileString += "#include <hip/hip_fp16.h>\n"
+          fileString += self.hipIncludes()
           fileString += "\n"
         else:
           fileString += "#include <string>\n"
@@ -1890,13 +1949,27 @@ class KernelWriter:
         fileString += self.functionSignature(kernel)
         fileString += ";\n"
     else:
-      if not globalParameters["MergeFiles"]:
+      if not self.context["MergeFiles"]:
         fileString += "#pragma once\n\n"
       if not globalParameters["CodeFromFiles"]:
         fileString += "extern const unsigned char %s_coba[]; // code object byte array\n" % kernelName
 
     return fileString
 
+  ##############################################################################
+  # HIP includes
+  # source kernels also build for the CPU against HostRuntime.h
+  ##############################################################################
+  def hipIncludes(self):
+    s = ""
+    s += "#if Tensile_RUNTIME_LANGUAGE_HOST\n"
+    s += "#include \"HostRuntime.h\"\n"
+    s += "#else\n"
+    s += "#include <hip/hip_runtime.h>\n"
+    s += "#include <hip/hip_fp16.h>\n"
+    s += "#endif\n"
+    return s
+
   ##############################################################################
   #
   #   Beta-Only Kernels
@@ -1930,7 +2003,7 @@ class KernelWriter:
   def getSourceFileStringBetaOnly(self, kernel):
     fileString = ""
     kernelName = self.getKernelNameBetaOnly(kernel)
-    if not globalParameters["MergeFiles"]:
+    if not self.context["MergeFiles"]:
       fileString += "\n"
       fileString += "#include \"%s.h\"\n" % kernelName
       fileString += "\n"
@@ -1945,13 +2018,12 @@ class KernelWriter:
   def getHeaderFileStringBetaOnly(self, kernel):
     kernelName = self.getKernelNameBetaOnly(kernel)
     fileString = "" # CHeader
-    if not globalParameters["MergeFiles"]:
+    if not self.context["MergeFiles"]:
       fileString += CHeader
       fileString += "#pragma once\n\n"
       fileString += "\n"
       if self.language == "HIP":
-        fileString += "#include <hip/hip_runtime.h>\n"
-        fileString += "#include <hip/hip_fp16.h>\n"
+        fileString += self.hipIncludes()
         fileString += "\n"
       else:
         fileString += "#include <string>\n"
@@ -21,7 +21,7 @@
 
 from SolutionStructs import DataType
 from Common import globalParameters, printExit, printWarning, roundUp
-from KernelWriter import KernelWriter
+from KernelWriter import KernelWriter, CodeEmitter
 from math import log, ceil
 import collections
 import traceback
@@ -66,71 +66,148 @@ class MemoryInstruction:
 # - checkIn, checkout take optional tag but this is not widely used in tensile.
 # - checkout returns vgpr index that was returned - can search disasm to see where
 #   this vgpr is used.
+# Implementation:
+# - availableMask is a bitmap (python int) with bit i set if register i can be
+#   allocated; finding an aligned block of n free registers is a handful of
+#   shift/and operations on the bitmap rather than a scan of every register.
+# - policyFirstFit (default) returns exactly the registers the original
+#   list-scanning pool returned, including its overflow behaviour, so
+#   generated kernels do not change.  policyBestFit picks the smallest free
+#   block which fits to reduce fragmentation.
+# - setting RegisterPool.traceLog to a list records every pool operation for
+#   replay by RegisterPoolBenchmark.
 ################################################################################
 class RegisterPool:
   statusUnAvailable = 0
   statusAvailable = 1
   statusInUse = 2
 
-  class Register:
-    def __init__(self, status, tag=""):
-      self.status = status
-      self.tag = tag
+  policyFirstFit = "FirstFit"
+  policyBestFit = "BestFit"
 
+  # list which collects one operation trace per pool, None=disabled
+  traceLog = None
 
   ########################################
   # Init
-  def __init__(self, size, type, printRP=0):
+  def __init__(self, size, type, printRP=0, policy=policyFirstFit):
     self.printRP=printRP
     self.type = type
-    self.pool = [self.Register(self.statusUnAvailable, "init") for i in range(0,size)]
+    self.policy = policy
+    self.status = bytearray(size) # all statusUnAvailable
+    self.tags = ["init"]*size
+    self.availableMask = 0
+    self.alignmentMasks = {}
+    self.alignmentMasksSize = size
     self.checkOutSize = {}
+    self.numInUse = 0
+    self.peakInUse = 0
+    self.numCheckOuts = 0
+    self.numOverflows = 0
+    self.trace = None
+    if RegisterPool.traceLog is not None:
+      self.trace = [("init", size, type)]
+      RegisterPool.traceLog.append(self.trace)
+
+  ########################################
+  # Bitmap helpers
+  @staticmethod
+  def blockMask(start, size):
+    return ((1 << size) - 1) << start
+
+  # bits set at every multiple of alignment within the pool
+  def alignmentMask(self, alignment):
+    if self.alignmentMasksSize != len(self.status):
+      self.alignmentMasks = {}
+      self.alignmentMasksSize = len(self.status)
+    if alignment not in self.alignmentMasks:
+      numAligned = (len(self.status) + alignment - 1) / alignment
+      self.alignmentMasks[alignment] = \
+          ((1 << (alignment*numAligned)) - 1) / ((1 << alignment) - 1)
+    return self.alignmentMasks[alignment]
+
+  # bit i set if registers i..i+size-1 are all available
+  def blockStarts(self, size):
+    mask = self.availableMask
+    span = 1
+    while span < size and mask:
+      step = min(span, size-span)
+      mask &= mask >> step
+      span += step
+    return mask
+
+  # (start, size) of each maximal run of available registers, low to high
+  def freeBlocks(self):
+    blocks = []
+    mask = self.availableMask
+    while mask:
+      start = (mask & -mask).bit_length() - 1
+      run = mask >> start
+      size = (~run & (run+1)).bit_length() - 1
+      blocks.append((start, size))
+      mask &= ~self.blockMask(0, start+size)
+    return blocks
+
+  def setStatus(self, start, size, status):
+    self.status[start:start+size] = bytearray([status])*size
+    if status == self.statusAvailable:
+      self.availableMask |= self.blockMask(start, size)
+    else:
+      self.availableMask &= ~self.blockMask(start, size)
+
+  def grow(self, newSize, status, tag):
+    oldSize = len(self.status)
+    if newSize > oldSize:
+      self.status.extend(bytearray([status])*(newSize-oldSize))
+      self.tags.extend([tag]*(newSize-oldSize))
+      if status == self.statusAvailable:
+        self.availableMask |= self.blockMask(oldSize, newSize-oldSize)
 
   ########################################
   # Adds registers to the pool so they can be used as temps
   # Add
   def add(self, start, size, tag=""):
+    if self.trace is not None:
+      self.trace.append(("add", start, size))
     # reserve space
     if self.printRP:
       print "RP::add(%u..%u for '%s')"%(start,start+size-1,tag)
-    newSize = start + size
-    oldSize = len(self.pool)
-    if newSize > oldSize:
-      for i in range(0, newSize-oldSize):
-        self.pool.append(self.Register(self.statusUnAvailable,tag))
+    self.grow(start + size, self.statusUnAvailable, tag)
     # mark as available
     for i in range(start, start+size):
-      if self.pool[i].status == self.statusUnAvailable:
-        self.pool[i].status = self.statusAvailable
-      elif self.pool[i].status == self.statusAvailable:
+      if self.status[i] == self.statusUnAvailable:
+        self.setStatus(i, 1, self.statusAvailable)
+      elif self.status[i] == self.statusAvailable:
         printWarning("RegisterPool::add(%u,%u) pool[%u] already available" % (start, size, i))
-      elif self.pool[i].status == self.statusInUse:
+      elif self.status[i] == self.statusInUse:
         printWarning("RegisterPool::add(%u,%u) pool[%u] already in use" % (start, size, i))
       else:
-        printExit("RegisterPool::add(%u,%u) pool[%u] = %s" % (start, size, i, self.pool[i].status))
+        printExit("RegisterPool::add(%u,%u) pool[%u] = %s" % (start, size, i, self.status[i]))
     if self.printRP:
       print self.state()
   ########################################
   # Remove
   # Removes registers from the pool so they cannot be subsequently allocated for tmps
   def remove(self, start, size, tag=""):
+    if self.trace is not None:
+      self.trace.append(("remove", start, size))
     if self.printRP:
       print "RP::remove(%u..%u) for %s"%(start,size-1,tag)
     # reserve space
     newSize = start + size
-    oldSize = len(self.pool)
+    oldSize = len(self.status)
     if newSize > oldSize:
       printWarning("RegisterPool::remove(%u,%u) but poolSize=%u" % (start, size, oldSize))
     # mark as unavailable
     for i in range(start, start+size):
-      if  self.pool[i].status == self.statusAvailable:
-        self.pool[i].status = self.statusUnAvailable
-      elif self.pool[i].status == self.statusUnAvailable:
+      if  self.status[i] == self.statusAvailable:
+        self.setStatus(i, 1, self.statusUnAvailable)
+      elif self.status[i] == self.statusUnAvailable:
         printWarning("RegisterPool::remove(%u,%u) pool[%u] already unavailable" % (start, size, i))
-      elif  self.pool[i].status == self.statusInUse:
+      elif  self.status[i] == self.statusInUse:
         printWarning("RegisterPool::remove(%u,%u) pool[%u] still in use" % (start, size, i))
       else:
-        printExit("RegisterPool::remove(%u,%u) pool[%u] = %s" % (start, size, i, self.pool[i].status))
+        printExit("RegisterPool::remove(%u,%u) pool[%u] = %s" % (start, size, i, self.status[i]))
 
   ########################################
   # Check Out
@@ -138,74 +215,79 @@ class RegisterPool:
     return self.checkOutAligned(size, 1, tag, preventOverflow)
   def checkOutAligned(self, size, alignment, tag="", preventOverflow=False):
     assert(size > 0)
-    found = -1
-    for i in range(0, len(self.pool)):
-      # alignment
-      if i % alignment != 0:
-        continue
-      # enough space
-      if i + size > len(self.pool):
-        continue
-      # all available
-      allAvailable = True
-      for j in range(0, size):
-        if self.pool[i+j].status != self.statusAvailable:
-          allAvailable = False
-          i = j+1
-          break
-      if allAvailable:
-        found = i
-        break
-      else:
-        continue
+    found = self.findBlock(size, alignment)
+    self.numCheckOuts += 1
 
     # success without overflowing
     if found > -1:
       #print "Found: %u" % found
-      for i in range(found, found+size):
-        self.pool[i].status = self.statusInUse
+      self.setStatus(found, size, self.statusInUse)
+      self.numInUse += size
       self.checkOutSize[found] = size
       if self.printRP:
         print "RP::checkOut '%s' (%u,%u) @ %u avail=%u"%(tag, size,alignment, found, self.available())
-      return found
     # need overflow
     else:
-      #print "RegisterPool::checkOutAligned(%u,%u) overflowing past %u" % (size, alignment, len(self.pool))
+      #print "RegisterPool::checkOutAligned(%u,%u) overflowing past %u" % (size, alignment, len(self.status))
       # where does tail sequence of available registers begin
       assert (not preventOverflow)
-      start = len(self.pool)
-      for i in range(len(self.pool)-1, 0, -1):
-        if self.pool[i].status == self.statusAvailable:
-          start = i
-          continue
-        else:
-          break
+      oldSize = len(self.status)
+      start = (~self.availableMask & self.blockMask(0, oldSize)).bit_length()
+      if self.policy == self.policyFirstFit and start == 0 and oldSize > 0:
+        # original scan stopped before register 0
+        start = 1
       #print "Start: ", start
       # move forward for alignment
       start = ((start + alignment - 1) / alignment) * alignment
       #print "Aligned Start: ", start
       # new checkout can begin at start
       newSize = start + size
-      oldSize = len(self.pool)
       overflow = newSize - oldSize
       #print "Overflow: ", overflow
-      for i in range(start, len(self.pool)):
-        self.pool[i].status = self.statusInUse
-      for i in range(0, overflow):
-        self.pool.append(self.Register(self.statusInUse,tag))
+      if start < oldSize:
+        self.setStatus(start, oldSize-start, self.statusInUse)
+        self.numInUse += oldSize-start
+      if overflow > 0:
+        self.grow(newSize, self.statusInUse, tag)
+        self.numInUse += overflow
       self.checkOutSize[start] = size
+      self.numOverflows += 1
       if self.printRP:
         print self.state()
         print "RP::checkOut' %s' (%u,%u) @ %u (overflow)"%(tag, size, alignment, start)
-      return start
+      found = start
+    self.peakInUse = max(self.peakInUse, self.numInUse)
+    if self.trace is not None:
+      self.trace.append(("checkOut", size, alignment, preventOverflow, found))
+    return found
+
+  # start of the block policy allocates without growing the pool, else -1
+  def findBlock(self, size, alignment):
+    starts = self.blockStarts(size)
+    if alignment > 1:
+      starts &= self.alignmentMask(alignment)
+    if not starts:
+      return -1
+    if self.policy == self.policyBestFit:
+      bestStart = -1
+      bestSize = 0
+      for (blockStart, blockSize) in self.freeBlocks():
+        if bestStart > -1 and blockSize >= bestSize:
+          continue
+        fits = starts & self.blockMask(blockStart, blockSize)
+        if fits:
+          bestStart = (fits & -fits).bit_length() - 1
+          bestSize = blockSize
+      return bestStart
+    return (starts & -starts).bit_length() - 1
 
   def initTmps(self, initValue, start=0, stop=-1):
     kStr = ""
-    stop= len(self.pool) if stop== -1 or stop>len(self.pool) else stop+1
+    stop= len(self.status) if stop== -1 or stop>len(self.status) else stop+1
     for i in range(start, stop):
       #if self.type == 's':
-      #  print i, self.pool[i].status
-      if self.pool[i].status==self.statusAvailable:
+      #  print i, self.status[i]
+      if self.status[i]==self.statusAvailable:
         if self.type == 's':
           kStr += inst("s_mov_b32", sgpr(i), hex(initValue), "init tmp in pool")
         elif self.type == 'v':
@@ -218,12 +300,14 @@ class RegisterPool:
   ########################################
   # Check In
   def checkIn(self, start, tag=""):
+    if self.trace is not None:
+      self.trace.append(("checkIn", start))
     if self.printRP:
       print "RP::checkIn '%s' () @ %u"%(tag, start)
     if start in self.checkOutSize:
       size = self.checkOutSize[start]
-      for i in range(start, start+size):
-        self.pool[i].status = self.statusAvailable
+      self.setStatus(start, size, self.statusAvailable)
+      self.numInUse -= size
       self.checkOutSize.pop(start)
       if self.printRP:
         print "  RP::checkIn() @ %u +%u"%(start,size)
@@ -235,42 +319,48 @@ class RegisterPool:
   ########################################
   # Size
   def size(self):
-    return len(self.pool)
+    return len(self.status)
 
 
   ########################################
   # Number of available registers
   def available(self):
-    numAvailable = 0
-    for s in self.pool:
-      if s.status == self.statusAvailable:
-        numAvailable += 1
-    return numAvailable
+    return bin(self.availableMask).count("1")
 
   ########################################
   # Size of largest consecutive block
   def availableBlock(self):
     maxAvailable = 0
-    numAvailable = 0
-    for s in self.pool:
-      if s.status == self.statusAvailable:
-        numAvailable += 1
-      else:
-        if numAvailable > maxAvailable:
-          maxAvailable = numAvailable
-        numAvailable = 0
-    if numAvailable > maxAvailable:
-      maxAvailable = numAvailable
-    #print self.state()
-    #print "available()=", self.available(), "availableBlock()=",maxAvailable
+    mask = self.availableMask
+    while mask:
+      mask &= mask >> 1
+      maxAvailable += 1
     return maxAvailable
 
+  ########################################
+  # Fragmentation Statistics
+  # - Fragmentation: 1 - largest free block / free registers
+  def stats(self):
+    numAvailable = self.available()
+    largestBlock = self.availableBlock()
+    return {
+        "Size": len(self.status),
+        "Available": numAvailable,
+        "LargestBlock": largestBlock,
+        "FreeBlocks": len(self.freeBlocks()),
+        "Fragmentation": (1.0 - float(largestBlock)/numAvailable) \
+            if numAvailable else 0.0,
+        "InUse": self.numInUse,
+        "PeakInUse": self.peakInUse,
+        "CheckOuts": self.numCheckOuts,
+        "Overflows": self.numOverflows }
+
   ########################################
   def checkFinalState(self):
-    for si in range(0,len(self.pool)):
-      if self.pool[si].status == self.statusInUse:
+    for si in range(0,len(self.status)):
+      if self.status[si] == self.statusInUse:
         printWarning("RegisterPool::checkFinalState: temp (%s, '%s') was never checked in." \
-            %(si, self.pool[si].tag))
+            %(si, self.tags[si]))
         if self.printRP:
           print self.state()
 
@@ -282,20 +372,20 @@ class RegisterPool:
     for placeValueIdx in range(1, len(placeValues)):
       placeValue = placeValues[placeValueIdx]
       priorPlaceValue = placeValues[placeValueIdx-1]
-      if len(self.pool) >= placeValue:
+      if len(self.status) >= placeValue:
         pvs = "" # place value string
-        for i in range(0, len(self.pool)):
+        for i in range(0, len(self.status)):
           if i % placeValue==0:
             pvs += "%u"%((i%priorPlaceValue)/placeValue)
           else:
             pvs += " "
         stateStr += pvs + "\n"
-    for i in range(0, len(self.pool)):
-      if self.pool[i].status == self.statusUnAvailable:
+    for i in range(0, len(self.status)):
+      if self.status[i] == self.statusUnAvailable:
         stateStr += "." # 'removed'
-      elif self.pool[i].status == self.statusAvailable:
+      elif self.status[i] == self.statusAvailable:
         stateStr += "|" # Can be allocated
-      elif self.pool[i].status == self.statusInUse:
+      elif self.status[i] == self.statusInUse:
         stateStr += "#" # Checked out
     return stateStr
 
@@ -5497,7 +5587,7 @@ class KernelWriterAssembly(KernelWriter):
   ##############################################################################
   def globalWriteElements(self, kernel, lsu, vectorWidths, elements):
     if not self.do["PostLoop"]: return ""
-    kStr = ""
+    kStr = CodeEmitter()
     atomic = kernel["GlobalSplitU"] > 1
 
     # write possibilities and labels
@@ -5796,7 +5886,7 @@ class KernelWriterAssembly(KernelWriter):
     # End label
     kStr += "label_%04u:%s"%(endLabel, self.endLine)
     self.vgprPool.checkIn(tmpVgpr)
-    return kStr
+    return kStr.getvalue()
 
 
   ##############################################################################
@@ -5928,7 +6018,7 @@ class KernelWriterAssembly(KernelWriter):
       batchElements, coord0, coord1, addrC,  \
       numVgprsPerAddr, numVgprsPerDataPerVI, halfDataRegPerVI, tmpVgpr, \
       batchElementSgprs, numSgprsPerElement, tmpSgpr):
-    kStr = ""
+    kStr = CodeEmitter()
 
     if atomic:
       # all kinds of code relies on this assumption:
@@ -6599,7 +6689,7 @@ class KernelWriterAssembly(KernelWriter):
           self.vgprPool.checkIn(data,"writeBatch data ei:%d"%elementIdx)
         lastData = data
 
-    return kStr
+    return kStr.getvalue()
 
   ##############################################################################
   # Function End
@@ -32,10 +32,10 @@ class KernelWriterSource(KernelWriter):
   ##############################################################################
   # Make OpenCL Kernel String
   ##############################################################################
-  def __init__( self, kernelMinNaming, kernelSerialNaming ):
+  def __init__( self, kernelMinNaming, kernelSerialNaming, context=None ):
     super(KernelWriterSource, self).__init__( \
-        kernelMinNaming, kernelSerialNaming)
-    self.language = globalParameters["RuntimeLanguage"]
+        kernelMinNaming, kernelSerialNaming, context)
+    self.language = self.context["RuntimeLanguage"]
 
     if self.language == "OCL":
       # everything escaped extra b/c string
@@ -2082,7 +2082,7 @@ class KernelWriterSource(KernelWriter):
   ##############################################################################
   def functionSuffix(self, kernel):
     kStr = ""
-    if globalParameters["MergeFiles"] and self.language == "HIP":
+    if self.context["MergeFiles"] and self.language == "HIP":
       kStr += "#undef UNROLL%s" % self.endLine
       kStr += "#undef LOCAL_SPLITU%s" % self.endLine
       kStr += "#undef LOCAL_DEPTHU%s" % self.endLine
@@ -2164,7 +2164,7 @@ class KernelWriterSource(KernelWriter):
   def kernelBodyPrefix(self, kernel, tPA, tPB ):
     kStr = ""
     kernelName = self.getKernelName(kernel)
-    if not globalParameters["MergeFiles"]:
+    if not self.context["MergeFiles"]:
       kStr += "\n"
       kStr += "#include \"%s.h\"\n" % kernelName
       kStr += "\n"
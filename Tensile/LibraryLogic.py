@@ -27,14 +27,18 @@ import time
 
 from copy import deepcopy
 
-from Common import print1, print2, HR, printExit, defaultAnalysisParameters, globalParameters, pushWorkingPath, popWorkingPath, assignParameterWithDefault, startTime, ProgressBar, printWarning
+from Common import print1, print2, HR, printExit, defaultAnalysisParameters, globalParameters, RunContext, assignParameterWithDefault, startTime, ProgressBar, printWarning
 from SolutionStructs import Solution
+from Trace import Span
 import YAMLIO
 
 ################################################################################
 # Analyze Problem Type
 ################################################################################
-def analyzeProblemType( problemType, problemSizeGroups, inputParameters ):
+def analyzeProblemType( problemType, problemSizeGroups, inputParameters, \
+    context=None ):
+  if context is None:
+    context = RunContext()
   print2(HR)
   print1("# Analyzing: %s" % problemType)
 
@@ -52,7 +56,8 @@ def analyzeProblemType( problemType, problemSizeGroups, inputParameters ):
 
     ######################################
     # Read Solutions
-    (problemSizes, solutions) = YAMLIO.readSolutions(solutionsFileName)
+    with Span("ReadSolutions"):
+      (problemSizes, solutions) = YAMLIO.readSolutions(solutionsFileName)
     problemSizesList.append(problemSizes)
     solutionsList.append(solutions)
     solutionMinNaming = Solution.getMinNaming(solutions)
@@ -69,7 +74,7 @@ def analyzeProblemType( problemType, problemSizeGroups, inputParameters ):
   ######################################
   # Create Logic Analyzer
   logicAnalyzer = LogicAnalyzer( problemType, problemSizesList, solutionsList, \
-      dataFileNameList, inputParameters)
+      dataFileNameList, inputParameters, context)
 
   ######################################
   # Remove invalid solutions
@@ -77,15 +82,15 @@ def analyzeProblemType( problemType, problemSizeGroups, inputParameters ):
 
   ######################################
   # Remove least important solutions
-  if globalParameters["SolutionSelectionAlg"] == 0:
+  if context["SolutionSelectionAlg"] == 0:
     logicAnalyzer.removeLeastImportantSolutions()
-  elif globalParameters["SolutionSelectionAlg"] == 1:
+  elif context["SolutionSelectionAlg"] == 1:
     logicAnalyzer.keepWinnerSolutions()
   else:
-    printExit("Bad KeepLogic=%u"%globalParameters["KeepLogic"])
+    printExit("Bad KeepLogic=%u"%context["KeepLogic"])
 
   # print raw data
-  if globalParameters["PrintLevel"] >= 2:
+  if context["PrintLevel"] >= 2:
     line = "After Removals:\n"
     numOther = 1
     for size in logicAnalyzer.numProblemSizes:
@@ -180,10 +185,11 @@ class LogicAnalyzer:
   # ENTRY: Init
   ##############################################################################
   def __init__(self, problemType, problemSizesList, solutionsList, \
-      dataFileNameList, inputParameters):
+      dataFileNameList, inputParameters, context=None):
 
     # parameters
     self.parameters = inputParameters
+    self.context = context if context is not None else RunContext()
 
     # problem type
     self.problemType = problemType
@@ -245,7 +251,7 @@ class LogicAnalyzer:
 
       # add ranges
       #print "ProblemSizes", problemSizes.sizes
-      self.rangeProblemSizes.update(problemSizes.sizes)
+      self.rangeProblemSizes.update(problemSizes)
       for rangeSize in problemSizes.ranges:
         #print "RangeSize", rangeSize
         sizedIdx = 0
@@ -341,8 +347,9 @@ class LogicAnalyzer:
     # Read Data From CSV
     for fileIdx in range(0, len(dataFileNameList)):
       dataFileName = dataFileNameList[fileIdx]
-      self.addFromCSV(dataFileName, self.numSolutionsPerGroup[fileIdx], \
-          self.solutionGroupMap[fileIdx])
+      with Span("ParseCSV"):
+        self.addFromCSV(dataFileName, self.numSolutionsPerGroup[fileIdx], \
+            self.solutionGroupMap[fileIdx])
 
 
 
@@ -893,7 +900,7 @@ class LogicAnalyzer:
     for idx in indices:
       printFileName += "_%u" % idx
     printFileName += ".csv"
-    printFile = open(os.path.join(globalParameters["WorkingPath"], printFileName), "w")
+    printFile = open(self.context.path(printFileName), "w")
     printFile.write( w )
     printFile.write( g )
     printFile.write( f )
@@ -1340,12 +1347,13 @@ class LogicAnalyzer:
 ###
 ################################################################################
 ################################################################################
-def main(  config ):
+def main(  config, context=None ):
+  if context is None:
+    context = RunContext()
   print2("# LibraryLogic config: %s" % config)
   print2("# DefaultAnalysisParameters: " % defaultAnalysisParameters)
-  benchmarkDataPath = os.path.join(globalParameters["WorkingPath"], \
-      globalParameters["BenchmarkDataPath"])
-  pushWorkingPath(globalParameters["LibraryLogicPath"])
+  benchmarkDataPath = context.path(context["BenchmarkDataPath"])
+  logicContext = context.child(context["LibraryLogicPath"])
 
   # Assign Defaults
   analysisParameters = {}
@@ -1357,7 +1365,7 @@ def main(  config ):
   print1(HR)
   currentTime = time.time()
   elapsedTime = currentTime - startTime
-  print1("# Analysing data in %s - %.3fs" % (globalParameters["BenchmarkDataPath"], elapsedTime) )
+  print1("# Analysing data in %s - %.3fs" % (context["BenchmarkDataPath"], elapsedTime) )
   for parameter in analysisParameters:
     print2("#   %s: %s" % (parameter, analysisParameters[parameter]))
   print1(HR)
@@ -1385,7 +1393,8 @@ def main(  config ):
         printExit("%s doesn't exist for %s" % (dataFileName, fileBase) )
       if not os.path.exists(solutionsFileName):
         printExit("%s doesn't exist for %s" % (solutionsFileName, fileBase) )
-      (problemSizes, solutions) = YAMLIO.readSolutions(solutionsFileName)
+      with Span("ReadSolutions"):
+        (problemSizes, solutions) = YAMLIO.readSolutions(solutionsFileName)
       if len(solutions) == 0:
         printExit("%s doesn't contains any solutions." % (solutionsFileName) )
       problemType = solutions[0]["ProblemType"]
@@ -1397,11 +1406,10 @@ def main(  config ):
       #  problemTypeTuples.append(problemTypeTuple)
 
   for problemType in problemTypes:
-    logicTuple = analyzeProblemType( problemType, problemTypes[problemType], \
-        analysisParameters )
-    YAMLIO.writeLibraryLogicForSchedule(globalParameters["WorkingPath"], \
+    with Span("AnalyzeProblemType", "Stage", {"ProblemType": str(problemType)}):
+      logicTuple = analyzeProblemType( problemType, problemTypes[problemType], \
+          analysisParameters, logicContext )
+    YAMLIO.writeLibraryLogicForSchedule(logicContext.workingPath, \
         analysisParameters["ScheduleName"], analysisParameters["ArchitectureName"], \
         analysisParameters["DeviceNames"], logicTuple)
 
-  popWorkingPath()
-
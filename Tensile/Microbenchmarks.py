@@ -0,0 +1,474 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Python Microbenchmarks
+# - times the host-side hot paths (solution derivation and naming, reading
+#   library logic, LogicAnalyzer pruning, assembly kernel generation) on
+#   synthetic data sized like a rocBLAS problem type; no gpu needed
+# - times are normalized by a fixed pure-python calibration loop so results
+#   from different machines can be compared against one stored baseline
+# - writes the results as json and exits 1 if any benchmark is slower than
+#   the baseline by more than its threshold
+################################################################################
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+from copy import deepcopy
+
+import yaml
+
+from Common import globalParameters, assignGlobalParameters, print1, \
+    printWarning, defaultSolution, defaultBenchmarkCommonParameters, \
+    defaultAnalysisParameters, HR
+from SolutionStructs import ProblemSizes, Solution
+from LibraryLogic import LogicAnalyzer
+from PerformanceModel import RooflineModel
+from AssemblyAnalyzer import generateAssembly
+from ClientWriter import writeProblemSizesFile
+import YAMLIO
+from __init__ import __version__
+
+defaultBaselineFileName = os.path.join(os.path.dirname( \
+    os.path.realpath(__file__)), "Tests", "microbenchmark_baseline.json")
+defaultThreshold = 0.25 # fraction slower than the baseline which regresses
+
+
+################################################################################
+# Synthetic Data
+# a single precision NT problem type forked over the parameters rocBLAS
+# logic files vary; sizes at scale 1 follow a typical rocBLAS problem type
+################################################################################
+problemTypeConfig = {"OperationType": "GEMM", "DataType": "s", \
+    "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True}
+
+forkParameters = [
+    ("ThreadTile", [[2, 2], [4, 4], [4, 8], [8, 4], [8, 8], [6, 6], [4, 2]]),
+    ("WorkGroup", [[16, 16, 1], [8, 8, 1], [16, 8, 1], [8, 16, 1], \
+        [16, 16, 2], [8, 8, 4]]),
+    ("DepthU", [8, 16, 32]),
+    ("GlobalSplitU", [1, 2, 4]),
+    ("WorkGroupMapping", [1, 4, 8]),
+    ("PrefetchGlobalRead", [False, True]),
+    ("VectorWidth", [-1, 1, 2, 4]),
+    ]
+
+def scaled(count, scale):
+  return max(1, int(count * scale))
+
+# solution configs in a fixed pseudo-random order, valid or not
+def solutionConfigs(numConfigs, isa=(9,0,0)):
+  commonState = {}
+  for parameterDict in defaultBenchmarkCommonParameters:
+    for key in parameterDict:
+      commonState[key] = parameterDict[key][0]
+  commonState.update(defaultSolution)
+  names = [name for (name, values) in forkParameters]
+  permutations = list(itertools.product( \
+      *[values for (name, values) in forkParameters]))
+  random.Random(0).shuffle(permutations)
+  configs = []
+  for permutation in permutations[:numConfigs]:
+    config = deepcopy(commonState)
+    config.update(deepcopy(dict(zip(names, permutation))))
+    config["ProblemType"] = deepcopy(problemTypeConfig)
+    config["KernelLanguage"] = "Assembly"
+    config["ISA"] = isa
+    configs.append(config)
+  return configs
+
+def validSolutions(numSolutions):
+  numConfigs = numSolutions
+  while True:
+    numConfigs *= 2
+    configs = solutionConfigs(numConfigs)
+    solutions = [s for s in [Solution(c) for c in configs] if s["Valid"]]
+    # or every permutation tried
+    if len(solutions) >= numSolutions or len(configs) < numConfigs:
+      return solutions[:numSolutions]
+
+# state of a solution as safe yaml writes it to a logic file
+def solutionLogicState(solution):
+  state = deepcopy(solution.state)
+  state["ProblemType"] = deepcopy(state["ProblemType"].state)
+  for key in ["DataType", "DestDataType"]:
+    state["ProblemType"][key] = state["ProblemType"][key].value
+  state["ISA"] = list(state["ISA"])
+  return state
+
+def writeLogicFile(fileName, solutions, numExactSizes):
+  problemType = deepcopy(solutions[0]["ProblemType"].state)
+  for key in ["DataType", "DestDataType"]:
+    problemType[key] = problemType[key].value
+  sizeRandom = random.Random(1)
+  exactLogic = []
+  for i in range(0, numExactSizes):
+    size = [sizeRandom.randint(1, 64)*64, sizeRandom.randint(1, 64)*64, 1, \
+        sizeRandom.randint(1, 64)*64]
+    exactLogic.append([size, [sizeRandom.randrange(len(solutions)), \
+        round(sizeRandom.uniform(1000, 12000), 1)]])
+  data = [{"MinimumRequiredVersion": __version__}, "vega10", "gfx900", \
+      ["Device 6863"], problemType, \
+      [solutionLogicState(s) for s in solutions], [0, 1, 2, 3], exactLogic, \
+      None]
+  with open(fileName, "w") as logicFile:
+    yaml.safe_dump(data, logicFile)
+
+
+################################################################################
+# Benchmarks
+# setup(scale, tempPath) returns (state, number of items); run(state) is
+# timed; benchmarks whose run consumes its state are set up before each run
+################################################################################
+def setupSolutionConstruction(scale, tempPath):
+  configs = solutionConfigs(scaled(2000, scale))
+  return (configs, len(configs))
+
+def runSolutionConstruction(configs):
+  for config in configs:
+    Solution(config)
+
+def setupSolutions(scale, tempPath):
+  solutions = validSolutions(scaled(500, scale))
+  return (solutions, len(solutions))
+
+def runGetNameFull(solutions):
+  for solution in solutions:
+    Solution.getNameFull(solution)
+
+def setupGetNameMin(scale, tempPath):
+  (solutions, numSolutions) = setupSolutions(scale, tempPath)
+  return ((solutions, Solution.getMinNaming(solutions)), numSolutions)
+
+def runGetNameMin(state):
+  (solutions, requiredParameters) = state
+  for solution in solutions:
+    Solution.getNameMin(solution, requiredParameters)
+
+def runGetMinNaming(solutions):
+  Solution.getMinNaming(solutions)
+
+def runGetSerialNaming(solutions):
+  Solution.getSerialNaming(solutions)
+
+def setupReadLibraryLogic(scale, tempPath):
+  fileName = os.path.join(tempPath, "vega10_Cijk_Ailk_Bjlk_SB.yaml")
+  if not os.path.exists(fileName):
+    writeLogicFile(fileName, validSolutions(scaled(100, scale)), \
+        scaled(2000, scale))
+  return (fileName, 1)
+
+def runReadLibraryLogic(fileName):
+  YAMLIO.readLibraryLogicForSchedule(fileName)
+
+# the analyzer reads measurements the roofline model predicts for the solutions
+def setupLogicAnalyzer(scale, tempPath):
+  solutions = validSolutions(scaled(48, scale))
+  problemType = solutions[0]["ProblemType"]
+  numSizes = scaled(16, scale ** 0.5)
+  sizeRange = [64, 64, 0, 64*numSizes]
+  problemSizes = ProblemSizes(problemType, [{"Range": [sizeRange, \
+      sizeRange, [1], [256, 256, 0, 1024]]}])
+  dataFileName = os.path.join(tempPath, "LogicAnalyzer.csv")
+  if not os.path.exists(dataFileName):
+    model = RooflineModel(solutions[0]["ISA"])
+    with open(dataFileName, "w") as dataFile:
+      dataFile.write("GFlops, SizeI, SizeJ, SizeK, SizeL, TotalFlops, %s\n" \
+          % ", ".join(["s%u" % i for i in range(0, len(solutions))]))
+      sizes = list(problemSizes)
+      for problemIdx in range(0, len(sizes)):
+        size = sizes[problemIdx]
+        dataFile.write("%u, %s, %u, %s\n" % (problemIdx, \
+            ", ".join([str(v) for v in size]), 2*size[0]*size[1]*size[3], \
+            ", ".join(["%f" % model.predict(s, size) for s in solutions])))
+  analyzer = LogicAnalyzer(problemType, [problemSizes], [solutions], \
+      [dataFileName], deepcopy(defaultAnalysisParameters))
+  return (analyzer, len(solutions))
+
+def runLogicAnalyzerPruning(analyzer):
+  analyzer.removeInvalidSolutions()
+  analyzer.removeLeastImportantSolutions()
+
+# a large range, counted, bounded and streamed into the client's sizes file
+def setupProblemSizes(scale, tempPath):
+  solutions = validSolutions(1)
+  numSizes = scaled(48, scale ** (1.0/3))
+  sizeRange = [32, 32, 0, 32*numSizes]
+  config = [{"Range": [sizeRange, sizeRange, [1], sizeRange]}, \
+      {"Exact": [127, 127, 1, 127]}]
+  fileName = os.path.join(tempPath, "ProblemSizes.bin")
+  return ((solutions[0]["ProblemType"], config, fileName), numSizes**3 + 1)
+
+def runProblemSizes(state):
+  (problemType, config, fileName) = state
+  problemSizes = ProblemSizes(problemType, deepcopy(config))
+  writeProblemSizesFile(fileName, problemSizes, problemType["TotalIndices"])
+
+def setupKernelGeneration(scale, tempPath):
+  solutions = validSolutions(scaled(500, scale))
+  # a spread of the valid kernels
+  stride = max(1, len(solutions) / scaled(8, scale))
+  kernels = [s.getKernels()[0] for s in solutions[::stride]]
+  return (kernels, len(kernels))
+
+def runKernelGeneration(kernels):
+  for kernel in kernels:
+    generateAssembly(kernel)
+
+# (name, setup, run, set up before every run)
+microbenchmarks = [
+    ("SolutionConstruction", setupSolutionConstruction, \
+        runSolutionConstruction, False),
+    ("GetNameFull", setupSolutions, runGetNameFull, False),
+    ("GetNameMin", setupGetNameMin, runGetNameMin, False),
+    ("GetMinNaming", setupSolutions, runGetMinNaming, False),
+    ("GetSerialNaming", setupSolutions, runGetSerialNaming, False),
+    ("ReadLibraryLogic", setupReadLibraryLogic, runReadLibraryLogic, False),
+    ("LogicAnalyzerPruning", setupLogicAnalyzer, runLogicAnalyzerPruning, \
+        True),
+    ("KernelGeneration", setupKernelGeneration, runKernelGeneration, False),
+    ("ProblemSizes", setupProblemSizes, runProblemSizes, False),
+    ]
+
+
+################################################################################
+# Run
+################################################################################
+# seconds of a fixed pure-python workload; results are multiples of it
+def calibrate(numRepeats):
+  bestTime = None
+  for repeat in range(0, numRepeats):
+    startTime = time.time()
+    table = {}
+    for i in range(0, 200000):
+      key = "k%u" % (i % 1000)
+      table[key] = table.get(key, 0) + i
+    elapsed = time.time() - startTime
+    bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+  return bestTime
+
+# kiB of /proc/self/status field VmRSS or VmHWM (peak), None if unavailable
+def residentKiB(field):
+  try:
+    with open("/proc/self/status", "r") as statusFile:
+      for line in statusFile:
+        if line.startswith(field + ":"):
+          return int(line.split()[1])
+  except IOError:
+    pass
+  return None
+
+# kiB run grows the peak resident set by, measured in a forked child so
+# earlier benchmarks do not hide it; None where not supported
+def peakMemoryGrowth(setup, run, scale, tempPath):
+  if not hasattr(os, "fork") or residentKiB("VmHWM") is None:
+    return None
+  (readFd, writeFd) = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(readFd)
+    growth = ""
+    try:
+      (state, numItems) = setup(scale, tempPath)
+      before = residentKiB("VmRSS")
+      try: # reset the peak to the current resident set
+        with open("/proc/self/clear_refs", "w") as clearFile:
+          clearFile.write("5")
+      except IOError:
+        before = residentKiB("VmHWM")
+      run(state)
+      growth = "%u" % max(0, residentKiB("VmHWM") - before)
+    finally:
+      os.write(writeFd, growth)
+      os._exit(0)
+  os.close(writeFd)
+  growth = os.read(readFd, 64)
+  os.close(readFd)
+  os.waitpid(pid, 0)
+  return int(growth) if growth else None
+
+def runMicrobenchmarks(names, scale, numRepeats, memory=False):
+  priorGlobals = dict([(key, globalParameters[key]) for key in \
+      ["CurrentISA", "PrintLevel", "SolutionMemoPath", "ShowProgressBar"]])
+  globalParameters["PrintLevel"] = 0
+  if "AsmCaps" not in globalParameters:
+    assignGlobalParameters({})
+  # derived solution parameters look up caps of the current isa, which is
+  # unset on machines without a gpu
+  if globalParameters["CurrentISA"] not in globalParameters["ArchCaps"]:
+    globalParameters["CurrentISA"] = (9,0,0)
+  globalParameters["SolutionMemoPath"] = None
+  globalParameters["ShowProgressBar"] = False
+  tempPath = tempfile.mkdtemp(prefix="TensileMicrobenchmarks")
+  # the code measured prints progress bars and warnings regardless
+  priorStdout = sys.stdout
+  sys.stdout = open(os.devnull, "w")
+  # calibrating before and after catches a machine busy for either part
+  calibration = calibrate(max(numRepeats, 5))
+  results = {"Version": __version__, "Python": sys.version.split()[0], \
+      "Scale": scale, "Benchmarks": {}}
+  try:
+    for (name, setup, run, freshSetup) in microbenchmarks:
+      if names and name not in names:
+        continue
+      (state, numItems) = setup(scale, tempPath)
+      bestTime = None
+      for repeat in range(0, numRepeats):
+        if freshSetup and repeat > 0:
+          (state, numItems) = setup(scale, tempPath)
+        startTime = time.time()
+        run(state)
+        elapsed = time.time() - startTime
+        bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+      results["Benchmarks"][name] = {"Items": numItems, "Seconds": bestTime, \
+          "PerItemUs": 1e6*bestTime/numItems}
+      if memory:
+        results["Benchmarks"][name]["PeakMemoryKiB"] = \
+            peakMemoryGrowth(setup, run, scale, tempPath)
+    calibration = min(calibration, calibrate(max(numRepeats, 5)))
+  finally:
+    sys.stdout.close()
+    sys.stdout = priorStdout
+    shutil.rmtree(tempPath, True)
+    globalParameters.update(priorGlobals)
+  results["Calibration"] = calibration
+  for result in results["Benchmarks"].values():
+    result["Normalized"] = result["Seconds"] / calibration
+  return results
+
+
+################################################################################
+# Compare
+# (name, ratio to baseline, threshold, verdict) per benchmark in both
+################################################################################
+def compareResults(results, baseline, threshold=None):
+  comparisons = []
+  if baseline.get("Scale") != results["Scale"]:
+    printWarning("baseline was measured at scale %s, not %s; not comparing" \
+        % (baseline.get("Scale"), results["Scale"]))
+    return comparisons
+  for name in sorted(results["Benchmarks"]):
+    if name not in baseline["Benchmarks"]:
+      continue
+    reference = baseline["Benchmarks"][name]
+    limit = threshold if threshold is not None \
+        else reference.get("Threshold", defaultThreshold)
+    ratio = results["Benchmarks"][name]["Normalized"] / reference["Normalized"]
+    if ratio > 1 + limit:
+      verdict = "REGRESSED"
+    elif ratio < 1 - limit:
+      verdict = "improved"
+    else:
+      verdict = "ok"
+    comparisons.append((name, ratio, limit, verdict))
+  return comparisons
+
+
+# thresholds tuned in the previous baseline are kept
+def writeBaseline(fileName, results):
+  thresholds = {}
+  if os.path.exists(fileName):
+    with open(fileName, "r") as baselineFile:
+      for (name, reference) in json.load(baselineFile)["Benchmarks"].items():
+        if "Threshold" in reference:
+          thresholds[name] = reference["Threshold"]
+  baseline = deepcopy(results)
+  for name in baseline["Benchmarks"]:
+    baseline["Benchmarks"][name]["Threshold"] = \
+        thresholds.get(name, defaultThreshold)
+  with open(fileName, "w") as baselineFile:
+    json.dump(baseline, baselineFile, indent=2, sort_keys=True)
+
+
+################################################################################
+# Main
+################################################################################
+def Microbenchmarks(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="time Tensile's host-side hot paths on synthetic data")
+  argParser.add_argument("benchmarks", nargs="*", \
+      help="benchmarks to run; default all of %s" \
+      % ", ".join([b[0] for b in microbenchmarks]))
+  argParser.add_argument("--scale", type=float, default=1.0, \
+      help="multiply the synthetic data sizes by this")
+  argParser.add_argument("--repeats", type=int, default=5, \
+      help="report the best of this many repeats")
+  argParser.add_argument("--output", help="write the results json here")
+  argParser.add_argument("--baseline", default=defaultBaselineFileName, \
+      help="compare against this results json")
+  argParser.add_argument("--threshold", type=float, default=None, \
+      help="fraction slower than the baseline which regresses; default per " \
+      "benchmark in the baseline, else %.2f" % defaultThreshold)
+  argParser.add_argument("--write-baseline", dest="writeBaseline", \
+      action="store_true", help="store the results as the baseline")
+  argParser.add_argument("--memory", action="store_true", \
+      help="also report how much each benchmark grows peak memory (Linux)")
+  args = argParser.parse_args(userArgs)
+
+  results = runMicrobenchmarks(args.benchmarks, args.scale, args.repeats, \
+      args.memory)
+  print HR
+  print "# Python %s, scale %s, calibration %.3f ms" % (results["Python"], \
+      results["Scale"], 1000*results["Calibration"])
+  print "# %-22s %8s %12s %14s %12s%s" % ("Benchmark", "Items", "Time(ms)", \
+      "PerItem(us)", "Normalized", " %12s" % "PeakMem(MiB)" \
+      if args.memory else "")
+  for name in sorted(results["Benchmarks"]):
+    result = results["Benchmarks"][name]
+    peakMemory = ""
+    if result.get("PeakMemoryKiB") is not None:
+      peakMemory = " %12.1f" % (result["PeakMemoryKiB"] / 1024.0)
+    print "# %-22s %8u %12.3f %14.1f %12.3f%s" % (name, result["Items"], \
+        1000*result["Seconds"], result["PerItemUs"], result["Normalized"], \
+        peakMemory)
+  print HR
+  if args.output:
+    with open(args.output, "w") as outputFile:
+      json.dump(results, outputFile, indent=2, sort_keys=True)
+
+  if args.writeBaseline:
+    writeBaseline(args.baseline, results)
+    print1("# Wrote baseline %s" % args.baseline)
+    return 0
+  if not os.path.exists(args.baseline):
+    printWarning("no baseline %s to compare against" % args.baseline)
+    return 0
+  with open(args.baseline, "r") as baselineFile:
+    baseline = json.load(baselineFile)
+  numRegressions = 0
+  print "# %-22s %10s %10s  %s" % ("vs baseline", "Ratio", "Threshold", "")
+  for (name, ratio, limit, verdict) in compareResults(results, baseline, \
+      args.threshold):
+    print "# %-22s %10.3f %10.2f  %s" % (name, ratio, limit, verdict)
+    if verdict == "REGRESSED":
+      numRegressions += 1
+  print HR
+  return 1 if numRegressions else 0
+
+def main():
+  sys.exit(Microbenchmarks(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
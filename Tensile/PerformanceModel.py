@@ -0,0 +1,431 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Performance Model
+# - predicts the GFlop/s of a solution on a problem size from its derived
+#   parameters and per-architecture constants, without running it
+# - BenchmarkProblems uses it to prune solutions predicted to fall outside
+#   PerformanceModelMargin of the best in their hardcoded group
+# - calibrated against the csv/yaml pairs in 2_BenchmarkData
+################################################################################
+import os
+import sys
+import abc
+import csv
+import argparse
+import itertools
+from math import ceil, log
+
+from Common import globalParameters, printExit, printWarning, HR
+from AssemblyAnalyzer import getOccupancy, isaResourceLimits
+import YAMLIO
+
+
+################################################################################
+# Per-ISA Performance Constants
+# - FmasPerCUPerClock is for single precision; DataTypeRates scales it by
+#   DataType char (complex types run at the rate of their component type)
+# - LdsBytesPerCUPerClock is the ds_read bandwidth of one CU
+################################################################################
+isaPerformanceConstants = {
+    (8,0,3): {
+      "ComputeUnits": 64,
+      "ClockMHz": 1000,
+      "MemoryBandwidthGBs": 512,
+      "FmasPerCUPerClock": 64,
+      "LdsBytesPerCUPerClock": 128,
+      "DataTypeRates": {"S": 1, "C": 1, "D": 1/16.0, "Z": 1/16.0, "H": 1, \
+          "4xi8": 1, "I": 1},
+      },
+    (9,0,0): {
+      "ComputeUnits": 64,
+      "ClockMHz": 1500,
+      "MemoryBandwidthGBs": 484,
+      "FmasPerCUPerClock": 64,
+      "LdsBytesPerCUPerClock": 128,
+      "DataTypeRates": {"S": 1, "C": 1, "D": 1/16.0, "Z": 1/16.0, "H": 2, \
+          "4xi8": 1, "I": 1},
+      },
+    (9,0,6): {
+      "ComputeUnits": 60,
+      "ClockMHz": 1725,
+      "MemoryBandwidthGBs": 1024,
+      "FmasPerCUPerClock": 64,
+      "LdsBytesPerCUPerClock": 128,
+      "DataTypeRates": {"S": 1, "C": 1, "D": 1/2.0, "Z": 1/2.0, "H": 2, \
+          "4xi8": 4, "I": 1},
+      },
+    }
+
+def isaName(isa):
+  return "gfx" + "".join(map(str, isa))
+
+
+################################################################################
+# Performance Model
+# base class; a model predicts GFlop/s and may fit its parameters to measured
+# samples, which are (solution, problemSize, measured GFlop/s) tuples
+################################################################################
+class PerformanceModel:
+  __metaclass__=abc.ABCMeta
+
+  # calibratable parameters and their defaults
+  defaultParameters = {}
+
+  def __init__(self, isa, parameters=None):
+    self.isa = tuple(isa)
+    self.parameters = dict(self.defaultParameters)
+    if parameters:
+      self.parameters.update(parameters)
+
+  @abc.abstractmethod
+  def predict(self, solution, problemSize):
+    return
+
+  # returns the fitted parameters, also assigned to self.parameters
+  def calibrate(self, samples):
+    return self.parameters
+
+
+################################################################################
+# Roofline Model
+# time is the slowest of the MAC, LDS and memory traffic of the executed
+# (tile-quantized) problem, with work-groups spread over the CUs in waves;
+# too few resident waves to hide latency scale the whole kernel down
+################################################################################
+class RooflineModel(PerformanceModel):
+  defaultParameters = {
+      "ComputeEfficiency": 0.8, # fraction of peak MAC and LDS throughput
+      "MemoryEfficiency": 1.0,  # fraction of dram bandwidth; >1 for cache reuse
+      "OccupancyForPeak": 2,    # waves per simd needed to hide latency
+      }
+
+  # sgprs aren't known before generating the kernel; typical for a gemm
+  estimatedSgprs = 64
+
+  def __init__(self, isa, parameters=None):
+    PerformanceModel.__init__(self, isa, parameters)
+    if self.isa not in isaPerformanceConstants:
+      printExit("no performance constants for isa %s" % isaName(self.isa))
+    self.constants = isaPerformanceConstants[self.isa]
+    self.occupancyCache = {}
+
+  def predict(self, solution, problemSize):
+    return self.combine(self.terms(solution, problemSize), self.parameters)
+
+  ########################################
+  # waves per simd a work-group can have resident, from estimated registers
+  def occupancy(self, solution):
+    key = (solution["NumThreads"], solution["ThreadTile0"], \
+        solution["ThreadTile1"], solution["MacroTile0"], \
+        solution["MacroTile1"], solution["DepthU"], \
+        solution["PrefetchLocalRead"], solution["LdsNumElements"], \
+        solution["ProblemType"]["DataType"].value)
+    if key not in self.occupancyCache:
+      dataType = solution["ProblemType"]["DataType"]
+      registers = dataType.numRegisters()
+      valuC = solution["ThreadTile0"] * solution["ThreadTile1"] * registers
+      valuAB = (solution["ThreadTile0"] + solution["ThreadTile1"]) \
+          * registers * (2 if solution["PrefetchLocalRead"] else 1)
+      globalRead = (solution["MacroTile0"] + solution["MacroTile1"]) \
+          * solution["DepthU"] * registers / float(solution["NumThreads"])
+      vgprs = int(ceil(valuC + valuAB + globalRead)) + 16 # addresses, serial
+      vgprs = min(vgprs, isaResourceLimits[self.isa]["MaxVgprs"])
+      ldsBytes = solution["LdsNumElements"] * dataType.numBytes()
+      self.occupancyCache[key] = getOccupancy(self.isa, \
+          solution["NumThreads"], vgprs, self.estimatedSgprs, ldsBytes)[0]
+    return self.occupancyCache[key]
+
+  ########################################
+  # parameter-independent terms of a prediction
+  def terms(self, solution, problemSize):
+    problemType = solution["ProblemType"]
+    dataType = problemType["DataType"]
+    constants = self.constants
+    bpe = dataType.numBytes()
+    macroTile0 = solution["MacroTile0"]
+    macroTile1 = solution["MacroTile1"]
+    depthU = solution["DepthU"]
+    globalSplitU = solution["GlobalSplitU"]
+
+    sizeI = problemSize[problemType["Index0"]]
+    sizeJ = problemSize[problemType["Index1"]]
+    sizeBatch = 1
+    for i in problemType["IndicesBatch"]:
+      sizeBatch *= problemSize[i]
+    sizeL = 1
+    for i in problemType["IndicesSummation"]:
+      sizeL *= problemSize[i]
+
+    # tile and depth quantization: the kernel computes whole macro tiles and
+    # whole unrolled iterations of each global split
+    numTiles0 = (sizeI + macroTile0 - 1) / macroTile0
+    numTiles1 = (sizeJ + macroTile1 - 1) / macroTile1
+    splitL = (sizeL + globalSplitU - 1) / globalSplitU
+    paddedSplitL = ((splitL + depthU - 1) / depthU) * depthU
+    numWorkGroups = numTiles0 * numTiles1 * sizeBatch * globalSplitU
+
+    # wave quantization: the busiest CU runs this many work-groups
+    numCUs = constants["ComputeUnits"]
+    workGroupsPerCU = (numWorkGroups + numCUs - 1) / numCUs
+    clock = constants["ClockMHz"] * 1.0e6
+    fmaRate = constants["FmasPerCUPerClock"] \
+        * constants["DataTypeRates"][dataType.toChar()]
+    macsPerFma = 1 if dataType.isReal() else 4
+    workGroupMacs = macroTile0 * macroTile1 * paddedSplitL * macsPerFma
+    computeTime = workGroupsPerCU * workGroupMacs / (fmaRate * clock)
+
+    # each thread of a split reads its ThreadTile0+ThreadTile1 per iteration
+    threadsPerSplit = solution["NumThreads"] / solution["LocalSplitU"]
+    workGroupLdsBytes = threadsPerSplit * (solution["ThreadTile0"] \
+        + solution["ThreadTile1"]) * bpe * paddedSplitL \
+        / solution["LocalSplitU"]
+    ldsTime = workGroupsPerCU * workGroupLdsBytes \
+        / float(constants["LdsBytesPerCUPerClock"] * clock)
+
+    # every work-group reads its panels of A and B; C is written once per
+    # split and also read when beta is used
+    accessesC = globalSplitU * (2 if problemType["UseBeta"] else 1)
+    memoryBytes = numWorkGroups * (macroTile0 + macroTile1) * paddedSplitL \
+        * bpe + sizeI * sizeJ * sizeBatch * bpe * accessesC
+    memoryTime = memoryBytes / (constants["MemoryBandwidthGBs"] * 1.0e9)
+
+    # resident waves per simd, limited by registers/lds or by the problem
+    wavesPerWorkGroup = max(1, solution["NumThreads"] \
+        / globalParameters["WavefrontWidth"])
+    simdsPerCU = isaResourceLimits[self.isa]["SimdsPerCU"]
+    residentWorkGroups = min(workGroupsPerCU, self.occupancy(solution) \
+        * simdsPerCU / wavesPerWorkGroup)
+    waves = residentWorkGroups * wavesPerWorkGroup / float(simdsPerCU)
+
+    flops = dataType.flopsPerMac() * sizeI * sizeJ * sizeBatch * sizeL
+    return (flops, computeTime, ldsTime, memoryTime, waves)
+
+  ########################################
+  @staticmethod
+  def combine(terms, parameters):
+    (flops, computeTime, ldsTime, memoryTime, waves) = terms
+    time = max(computeTime / parameters["ComputeEfficiency"], \
+        ldsTime / parameters["ComputeEfficiency"], \
+        memoryTime / parameters["MemoryEfficiency"])
+    latencyHiding = min(1.0, waves / parameters["OccupancyForPeak"])
+    if time <= 0 or latencyHiding <= 0:
+      return 0.0
+    return flops * latencyHiding / time / 1.0e9
+
+  ########################################
+  # grid search minimizing the squared log error of the predictions
+  def calibrate(self, samples):
+    measured = []
+    terms = []
+    for (solution, problemSize, gflops) in samples:
+      if gflops > 0:
+        measured.append(log(gflops))
+        terms.append(self.terms(solution, problemSize))
+    if len(terms) == 0:
+      printWarning("no measured samples to calibrate the roofline model")
+      return self.parameters
+    best = None
+    for computeIdx in range(1, 21):
+      for memoryIdx in range(-4, 9):
+        for occupancy in range(1, 5):
+          parameters = { "ComputeEfficiency": computeIdx * 0.05, \
+              "MemoryEfficiency": 2 ** (memoryIdx / 4.0), \
+              "OccupancyForPeak": occupancy }
+          error = 0
+          for i in range(0, len(terms)):
+            predicted = self.combine(terms[i], parameters)
+            if predicted <= 0:
+              error = None
+              break
+            error += (log(predicted) - measured[i]) ** 2
+          if error is not None and (best is None or error < best[0]):
+            best = (error, parameters)
+    if best is not None:
+      self.parameters = best[1]
+    return self.parameters
+
+
+################################################################################
+# Model Registry
+# other models may be registered here, or named as module.Class
+################################################################################
+performanceModels = {
+    "Roofline": RooflineModel,
+    }
+
+def getPerformanceModel(name, isa):
+  if name in performanceModels:
+    modelClass = performanceModels[name]
+  elif "." in name:
+    (moduleName, className) = name.rsplit(".", 1)
+    try:
+      module = __import__(moduleName, fromlist=[className])
+      modelClass = getattr(module, className)
+    except (ImportError, AttributeError):
+      printExit("Cannot load PerformanceModel %s" % name)
+  else:
+    printExit("Unknown PerformanceModel %s; choose from %s" \
+        % (name, sorted(performanceModels.keys())))
+  return modelClass(isa, readCalibration(isa))
+
+# calibrated parameters for isa, or None
+def readCalibration(isa):
+  fileName = globalParameters["PerformanceModelCalibration"]
+  if not fileName:
+    return None
+  if not os.path.exists(fileName):
+    printWarning("PerformanceModelCalibration %s doesn't exist" % fileName)
+    return None
+  calibration = YAMLIO.readConfig(fileName)
+  if calibration and isaName(isa) in calibration:
+    return calibration[isaName(isa)]
+  return None
+
+
+################################################################################
+# Prune Solutions
+# keeps the solutions whose prediction is within margin of the best on at
+# least one problem size; sizes (a list or ProblemSizes) are subsampled to
+# at most maxProblemSizes
+################################################################################
+def pruneSolutions(model, solutions, problemSizes, margin, maxProblemSizes=256):
+  if len(solutions) < 2:
+    return solutions
+  stride = max(1, (len(problemSizes) + maxProblemSizes - 1) / maxProblemSizes)
+  keep = [False]*len(solutions)
+  for problemSize in itertools.islice(problemSizes, 0, None, stride):
+    predictions = [model.predict(s, problemSize) for s in solutions]
+    threshold = (1.0 - margin) * max(predictions)
+    for i in range(0, len(solutions)):
+      if predictions[i] >= threshold:
+        keep[i] = True
+  return [solutions[i] for i in range(0, len(solutions)) if keep[i]]
+
+
+################################################################################
+# Read Benchmark Data
+# (solution, problemSize, GFlop/s) for every measurement in a csv written by
+# the benchmark client and its solutions yaml
+################################################################################
+def readBenchmarkSamples(dataFileName):
+  solutionsFileName = os.path.splitext(dataFileName)[0] + ".yaml"
+  if not os.path.exists(solutionsFileName):
+    printExit("%s doesn't exist for %s" % (solutionsFileName, dataFileName))
+  (problemSizes, solutions) = YAMLIO.readSolutions(solutionsFileName)
+  numIndices = solutions[0]["ProblemType"]["TotalIndices"]
+  solutionStartIdx = 1 + numIndices + 1
+  samples = []
+  with open(dataFileName, "r") as dataFile:
+    rows = csv.reader(dataFile)
+    rows.next() # header
+    for row in rows:
+      if len(row) < solutionStartIdx + len(solutions):
+        continue
+      problemSize = tuple([int(row[i]) for i in range(1, 1+numIndices)])
+      for i in range(0, len(solutions)):
+        samples.append((solutions[i], problemSize, \
+            float(row[solutionStartIdx+i])))
+  return samples
+
+def listBenchmarkData(paths):
+  dataFileNames = []
+  for path in paths:
+    if os.path.isdir(path):
+      for fileName in sorted(os.listdir(path)):
+        if os.path.splitext(fileName)[1] == ".csv":
+          dataFileNames.append(os.path.join(path, fileName))
+    else:
+      dataFileNames.append(path)
+  return dataFileNames
+
+# fraction of problem sizes whose measured winner pruning would keep
+def winnerRetention(model, samples, margin):
+  sizes = {}
+  for (solution, problemSize, gflops) in samples:
+    key = (str(solution["ProblemType"]), problemSize)
+    if key not in sizes:
+      sizes[key] = []
+    sizes[key].append((gflops, model.predict(solution, problemSize)))
+  numRetained = 0
+  for key in sizes:
+    (winnerGFlops, winnerPrediction) = max(sizes[key])
+    bestPrediction = max([p for (g, p) in sizes[key]])
+    if winnerPrediction >= (1.0 - margin) * bestPrediction:
+      numRetained += 1
+  return numRetained / float(max(1, len(sizes)))
+
+
+################################################################################
+# Main
+################################################################################
+def CalibratePerformanceModel(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="fit a Tensile performance model to benchmark data")
+  argParser.add_argument("paths", nargs="+", \
+      help="benchmark csv files or directories of them, eg 2_BenchmarkData")
+  argParser.add_argument("--model", default="Roofline", \
+      help="performance model to calibrate")
+  argParser.add_argument("--isa", default="9,0,0", \
+      help="isa the data was measured on, eg 9,0,6")
+  argParser.add_argument("--margin", type=float, default=0.5, \
+      help="report winners kept when pruning with this margin")
+  argParser.add_argument("--output", default=None, \
+      help="calibration yaml to add the fitted parameters to")
+  args = argParser.parse_args(userArgs)
+  isa = tuple([int(v) for v in args.isa.split(",")])
+  if isa not in isaPerformanceConstants:
+    printExit("no performance constants for isa %s" % isaName(isa))
+  if "AsmCaps" not in globalParameters:
+    from Common import assignGlobalParameters
+    assignGlobalParameters({})
+  globalParameters["PerformanceModelCalibration"] = None
+
+  samples = []
+  for dataFileName in listBenchmarkData(args.paths):
+    samples += readBenchmarkSamples(dataFileName)
+  if len(samples) == 0:
+    printExit("no benchmark data in %s" % " ".join(args.paths))
+  model = getPerformanceModel(args.model, isa)
+
+  print HR
+  print "# %u samples" % len(samples)
+  print "# before: winners kept %.1f%%" \
+      % (100 * winnerRetention(model, samples, args.margin))
+  parameters = model.calibrate(samples)
+  for name in sorted(parameters):
+    print "#   %s: %s" % (name, parameters[name])
+  print "# after:  winners kept %.1f%%" \
+      % (100 * winnerRetention(model, samples, args.margin))
+  print HR
+
+  if args.output:
+    calibration = {}
+    if os.path.exists(args.output):
+      calibration = YAMLIO.readConfig(args.output) or {}
+    calibration[isaName(isa)] = parameters
+    YAMLIO.writeConfig(args.output, calibration)
+  return 0
+
+def main():
+  sys.exit(CalibratePerformanceModel(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,133 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Pipeline
+# - overlaps the CPU side of benchmarking (enumerating, generating and
+#   building kernels and clients, reading results) with client runs on the
+#   device, so neither sits idle while the other works
+# - a pipeline is a generator for one problem size group: advancing it does
+#   its CPU work up to the next client run, which it yields as a DeviceRun;
+#   the run's return code is sent back in, so every step still starts from
+#   the winners of the steps before it
+# - a pipeline ends by yielding its result (anything but a DeviceRun)
+# - PipelineExecutor runs one DeviceRun at a time and prepares up to depth
+#   other pipelines ahead of it; it drives them all from the calling thread,
+#   so only subprocesses overlap and no Python state is shared across threads
+################################################################################
+import time
+from collections import deque
+from subprocess import Popen
+
+from Common import globalParameters, print1
+from Trace import Span
+
+################################################################################
+# Device Run
+# a client run a pipeline waits for; holds the device while it runs
+################################################################################
+class DeviceRun:
+
+  def __init__(self, command, cwd=None, name="RunBenchmark"):
+    self.command = command
+    self.cwd = cwd
+    self.name = name
+
+  def start(self):
+    self.span = Span(self.name, "Subprocess").begin()
+    self.startTime = time.time()
+    self.process = Popen(self.command, cwd=self.cwd)
+
+  # return code once finished, else None
+  def poll(self):
+    return self.process.poll()
+
+  def wait(self):
+    return self.process.wait()
+
+  def finish(self):
+    self.span.end()
+    self.duration = time.time() - self.startTime
+    return self.process.returncode
+
+
+################################################################################
+# Pipeline Executor
+################################################################################
+class PipelineExecutor:
+
+  def __init__(self, depth=None):
+    self.depth = globalParameters["PipelineDepth"] if depth is None \
+        else depth
+    self.numRuns = 0
+    self.deviceBusy = 0.0
+    self.elapsed = 0.0
+
+  ##############################################################################
+  # run pipelines to completion, returning their results in order; finished
+  # is called with (index, result) as each one ends
+  ##############################################################################
+  def run(self, pipelines, finished=None):
+    start = time.time()
+    results = [None] * len(pipelines)
+    unstarted = deque(enumerate(pipelines))
+    ready = deque()  # (idx, pipeline, return code) whose client run finished
+    queued = deque() # (idx, pipeline, DeviceRun) waiting for the device
+    running = None   # (idx, pipeline, DeviceRun) on the device
+    while unstarted or ready or queued or running:
+      if running and running[2].poll() is not None:
+        (idx, pipeline, deviceRun) = running
+        ready.append((idx, pipeline, deviceRun.finish()))
+        self.numRuns += 1
+        self.deviceBusy += deviceRun.duration
+        running = None
+      elif running is None and queued:
+        running = queued.popleft()
+        running[2].start()
+      # pipelines whose run finished are on the critical path
+      elif ready:
+        (idx, pipeline, returnCode) = ready.popleft()
+        self.advance(idx, pipeline, returnCode, queued, results, finished)
+      elif unstarted and len(queued) + (running is not None) <= self.depth:
+        (idx, pipeline) = unstarted.popleft()
+        self.advance(idx, pipeline, None, queued, results, finished)
+      else:
+        running[2].wait()
+    self.elapsed = time.time() - start
+    return results
+
+  def advance(self, idx, pipeline, value, queued, results, finished):
+    request = pipeline.send(value)
+    if isinstance(request, DeviceRun):
+      queued.append((idx, pipeline, request))
+    else:
+      results[idx] = request
+      pipeline.close()
+      if finished:
+        finished(idx, request)
+
+  def report(self):
+    if self.numRuns:
+      print1("# Pipeline: %u client runs, device busy %.1f%% of %.3fs (depth %u)" \
+          % (self.numRuns, 100 * self.deviceBusy / self.elapsed \
+          if self.elapsed > 0 else 0, self.elapsed, self.depth))
+
+# run pipelines one after the other
+def runSequentially(pipelines):
+  return PipelineExecutor(0).run(pipelines)
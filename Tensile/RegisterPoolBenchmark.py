@@ -0,0 +1,396 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# RegisterPool Microbenchmark
+# - captures the register pool operations made while generating a set of
+#   assembly kernels
+# - replays them against the original list-scanning pool (LegacyRegisterPool)
+#   and the bitmap RegisterPool, checks FirstFit makes identical decisions and
+#   reports time and fragmentation for each
+################################################################################
+import sys
+import time
+import argparse
+from copy import deepcopy
+
+from Common import globalParameters, assignGlobalParameters, printWarning, \
+    defaultSolution, defaultBenchmarkCommonParameters, HR
+from SolutionStructs import ProblemType, Solution
+from KernelWriterAssembly import KernelWriterAssembly, RegisterPool
+
+
+################################################################################
+# Legacy Register Pool
+# the pool as it was before the bitmap rewrite: a list with one status per
+# register and a first-fit scan; kept as the reference for FirstFit decisions
+################################################################################
+class LegacyRegisterPool:
+  statusUnAvailable = 0
+  statusAvailable = 1
+  statusInUse = 2
+
+  class Register:
+    def __init__(self, status, tag=""):
+      self.status = status
+      self.tag = tag
+
+  def __init__(self, size, type):
+    self.type = type
+    self.pool = [self.Register(self.statusUnAvailable, "init") for i in range(0,size)]
+    self.checkOutSize = {}
+
+  def add(self, start, size, tag=""):
+    newSize = start + size
+    oldSize = len(self.pool)
+    if newSize > oldSize:
+      for i in range(0, newSize-oldSize):
+        self.pool.append(self.Register(self.statusUnAvailable,tag))
+    for i in range(start, start+size):
+      if self.pool[i].status == self.statusUnAvailable:
+        self.pool[i].status = self.statusAvailable
+
+  def remove(self, start, size, tag=""):
+    for i in range(start, start+size):
+      if  self.pool[i].status == self.statusAvailable:
+        self.pool[i].status = self.statusUnAvailable
+
+  def checkOut(self, size, tag="", preventOverflow=False):
+    return self.checkOutAligned(size, 1, tag, preventOverflow)
+
+  def checkOutAligned(self, size, alignment, tag="", preventOverflow=False):
+    assert(size > 0)
+    found = -1
+    for i in range(0, len(self.pool)):
+      # alignment
+      if i % alignment != 0:
+        continue
+      # enough space
+      if i + size > len(self.pool):
+        continue
+      # all available
+      allAvailable = True
+      for j in range(0, size):
+        if self.pool[i+j].status != self.statusAvailable:
+          allAvailable = False
+          i = j+1
+          break
+      if allAvailable:
+        found = i
+        break
+      else:
+        continue
+
+    # success without overflowing
+    if found > -1:
+      for i in range(found, found+size):
+        self.pool[i].status = self.statusInUse
+      self.checkOutSize[found] = size
+      return found
+    # need overflow
+    else:
+      assert (not preventOverflow)
+      start = len(self.pool)
+      for i in range(len(self.pool)-1, 0, -1):
+        if self.pool[i].status == self.statusAvailable:
+          start = i
+          continue
+        else:
+          break
+      start = ((start + alignment - 1) / alignment) * alignment
+      newSize = start + size
+      oldSize = len(self.pool)
+      overflow = newSize - oldSize
+      for i in range(start, len(self.pool)):
+        self.pool[i].status = self.statusInUse
+      for i in range(0, overflow):
+        self.pool.append(self.Register(self.statusInUse,tag))
+      self.checkOutSize[start] = size
+      return start
+
+  def checkIn(self, start, tag=""):
+    if start in self.checkOutSize:
+      size = self.checkOutSize[start]
+      for i in range(start, start+size):
+        self.pool[i].status = self.statusAvailable
+      self.checkOutSize.pop(start)
+
+  def size(self):
+    return len(self.pool)
+
+  def available(self):
+    numAvailable = 0
+    for s in self.pool:
+      if s.status == self.statusAvailable:
+        numAvailable += 1
+    return numAvailable
+
+  def availableBlock(self):
+    maxAvailable = 0
+    numAvailable = 0
+    for s in self.pool:
+      if s.status == self.statusAvailable:
+        numAvailable += 1
+      else:
+        if numAvailable > maxAvailable:
+          maxAvailable = numAvailable
+        numAvailable = 0
+    if numAvailable > maxAvailable:
+      maxAvailable = numAvailable
+    return maxAvailable
+
+  def statusList(self):
+    return [r.status for r in self.pool]
+
+
+################################################################################
+# Kernels whose generation is traced
+# - overrides applied to the default solution; invalid ones are skipped
+################################################################################
+benchmarkProblemTypes = [
+    {"OperationType": "GEMM", "DataType": "s", "TransposeA": False, \
+        "TransposeB": True, "UseBeta": True, "Batched": True},
+    {"OperationType": "GEMM", "DataType": "d", "TransposeA": True, \
+        "TransposeB": False, "UseBeta": True, "Batched": True},
+    {"OperationType": "GEMM", "DataType": "h", "TransposeA": False, \
+        "TransposeB": False, "UseBeta": True, "Batched": True, \
+        "HighPrecisionAccumulate": True},
+    ]
+
+benchmarkKernelParameters = [
+    {},
+    {"ThreadTile": [ 8, 8 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 8},
+    {"ThreadTile": [ 4, 8 ], "WorkGroup": [ 16, 8, 1 ], "DepthU": 16, \
+        "PrefetchGlobalRead": False},
+    {"ThreadTile": [ 6, 4 ], "WorkGroup": [ 8, 16, 1 ], "DepthU": 8, \
+        "PrefetchLocalRead": False},
+    {"ThreadTile": [ 8, 4 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 16, \
+        "GlobalSplitU": 2},
+    {"ThreadTile": [ 4, 4 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 32, \
+        "GlobalReadVectorWidth": 1},
+    ]
+
+
+################################################################################
+# Capture Traces
+# returns one list of pool operations per register pool created while
+# generating every valid kernel
+################################################################################
+def captureTraces(isa=(9,0,0), problemTypes=None, kernelParameters=None):
+  if "AsmCaps" not in globalParameters:
+    assignGlobalParameters({})
+  if problemTypes is None:
+    problemTypes = benchmarkProblemTypes
+  if kernelParameters is None:
+    kernelParameters = benchmarkKernelParameters
+  commonState = {}
+  for parameterDict in defaultBenchmarkCommonParameters:
+    for key in parameterDict:
+      commonState[key] = parameterDict[key][0]
+  commonState.update(defaultSolution)
+
+  # derived solution parameters look up caps of the current isa, which is
+  # unset on machines without a gpu
+  priorCurrentISA = globalParameters["CurrentISA"]
+  if priorCurrentISA not in globalParameters["ArchCaps"]:
+    globalParameters["CurrentISA"] = isa
+  try:
+    traces = captureKernelTraces(isa, problemTypes, kernelParameters, \
+        commonState)
+  finally:
+    globalParameters["CurrentISA"] = priorCurrentISA
+  return traces
+
+
+def captureKernelTraces(isa, problemTypes, kernelParameters, commonState):
+  traces = []
+  for problemTypeConfig in problemTypes:
+    problemType = ProblemType(problemTypeConfig)
+    for overrides in kernelParameters:
+      state = deepcopy(commonState)
+      state.update(deepcopy(overrides))
+      state["ProblemType"] = problemType
+      state["KernelLanguage"] = "Assembly"
+      state["ISA"] = isa
+      solution = Solution(state)
+      if not solution["Valid"]:
+        continue
+      kernelWriter = KernelWriterAssembly( \
+          Solution.getMinNaming([solution]), \
+          Solution.getSerialNaming([solution]))
+      priorTraceLog = RegisterPool.traceLog
+      RegisterPool.traceLog = traces
+      try:
+        tensorParametersA = {}
+        tensorParametersB = {}
+        kernelWriter.initKernel(solution, tensorParametersA, tensorParametersB)
+        kernelWriter.kernelBodyPrefix(solution, tensorParametersA, \
+            tensorParametersB)
+        kernelWriter.kernelBody(solution, tensorParametersA, tensorParametersB)
+        kernelWriter.kernelBodySuffix(solution, tensorParametersA, \
+            tensorParametersB)
+      finally:
+        RegisterPool.traceLog = priorTraceLog
+  return traces
+
+
+################################################################################
+# Replay Trace
+# - recorded checkOut results are mapped to the replayed ones so checkIns
+#   still refer to the right block when a policy picks different registers
+# - onCheckOut(pool) is called after every checkOut
+# - returns (pool, number of checkOuts which differ from the recording)
+################################################################################
+def replayTrace(trace, makePool, onCheckOut=None):
+  (_, size, type) = trace[0]
+  pool = makePool(size, type)
+  startMap = {}
+  numDifferent = 0
+  for op in trace[1:]:
+    if op[0] == "checkOut":
+      (_, size, alignment, preventOverflow, recorded) = op
+      start = pool.checkOutAligned(size, alignment, "", preventOverflow)
+      startMap[recorded] = start
+      if start != recorded:
+        numDifferent += 1
+      if onCheckOut:
+        onCheckOut(pool)
+    elif op[0] == "checkIn":
+      pool.checkIn(startMap.pop(op[1], op[1]))
+    elif op[0] == "add":
+      pool.add(op[1], op[2])
+    elif op[0] == "remove":
+      pool.remove(op[1], op[2])
+  return (pool, numDifferent)
+
+
+def makeLegacyPool(size, type):
+  return LegacyRegisterPool(size, type)
+
+def makeFirstFitPool(size, type):
+  return RegisterPool(size, type, 0, RegisterPool.policyFirstFit)
+
+def makeBestFitPool(size, type):
+  return RegisterPool(size, type, 0, RegisterPool.policyBestFit)
+
+
+################################################################################
+# Time Replay
+# best of numRepeats wall time to replay every trace
+################################################################################
+def timeReplay(traces, makePool, numRepeats):
+  bestTime = None
+  for repeat in range(0, numRepeats):
+    startTime = time.time()
+    for trace in traces:
+      replayTrace(trace, makePool)
+    elapsed = time.time() - startTime
+    if bestTime is None or elapsed < bestTime:
+      bestTime = elapsed
+  return bestTime
+
+
+################################################################################
+# Main
+################################################################################
+def RegisterPoolBenchmark(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="replay register pool traces captured from kernel generation")
+  argParser.add_argument("--repeats", type=int, default=5, \
+      help="replay each implementation this many times and keep the best")
+  args = argParser.parse_args(userArgs)
+
+  globalParameters["PrintLevel"] = 0
+  traces = captureTraces()
+  numOps = sum([len(trace)-1 for trace in traces])
+  numCheckOuts = sum([len([op for op in trace if op[0] == "checkOut"]) \
+      for trace in traces])
+  print HR
+  print "# RegisterPool Benchmark: %u pools, %u operations, %u checkOuts" \
+      % (len(traces), numOps, numCheckOuts)
+  print HR
+
+  # FirstFit must reproduce the legacy pool exactly
+  numMismatches = 0
+  for trace in traces:
+    (legacyPool, legacyDifferent) = replayTrace(trace, makeLegacyPool)
+    (firstFitPool, firstFitDifferent) = replayTrace(trace, makeFirstFitPool)
+    if legacyDifferent or firstFitDifferent \
+        or legacyPool.statusList() != list(firstFitPool.status):
+      numMismatches += 1
+  if numMismatches:
+    printWarning("FirstFit differs from legacy pool on %u/%u traces" \
+        % (numMismatches, len(traces)))
+
+  implementations = [
+      ("Legacy", makeLegacyPool),
+      ("FirstFit", makeFirstFitPool),
+      ("BestFit", makeBestFitPool) ]
+  legacyTime = None
+  print "%-10s %10s %8s %10s %10s %10s" % ("Pool", "Time(ms)", "Speedup", \
+      "PeakSize", "Overflows", "Different")
+  for (name, makePool) in implementations:
+    elapsed = timeReplay(traces, makePool, args.repeats)
+    if legacyTime is None:
+      legacyTime = elapsed
+    peakSize = 0
+    overflows = "-"
+    numDifferent = 0
+    if name != "Legacy":
+      overflows = 0
+    for trace in traces:
+      (pool, different) = replayTrace(trace, makePool)
+      numDifferent += different
+      peakSize = max(peakSize, pool.size())
+      if name != "Legacy":
+        overflows += pool.stats()["Overflows"]
+    print "%-10s %10.3f %8.2f %10u %10s %10u" % (name, elapsed*1000, \
+        legacyTime/elapsed if elapsed > 0 else 0, peakSize, overflows, \
+        numDifferent)
+
+  # fragmentation at the point each pool was most heavily used
+  print HR
+  print "# Fragmentation at peak use (FirstFit vs BestFit)"
+  for (name, makePool) in implementations[1:]:
+    fragmentation = []
+    for trace in traces:
+      fragmentation.append(peakFragmentation(trace, makePool))
+    print "%-10s mean=%.3f max=%.3f" % (name, \
+        sum(fragmentation)/len(fragmentation) if fragmentation else 0, \
+        max(fragmentation) if fragmentation else 0)
+  return 1 if numMismatches else 0
+
+
+# fragmentation of the pool right after its in-use count peaked
+def peakFragmentation(trace, makePool):
+  peak = { "InUse": -1, "Fragmentation": 0.0 }
+  def sample(pool):
+    stats = pool.stats()
+    if stats["InUse"] > peak["InUse"]:
+      peak["InUse"] = stats["InUse"]
+      peak["Fragmentation"] = stats["Fragmentation"]
+  replayTrace(trace, makePool, sample)
+  return peak["Fragmentation"]
+
+
+def main():
+  sys.exit(RegisterPoolBenchmark(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,178 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Solution Memo
+# - remembers the derived parameters, or the rejection reason, of every
+#   solution configuration Solution() has derived, across runs and configs
+# - keyed by the problem type, the solution parameters and the globals the
+#   derivation reads
+# - stored in one file per version (hash) of SolutionStructs.py, so editing
+#   the derivation starts a new memo and deletes the stale one
+################################################################################
+import os
+import hashlib
+import cPickle
+import tempfile
+
+from Common import globalParameters, print1, printWarning
+
+# globals Solution.assignDerivedParameters reads
+derivationGlobals = [ "CurrentISA", "MaxLDS", "DeviceLDS", "MaxDepthU", \
+    "WavefrontWidth" ]
+
+def sourceVersion(fileNames):
+  version = hashlib.sha1()
+  for fileName in fileNames:
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), \
+        fileName), "rb") as sourceFile:
+      version.update(sourceFile.read())
+  return version.hexdigest()
+
+def solutionStructsVersion():
+  return sourceVersion(["SolutionStructs.py"])
+
+# resource analysis verdicts also depend on the assembly they analyze
+def kernelWriterVersion():
+  return sourceVersion(["KernelWriter.py", "KernelWriterAssembly.py", \
+      "AssemblyAnalyzer.py"])
+
+
+################################################################################
+# Solution Memo
+################################################################################
+class SolutionMemo:
+
+  def __init__(self, path):
+    self.path = path
+    self.version = solutionStructsVersion()
+    self.writerVersion = kernelWriterVersion()
+    self.fileName = os.path.join(path, "SolutionMemo-%s.pickle" \
+        % self.version[:16])
+    self.entries = {}    # key -> pickled (derived state, rejection reason)
+    self.newEntries = {}
+    self.numHits = 0
+    self.numMisses = 0
+    if os.path.exists(self.fileName):
+      self.entries = self.read()
+
+  def read(self):
+    try:
+      with open(self.fileName, "rb") as memoFile:
+        return cPickle.load(memoFile)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+      printWarning("ignoring unreadable solution memo %s" % self.fileName)
+      return {}
+
+  ########################################
+  # key of a solution state before derivation
+  def key(self, state):
+    derivationState = [globalParameters.get(name) for name in derivationGlobals]
+    currentISA = globalParameters["CurrentISA"]
+    if "ArchCaps" in globalParameters \
+        and currentISA in globalParameters["ArchCaps"]:
+      derivationState.append(globalParameters["ArchCaps"][currentISA])
+    items = sorted([item for item in state.items() \
+        if item[0] != "ProblemType"])
+    problemType = sorted(state["ProblemType"].state.items())
+    return hashlib.sha1(repr((problemType, items, derivationState))).digest()
+
+  # (derived state without ProblemType, rejection reason) or None
+  def get(self, key):
+    if key in self.entries:
+      self.numHits += 1
+      return cPickle.loads(self.entries[key])
+    self.numMisses += 1
+    return None
+
+  def put(self, key, state, rejection):
+    derived = dict(state)
+    del derived["ProblemType"]
+    entry = cPickle.dumps((derived, rejection), cPickle.HIGHEST_PROTOCOL)
+    self.entries[key] = entry
+    self.newEntries[key] = entry
+
+  ########################################
+  # verdict of the kernel resource analysis: None if not memoized, else the
+  # rejection reason ("" if the kernels fit); also depends on the writers
+  def resourceKey(self, solution):
+    if not hasattr(solution, "memoKey"):
+      return None
+    asmCaps = sorted([(isa, sorted(caps.items())) for (isa, caps) \
+        in globalParameters.get("AsmCaps", {}).items()])
+    return hashlib.sha1(repr((solution.memoKey, self.writerVersion, \
+        globalParameters["MinOccupancy"], globalParameters["DebugKernel"], \
+        asmCaps))).digest()
+
+  def getResources(self, solution):
+    key = self.resourceKey(solution)
+    if key in self.entries:
+      self.numHits += 1
+      return cPickle.loads(self.entries[key])
+    return None
+
+  def putResources(self, solution, rejection):
+    key = self.resourceKey(solution)
+    if key is not None:
+      entry = cPickle.dumps(rejection, cPickle.HIGHEST_PROTOCOL)
+      self.entries[key] = entry
+      self.newEntries[key] = entry
+
+  ########################################
+  # merge new entries into the file; concurrent runs may have added others
+  def save(self):
+    print1("# Solution memo: %u hits, %u derived, %u entries" \
+        % (self.numHits, self.numMisses, len(self.entries)))
+    if len(self.newEntries) == 0:
+      return
+    if not os.path.exists(self.path):
+      os.makedirs(self.path)
+    if os.path.exists(self.fileName):
+      self.entries = self.read()
+      self.entries.update(self.newEntries)
+    (fileHandle, tempFileName) = tempfile.mkstemp(dir=self.path)
+    with os.fdopen(fileHandle, "wb") as memoFile:
+      cPickle.dump(self.entries, memoFile, cPickle.HIGHEST_PROTOCOL)
+    os.rename(tempFileName, self.fileName)
+    self.newEntries = {}
+    for fileName in os.listdir(self.path):
+      if fileName.startswith("SolutionMemo-") \
+          and fileName != os.path.basename(self.fileName):
+        os.remove(os.path.join(self.path, fileName))
+
+
+################################################################################
+# Current Memo
+# the memo at globalParameters["SolutionMemoPath"]; None when that is unset
+################################################################################
+currentMemo = None
+
+def getSolutionMemo():
+  global currentMemo
+  path = globalParameters["SolutionMemoPath"]
+  if not path:
+    return None
+  if currentMemo is None or currentMemo.path != path:
+    currentMemo = SolutionMemo(path)
+  return currentMemo
+
+def saveSolutionMemo():
+  memo = getSolutionMemo()
+  if memo is not None:
+    memo.save()
@@ -22,7 +22,11 @@
 
 import sys,traceback
 from Common import globalParameters, defaultProblemType, assignParameterWithDefault, printExit, assignParameterRequired, defaultSolution, validParameters, print1
+from SolutionMemo import getSolutionMemo
 from copy import deepcopy
+import hashlib
+import heapq
+import itertools
 from math import ceil, log
 
 ################################################################################
@@ -170,7 +174,11 @@ class DataType:
 
 ########################################
 # Print a reject message :
+# reason of the most recent rejection, for the solution memo
+lastRejection = None
+
 def reject(state, *args):
+  global lastRejection
   if globalParameters["PrintSolutionRejectionReason"]:
     sys.stdout.write("\nreject: ")
     for a in args:
@@ -178,6 +186,7 @@ def reject(state, *args):
     traceback.print_stack(None, 2)
   if state != None:
     state["Valid"] = False
+    lastRejection = " ".join([str(a) for a in args])
 
 # print a labled variable
 def pvar(state, field):
@@ -457,71 +466,92 @@ class ProblemSizeRange:
     for i in problemType["IndexAssignmentsB"]:
       self.maxNumElements[2] *= self.indexMax[i]
 
-    self.totalProblemSizes = 1
-    self.numProblemSizes = [] # per index
-    self.problemSizeToIndex = []
-    self.problemIndexToSize = []
+    ########################################
+    # sizes stay symbolic: the sizes of each sized index, and which sized
+    # index supplies each index; tuples are generated when iterated
+    self.indexSizes = []
+    for index in self.indicesSized:
+      sizes = []
+      currentSize = index[0]
+      currentIncrement = index[1]
+      while currentSize <= index[3]:
+        sizes.append(currentSize)
+        currentSize += currentIncrement
+        currentIncrement += index[2]
+      self.indexSizes.append(sizes)
+
+    self.sources = [] # per index, position in indicesSized
     sizedIdx = 0
-    for i in range(0, len(self.indexIsSized)):
-      self.problemSizeToIndex.append({})
-      self.problemIndexToSize.append({})
+    for i in range(0, self.totalIndices):
       if self.indexIsSized[i]:
-        self.numProblemSizes.append(0)
-        index = self.indicesSized[sizedIdx]
+        self.sources.append(sizedIdx)
         sizedIdx += 1
-        currentSize = index[0]
-        currentIncrement = index[1]
-        while currentSize <= index[3]:
-          currentSize += currentIncrement
-          currentIncrement += index[2]
-          self.numProblemSizes[i] += 1
+      else:
+        self.sources.append(None)
+    mappedIdx = 0
+    for i in range(0, self.totalIndices):
+      if not self.indexIsSized[i]:
+        self.sources[i] = self.getSource(self.indicesMapped[mappedIdx], [i])
+        mappedIdx += 1
+
+    self.numProblemSizes = [] # per index
+    self.totalProblemSizes = 1
+    for i in range(0, self.totalIndices):
+      if self.indexIsSized[i]:
+        self.numProblemSizes.append(len(self.indexSizes[self.sources[i]]))
       else:
         self.numProblemSizes.append(1)
       self.totalProblemSizes *= self.numProblemSizes[i]
 
-    ########################################
-    # enumerate problem sizes
-    currentSizedIndexSizes = []
-    currentSizedIndexIncrements = []
-    for i in range(0, len(self.indicesSized)):
-      currentSizedIndexSizes.append(self.indicesSized[i][0])
-      currentSizedIndexIncrements.append(self.indicesSized[i][1])
-
-    # iterate over all problem sizes
-    self.problemSizes = []
-    moreProblemSizes = True
-    problemIdx = 0
-    problemSize = [0]*self.totalIndices
-    while moreProblemSizes:
-      #/ convert current sized and mapped indices to full sizes
-      currentSizedIdx = 0
-      currentMappedIdx = 0
-      for i in range(0, self.totalIndices):
-        if self.indexIsSized[i]:
-          problemSize[i] = currentSizedIndexSizes[currentSizedIdx]
-          currentSizedIdx+=1
-        else:
-          problemSize[i] = problemSize[self.indicesMapped[currentMappedIdx]]
-          currentMappedIdx+=1
-      self.problemSizes.append(tuple(problemSize))
-
-      #/ increment sizes for next benchmark
-      currentSizedIndexSizes[0] += currentSizedIndexIncrements[0]
-      currentSizedIndexIncrements[0] += self.indicesSized[0][2]
-      for i in range(1, len(self.indicesSized)+1):
-        # if prior index past max, reset to min and increment next index
-        if currentSizedIndexSizes[i-1] > self.indicesSized[i-1][3]:
-          #/ reset prior index
-          currentSizedIndexSizes[i-1] = self.indicesSized[i-1][0]
-          currentSizedIndexIncrements[i-1] = self.indicesSized[i-1][1]
-          # increment next index
-          if i >= len(self.indicesSized):
-            moreProblemSizes = False
-          else:
-            currentSizedIndexSizes[i] += currentSizedIndexIncrements[i]
-            currentSizedIndexIncrements[i] += self.indicesSized[i][2]
+    # sized indices in order of first appearance; a product over them in
+    # this order generates sizes in sorted (lexicographic) order
+    self.sortedOrder = []
+    for source in self.sources:
+      if source not in self.sortedOrder:
+        self.sortedOrder.append(source)
+    self.uniqueIndexSizes = [ sorted(set(self.indexSizes[source])) \
+        for source in self.sortedOrder ]
+    self.numUniqueProblemSizes = 1
+    for sizes in self.uniqueIndexSizes:
+      self.numUniqueProblemSizes *= len(sizes)
+
+    # largest size of each index
+    if self.totalProblemSizes > 0:
+      self.maxSizes = tuple([ max(self.indexSizes[source]) \
+          for source in self.sources ])
+    else:
+      self.maxSizes = None
+
+  ########################################
+  # sized index supplying index i, following mapped indices
+  def getSource(self, i, visited):
+    if i >= self.totalIndices or i in visited:
+      printExit("ProblemSizeRange %s maps index %u to itself or past %u indices" \
+          % (self, visited[0], self.totalIndices))
+    if self.indexIsSized[i]:
+      return self.sources[i]
+    mappedIdx = self.indexIsSized[0:i].count(False)
+    return self.getSource(self.indicesMapped[mappedIdx], visited + [i])
+
+  ########################################
+  # sizes in enumeration order, first sized index fastest
+  def __iter__(self):
+    for sizes in itertools.product(*reversed(self.indexSizes)):
+      yield tuple([sizes[-1-source] for source in self.sources])
 
-      problemIdx+=1
+  def __len__(self):
+    return self.totalProblemSizes
+
+  # distinct sizes in sorted order
+  def iterSorted(self):
+    slots = [self.sortedOrder.index(source) for source in self.sources]
+    for sizes in itertools.product(*self.uniqueIndexSizes):
+      yield tuple([sizes[slot] for slot in slots])
+
+  # materializes every size; iterate the range instead where possible
+  @property
+  def problemSizes(self):
+    return list(self)
 
   ########################################
   # YAML format
@@ -584,18 +614,26 @@ class ProblemSizes:
       # set harmless default mins of 0
       self.minStrides = ([0]* problemType["TotalIndices"])
 
-    self.sizes = set()
-    for sizeRange in self.ranges:
-      self.sizes.update(sizeRange.problemSizes)
-    self.sizes.update(self.exacts)
-    self.sizes = sorted( list( self.sizes ) )
-    self.totalProblemSizes = len(self.sizes)
+    self.exacts = sorted(set(self.exacts))
 
-    # max sizes
+    # count without listing the sizes when no two sources can overlap
+    if len(self.ranges) == 0:
+      self.totalProblemSizes = len(self.exacts)
+    elif len(self.ranges) == 1 and len(self.exacts) == 0:
+      self.totalProblemSizes = self.ranges[0].numUniqueProblemSizes
+    else:
+      self.totalProblemSizes = 0
+      for problemSize in self:
+        self.totalProblemSizes += 1
+
+    # max sizes; each factor grows with each index, so the largest size of
+    # a range is where every index is largest
     self.maxC = 0
     self.maxA = 0
     self.maxB = 0
-    for problemSize in self.sizes:
+    extents = [ sizeRange.maxSizes for sizeRange in self.ranges \
+        if sizeRange.maxSizes is not None ] + self.exacts
+    for problemSize in extents:
       sizeC = 1
       sizeA = 1
       sizeB = 1
@@ -609,6 +647,25 @@ class ProblemSizes:
       self.maxA = max(self.maxA, sizeA)
       self.maxB = max(self.maxB, sizeB)
 
+  ########################################
+  # distinct sizes of all ranges and exacts in sorted order, merged lazily
+  def __iter__(self):
+    sources = [ sizeRange.iterSorted() for sizeRange in self.ranges ]
+    sources.append(iter(self.exacts))
+    previous = None
+    for problemSize in heapq.merge(*sources):
+      if problemSize != previous:
+        yield problemSize
+        previous = problemSize
+
+  def __len__(self):
+    return self.totalProblemSizes
+
+  # materializes every size; iterate instead where possible
+  @property
+  def sizes(self):
+    return list(self)
+
   def __str__(self):
     s = "ProblemSizes\n"
     for sizeRange in self.ranges:
@@ -641,7 +698,25 @@ class Solution:
     self["Valid"] = True
     self["AssignedProblemIndependentDerivedParameters"] = False
     self["AssignedDerivedParameters"] = False
-    Solution.assignDerivedParameters(self.state)
+
+    # reuse the derivation of an identical configuration
+    memo = getSolutionMemo()
+    if memo is None:
+      Solution.assignDerivedParameters(self.state)
+      return
+    self.memoKey = memo.key(self.state)
+    entry = memo.get(self.memoKey)
+    if entry is None:
+      global lastRejection
+      lastRejection = None
+      Solution.assignDerivedParameters(self.state)
+      memo.put(self.memoKey, self.state, \
+          None if self["Valid"] else lastRejection)
+    else:
+      (derived, rejection) = entry
+      self.state.update(derived)
+      if rejection and globalParameters["PrintSolutionRejectionReason"]:
+        print("\nreject (memo): %s" % rejection)
 
   ########################################
   # get a list of kernel parameters for this solution
@@ -1574,27 +1649,24 @@ class Solution:
       return {}
     # determine keys
     requiredParameters = {}
-    if isinstance(objs[0], Solution):
-      keys = list(objs[0].state.keys())
-    else:
-      keys = list(objs[0].keys())
+    first = Solution.getStateDict(objs[0])
+    keys = list(first.keys())
     # only 1, rather than name being nothing, it'll be everything
     if len(objs) == 1:
       for key in keys:
-        if key in validParameters.keys():
+        if key in validParameters:
           requiredParameters[key] = False
     else:
+      # one pass over the objects; keys drop out once a value differs
+      same = [key for key in keys if key in validParameters]
+      for i in range(1, len(objs)):
+        state = Solution.getStateDict(objs[i])
+        same = [key for key in same if first[key] == state[key]]
+        if len(same) == 0:
+          break
+      same = set(same)
       for key in keys:
-        required = False
-        if key in validParameters.keys():
-          for i in range(1, len(objs)):
-            if objs[0][key] != objs[i][key]:
-              required = True
-              break
-        if required:
-          requiredParameters[key] = True
-        else:
-          requiredParameters[key] = False
+        requiredParameters[key] = key in validParameters and key not in same
     requiredParameters["ProblemType"] = False # always prepended
     requiredParameters["MacroTile0"] = False # always prepended
     requiredParameters["MacroTile1"] = False # always prepended
@@ -1608,7 +1680,7 @@ class Solution:
   def getNameFull(state):
     requiredParameters = {}
     for key in state:
-      if key in validParameters.keys():
+      if key in validParameters:
         requiredParameters[key] = True
     return Solution.getNameMin(state, requiredParameters)
 
@@ -1617,7 +1689,6 @@ class Solution:
   @ staticmethod
   def getNameMin(state, requiredParameters):
     name = ""
-    first = True
     # put problem first
     if "ProblemType" in state:
       name += str(state["ProblemType"]) + "_"
@@ -1627,38 +1698,110 @@ class Solution:
       name += "%s%03ux%03ux%02u_" \
           % ( Solution.getParameterNameAbbreviation("MacroTile"), \
           state["MacroTile0"], state["MacroTile1"], state["DepthU"] )
-    for key in sorted(state.keys()):
-      if key in requiredParameters:
-        if requiredParameters[key]:
-          if not first:
-            name += "_"
-          else:
-            first = False
-          name += "%s%s" % ( Solution.getParameterNameAbbreviation(key), \
-              Solution.getParameterValueAbbreviation(state[key]) )
-    return name
+    fragments = []
+    for key in Solution.getSortedKeys(state):
+      if requiredParameters.get(key, False):
+        fragments.append(Solution.getNameFragment(key, state[key]))
+    return name + "_".join(fragments)
+
+  ########################################
+  # Naming Caches
+  # names are built for every kernel of every step, from few distinct keys
+  # and values: key orders and "AbbrevValue" fragments are computed once
+  sortedKeysCache = {} # tuple of keys -> keys in sorted order
+  nameAbbreviationCache = {} # parameter name -> abbreviation
+  nameFragmentCache = {} # (parameter name, valueKey) -> fragment
+
+  @staticmethod
+  def getStateDict(obj):
+    return obj.state if isinstance(obj, Solution) else obj
+
+  @staticmethod
+  def getSortedKeys(state):
+    keys = tuple(state.keys())
+    sortedKeys = Solution.sortedKeysCache.get(keys)
+    if sortedKeys is None:
+      sortedKeys = tuple(sorted(keys))
+      Solution.sortedKeysCache[keys] = sortedKeys
+    return sortedKeys
+
+  # stand-in for a parameter value which keeps the types apart (True and 1
+  # abbreviate differently); None for nested lists, which are not cached
+  @staticmethod
+  def getValueKey(value):
+    valueType = type(value)
+    if valueType is list or valueType is tuple:
+      itemTypes = tuple([type(item) for item in value])
+      if list in itemTypes or tuple in itemTypes:
+        return None
+      return (valueType, itemTypes, tuple(value))
+    return (valueType, value)
+
+  @staticmethod
+  def getNameFragment(key, value):
+    valueKey = Solution.getValueKey(value)
+    try:
+      fragment = Solution.nameFragmentCache.get((key, valueKey))
+    except TypeError: # unhashable
+      valueKey = None
+      fragment = None
+    if fragment is None:
+      fragment = "%s%s" % ( Solution.getParameterNameAbbreviation(key), \
+          Solution.getParameterValueAbbreviation(value) )
+      if valueKey is not None:
+        Solution.nameFragmentCache[(key, valueKey)] = fragment
+    return fragment
+
+  # stand-in for a parameter value which is equal (and hashes equal)
+  # exactly when the values compare equal, as list membership does;
+  # TypeError when hashed if the value is unhashable
+  @staticmethod
+  def getSerialKey(value):
+    if type(value) is list:
+      return (list, tuple(value))
+    return value
 
   ########################################
   # create a dictionary of lists of parameter values
   @staticmethod
   def getSerialNaming(objs):
     data = {}
+    seen = {} # paramName -> set of serial keys already in data
     for objIdx in range(0, len(objs)):
-      obj = objs[objIdx]
-      for paramName in sorted(obj.keys()):
-        if paramName in validParameters.keys():
+      obj = Solution.getStateDict(objs[objIdx])
+      for paramName in obj:
+        if paramName in validParameters:
           paramValue = obj[paramName]
-          if paramName in data:
-            if paramValue not in data[paramName]:
-              data[paramName].append(paramValue)
-          else:
-            data[paramName] = [ paramValue ]
+          try:
+            serialKey = Solution.getSerialKey(paramValue)
+            if paramName in data:
+              if serialKey not in seen[paramName]:
+                seen[paramName].add(serialKey)
+                data[paramName].append(paramValue)
+            else:
+              seen[paramName] = set([serialKey])
+              data[paramName] = [ paramValue ]
+          except TypeError: # unhashable
+            if paramName in data:
+              if paramValue not in data[paramName]:
+                data[paramName].append(paramValue)
+            else:
+              seen[paramName] = set()
+              data[paramName] = [ paramValue ]
     maxObjs = 1
+    indices = {} # paramName -> {serial key: index into data[paramName]}
     for paramName in data:
       data[paramName] = sorted(data[paramName])
       maxObjs *= len(data[paramName])
+      indices[paramName] = {}
+      for (valueIdx, paramValue) in enumerate(data[paramName]):
+        try:
+          indices[paramName].setdefault(Solution.getSerialKey(paramValue), \
+              valueIdx)
+        except TypeError:
+          pass
     numDigits = len(str(maxObjs))
-    return [ data, numDigits ]
+    return [ data, numDigits, indices ]
 
   ########################################
   # Get Name Serial
@@ -1666,16 +1809,22 @@ class Solution:
   def getNameSerial(state, serialNaming):
     data = serialNaming[0]
     numDigits = serialNaming[1]
+    indices = serialNaming[2]
 
     serial = 0
     multiplier = 1
-    for paramName in sorted(state.keys()):
-      if paramName in validParameters.keys():
+    for paramName in Solution.getSortedKeys(state):
+      if paramName in validParameters:
         paramValue = state[paramName]
         paramData = data[paramName]
         paramNameMultiplier = len(paramData)
-        if paramValue in paramData:
-          paramValueIdx = paramData.index(paramValue)
+        try:
+          serialKey = Solution.getSerialKey(paramValue)
+          if serialKey in indices[paramName]:
+            paramValueIdx = indices[paramName][serialKey]
+        except TypeError:
+          if paramValue in paramData:
+            paramValueIdx = paramData.index(paramValue)
         serial += paramValueIdx * multiplier
         multiplier *= paramNameMultiplier
     name = "%s%0*u" % ("S" if isinstance(state, Solution) else "K", \
@@ -1683,6 +1832,33 @@ class Solution:
     return name
 
 
+  ########################################
+  # Get Name Hashed
+  # digest of the full name, which is canonical (solutions compare equal
+  # by it), so the name does not depend on what else is in the library
+  hashedNameDigits = 16 # hex digits
+
+  @ staticmethod
+  def getNameHashed(state):
+    return "%s%s" % ("S" if isinstance(state, Solution) else "K", \
+        hashlib.sha1(Solution.getNameFull(state)).hexdigest() \
+        [:Solution.hashedNameDigits])
+
+  ########################################
+  # map of hashed names to full names; distinct objects must not collide
+  @staticmethod
+  def getHashedNaming(objs):
+    hashedNaming = {}
+    for obj in objs:
+      fullName = Solution.getNameFull(obj)
+      hashedName = Solution.getNameHashed(obj)
+      if hashedNaming.get(hashedName, fullName) != fullName:
+        printExit("Hashed name %s of %s collides with %s; turn off HashedNames" \
+            % (hashedName, fullName, hashedNaming[hashedName]))
+      hashedNaming[hashedName] = fullName
+    return hashedNaming
+
+
   ########################################
   @ staticmethod
   def getParametersIndented(state, indent):
@@ -1695,7 +1871,11 @@ class Solution:
   ########################################
   @ staticmethod
   def getParameterNameAbbreviation( name ):
-    return ''.join([c for c in name if not c.islower()])
+    abbreviation = Solution.nameAbbreviationCache.get(name)
+    if abbreviation is None:
+      abbreviation = ''.join([c for c in name if not c.islower()])
+      Solution.nameAbbreviationCache[name] = abbreviation
+    return abbreviation
 
   ########################################
   @ staticmethod
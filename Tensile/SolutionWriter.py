@@ -21,7 +21,7 @@
 
 from SolutionStructs import Solution
 from KernelWriterSource import KernelWriterSource
-from Common import globalParameters
+from Common import globalParameters, RunContext
 
 ################################################################################
 # SolutionWriter
@@ -33,15 +33,20 @@ class SolutionWriter:
   ##############################################################################
   # SolutionWriter
   ##############################################################################
+  # context: runtime language and file layout the solutions are written for
   def __init__(self, solutionMinNaming, solutionSerialNaming, \
-      kernelMinNaming, kernelSerialNaming):
-    self.language = globalParameters["RuntimeLanguage"]
+      kernelMinNaming, kernelSerialNaming, context=None):
+    if context is None:
+      context = RunContext()
+    self.context = context
+    self.language = context["RuntimeLanguage"]
     self.solutionMinNaming = solutionMinNaming
     self.solutionSerialNaming = solutionSerialNaming
     self.kernelMinNaming = kernelMinNaming
     self.kernelSerialNaming = kernelSerialNaming
     # only using getKernelName from KernelWriter so child doesn't matter
-    self.kernelWriter = KernelWriterSource( kernelMinNaming, kernelSerialNaming)
+    self.kernelWriter = KernelWriterSource( kernelMinNaming, kernelSerialNaming, \
+        context)
 
     self.streamName = "hipStream_t" if self.language == "HIP" \
         else "cl_command_queue"
@@ -57,7 +62,9 @@ class SolutionWriter:
   # get solution name
   ##############################################################################
   def getSolutionName(self, solution):
-    if globalParameters["ShortNames"]:
+    if globalParameters["HashedNames"]:
+      solutionName = Solution.getNameHashed(solution)
+    elif globalParameters["ShortNames"]:
       solutionName = Solution.getNameSerial(solution, self.solutionSerialNaming)
     else:
       solutionName = Solution.getNameMin(solution, self.solutionMinNaming)
@@ -82,7 +89,7 @@ class SolutionWriter:
     # includes
 
 
-    if not globalParameters["MergeFiles"]:
+    if not self.context["MergeFiles"]:
       solutionName = self.getSolutionName(solution)
       s += "#include \"%s.h\"\n" % solutionName
       s += "\n"
@@ -138,11 +145,11 @@ class SolutionWriter:
 
     # NOTE: host compiler aligns size of structs to 64-bits (at least) and aligns the offset of pointers to 64-bits, therefore, having pointers which are not at the beginning of the struct may get padded/shifted by the host compiler and, therefore, not coppied correctly to gpu
 
-    if globalParameters["RuntimeLanguage"] == "HIP":
+    if self.language == "HIP":
       s += "%sint deviceId;\n" % (t)
       s += "%shipGetDevice(&deviceId);\n" % (t)
     if solution["ProblemType"]["DataType"].isInt8x4() and solution["ProblemType"]["HighPrecisionAccumulate"]:
-      if globalParameters["RuntimeLanguage"] == "HIP":
+      if self.language == "HIP":
         s += "%shipDeviceProp_t deviceProperties;\n" % (t)
         s += "%shipGetDeviceProperties(&deviceProperties, deviceId);\n" % (t)
         s += "%sint gcnArch = deviceProperties.gcnArch;\n" % (t)
@@ -152,7 +159,7 @@ class SolutionWriter:
     s += "\n%s/* kernels */\n" % (t)
     s += "%sconst unsigned int numKernels = %u; // 1 or 4\n" % (t, len(kernels))
 
-    if solution["KernelLanguage"] == "Source" and globalParameters["RuntimeLanguage"] == "OCL":
+    if solution["KernelLanguage"] == "Source" and self.language == "OCL":
       s += "%sconst char *kernelSources[numKernels] = {\n" % (t)
       t += "  "
       for kernelIdx in range(0, len(kernelNames)):
@@ -745,7 +752,7 @@ class SolutionWriter:
   ##############################################################################
   def getHeaderString(self, solution):
     s = ""
-    if not globalParameters["MergeFiles"]:
+    if not self.context["MergeFiles"]:
       s += "#pragma once\n\n"
       s += "#include \"TensileTypes.h\"\n"
       s += "#include \"SolutionHelper.h\"\n"
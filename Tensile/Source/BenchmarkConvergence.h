@@ -0,0 +1,141 @@
+/*******************************************************************************
+* Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+*
+* Permission is hereby granted, free of charge, to any person obtaining a copy
+* of this software and associated documentation files (the "Software"), to deal
+* in the Software without restriction, including without limitation the rights
+* to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+* ies of the Software, and to permit persons to whom the Software is furnished
+* to do so, subject to the following conditions:
+*
+* The above copyright notice and this permission notice shall be included in all
+* copies or substantial portions of the Software.
+*
+* THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+* PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+* FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+* COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+* IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+* CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+*******************************************************************************/
+
+#ifndef BENCHMARK_CONVERGENCE_H
+#define BENCHMARK_CONVERGENCE_H
+
+#include <cmath>
+#include <limits>
+
+/*******************************************************************************
+ * Student-t critical value for a two-sided 95% confidence interval
+ * - exact table up to 30 degrees of freedom, Cornish-Fisher expansion above
+ ******************************************************************************/
+inline double tensileStudentT95(unsigned int degreesOfFreedom) {
+  static const double table[31] = {
+    0.0,
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+     2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+     2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042 };
+  if (degreesOfFreedom == 0) {
+    return std::numeric_limits<double>::infinity();
+  }
+  if (degreesOfFreedom <= 30) {
+    return table[degreesOfFreedom];
+  }
+  const double z = 1.959964;
+  double n = static_cast<double>(degreesOfFreedom);
+  return z + (z*z*z + z) / (4.0*n)
+      + (5.0*z*z*z*z*z + 16.0*z*z*z + 3.0*z) / (96.0*n*n);
+}
+
+/*******************************************************************************
+ * Benchmark Convergence
+ * - accumulates timing samples (Welford running mean/variance)
+ * - done() is the stopping rule: stop once the 95% confidence interval of the
+ *   mean is within targetRelativeCI of the mean, or once maxSamples samples
+ *   or maxTimeMs of wall time have been spent; never before minSamples
+ ******************************************************************************/
+class TensileBenchmarkConvergence {
+public:
+  TensileBenchmarkConvergence(
+      double targetRelativeCI,
+      double maxTimeMs,
+      unsigned int minSamples,
+      unsigned int maxSamples)
+    : targetRelativeCI(targetRelativeCI),
+      maxTimeMs(maxTimeMs),
+      minSamples(minSamples > 1 ? minSamples : 2),
+      maxSamples(maxSamples > 0 ? maxSamples : 1) {
+    reset();
+  }
+
+  void reset() {
+    n = 0;
+    runningMean = 0.0;
+    m2 = 0.0;
+  }
+
+  void addSample(double sample) {
+    n++;
+    double delta = sample - runningMean;
+    runningMean += delta / n;
+    m2 += delta * (sample - runningMean);
+  }
+
+  unsigned int numSamples() const { return n; }
+
+  double mean() const { return runningMean; }
+
+  double variance() const {
+    return n > 1 ? m2 / (n - 1) : 0.0;
+  }
+
+  double stddev() const { return std::sqrt(variance()); }
+
+  // half-width of the 95% confidence interval of the mean
+  double confidenceInterval() const {
+    if (n < 2) {
+      return std::numeric_limits<double>::infinity();
+    }
+    return tensileStudentT95(n-1) * stddev() / std::sqrt(static_cast<double>(n));
+  }
+
+  // confidence interval half-width as a fraction of the mean
+  double relativeConfidenceInterval() const {
+    if (n < 2) {
+      return std::numeric_limits<double>::infinity();
+    }
+    if (runningMean == 0.0) {
+      return m2 == 0.0 ? 0.0 : std::numeric_limits<double>::infinity();
+    }
+    return confidenceInterval() / std::fabs(runningMean);
+  }
+
+  bool converged() const {
+    return n >= minSamples && relativeConfidenceInterval() <= targetRelativeCI;
+  }
+
+  bool done(double elapsedMs) const {
+    if (n == 0) {
+      return false;
+    }
+    if (n >= maxSamples) {
+      return true;
+    }
+    if (elapsedMs >= maxTimeMs) {
+      return true;
+    }
+    return converged();
+  }
+
+private:
+  double targetRelativeCI;
+  double maxTimeMs;
+  unsigned int minSamples;
+  unsigned int maxSamples;
+
+  unsigned int n;
+  double runningMean;
+  double m2;
+};
+
+#endif
@@ -37,9 +37,28 @@ int main( int argc, char *argv[] ) {
   // parse command line parameters
   parseCommandLineParameters(argc, argv);
 
+#if Tensile_CLIENT_LIBRARY
+  // server responses own stdout, everything else the client prints goes to
+  // stderr
+  std::streambuf *responseBuffer = std::cout.rdbuf();
+  if (!serverInputName.empty()) {
+    std::cout.rdbuf(std::cerr.rdbuf());
+  }
+#endif
+
   // init runtime controls
   initControls();
 
+#if Tensile_CLIENT_LIBRARY
+  if (!serverInputName.empty()) {
+    std::ostream responses(responseBuffer);
+    int serverStatus = serveLibrary(responses);
+    destroyControls();
+    std::cout.rdbuf(responseBuffer);
+    return serverStatus;
+  }
+#endif
+
   // init data
   unsigned int dataTypeIdx = 0;
   DataTypeEnum dataTypeEnum = dataTypeEnums[dataTypeIdx];
@@ -357,3 +376,55 @@ void destroyControls() {
   hipStreamDestroy(stream);
 #endif
 }
+
+
+/*******************************************************************************
+ * serve library
+ * - benchmarks the problems read from serverInputName until end of input
+ ******************************************************************************/
+#if Tensile_CLIENT_LIBRARY
+int serveLibrary(std::ostream &responses) {
+  std::ifstream inputFile;
+  std::istream *requests = &std::cin;
+  if (serverInputName != "-") {
+    inputFile.open(serverInputName.c_str());
+    if (!inputFile) {
+      std::cout << "Tensile::FATAL: cannot open " << keyServer << " "
+        << serverInputName << std::endl;
+      return EXIT_FAILURE;
+    }
+    requests = &inputFile;
+  }
+
+  switch(dataTypeEnums[0]) {
+#ifdef Tensile_DATA_TYPE_FLOAT
+  case enum_float:
+    return serveLibraryProblems<float, float>(*requests, responses);
+#endif
+#ifdef Tensile_DATA_TYPE_DOUBLE
+  case enum_double:
+    return serveLibraryProblems<double, double>(*requests, responses);
+#endif
+#ifdef Tensile_DATA_TYPE_TENSILECOMPLEXFLOAT
+  case enum_TensileComplexFloat:
+    return serveLibraryProblems<TensileComplexFloat, TensileComplexFloat>(
+        *requests, responses);
+#endif
+#ifdef Tensile_DATA_TYPE_TENSILECOMPLEXDOUBLE
+  case enum_TensileComplexDouble:
+    return serveLibraryProblems<TensileComplexDouble, TensileComplexDouble>(
+        *requests, responses);
+#endif
+#ifdef Tensile_DATA_TYPE_TENSILEHALF
+  case enum_TensileHalf:
+    return serveLibraryProblems<TensileHalf, TensileHalf>(*requests,
+        responses);
+#endif
+  case enum_TensileInt8x4:
+    return serveLibraryProblems<TensileInt8x4, TensileInt32>(*requests,
+        responses);
+  default:
+    return EXIT_FAILURE;
+  }
+}
+#endif
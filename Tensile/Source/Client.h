@@ -26,13 +26,19 @@
 #include "ClientParameters.h"
 #include "DeviceStats.h"
 #include "TensorUtils.h"
+#include "BenchmarkConvergence.h"
 #include <iostream>
 #include <iomanip>
 #include <fstream>
 #include <cstring>
 #include <unistd.h>
 #include <set>
+#include <sstream>
+#include <cmath>
 #include <assert.h>
+#if Tensile_CLIENT_PREBUILT
+#include <dlfcn.h>
+#endif
 
 TensileTimer timer;
 TensileTimer apiTimer;
@@ -86,6 +92,15 @@ const std::string keyStrideC = "--stride_c";
 const std::string keySolutionStartIdx = "--solution-start-idx";
 const std::string keyNumSolutions = "--num-solutions";
 #endif
+#if Tensile_CLIENT_PREBUILT
+const std::string keySolutionsLibrary = "--solutions-library";
+const std::string keyClientData = "--client-data";
+#endif
+#if Tensile_BINARY_PROBLEM_SIZES
+const std::string keyProblemSizesFile = "--problem-sizes-file";
+std::string problemSizesFileName;
+TensileProblemSizesFile problemSizesFile;
+#endif
 
 // benchmark parameters default values
 const unsigned int defaultDeviceIdx = 0;
@@ -108,15 +123,32 @@ unsigned int strideB = std::numeric_limits<unsigned int>::max();
 unsigned int strideC = std::numeric_limits<unsigned int>::max();
 #if Tensile_CLIENT_BENCHMARK
 const unsigned int defaultSolutionStartIdx = 0;
+#if Tensile_CLIENT_PREBUILT
+unsigned int defaultNumSolutions = 0; // set once solutions are loaded
+#else
 const unsigned int defaultNumSolutions = maxNumSolutions;
 #endif
+#endif
 
 // benchmark parameters for library client
 #if Tensile_CLIENT_LIBRARY
 const std::string keyFunctionIdx = "--function-idx";
 const std::string keySizes = "--sizes";
+const std::string keyServer = "--server";
 const unsigned int defaultFunctionIdx = 0;
 const unsigned int defaultSize = 128;
+std::string serverInputName; // "-" for stdin; empty benchmarks --sizes once
+
+// result of the most recent callLibrary, reported by the server
+struct LibraryCallResult {
+  double gflops;
+  double timeMs;
+  double apiUs;
+  bool valid;
+  std::string solutionName;
+};
+LibraryCallResult lastLibraryCall;
+int serveLibrary(std::ostream &responses);
 #endif
 
 #if Tensile_CLIENT_BENCHMARK
@@ -676,6 +708,11 @@ bool callLibrary(
   std::cout << functionIdx << "/" << numFunctions;
   std::cout << std::endl;
 
+  lastLibraryCall.gflops = gflops;
+  lastLibraryCall.timeMs = timeNs * TensileTimer::reciprical_million;
+  lastLibraryCall.apiUs = apiTimeUs;
+  lastLibraryCall.valid = solutionIsValid && !numInvalids;
+  lastLibraryCall.solutionName = solutionName;
 
 #if 0
   if (numElementsToValidate) {
@@ -870,6 +907,7 @@ bool benchmarkAllSolutionsForSize(
 
   fastestGFlops = 0;
   *problem_gpu_time_ms = 0;
+  std::vector<double> solutionRelativeCI; // 95% CI half-width / mean
   for (unsigned int solutionIdx = solutionStartIdx; solutionIdx < solutionStartIdx + numSolutions; solutionIdx ++) {
     bool solutionIsValid = true;
 
@@ -952,112 +990,128 @@ bool benchmarkAllSolutionsForSize(
 
 
     // time solution
-    timer.start();
+    // each pass of the batch loop is one timing sample of
+    // numSyncsPerBenchmark*numEnqueuesPerSync enqueues; with benchmark
+    // convergence off exactly one batch is timed
+    TensileBenchmarkConvergence convergence(convergenceTargetRelativeCI,
+        convergenceMaxTimeMs, convergenceMinSamples, convergenceMaxSamples);
+    TensileTimer convergenceTimer;
+    convergenceTimer.start();
+    double timeNs = 0.0;
       // device stats
     unsigned long long avgCoreClock = 0;
     unsigned long long avgMemClock = 0;
     double avgTemp = 0;
     unsigned long long avgFanSpeed = 0;
-    for (unsigned int syncIdx = 0; syncIdx < numSyncsPerBenchmark; syncIdx++) {
-      unsigned long long syncCoreClock = 0;
-      unsigned long long syncMemClock = 0;
-      double syncTemp = 0;
-      unsigned long long syncFanSpeed = 0;
-      for (unsigned int enqIdx = 0; enqIdx < numEnqueuesPerSync; enqIdx++) {
+    do { // batch loop
+      timer.start();
+      for (unsigned int syncIdx = 0; syncIdx < numSyncsPerBenchmark; syncIdx++) {
+        unsigned long long syncCoreClock = 0;
+        unsigned long long syncMemClock = 0;
+        double syncTemp = 0;
+        unsigned long long syncFanSpeed = 0;
+        for (unsigned int enqIdx = 0; enqIdx < numEnqueuesPerSync; enqIdx++) {
 #if Tensile_RUNTIME_LANGUAGE_OCL
-        TensileStatus status = generatedCallToSolution( solutionIdx , sizes, minStrides, strideA, strideB, strideC, alpha, beta,
-            0, NULL, &l_outputEvent[syncIdx][enqIdx] );
+          TensileStatus status = generatedCallToSolution( solutionIdx , sizes, minStrides, strideA, strideB, strideC, alpha, beta,
+              0, NULL, &l_outputEvent[syncIdx][enqIdx] );
 #else
-        TensileStatus status = generatedCallToSolution( solutionIdx, sizes, minStrides, strideA, strideB, strideC, alpha, beta,
-            numEnqueuesPerSync, &l_eventStart[syncIdx][enqIdx],
-            &l_eventStop[syncIdx][enqIdx] );
+          TensileStatus status = generatedCallToSolution( solutionIdx, sizes, minStrides, strideA, strideB, strideC, alpha, beta,
+              numEnqueuesPerSync, &l_eventStart[syncIdx][enqIdx],
+              &l_eventStop[syncIdx][enqIdx] );
 #endif
-        if (status != tensileStatusSuccess) {
-          solutionIsValid = false;
-        }
+          if (status != tensileStatusSuccess) {
+            solutionIsValid = false;
+          }
 
-      }
-      // sync
+        }
+        // sync
 #if Tensile_RUNTIME_LANGUAGE_OCL
-      status = clFinish(stream);
+        status = clFinish(stream);
 #else
-      unsigned int numDeviceStatsQueries = 0;
-      do { // device stats
-        int currentCoreClock = tensileGetDeviceCoreClock(0);
-        int currentMemClock = tensileGetDeviceMemClock(0);
-        float currentTemp = tensileGetDeviceTemp(0);
-        int currentFanSpeed = tensileGetDeviceFanSpeed(0);
-        //std::cout << "clock: " << currentCoreClock << " Mhz" << std::endl;
-        syncCoreClock += currentCoreClock;
-        syncMemClock += currentMemClock;
-        syncTemp += currentTemp;
-        syncFanSpeed += currentFanSpeed;
-        numDeviceStatsQueries++;
-      } while (hipEventQuery(l_eventStop[syncIdx][numEnqueuesPerSync-1]) != hipSuccess);
-      syncCoreClock /= numDeviceStatsQueries;
-      syncMemClock /= numDeviceStatsQueries;
-      syncTemp /= numDeviceStatsQueries;
-      syncFanSpeed /= numDeviceStatsQueries;
-
-      avgCoreClock += syncCoreClock;
-      avgMemClock += syncMemClock;
-      avgTemp += syncTemp;
-      avgFanSpeed += syncFanSpeed;
+        unsigned int numDeviceStatsQueries = 0;
+        do { // device stats
+          int currentCoreClock = tensileGetDeviceCoreClock(0);
+          int currentMemClock = tensileGetDeviceMemClock(0);
+          float currentTemp = tensileGetDeviceTemp(0);
+          int currentFanSpeed = tensileGetDeviceFanSpeed(0);
+          //std::cout << "clock: " << currentCoreClock << " Mhz" << std::endl;
+          syncCoreClock += currentCoreClock;
+          syncMemClock += currentMemClock;
+          syncTemp += currentTemp;
+          syncFanSpeed += currentFanSpeed;
+          numDeviceStatsQueries++;
+        } while (hipEventQuery(l_eventStop[syncIdx][numEnqueuesPerSync-1]) != hipSuccess);
+        syncCoreClock /= numDeviceStatsQueries;
+        syncMemClock /= numDeviceStatsQueries;
+        syncTemp /= numDeviceStatsQueries;
+        syncFanSpeed /= numDeviceStatsQueries;
+
+        avgCoreClock += syncCoreClock;
+        avgMemClock += syncMemClock;
+        avgTemp += syncTemp;
+        avgFanSpeed += syncFanSpeed;
 #endif
-      tensileStatusCheck(status);
-    } // sync loop
+        tensileStatusCheck(status);
+      } // sync loop
 
-    double timeNs = 0.0;
+      double batchTimeNs = 0.0;
 #if Tensile_RUNTIME_LANGUAGE_OCL
-    if (useGPUTimer) {
-      // Loop through the multi-dimensional event array and collect kernel performance data
-      // Release events when done with them
-      cl_ulong kernel_time_sum = 0;
-      for (auto& event_array : l_outputEvent) {
-        for (auto event : event_array) {
-          // getEventDeltaTime returns unsigned long in nano-seconds on opencl
-          kernel_time_sum += getEventDeltaTime(event);
+      if (useGPUTimer) {
+        // Loop through the multi-dimensional event array and collect kernel performance data
+        // Release events when done with them
+        cl_ulong kernel_time_sum = 0;
+        for (auto& event_array : l_outputEvent) {
+          for (auto event : event_array) {
+            // getEventDeltaTime returns unsigned long in nano-seconds on opencl
+            kernel_time_sum += getEventDeltaTime(event);
+            ::clReleaseEvent(event);
+          }
         }
+        batchTimeNs = static_cast<double>(kernel_time_sum);
+      } else {
+        batchTimeNs = timer.elapsed_ns();
       }
-      timeNs = static_cast<double>(kernel_time_sum);
-    } else {
-      timeNs = timer.elapsed_ns();
-    }
 #else
-    if (useGPUTimer) {
-      // Loop through the event array and collect kernel performance data
-      // Release events when done with them
-      float kernel_time_sum = 0;
-      for (unsigned int syncIdx = 0; syncIdx < numSyncsPerBenchmark; syncIdx++){
-        for (unsigned int enqIdx = 0; enqIdx < numEnqueuesPerSync; enqIdx++) {
-          // getEventDeltaTime returns unsigned long in milli-seconds on hip
-          float kernel_time = getEventDeltaTime(l_eventStart[syncIdx][enqIdx],
-              l_eventStop[syncIdx][enqIdx] );
-          //std::cout << "kernelTime: " << kernel_time << std::endl;
-          kernel_time_sum += kernel_time;
+      if (useGPUTimer) {
+        // Loop through the event array and collect kernel performance data
+        // Release events when done with them
+        float kernel_time_sum = 0;
+        for (unsigned int syncIdx = 0; syncIdx < numSyncsPerBenchmark; syncIdx++){
+          for (unsigned int enqIdx = 0; enqIdx < numEnqueuesPerSync; enqIdx++) {
+            // getEventDeltaTime returns unsigned long in milli-seconds on hip
+            float kernel_time = getEventDeltaTime(l_eventStart[syncIdx][enqIdx],
+                l_eventStop[syncIdx][enqIdx] );
+            //std::cout << "kernelTime: " << kernel_time << std::endl;
+            kernel_time_sum += kernel_time;
+          }
         }
+        batchTimeNs = static_cast<double>(kernel_time_sum)
+          * TensileTimer::million;  // convert to nano-seconds
+      } else {
+        batchTimeNs = timer.elapsed_ns();
       }
-      timeNs = static_cast<double>(kernel_time_sum)
-        * TensileTimer::million;  // convert to nano-seconds
-    } else {
-      timeNs = timer.elapsed_ns();
-    }
 
 #endif
-    if (sleepPercent) {
-      unsigned int sleepMicroSeconds = (timeNs*10*sleepPercent)/1e6;
-      usleep(sleepMicroSeconds);
-    }
+      if (sleepPercent) {
+        unsigned int sleepMicroSeconds = (batchTimeNs*10*sleepPercent)/1e6;
+        usleep(sleepMicroSeconds);
+      }
+
+      *problem_gpu_time_ms += batchTimeNs/1e6;
+      //printf ("problem: %6.2f ms+ %6.2fns\n", *problem_gpu_time_ms, batchTimeNs);
 
-    *problem_gpu_time_ms += timeNs/1e6;
-    //printf ("problem: %6.2f ms+ %6.2fns\n", *problem_gpu_time_ms, timeNs);
+      timeNs += batchTimeNs;
+      convergence.addSample(batchTimeNs / (numSyncsPerBenchmark * numEnqueuesPerSync));
+    } while (benchmarkConvergence && solutionIsValid
+        && !convergence.done(convergenceTimer.elapsed_ms())); // batch loop
 
-    timeNs /= (numSyncsPerBenchmark * numEnqueuesPerSync);
+    unsigned int numBatches = convergence.numSamples();
+    timeNs /= (numBatches * numSyncsPerBenchmark * numEnqueuesPerSync);
     // device status
-    avgCoreClock /= numSyncsPerBenchmark;
-    avgMemClock /= numSyncsPerBenchmark;
-    avgTemp /= numSyncsPerBenchmark;
-    avgFanSpeed /= numSyncsPerBenchmark;
+    avgCoreClock /= (numBatches * numSyncsPerBenchmark);
+    avgMemClock /= (numBatches * numSyncsPerBenchmark);
+    avgTemp /= (numBatches * numSyncsPerBenchmark);
+    avgFanSpeed /= (numBatches * numSyncsPerBenchmark);
 
     float perfScaling = 1.f;
 #if Tensile_RUNTIME_LANGUAGE_HIP
@@ -1113,24 +1167,27 @@ bool benchmarkAllSolutionsForSize(
     }
     file << ", " << gflops;
     solutionPerf[problemIdx][solutionIdx ] = static_cast<float>(gflops);
+    solutionRelativeCI.push_back(convergence.relativeConfidenceInterval());
   } // solution loop
 
-  if (useGPUTimer) {
-#if Tensile_RUNTIME_LANGUAGE_OCL
-    for (auto& event_array : l_outputEvent) {
-      for (auto event : event_array) {
-        ::clReleaseEvent(event);
-      }
+  // achieved confidence intervals follow the gflops columns
+  if (benchmarkConvergence) {
+    for (unsigned int i = 0; i < solutionRelativeCI.size(); i++) {
+      file << ", " << solutionRelativeCI[i];
     }
-#else
+  }
+
+#if Tensile_RUNTIME_LANGUAGE_HIP
+  // opencl events are released after each timing batch
+  if (useGPUTimer) {
     for (unsigned int syncIdx = 0; syncIdx < numSyncsPerBenchmark; syncIdx++){
       for (unsigned int enqIdx = 0; enqIdx < numEnqueuesPerSync; enqIdx++) {
         ::hipEventDestroy( l_eventStart[syncIdx][enqIdx] );
         ::hipEventDestroy( l_eventStop[syncIdx][enqIdx] );
       }
     }
-#endif
   }
+#endif
   file << std::endl;
 
   return returnInvalids;
@@ -1168,6 +1225,11 @@ bool benchmarkProblemSizes(
   for ( unsigned int s = 0; s < numSolutions; s++) {
     file << ", " << solutions[s].name;
   }
+  if (benchmarkConvergence) {
+    for ( unsigned int s = 0; s < numSolutions; s++) {
+      file << ", RelativeCI_" << solutions[s].name;
+    }
+  }
   file << std::endl;
 
 #if Tensile_RUNTIME_LANGUAGE_OCL
@@ -1397,6 +1459,140 @@ void destroyData(
 }
 
 
+/*******************************************************************************
+ * max tensor sizes of a library problem
+ ******************************************************************************/
+#if Tensile_CLIENT_LIBRARY
+void libraryMaxSizes(const unsigned int *sizes, size_t *sizeC, size_t *sizeA,
+    size_t *sizeB) {
+  *sizeC = 1;
+  for (unsigned int i = 0; i < numIndicesC[problemTypeIdx]; i++) {
+    *sizeC *= sizes[i];
+  }
+  *sizeA = 1;
+  *sizeB = 1;
+  for (unsigned int i = 0; i < numIndicesAB[problemTypeIdx]; i++) {
+    *sizeA *= sizes[indexAssignmentsA[problemTypeIdx][i]];
+    *sizeB *= sizes[indexAssignmentsB[problemTypeIdx][i]];
+  }
+}
+
+
+/*******************************************************************************
+ * Serve Library Problems
+ * long-lived library client: reads "sizes s0 s1 ..." lines, benchmarks each
+ * problem numBenchmarks times and answers with one json line per problem;
+ * the device, stream and loaded code objects stay up between problems and
+ * data is only reallocated when a problem outgrows the current buffers
+ * - blank lines and lines starting with # are ignored, quit stops serving
+ ******************************************************************************/
+// json has no inf or nan, which a zero time or failed call produces
+inline void writeJsonNumber(std::ostream &responses, double value) {
+  if (std::isfinite(value)) {
+    responses << value;
+  } else {
+    responses << "null";
+  }
+}
+
+template<typename DataType, typename DestDataType>
+int serveLibraryProblems(std::istream &requests, std::ostream &responses) {
+  DestDataType *initialC = NULL;
+  DataType *initialA = NULL;
+  DataType *initialB = NULL;
+  DestDataType alpha;
+  DestDataType beta;
+  DestDataType *referenceC = NULL;
+  DestDataType *deviceOnHostC = NULL;
+  bool allocated = false;
+  unsigned int lineIdx = 0;
+  unsigned int problemIdx = 0;
+
+  std::string line;
+  while (std::getline(requests, line)) {
+    lineIdx++;
+    std::istringstream tokens(line);
+    std::string command;
+    if (!(tokens >> command) || command[0] == '#') {
+      continue;
+    }
+    if (command == "quit") {
+      break;
+    }
+    bool parsed = command == "sizes";
+    for (unsigned int i = 0; parsed && i < totalIndices[problemTypeIdx]; i++) {
+      parsed = static_cast<bool>(tokens >> userSizes[i]);
+    }
+    std::string extra;
+    if (!parsed || tokens >> extra) {
+      responses << "{\"error\": \"expected " << keySizes.substr(2) << " and "
+        << totalIndices[problemTypeIdx] << " sizes\", \"line\": " << lineIdx
+        << "}" << std::endl;
+      continue;
+    }
+
+    // grow buffers to fit this problem
+    size_t sizeC, sizeA, sizeB;
+    libraryMaxSizes(userSizes, &sizeC, &sizeA, &sizeB);
+    if (!allocated || sizeC > maxSizeC || sizeA > maxSizeA
+        || sizeB > maxSizeB) {
+      if (allocated) {
+        destroyData(initialC, initialA, initialB, referenceC, deviceOnHostC);
+      }
+      maxSizeC = allocated ? std::max(sizeC, maxSizeC) : sizeC;
+      maxSizeA = allocated ? std::max(sizeA, maxSizeA) : sizeA;
+      maxSizeB = allocated ? std::max(sizeB, maxSizeB) : sizeB;
+      initData(&initialC, &initialA, &initialB, &alpha, &beta, &referenceC,
+          &deviceOnHostC);
+      allocated = true;
+    }
+
+    fastestGFlops = 0;
+    std::vector<LibraryCallResult> calls;
+    for (unsigned int benchmarkIdx = 0; benchmarkIdx < numBenchmarks;
+        benchmarkIdx++) {
+      callLibrary(initialC, initialA, initialB, alpha, beta, strideA, strideB,
+          strideC, referenceC, deviceOnHostC);
+      calls.push_back(lastLibraryCall);
+    }
+
+    bool valid = true;
+    for (unsigned int i = 0; i < calls.size(); i++) {
+      valid = valid && calls[i].valid;
+    }
+    responses << "{\"problem\": " << problemIdx << ", \"sizes\": [";
+    for (unsigned int i = 0; i < totalIndices[problemTypeIdx]; i++) {
+      responses << (i ? ", " : "") << userSizes[i];
+    }
+    responses << "], \"solution\": \""
+      << (calls.empty() ? "" : calls[0].solutionName) << "\", \"valid\": "
+      << (valid ? "true" : "false") << ", \"gflops\": [";
+    for (unsigned int i = 0; i < calls.size(); i++) {
+      responses << (i ? ", " : "");
+      writeJsonNumber(responses, calls[i].gflops);
+    }
+    responses << "], \"ms\": [";
+    for (unsigned int i = 0; i < calls.size(); i++) {
+      responses << (i ? ", " : "");
+      writeJsonNumber(responses, calls[i].timeMs);
+    }
+    responses << "], \"apiUs\": [";
+    for (unsigned int i = 0; i < calls.size(); i++) {
+      responses << (i ? ", " : "");
+      writeJsonNumber(responses, calls[i].apiUs);
+    }
+    responses << "]}" << std::endl;
+    problemIdx++;
+  }
+
+  if (allocated) {
+    destroyData(initialC, initialA, initialB, referenceC, deviceOnHostC);
+  }
+  return EXIT_SUCCESS;
+}
+#endif
+
+
 void printClientUsage(std::string executableName) {
   std::cout << "Usage: " << executableName << std::endl;
   std::cout << "  " << keyDeviceIdx << " [" << defaultDeviceIdx << "]" << std::endl;  
@@ -1422,6 +1618,7 @@ void printClientUsage(std::string executableName) {
 #if Tensile_CLIENT_LIBRARY
   std::cout << "  " << keyFunctionIdx << " [" << defaultFunctionIdx << "]" << std::endl;  
   std::cout << "  " << keySizes << " [" << defaultSize << " " << defaultSize << " " << defaultSize << "]" << std::endl;  
+  std::cout << "  " << keyServer << " [problems file or - for stdin]" << std::endl;
   std::cout << "FunctionIdx:" << std::endl;
   for (unsigned int i = 0; i < numFunctions; i++) {
     std::cout << "  (" << i << ") " << functionNames[i] << std::endl;
@@ -1429,8 +1626,137 @@ void printClientUsage(std::string executableName) {
 #else
   std::cout << "  " << keySolutionStartIdx << " [" << defaultSolutionStartIdx << "]" << std::endl;  
   std::cout << "  " << keyNumSolutions << " [" << defaultNumSolutions << "]" << std::endl;  
+#if Tensile_CLIENT_PREBUILT
+  std::cout << "  " << keySolutionsLibrary << " [required]" << std::endl;  
+  std::cout << "  " << keyClientData << " [required]" << std::endl;  
+#endif
+#if Tensile_BINARY_PROBLEM_SIZES
+  std::cout << "  " << keyProblemSizesFile << " [" << problemSizesFileName << "]" << std::endl;  
+#endif
+#endif
+}
+
+
+#if Tensile_CLIENT_PREBUILT
+/*******************************************************************************
+ * Load Client Data
+ * - solution function pointers from the benchmark step's solutions library
+ * - problem sizes, solution names and results file from its client data file
+ ******************************************************************************/
+void *solutionsLibrary = NULL;
+std::vector<ClientSolutionInfo> loadedSolutions;
+std::vector<std::string> loadedSolutionNames;
+std::string loadedResultsFileName;
+
+void loadClientData( const std::string &libraryPath,
+    const std::string &dataPath ) {
+  solutionsLibrary = dlopen(libraryPath.c_str(), RTLD_NOW | RTLD_LOCAL);
+  if (!solutionsLibrary) {
+    std::cout << "Tensile::FATAL: cannot load " << libraryPath << ": "
+      << dlerror() << std::endl;
+    throw -1;
+  }
+  const unsigned int *libraryNumSolutions = static_cast<const unsigned int *>(
+      dlsym(solutionsLibrary, "tensileClientNumSolutions"));
+  const SolutionFunctionPointer *libraryFunctions
+    = static_cast<const SolutionFunctionPointer *>(
+      dlsym(solutionsLibrary, "tensileClientSolutionFunctions"));
+  if (!libraryNumSolutions || !libraryFunctions) {
+    std::cout << "Tensile::FATAL: " << libraryPath
+      << " is not a Tensile client solutions library" << std::endl;
+    throw -1;
+  }
+
+  std::ifstream dataFile(dataPath.c_str());
+  if (!dataFile) {
+    std::cout << "Tensile::FATAL: cannot open " << dataPath << std::endl;
+    throw -1;
+  }
+  std::string line;
+  while (std::getline(dataFile, line)) {
+    std::istringstream lineStream(line);
+    std::string key;
+    if (!(lineStream >> key) || key[0] == '#') {
+      continue;
+    }
+    if (key == "ResultsFile") {
+      std::getline(lineStream >> std::ws, loadedResultsFileName);
+    } else if (key == "ProblemSizesFile") {
+      std::getline(lineStream >> std::ws, problemSizesFileName);
+    } else if (key == "Solutions") {
+      lineStream >> maxNumSolutions;
+      if (maxNumSolutions != *libraryNumSolutions) {
+        std::cout << "Tensile::FATAL: " << dataPath << " lists "
+          << maxNumSolutions << " solutions but " << libraryPath << " has "
+          << *libraryNumSolutions << std::endl;
+        throw -1;
+      }
+      loadedSolutionNames.resize(maxNumSolutions);
+      loadedSolutions.resize(maxNumSolutions);
+      for (unsigned int i = 0; i < maxNumSolutions; i++) {
+        dataFile >> loadedSolutionNames[i]
+          >> loadedSolutions[i].assertSummationElementMultiple
+          >> loadedSolutions[i].assertFree0ElementMultiple
+          >> loadedSolutions[i].assertFree1ElementMultiple;
+        loadedSolutions[i].functionPtr = libraryFunctions[i];
+      }
+    }
+    if (!dataFile) {
+      std::cout << "Tensile::FATAL: cannot parse " << dataPath << std::endl;
+      throw -1;
+    }
+  }
+
+  if (!maxNumSolutions || problemSizesFileName.empty()
+      || loadedResultsFileName.empty()) {
+    std::cout << "Tensile::FATAL: " << dataPath
+      << " is missing solutions, problem sizes or results file" << std::endl;
+    throw -1;
+  }
+  // names are not resized after this point so c_str() stays valid
+  for (unsigned int i = 0; i < maxNumSolutions; i++) {
+    loadedSolutions[i].name = loadedSolutionNames[i].c_str();
+  }
+  solutions = loadedSolutions.data();
+  resultsFileName = loadedResultsFileName.c_str();
+}
 #endif
+
+
+#if Tensile_BINARY_PROBLEM_SIZES
+/*******************************************************************************
+ * Load Problem Sizes
+ * - maps the binary problem sizes file; problemSizes points into the mapping
+ ******************************************************************************/
+void loadProblemSizes( const std::string &path ) {
+  if (!problemSizesFile.open(path)) {
+    std::cout << "Tensile::FATAL: " << problemSizesFile.error() << std::endl;
+    throw -1;
+  }
+  if (problemSizesFile.numIndices() != maxNumIndices) {
+    std::cout << "Tensile::FATAL: " << path << " has "
+      << problemSizesFile.numIndices() << " indices per problem but client expects "
+      << maxNumIndices << std::endl;
+    throw -1;
+  }
+  if (problemSizesFile.numProblems() == 0
+      || problemSizesFile.numProblems() > std::numeric_limits<unsigned int>::max()) {
+    std::cout << "Tensile::FATAL: " << path << " has "
+      << problemSizesFile.numProblems() << " problems" << std::endl;
+    throw -1;
+  }
+  numProblems = static_cast<unsigned int>(problemSizesFile.numProblems());
+  problemSizes = reinterpret_cast<decltype(problemSizes)>(
+      problemSizesFile.sizes());
+  for (unsigned int i = 0; i < maxNumIndices; i++) {
+    minStrides[i] = problemSizesFile.minStrides()[i];
+  }
+  maxSizeC = problemSizesFile.maxSizeC();
+  maxSizeA = problemSizesFile.maxSizeA();
+  maxSizeB = problemSizesFile.maxSizeB();
+  solutionPerf.assign(numProblems, std::vector<float>(maxNumSolutions));
 }
+#endif
 
 
 /*******************************************************************************
@@ -1467,8 +1793,12 @@ void parseCommandLineParameters( int argc, char *argv[] ) {
   solutionStartIdx = defaultSolutionStartIdx;
   numSolutions = defaultNumSolutions;
 #endif
+#if Tensile_BINARY_PROBLEM_SIZES && !Tensile_CLIENT_PREBUILT
+  problemSizesFileName = defaultProblemSizesFileName;
+#endif
 
   try {
+
     // check for help
     for (unsigned int argIdx = 1; argIdx < argc; argIdx++) {
       if (keyHelp1 == argv[argIdx] || keyHelp2 == argv[argIdx]) {
@@ -1476,6 +1806,26 @@ void parseCommandLineParameters( int argc, char *argv[] ) {
           exit(0);
       }
     }
+#if Tensile_CLIENT_PREBUILT
+    // first, load solutions and problem sizes
+    std::string solutionsLibraryPath;
+    std::string clientDataPath;
+    for (unsigned int argIdx = 1; argIdx+1 < argc; argIdx++) {
+      if (keySolutionsLibrary == argv[argIdx]) {
+        solutionsLibraryPath = argv[argIdx+1];
+      } else if (keyClientData == argv[argIdx]) {
+        clientDataPath = argv[argIdx+1];
+      }
+    }
+    if (solutionsLibraryPath.empty() || clientDataPath.empty()) {
+      std::cout << "Tensile::FATAL: prebuilt client requires "
+        << keySolutionsLibrary << " and " << keyClientData << std::endl;
+      throw -1;
+    }
+    loadClientData(solutionsLibraryPath, clientDataPath);
+    defaultNumSolutions = maxNumSolutions;
+    numSolutions = defaultNumSolutions;
+#endif
 #if Tensile_CLIENT_LIBRARY
     // first, get functionIdx
     functionIdx = defaultFunctionIdx;
@@ -1599,8 +1949,28 @@ void parseCommandLineParameters( int argc, char *argv[] ) {
           argIdx++;
         }
         argIdx--; // b/c incremented at end of loop
+
+      // serve problems from a file or stdin
+      } else if (keyServer == argv[argIdx]) {
+        argIdx++;
+        serverInputName = argv[argIdx];
       }
 #else
+#if Tensile_CLIENT_PREBUILT
+      // solutions library and client data
+      else if (keySolutionsLibrary == argv[argIdx]
+          || keyClientData == argv[argIdx]) {
+        argIdx++;
+        // handled above
+      }
+#endif
+#if Tensile_BINARY_PROBLEM_SIZES
+      // problem sizes file
+      else if (keyProblemSizesFile == argv[argIdx]) {
+        argIdx++;
+        problemSizesFileName = argv[argIdx];
+      }
+#endif
       // solution start idx
       else if (keySolutionStartIdx == argv[argIdx]) {
         argIdx++;
@@ -1627,6 +1997,9 @@ void parseCommandLineParameters( int argc, char *argv[] ) {
        exit(0);
       }
     } // loop
+#if Tensile_BINARY_PROBLEM_SIZES
+    loadProblemSizes(problemSizesFileName);
+#endif
 #if Tensile_CLIENT_BENCHMARK
     if (solutionStartIdx + numSolutions > maxNumSolutions) {
       std::cout << "Tensile::FATAL: " << keySolutionStartIdx << " " << solutionStartIdx << " + " << keyNumSolutions << " " << numSolutions << " must be less than maxNumSolutions " << maxNumSolutions  << std::endl;
@@ -1640,16 +2013,7 @@ void parseCommandLineParameters( int argc, char *argv[] ) {
 
 #if Tensile_CLIENT_LIBRARY
   // max tensor sizes
-  maxSizeC = 1;
-  for (unsigned int i = 0; i < numIndicesC[problemTypeIdx]; i++) {
-    maxSizeC *= userSizes[i];
-  }
-  maxSizeA = 1;
-  maxSizeB = 1;
-  for (unsigned int i = 0; i < numIndicesAB[problemTypeIdx]; i++) {
-    maxSizeA *= userSizes[indexAssignmentsA[problemTypeIdx][i]];
-    maxSizeB *= userSizes[indexAssignmentsB[problemTypeIdx][i]];
-  }
+  libraryMaxSizes(userSizes, &maxSizeC, &maxSizeA, &maxSizeB);
 #endif
 
 }
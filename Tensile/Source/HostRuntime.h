@@ -0,0 +1,294 @@
+/*******************************************************************************
+* Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+*
+* Permission is hereby granted, free of charge, to any person obtaining a copy
+* of this software and associated documentation files (the "Software"), to deal
+* in the Software without restriction, including without limitation the rights
+* to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+* ies of the Software, and to permit persons to whom the Software is furnished
+* to do so, subject to the following conditions:
+*
+* The above copyright notice and this permission notice shall be included in all
+* copies or substantial portions of the Software.
+*
+* THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+* PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+* FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+* COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+* IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+* CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+*******************************************************************************/
+
+
+#ifndef HOST_RUNTIME_H
+#define HOST_RUNTIME_H
+
+/*******************************************************************************
+ * Host Runtime
+ * - the subset of HIP that Tensile's source kernels and solutions use,
+ *   implemented on the CPU, so generated kernels build with a plain C++
+ *   compiler (-DTensile_RUNTIME_LANGUAGE_HOST=1) and validate without a GPU
+ * - each work-item of a work-group is a fiber (ucontext) with its own stack;
+ *   __syncthreads() switches back to the work-group scheduler, which runs
+ *   every work-item up to its next barrier before releasing any of them
+ * - a work-group runs on one OS thread and __shared__ memory is per OS
+ *   thread, so work-groups are spread over threads like on a GPU; the
+ *   TENSILE_HOST_THREADS environment variable caps the threads (0 = one per
+ *   hardware thread)
+ * - launches are synchronous; streams and events are placeholders
+ * - float2/double2 are plain structs without the HIP vector operators, so
+ *   only float and double kernels are validated on the host
+ ******************************************************************************/
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <functional>
+#include <memory>
+#include <thread>
+#include <vector>
+#include <ucontext.h>
+
+#ifndef TENSILE_HOST_STACK_BYTES
+#define TENSILE_HOST_STACK_BYTES (64*1024)
+#endif
+
+/*******************************************************************************
+ * Qualifiers and Types
+ ******************************************************************************/
+#define __global__
+#define __device__
+#define __host__
+#define __shared__ static thread_local
+#define HIP_KERNEL_NAME(...) __VA_ARGS__
+
+enum hipError_t {
+  hipSuccess = 0,
+  hipErrorUnknown = 999
+};
+typedef int hipDevice_t;
+typedef struct TensileHostFunction *hipFunction_t;
+typedef struct TensileHostStream *hipStream_t;
+typedef struct TensileHostEvent *hipEvent_t;
+
+struct dim3 {
+  unsigned int x, y, z;
+  dim3(unsigned int x = 1, unsigned int y = 1, unsigned int z = 1)
+    : x(x), y(y), z(z) {}
+};
+
+struct float2 { float x, y; };
+struct double2 { double x, y; };
+
+struct hipDeviceProp_t {
+  int multiProcessorCount;
+  int gcnArch;
+};
+
+using std::min;
+using std::max;
+
+/*******************************************************************************
+ * Work-Group State
+ * one per OS thread: the work-group it is running and its work-item fibers
+ ******************************************************************************/
+struct TensileHostWorkGroup {
+  unsigned int groupId[3];
+  unsigned int numGroups[3];
+  unsigned int groupSize[3];
+  unsigned int numWorkItems;
+  unsigned int current; // work-item running
+  std::vector<ucontext_t> contexts;
+  std::vector<char> done;
+  std::unique_ptr<char[]> stacks;
+  unsigned int numStacks;
+  ucontext_t scheduler;
+  const std::function<void()> *body;
+
+  TensileHostWorkGroup() : numWorkItems(0), current(0), numStacks(0),
+      body(nullptr) {}
+};
+
+inline TensileHostWorkGroup &tensileHostWorkGroup() {
+  static thread_local TensileHostWorkGroup workGroup;
+  return workGroup;
+}
+
+/*******************************************************************************
+ * Work-Item Functions
+ ******************************************************************************/
+inline unsigned int hc_get_workitem_id(unsigned int dim) {
+  const TensileHostWorkGroup &wg = tensileHostWorkGroup();
+  unsigned int id = wg.current;
+  for (unsigned int d = 0; d < dim; d++) {
+    id /= wg.groupSize[d];
+  }
+  return id % wg.groupSize[dim];
+}
+
+inline unsigned int hc_get_group_id(unsigned int dim) {
+  return tensileHostWorkGroup().groupId[dim];
+}
+
+inline unsigned int hc_get_num_groups(unsigned int dim) {
+  return tensileHostWorkGroup().numGroups[dim];
+}
+
+inline unsigned int hc_get_group_size(unsigned int dim) {
+  return tensileHostWorkGroup().groupSize[dim];
+}
+
+inline unsigned int hc_get_workitem_absolute_id(unsigned int dim) {
+  return hc_get_group_id(dim)*hc_get_group_size(dim)
+      + hc_get_workitem_id(dim);
+}
+
+#define hipThreadIdx_x hc_get_workitem_id(0)
+#define hipThreadIdx_y hc_get_workitem_id(1)
+#define hipThreadIdx_z hc_get_workitem_id(2)
+#define hipBlockIdx_x hc_get_group_id(0)
+#define hipBlockIdx_y hc_get_group_id(1)
+#define hipBlockIdx_z hc_get_group_id(2)
+#define hipBlockDim_x hc_get_group_size(0)
+#define hipBlockDim_y hc_get_group_size(1)
+#define hipBlockDim_z hc_get_group_size(2)
+#define hipGridDim_x hc_get_num_groups(0)
+#define hipGridDim_y hc_get_num_groups(1)
+#define hipGridDim_z hc_get_num_groups(2)
+
+// barrier: hand control back to the scheduler until every work-item arrives
+inline void __syncthreads() {
+  TensileHostWorkGroup &wg = tensileHostWorkGroup();
+  swapcontext(&wg.contexts[wg.current], &wg.scheduler);
+}
+
+inline void tensileHostWorkItem() {
+  TensileHostWorkGroup &wg = tensileHostWorkGroup();
+  (*wg.body)();
+  wg.done[wg.current] = 1;
+  // returns to the scheduler through uc_link
+}
+
+/*******************************************************************************
+ * Run Work-Group
+ * round robin: each pass takes every unfinished work-item from one barrier
+ * to the next, so no work-item passes a barrier another has not reached
+ ******************************************************************************/
+inline void tensileHostRunWorkGroup(TensileHostWorkGroup &wg) {
+  for (unsigned int i = 0; i < wg.numWorkItems; i++) {
+    ucontext_t &context = wg.contexts[i];
+    getcontext(&context);
+    context.uc_stack.ss_sp = wg.stacks.get() + i*TENSILE_HOST_STACK_BYTES;
+    context.uc_stack.ss_size = TENSILE_HOST_STACK_BYTES;
+    context.uc_link = &wg.scheduler;
+    makecontext(&context, tensileHostWorkItem, 0);
+    wg.done[i] = 0;
+  }
+  unsigned int numRunning = wg.numWorkItems;
+  while (numRunning) {
+    for (unsigned int i = 0; i < wg.numWorkItems; i++) {
+      if (wg.done[i]) {
+        continue;
+      }
+      wg.current = i;
+      swapcontext(&wg.scheduler, &wg.contexts[i]);
+      if (wg.done[i]) {
+        numRunning--;
+      }
+    }
+  }
+}
+
+/*******************************************************************************
+ * Launch Kernel
+ ******************************************************************************/
+inline unsigned int tensileHostNumThreads() {
+  const char *threads = std::getenv("TENSILE_HOST_THREADS");
+  unsigned int numThreads = threads ? std::atoi(threads) : 0;
+  if (numThreads == 0) {
+    numThreads = std::max(1u, std::thread::hardware_concurrency());
+  }
+  return numThreads;
+}
+
+template<typename... Params, typename... Args>
+void tensileHostLaunchKernel(void (*kernel)(Params...), dim3 numGroups,
+    dim3 groupSize, Args... args) {
+  size_t totalGroups = static_cast<size_t>(numGroups.x)*numGroups.y
+      *numGroups.z;
+  unsigned int numWorkItems = groupSize.x*groupSize.y*groupSize.z;
+  if (totalGroups == 0 || numWorkItems == 0) {
+    return;
+  }
+  const std::function<void()> body = [=]() { kernel(args...); };
+  std::atomic<size_t> nextGroup(0);
+  auto worker = [&]() {
+    TensileHostWorkGroup &wg = tensileHostWorkGroup();
+    wg.numGroups[0] = numGroups.x;
+    wg.numGroups[1] = numGroups.y;
+    wg.numGroups[2] = numGroups.z;
+    wg.groupSize[0] = groupSize.x;
+    wg.groupSize[1] = groupSize.y;
+    wg.groupSize[2] = groupSize.z;
+    wg.numWorkItems = numWorkItems;
+    wg.body = &body;
+    if (wg.numStacks < numWorkItems) {
+      // not zeroed: pages are only committed as far as a stack grows
+      wg.stacks.reset(new char[static_cast<size_t>(numWorkItems)
+          *TENSILE_HOST_STACK_BYTES]);
+      wg.numStacks = numWorkItems;
+    }
+    wg.contexts.resize(numWorkItems);
+    wg.done.resize(numWorkItems);
+    for (size_t group = nextGroup++; group < totalGroups;
+        group = nextGroup++) {
+      wg.groupId[0] = group % numGroups.x;
+      wg.groupId[1] = (group / numGroups.x) % numGroups.y;
+      wg.groupId[2] = group / (static_cast<size_t>(numGroups.x)*numGroups.y);
+      tensileHostRunWorkGroup(wg);
+    }
+    wg.body = nullptr;
+  };
+  unsigned int numThreads = static_cast<unsigned int>(std::min(
+      static_cast<size_t>(tensileHostNumThreads()), totalGroups));
+  if (numThreads <= 1) {
+    worker();
+    return;
+  }
+  std::vector<std::thread> threads;
+  for (unsigned int t = 0; t < numThreads; t++) {
+    threads.push_back(std::thread(worker));
+  }
+  for (unsigned int t = 0; t < numThreads; t++) {
+    threads[t].join();
+  }
+}
+
+#define hipLaunchKernelGGL(kernelName, numGroups, groupSize, groupMemBytes, \
+    stream, ...) tensileHostLaunchKernel(kernelName, numGroups, groupSize, \
+    __VA_ARGS__)
+
+/*******************************************************************************
+ * Device and Events
+ ******************************************************************************/
+inline hipError_t hipGetDevice(int *deviceId) {
+  *deviceId = 0;
+  return hipSuccess;
+}
+
+inline hipError_t hipGetDeviceProperties(hipDeviceProp_t *properties,
+    int /*deviceId*/) {
+  properties->multiProcessorCount = static_cast<int>(tensileHostNumThreads());
+  properties->gcnArch = 0;
+  return hipSuccess;
+}
+
+// launches finish before returning, so there is nothing to time or wait for
+inline hipError_t hipEventRecord(hipEvent_t /*event*/,
+    hipStream_t /*stream*/) {
+  return hipSuccess;
+}
+
+#endif
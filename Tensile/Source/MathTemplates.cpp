@@ -23,6 +23,7 @@
 #include "MathTemplates.h"
 #include <cstdio>
 #include <cstdlib>
+#include <cstring>
 #include <string>
 #include <sstream>
 
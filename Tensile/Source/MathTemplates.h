@@ -29,6 +29,9 @@
 #include "CL/cl.h"
 #define TENSILEREAL(C) C.s[0]
 #define TENSILECOMP(C) C.s[1]
+#elif Tensile_RUNTIME_LANGUAGE_HOST
+#define TENSILEREAL(C) C.x
+#define TENSILECOMP(C) C.y
 #else
 #include <hip/hip_runtime.h>
 #define TENSILEREAL(C) C.x
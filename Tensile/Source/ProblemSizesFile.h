@@ -0,0 +1,196 @@
+/*******************************************************************************
+* Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+*
+* Permission is hereby granted, free of charge, to any person obtaining a copy
+* of this software and associated documentation files (the "Software"), to deal
+* in the Software without restriction, including without limitation the rights
+* to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+* ies of the Software, and to permit persons to whom the Software is furnished
+* to do so, subject to the following conditions:
+*
+* The above copyright notice and this permission notice shall be included in all
+* copies or substantial portions of the Software.
+*
+* THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+* PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+* FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+* COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+* IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+* CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+*******************************************************************************/
+
+#ifndef PROBLEM_SIZES_FILE_H
+#define PROBLEM_SIZES_FILE_H
+
+#include <cstdint>
+#include <cstring>
+#include <string>
+#include <vector>
+#include <fstream>
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+/*******************************************************************************
+ * Problem Sizes File
+ * - binary problem sizes written by ClientWriter.writeProblemSizesFile
+ * - little-endian layout:
+ *     char     magic[4]            "TPSZ"
+ *     uint32_t version             1
+ *     uint32_t numIndices
+ *     uint32_t reserved
+ *     uint64_t numProblems
+ *     uint64_t maxSizeC, maxSizeA, maxSizeB
+ *     uint32_t minStrides[numIndices]
+ *     uint32_t sizes[numProblems][numIndices]
+ * - file is mmap'd so sizes are paged in as the client walks them
+ ******************************************************************************/
+class TensileProblemSizesFile {
+public:
+  static const unsigned int version = 1;
+  static const size_t headerBytes = 48;
+
+  TensileProblemSizesFile() : base(NULL), mappedBytes(0), fd(-1) {
+    clear();
+  }
+
+  ~TensileProblemSizesFile() {
+    close();
+  }
+
+  bool open(const std::string &path) {
+    close();
+    const unsigned char *data = NULL;
+    size_t numBytes = 0;
+#ifdef _WIN32
+    std::ifstream file(path.c_str(), std::ios::binary);
+    if (!file) {
+      errorString = "cannot open " + path;
+      return false;
+    }
+    file.seekg(0, std::ios::end);
+    numBytes = static_cast<size_t>(file.tellg());
+    file.seekg(0, std::ios::beg);
+    buffer.resize(numBytes);
+    if (numBytes > 0) {
+      file.read(reinterpret_cast<char *>(&buffer[0]), numBytes);
+    }
+    data = buffer.empty() ? NULL : &buffer[0];
+#else
+    fd = ::open(path.c_str(), O_RDONLY);
+    if (fd < 0) {
+      errorString = "cannot open " + path;
+      return false;
+    }
+    struct stat fileStat;
+    if (fstat(fd, &fileStat) != 0) {
+      errorString = "cannot stat " + path;
+      close();
+      return false;
+    }
+    numBytes = static_cast<size_t>(fileStat.st_size);
+    if (numBytes > 0) {
+      void *p = mmap(NULL, numBytes, PROT_READ, MAP_PRIVATE, fd, 0);
+      if (p == MAP_FAILED) {
+        errorString = "cannot mmap " + path;
+        close();
+        return false;
+      }
+      base = p;
+      mappedBytes = numBytes;
+      data = static_cast<const unsigned char *>(p);
+    }
+#endif
+    if (!parse(data, numBytes)) {
+      errorString = path + ": " + errorString;
+      close();
+      return false;
+    }
+    return true;
+  }
+
+  void close() {
+#ifndef _WIN32
+    if (base) {
+      munmap(base, mappedBytes);
+    }
+    if (fd >= 0) {
+      ::close(fd);
+    }
+#endif
+    base = NULL;
+    mappedBytes = 0;
+    fd = -1;
+    buffer.clear();
+    clear();
+  }
+
+  unsigned int numIndices() const { return numIndices_; }
+  uint64_t numProblems() const { return numProblems_; }
+  uint64_t maxSizeC() const { return maxSizes[0]; }
+  uint64_t maxSizeA() const { return maxSizes[1]; }
+  uint64_t maxSizeB() const { return maxSizes[2]; }
+  const unsigned int *minStrides() const { return minStrides_; }
+  const unsigned int *sizes() const { return sizes_; }
+  const unsigned int *problem(uint64_t problemIdx) const {
+    return sizes_ + problemIdx*numIndices_;
+  }
+  const std::string &error() const { return errorString; }
+
+private:
+  void clear() {
+    numIndices_ = 0;
+    numProblems_ = 0;
+    maxSizes[0] = maxSizes[1] = maxSizes[2] = 0;
+    minStrides_ = NULL;
+    sizes_ = NULL;
+  }
+
+  bool parse(const unsigned char *data, size_t numBytes) {
+    if (numBytes < headerBytes || std::memcmp(data, "TPSZ", 4) != 0) {
+      errorString = "not a Tensile problem sizes file";
+      return false;
+    }
+    uint32_t fileVersion;
+    uint32_t fileNumIndices;
+    uint64_t fileNumProblems;
+    std::memcpy(&fileVersion, data+4, 4);
+    std::memcpy(&fileNumIndices, data+8, 4);
+    std::memcpy(&fileNumProblems, data+16, 8);
+    std::memcpy(maxSizes, data+24, 24);
+    if (fileVersion != version) {
+      errorString = "unsupported problem sizes file version";
+      return false;
+    }
+    size_t stridesBytes = 4*static_cast<size_t>(fileNumIndices);
+    if (fileNumIndices == 0
+        || fileNumProblems > (numBytes - headerBytes) / stridesBytes
+        || headerBytes + stridesBytes*(1+fileNumProblems) != numBytes) {
+      errorString = "truncated problem sizes file";
+      return false;
+    }
+    numIndices_ = fileNumIndices;
+    numProblems_ = fileNumProblems;
+    // offsets are multiples of 4 from a page-aligned mapping
+    minStrides_ = reinterpret_cast<const unsigned int *>(data + headerBytes);
+    sizes_ = minStrides_ + numIndices_;
+    return true;
+  }
+
+  void *base;
+  size_t mappedBytes;
+  int fd;
+  std::vector<unsigned char> buffer;
+  std::string errorString;
+
+  unsigned int numIndices_;
+  uint64_t numProblems_;
+  uint64_t maxSizes[3];
+  const unsigned int *minStrides_;
+  const unsigned int *sizes_;
+};
+
+#endif
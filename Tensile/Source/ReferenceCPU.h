@@ -25,10 +25,19 @@
 #include "MathTemplates.h"
 #include <vector>
 #include <type_traits>
+#include <algorithm>
+#include <atomic>
+#include <limits>
+#include <thread>
 
 
 /*******************************************************************************
  * Reference Tensor Contraction
+ * - tensileReferenceCPUNaive walks every index of the contraction one
+ *   element at a time; it is the plain statement of what Tensile computes
+ * - tensileReferenceCPU, which the clients call, computes the same sums in
+ *   the same order per element, so its results are bitwise identical, but
+ *   cache-blocked and spread over threads
  ******************************************************************************/
 typedef union{
   int8_t byte[4];
@@ -47,7 +56,7 @@ void unpack_int8x4(uint32_t in, int32_t &out_0, int32_t &out_1, int32_t &out_2,
 }
 
 template< typename Type, typename DestType >
-TensileStatus tensileReferenceCPU(
+TensileStatus tensileReferenceCPUNaive(
     DestType *dataC,
     const Type *dataA,
     const Type *dataB,
@@ -70,7 +79,11 @@ TensileStatus tensileReferenceCPU(
   ) {
 
   // Only allow high precision accumulate if Type is half
+#ifdef Tensile_ENABLE_HALF
   bool localUseHighPrecisionAccumulate = useHighPrecisionAccumulate && std::is_same<Type, TensileHalf>::value;
+#else
+  bool localUseHighPrecisionAccumulate = false;
+#endif
 
   // sizes
   unsigned int *sizesA = new unsigned int[numIndicesAB];
@@ -265,5 +278,326 @@ TensileStatus tensileReferenceCPU(
   return tensileStatusSuccess;
 } // referenceTensorContraction
 
+
+/*******************************************************************************
+ * Blocked, Multithreaded Reference
+ * - the offsets into A and B of every summation coordinate are computed once,
+ *   in the order the naive walk visits them (last summation index fastest)
+ * - validationStride == 1: C is cut into tiles of free indices 0 and 1 and
+ *   each tile walks the summation in blocks, so the tile's rows of A and
+ *   columns of B stay in cache while every element of the tile uses them
+ * - validationStride > 1: only the elements the client compares are
+ *   computed, every validationStride-th of C in serial order
+ * - tiles or chunks of sampled elements are handed to numThreads threads
+ *   (0 = one per hardware thread)
+ ******************************************************************************/
+const unsigned int tensileReferenceTileSize = 16;
+const size_t tensileReferenceSumBlock = 256;
+const size_t tensileReferenceSampleChunk = 64;
+
+template< typename Type >
+struct TensileReferenceSum {
+  Type sumC;
+  float sumCfloat;
+};
+
+// one term of the summation, as accumulated by the naive walk
+template< typename Type, typename DestType >
+inline void tensileReferenceAccumulate(
+    TensileReferenceSum<Type> &sum,
+    Type valueA,
+    Type valueB,
+    bool complexConjugateA,
+    bool complexConjugateB,
+    bool localUseHighPrecisionAccumulate ) {
+  if (
+#ifdef Tensile_ENABLE_HALF
+//       std::is_same<Type, TensileComplexHalf>() ||
+#endif
+       std::is_same<Type, TensileComplexFloat>()
+    || std::is_same<Type, TensileComplexDouble>() ) {
+    if ( complexConjugateA ) {
+      tensileComplexConjugate<Type>( valueA );
+    }
+    if ( complexConjugateB ) {
+      tensileComplexConjugate<Type>( valueB );
+    }
+  }
+
+  if(std::is_same<Type, uint32_t>() && std::is_same<DestType, int32_t>())
+  {
+     int32_t a_0, a_1, a_2, a_3, b_0, b_1, b_2, b_3;
+     unpack_int8x4(valueA, a_0, a_1, a_2, a_3);
+     unpack_int8x4(valueB, b_0, b_1, b_2, b_3);
+     sum.sumC += (a_0 * b_0) + (a_1 * b_1) + (a_2 * b_2) + (a_3 * b_3);
+  }
+  else
+  {
+    Type product = tensileMultiply<Type>( valueA, valueB );
+    if (localUseHighPrecisionAccumulate)
+      sum.sumCfloat = tensileAdd<float>(sum.sumCfloat,(float)product);
+    else
+      sum.sumC = tensileAdd<Type>(sum.sumC,product);
+  }
+}
+
+// scale by alpha, add beta*C and store, as the naive walk does
+template< typename Type, typename DestType >
+inline void tensileReferenceStore(
+    DestType *dataC,
+    size_t serialIdxC,
+    TensileReferenceSum<Type> sum,
+    DestType alpha,
+    DestType beta,
+    bool localUseHighPrecisionAccumulate ) {
+  if (localUseHighPrecisionAccumulate)
+    sum.sumCfloat = tensileMultiply<float>((float)alpha,sum.sumCfloat);
+  else
+    sum.sumC = tensileMultiply<Type>(alpha,sum.sumC);
+  if (!tensileIsZero(beta)) {
+    Type tmp = tensileMultiply<Type>(beta, dataC[serialIdxC]);
+    if (localUseHighPrecisionAccumulate)
+      sum.sumCfloat = tensileAdd<float>((float)tmp,sum.sumCfloat);
+    else
+      sum.sumC = tensileAdd<Type>(tmp,sum.sumC);
+  }
+
+  if (localUseHighPrecisionAccumulate)
+    dataC[serialIdxC] = (Type)sum.sumCfloat;
+  else
+    dataC[serialIdxC] = sum.sumC;
+}
+
+// run work(item) for items [0, numItems) on up to numThreads threads
+template< typename Work >
+void tensileReferenceParallel( size_t numItems, unsigned int numThreads,
+    Work work ) {
+  if (numThreads == 0) {
+    numThreads = std::max(1u, std::thread::hardware_concurrency());
+  }
+  numThreads = static_cast<unsigned int>(
+      std::min(static_cast<size_t>(numThreads), numItems));
+  std::atomic<size_t> nextItem(0);
+  auto worker = [&]() {
+    for (size_t item = nextItem++; item < numItems; item = nextItem++) {
+      work(item);
+    }
+  };
+  if (numThreads <= 1) {
+    worker();
+    return;
+  }
+  std::vector<std::thread> threads;
+  for (unsigned int t = 0; t < numThreads; t++) {
+    threads.push_back(std::thread(worker));
+  }
+  for (unsigned int t = 0; t < numThreads; t++) {
+    threads[t].join();
+  }
+}
+
+template< typename Type, typename DestType >
+TensileStatus tensileReferenceCPU(
+    DestType *dataC,
+    const Type *dataA,
+    const Type *dataB,
+    const unsigned int stride_a,
+    const unsigned int stride_b,
+    const unsigned int stride_c,
+    DestType alpha,
+    DestType beta,
+    unsigned int totalIndices,
+    const unsigned int *sizes,
+    const unsigned int *minStrides,
+    unsigned int numIndicesC,
+    unsigned int numIndicesAB,
+    const unsigned int *indexAssignmentsA,
+    const unsigned int *indexAssignmentsB,
+    bool complexConjugateA,
+    bool complexConjugateB,
+    size_t validationStride, // = 1 means do all
+    bool useHighPrecisionAccumulate,
+    unsigned int numThreads = 0 // = 0 means one per hardware thread
+  ) {
+
+  // Only allow high precision accumulate if Type is half
+#ifdef Tensile_ENABLE_HALF
+  bool localUseHighPrecisionAccumulate = useHighPrecisionAccumulate && std::is_same<Type, TensileHalf>::value;
+#else
+  bool localUseHighPrecisionAccumulate = false;
+#endif
+  unsigned int numIndicesSummation = totalIndices - numIndicesC;
+
+  // element strides of A, B and C, as the naive walk computes them
+  std::vector<size_t> strides(totalIndices);
+  for (unsigned int i = 0; i < totalIndices; i++) {
+    strides[i] = std::max(minStrides[i], sizes[i]);
+  }
+  std::vector<size_t> stridesA(numIndicesAB);
+  std::vector<size_t> stridesB(numIndicesAB);
+  std::vector<size_t> stridesC(numIndicesC);
+  stridesA[0] = 1;
+  stridesB[0] = 1;
+  stridesC[0] = 1;
+  for (unsigned int i = 1; i < numIndicesAB; i++) {
+    stridesA[i] = stridesA[i-1] * strides[indexAssignmentsA[i-1]];
+    stridesB[i] = stridesB[i-1] * strides[indexAssignmentsB[i-1]];
+  }
+  for (unsigned int i = 1; i < numIndicesC; i++) {
+    stridesC[i] = stridesC[i-1] * strides[i-1];
+  }
+  if (stride_a != std::numeric_limits<unsigned int>::max())  stridesA[2] = stride_a;
+  if (stride_b != std::numeric_limits<unsigned int>::max())  stridesB[2] = stride_b;
+  if (stride_c != std::numeric_limits<unsigned int>::max())  stridesC[2] = stride_c;
+
+  // stride of each free and summation index within A and B
+  std::vector<size_t> freeStridesA(numIndicesC, 0);
+  std::vector<size_t> freeStridesB(numIndicesC, 0);
+  std::vector<size_t> boundStridesA(numIndicesSummation, 0);
+  std::vector<size_t> boundStridesB(numIndicesSummation, 0);
+  for (unsigned int i = 0; i < numIndicesAB; i++) {
+    if (indexAssignmentsA[i] < numIndicesC) {
+      freeStridesA[indexAssignmentsA[i]] += stridesA[i];
+    } else {
+      boundStridesA[indexAssignmentsA[i]-numIndicesC] += stridesA[i];
+    }
+    if (indexAssignmentsB[i] < numIndicesC) {
+      freeStridesB[indexAssignmentsB[i]] += stridesB[i];
+    } else {
+      boundStridesB[indexAssignmentsB[i]-numIndicesC] += stridesB[i];
+    }
+  }
+
+  // offsets of every summation coordinate, last summation index fastest
+  size_t numSums = 1;
+  for (unsigned int b = 0; b < numIndicesSummation; b++) {
+    numSums *= sizes[numIndicesC+b];
+  }
+  std::vector<size_t> sumOffsetsA(numSums);
+  std::vector<size_t> sumOffsetsB(numSums);
+  std::vector<unsigned int> boundCoord(numIndicesSummation, 0);
+  for (size_t s = 0; s < numSums; s++) {
+    size_t offsetA = 0;
+    size_t offsetB = 0;
+    for (unsigned int b = 0; b < numIndicesSummation; b++) {
+      offsetA += boundCoord[b]*boundStridesA[b];
+      offsetB += boundCoord[b]*boundStridesB[b];
+    }
+    sumOffsetsA[s] = offsetA;
+    sumOffsetsB[s] = offsetB;
+    for (int b = numIndicesSummation-1; b >= 0; b--) {
+      if (++boundCoord[b] < sizes[numIndicesC+b]) {
+        break;
+      }
+      boundCoord[b] = 0;
+    }
+  }
+
+  size_t numElementsC = 1;
+  for (unsigned int i = 0; i < numIndicesC; i++) {
+    numElementsC *= sizes[i];
+  }
+  if (numElementsC == 0) {
+    return tensileStatusSuccess;
+  }
+
+  if (validationStride > 1) {
+    // sampled elements: each found from its serial index, free index 0 fastest
+    size_t numSamples = (numElementsC + validationStride - 1) / validationStride;
+    size_t numChunks = (numSamples + tensileReferenceSampleChunk - 1)
+        / tensileReferenceSampleChunk;
+    tensileReferenceParallel(numChunks, numThreads, [&](size_t chunk) {
+      size_t sampleEnd = std::min(numSamples,
+          (chunk+1)*tensileReferenceSampleChunk);
+      for (size_t sample = chunk*tensileReferenceSampleChunk;
+          sample < sampleEnd; sample++) {
+        size_t r = sample * validationStride;
+        size_t serialIdxC = 0;
+        const Type *tileA = dataA;
+        const Type *tileB = dataB;
+        for (unsigned int i = 0; i < numIndicesC; i++) {
+          size_t coord = r % sizes[i];
+          r /= sizes[i];
+          serialIdxC += coord*stridesC[i];
+          tileA += coord*freeStridesA[i];
+          tileB += coord*freeStridesB[i];
+        }
+        TensileReferenceSum<Type> sum = { tensileGetZero<Type>(), 0.0f };
+        for (size_t s = 0; s < numSums; s++) {
+          tensileReferenceAccumulate<Type, DestType>(sum,
+              tileA[sumOffsetsA[s]], tileB[sumOffsetsB[s]],
+              complexConjugateA, complexConjugateB,
+              localUseHighPrecisionAccumulate);
+        }
+        tensileReferenceStore<Type, DestType>(dataC, serialIdxC, sum, alpha,
+            beta, localUseHighPrecisionAccumulate);
+      }
+    });
+    return tensileStatusSuccess;
+  }
+
+  // tiles over free indices 0 and 1; the other free indices are outer
+  const unsigned int tileSize = tensileReferenceTileSize;
+  size_t size0 = sizes[0];
+  size_t size1 = numIndicesC > 1 ? sizes[1] : 1;
+  size_t numTiles0 = (size0 + tileSize - 1) / tileSize;
+  size_t numTiles1 = (size1 + tileSize - 1) / tileSize;
+  size_t numOuter = numElementsC / (size0*size1);
+  tensileReferenceParallel(numOuter*numTiles1*numTiles0, numThreads,
+      [&](size_t tile) {
+    size_t tile0 = tile % numTiles0;
+    size_t tile1 = (tile / numTiles0) % numTiles1;
+    size_t outer = tile / (numTiles0*numTiles1);
+    size_t outerC = 0;
+    size_t outerA = 0;
+    size_t outerB = 0;
+    for (unsigned int i = 2; i < numIndicesC; i++) {
+      size_t coord = outer % sizes[i];
+      outer /= sizes[i];
+      outerC += coord*stridesC[i];
+      outerA += coord*freeStridesA[i];
+      outerB += coord*freeStridesB[i];
+    }
+    size_t begin0 = tile0*tileSize;
+    size_t begin1 = tile1*tileSize;
+    size_t end0 = std::min(size0, begin0 + tileSize);
+    size_t end1 = std::min(size1, begin1 + tileSize);
+    size_t stride1C = numIndicesC > 1 ? stridesC[1] : 0;
+    size_t stride1A = numIndicesC > 1 ? freeStridesA[1] : 0;
+    size_t stride1B = numIndicesC > 1 ? freeStridesB[1] : 0;
+
+    TensileReferenceSum<Type> zero = { tensileGetZero<Type>(), 0.0f };
+    std::vector<TensileReferenceSum<Type> > sums(tileSize*tileSize, zero);
+    for (size_t sumBegin = 0; sumBegin < numSums;
+        sumBegin += tensileReferenceSumBlock) {
+      size_t sumEnd = std::min(numSums, sumBegin + tensileReferenceSumBlock);
+      for (size_t j = begin1; j < end1; j++) {
+        for (size_t i = begin0; i < end0; i++) {
+          TensileReferenceSum<Type> &sum
+              = sums[(j-begin1)*tileSize + (i-begin0)];
+          const Type *tileA = dataA + outerA + i*freeStridesA[0] + j*stride1A;
+          const Type *tileB = dataB + outerB + i*freeStridesB[0] + j*stride1B;
+          for (size_t s = sumBegin; s < sumEnd; s++) {
+            tensileReferenceAccumulate<Type, DestType>(sum,
+                tileA[sumOffsetsA[s]], tileB[sumOffsetsB[s]],
+                complexConjugateA, complexConjugateB,
+                localUseHighPrecisionAccumulate);
+          }
+        }
+      }
+    }
+    for (size_t j = begin1; j < end1; j++) {
+      for (size_t i = begin0; i < end0; i++) {
+        tensileReferenceStore<Type, DestType>(dataC,
+            outerC + i*stridesC[0] + j*stride1C,
+            sums[(j-begin1)*tileSize + (i-begin0)], alpha, beta,
+            localUseHighPrecisionAccumulate);
+      }
+    }
+  });
+
+  return tensileStatusSuccess;
+} // tensileReferenceCPU
+
 #endif
 
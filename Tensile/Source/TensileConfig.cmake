@@ -32,8 +32,10 @@ function(TensileCreateLibrary
     Tensile_LIBRARY_PRINT_DEBUG )
 
   # Tensile_ROOT can be specified instead of installing
+  # Tensile_HASHED_NAMES names solutions and kernels by digests
+  set(options Tensile_HASHED_NAMES)
   set(oneValueArgs Tensile_ROOT)
-  cmake_parse_arguments(PARSE "" "${oneValueArgs}" "" ${ARGN})
+  cmake_parse_arguments(PARSE "${options}" "${oneValueArgs}" "" ${ARGN})
 
   if(PARSE_Tensile_ROOT)
     # python not pre-installed, use scripts downloaded to extern/Tensile
@@ -60,6 +62,10 @@ function(TensileCreateLibrary
     set(Tensile_CREATE_COMMAND ${Tensile_CREATE_COMMAND} "--no-short-file-names")
   endif()
 
+  if(PARSE_Tensile_HASHED_NAMES)
+    set(Tensile_CREATE_COMMAND ${Tensile_CREATE_COMMAND} "--hashed-names")
+  endif()
+
   if(${Tensile_PRINT_DEBUG})
     set(Tensile_CREATE_COMMAND ${Tensile_CREATE_COMMAND} "--library-print-debug")
   else()
@@ -34,6 +34,31 @@
 #define TensileComplexDouble cl_double2
 #define TensileHalf cl_half
 
+// Host only: reference, validation and HIP source kernels built without a
+// GPU runtime, as by the CPU unit tests and host validation
+#elif Tensile_RUNTIME_LANGUAGE_HOST
+#include "HostRuntime.h"
+#include <ostream>
+#define TensileStatus int
+#define tensileStatusSuccess 0
+#define tensileStatusFailure -1
+#define tensileStatusAssertFailure -2
+#define TensileComplexFloat float2
+#define TensileComplexDouble double2
+#define TensileInt8x4 uint32_t
+#define TensileInt32 int32_t
+
+// not every host compiler or target has _Float16
+#ifdef Tensile_ENABLE_HALF
+#define TensileHalf _Float16
+
+inline std::ostream& operator<<(std::ostream& os, const _Float16& dt)
+{
+   os << (float)(dt);
+   return os;
+}
+#endif
+
 // HIP
 #else
 #include <hip/hip_runtime.h>
@@ -23,12 +23,14 @@ import os
 import sys
 import argparse
 
-from Common import globalParameters, print1, ensurePath, \
+from Common import globalParameters, RunContext, print1, ensurePath, \
     assignGlobalParameters, HR
 import YAMLIO
 import BenchmarkProblems
 import LibraryLogic
 import ClientWriter
+from Trace import Span, writeTrace
+from JobServer import reportJobs
 from __init__ import __version__
 
 ###############################################################################
@@ -39,31 +41,34 @@ from __init__ import __version__
 #   LibraryLogic.main() to analyse final benchmark data and produce logic/yaml
 #   ClientWriter.main() to create client which calls library based on above yaml
 ################################################################################
-def executeStepsInConfig( config ):
+def executeStepsInConfig( config, context=None ):
+  if context is None:
+    context = RunContext()
 
   ##############################################################################
   # Benchmark Problems
   ##############################################################################
   if "BenchmarkProblems" in config:
-    BenchmarkProblems.main( config["BenchmarkProblems"] )
+    with Span("BenchmarkProblems"):
+      BenchmarkProblems.main( config["BenchmarkProblems"], context )
     print1("")
 
   ##############################################################################
   # Library Logic
   ##############################################################################
-  libraryLogicDataPath = os.path.join(globalParameters["WorkingPath"], \
-      globalParameters["LibraryLogicPath"])
+  libraryLogicDataPath = context.path(context["LibraryLogicPath"])
   if "LibraryLogic" in config:
     if os.path.exists(libraryLogicDataPath):
       libraryLogicFiles = os.listdir(libraryLogicDataPath)
     else:
       libraryLogicFiles = []
-    if len(libraryLogicFiles) < 1 or globalParameters["ForceRedoLibraryLogic"]:
+    if len(libraryLogicFiles) < 1 or context["ForceRedoLibraryLogic"]:
       if config["LibraryLogic"] != None:
         libraryLogicConfig = config["LibraryLogic"]
       else:
         libraryLogicConfig = {}
-      LibraryLogic.main( libraryLogicConfig )
+      with Span("LibraryLogic"):
+        LibraryLogic.main( libraryLogicConfig, context )
       print1("")
     else:
       print1("# LibraryLogic already done.")
@@ -78,7 +83,8 @@ def executeStepsInConfig( config ):
       libraryClientConfig = config["LibraryClient"]
     else:
       libraryClientConfig = {}
-    ClientWriter.main( libraryClientConfig )
+    with Span("LibraryClient"):
+      ClientWriter.main( libraryClientConfig, context )
     print1("")
 
 
@@ -115,6 +121,10 @@ def Tensile(userArgs):
       help="use serial kernel and solution names")
   argParser.add_argument("--no-merge-files", dest="noMergeFiles", action="store_true", \
       help="kernels and solutions written to individual files")
+  argParser.add_argument("--trace", dest="trace", action="store_true", \
+      help="write Trace.json of where the run spends its time and summarize it")
+  argParser.add_argument("-j", "--jobs", dest="jobs", type=int, \
+      help="override JobTokens, the jobs run at once by all tools")
   # argParser.add_argument("--hcc-version", dest="HccVersion", \
   #     help="This can affect what opcodes are emitted by the assembler")
 
@@ -129,15 +139,22 @@ def Tensile(userArgs):
   print1(HR)
   print1("")
 
+  if args.trace:
+    globalParameters["Trace"] = True
+  runSpan = Span("Tensile").begin()
+
   # read config
-  config = YAMLIO.readConfig( configPath )
-  ensurePath(globalParameters["WorkingPath"])
+  with Span("ReadConfig"):
+    config = YAMLIO.readConfig( configPath )
+    ensurePath(globalParameters["WorkingPath"])
 
-  # assign global parameters
-  if "GlobalParameters" in config:
-    assignGlobalParameters( config["GlobalParameters"] )
-  else:
-    assignGlobalParameters({})
+    # assign global parameters
+    if "GlobalParameters" in config:
+      assignGlobalParameters( config["GlobalParameters"] )
+    else:
+      assignGlobalParameters({})
+    if args.trace:
+      globalParameters["Trace"] = True
 
   # override config with command-line options
   if args.device:
@@ -160,10 +177,16 @@ def Tensile(userArgs):
     globalParameters["ShortNames"] = True
   if args.noMergeFiles:
     globalParameters["MergeFiles"] = False
+  if args.jobs is not None:
+    print1("# Command-line override: JobTokens")
+    globalParameters["JobTokens"] = args.jobs
   print1("")
 
   # Execute Steps in the config script
   executeStepsInConfig( config )
+  runSpan.end()
+  reportJobs()
+  writeTrace(globalParameters["WorkingPath"])
 
 
 def TensileConfigPath(*args):
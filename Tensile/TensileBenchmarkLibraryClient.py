@@ -21,8 +21,15 @@
 import sys
 import csv
 import os
+import json
+import threading
+from Queue import Queue, Empty
 from subprocess import Popen, PIPE
 
+# a problem size the library client could not benchmark
+class BenchmarkError(Exception):
+  pass
+
 ################################################################################
 # Benchmark Problem Size
 ################################################################################
@@ -34,7 +41,7 @@ def BenchmarkProblemSize(cmdPrefix, row):
     cmd += size.lstrip()
   sys.stderr.write(cmd)
   sys.stderr.write("\n")
-  process = Popen(cmd, stdout=PIPE, shell=True)
+  process = Popen(cmd, stdout=PIPE, shell=True, close_fds=True)
   stdout = process.communicate()[0]
   sys.stderr.write(stdout)
 
@@ -66,9 +73,86 @@ def BenchmarkProblemSize(cmdPrefix, row):
     
     # next line
     stdout = stdout[newLineIdx+1:]
+  if len(gflopList) == 0:
+    raise BenchmarkError("no results from %s" % cmd)
   return (gflopList, msList)
 
 
+################################################################################
+# Library Client Server
+# one "--server -" client process benchmarks every problem size: sizes go to
+# its stdin and one json result line per problem comes back on its stdout,
+# so the device, stream and code objects are only set up once
+################################################################################
+class LibraryClientServer:
+
+  def __init__(self, cmdPrefix):
+    cmd = cmdPrefix + " --server -"
+    sys.stderr.write(cmd)
+    sys.stderr.write("\n")
+    self.process = Popen(cmd, stdin=PIPE, stdout=PIPE, shell=True, \
+        close_fds=True)
+
+  def benchmark(self, row):
+    request = "sizes %s\n" % " ".join([size.strip() for size in row])
+    sys.stderr.write(request)
+    # a server that exited between problems breaks the pipe
+    try:
+      self.process.stdin.write(request)
+      self.process.stdin.flush()
+    except (IOError, OSError) as e:
+      raise BenchmarkError("server exited before %s: %s" \
+          % (request.strip(), e))
+    result = None
+    while result is None:
+      try:
+        line = self.process.stdout.readline()
+      except (IOError, OSError) as e:
+        raise BenchmarkError("server exited answering %s: %s" \
+            % (request.strip(), e))
+      if not line:
+        raise BenchmarkError("server exited before answering %s" \
+            % request.strip())
+      try:
+        result = json.loads(line)
+      except ValueError:
+        # a response that does not parse is the answer, waiting for another
+        # would deadlock with the server waiting for the next request
+        if line.lstrip().startswith("{"):
+          raise BenchmarkError("malformed result for %s: %s" \
+              % (request.strip(), line.strip()))
+        sys.stderr.write(line)
+        continue
+      if not isinstance(result, dict):
+        result = None
+    sys.stderr.write(line)
+    if "error" in result:
+      raise BenchmarkError(result["error"])
+    try:
+      gflopList = [float(gflops) for gflops in result["gflops"]]
+      msList = [float(ms) for ms in result["ms"]]
+    except (KeyError, TypeError, ValueError):
+      raise BenchmarkError("malformed result for %s: %s" \
+          % (request.strip(), line.strip()))
+    # skip first b/c warmup/lookup
+    if len(gflopList) < 2 or len(msList) != len(gflopList):
+      raise BenchmarkError("no results for %s" % request.strip())
+    return (gflopList[1:], msList[1:])
+
+  def close(self):
+    try:
+      self.process.stdin.write("quit\n")
+      self.process.stdin.close()
+    except IOError:
+      pass # already exited
+    self.process.wait()
+
+  def kill(self):
+    if self.process.poll() is None:
+      self.process.kill()
+    self.process.wait()
+
+
 ################################################################################
 # Print Stats
 ################################################################################
@@ -94,14 +178,155 @@ def PrintStats(header, row, gflopList, msList):
   sys.stderr.write("[STDOUT] %s\n" % line) 
   sys.stderr.write("[END]\n\n\n") 
   sys.stderr.flush()
+  return line
+
+
+################################################################################
+# Benchmark Scheduler
+# one worker thread per device pulls sizes from a shared queue, largest
+# estimated flops first so the run does not end on one long size; a failed
+# size goes back on the queue for any device until it has been tried
+# 1+retries times, and finished rows are appended to the output file as they
+# complete so an interrupted run resumes where it stopped; a size is never
+# dropped: it completes, fails, or is left queued and reported as failed
+################################################################################
+class BenchmarkScheduler:
+
+  def __init__(self, command, devices, server, retries, header, outputFile):
+    self.command = command
+    self.devices = devices
+    self.server = server
+    self.retries = retries
+    self.header = header
+    self.outputFile = outputFile
+    self.queue = Queue()
+    self.lock = threading.Lock()
+    self.failed = []
+
+  # flops of a size are proportional to the product of its indices
+  @staticmethod
+  def estimatedFlops(row):
+    flops = 1
+    for size in row:
+      flops *= int(size)
+    return flops
+
+  def run(self, rows):
+    if len(self.devices) > 1:
+      rows = sorted(rows, key=lambda row: -self.estimatedFlops(row))
+    for row in rows:
+      self.queue.put((row, 0))
+    workers = [threading.Thread(target=self.work, args=(device,)) \
+        for device in self.devices]
+    for worker in workers:
+      worker.daemon = True
+      worker.start()
+    # join with a timeout so ctrl-c still reaches the main thread
+    for worker in workers:
+      while worker.is_alive():
+        worker.join(1)
+    # sizes no worker got to, eg after every worker died
+    while True:
+      try:
+        (row, attempts) = self.queue.get_nowait()
+      except Empty:
+        break
+      self.failed.append(row)
+    return self.failed
+
+  def work(self, device):
+    command = self.command
+    if device is not None:
+      command += " --device-idx %u" % device
+    libraryClientServer = None
+    while True:
+      try:
+        (row, attempts) = self.queue.get_nowait()
+      except Empty:
+        break
+      try:
+        if self.server:
+          if libraryClientServer is None:
+            libraryClientServer = LibraryClientServer(command)
+          (gflopList, msList) = libraryClientServer.benchmark(row)
+        else:
+          (gflopList, msList) = BenchmarkProblemSize(command, row)
+        with self.lock:
+          line = PrintStats(self.header, row, gflopList, msList)
+          if self.outputFile is not None:
+            self.outputFile.write(line + "\n")
+            self.outputFile.flush()
+      except Exception as e:
+        # anything unexpected is retried like a BenchmarkError so the worker
+        # keeps serving its queue
+        if not isinstance(e, BenchmarkError):
+          e = "%s: %s" % (type(e).__name__, e)
+        self.retry(device, row, attempts, e)
+        if libraryClientServer is not None:
+          libraryClientServer.kill()
+          libraryClientServer = None
+    if libraryClientServer is not None:
+      libraryClientServer.close()
+
+  def retry(self, device, row, attempts, error):
+    with self.lock:
+      sys.stderr.write("Device %s failed size %s (attempt %u): %s\n" \
+          % (device, ",".join([size.strip() for size in row]), attempts+1, \
+          error))
+      if attempts < self.retries:
+        self.queue.put((row, attempts+1))
+      else:
+        self.failed.append(row)
+
+
+# sizes already in an output file of an earlier run
+def readCompletedSizes(outputPath, numIndices):
+  completed = set()
+  if not os.path.exists(outputPath):
+    return completed
+  with open(outputPath, "r") as outputFile:
+    for line in outputFile:
+      splits = line.split(",")
+      try:
+        completed.add(tuple([int(size) for size in splits[:numIndices]]))
+      except ValueError:
+        pass # header
+  return completed
 
 
 ################################################################################
 # Benchmark Problem Sizes
 ################################################################################
 def TensileBenchmarkLibraryClient(userArgs):
+  # options before sizes.csv:
+  # --server keeps one client process up per device for all sizes
+  # --devices 0,1,2 benchmarks on each device in parallel
+  # --output file appends finished rows to file and skips rows already in it
+  # --retries n tries a failed size up to n more times
+  server = False
+  devices = [None]
+  outputPath = None
+  retries = 2
+  try:
+    while len(userArgs) > 0 and userArgs[0].startswith("--"):
+      if userArgs[0] == "--server":
+        server = True
+        userArgs = userArgs[1:]
+      elif userArgs[0] == "--devices":
+        devices = [int(device) for device in userArgs[1].split(",")]
+        userArgs = userArgs[2:]
+      elif userArgs[0] == "--output":
+        outputPath = os.path.realpath(userArgs[1])
+        userArgs = userArgs[2:]
+      elif userArgs[0] == "--retries":
+        retries = int(userArgs[1])
+        userArgs = userArgs[2:]
+      else:
+        break
+  except (IndexError, ValueError):
+    userArgs = []
   if len(userArgs) < 2:
-    line = "USAGE:   python TensileBenchmarkLibraryClient.py sizes.csv library_client_command > name.txt 2> name.raw.txt \n"
+    line = "USAGE:   python TensileBenchmarkLibraryClient.py [--server] [--devices 0,1,...] [--output name.csv] [--retries 2] sizes.csv library_client_command > name.txt 2> name.raw.txt \n"
     sys.stderr.write(line)
     line = "Example: python TensileBenchmarkLibraryClient.py sizes.csv ./4_LibraryClient/build/client --function-idx 1 --num-benchmarks 100 --use-gpu-timer 0 > nn.txt 2> nn.raw.txt\n"
     sys.stderr.write(line)
@@ -129,11 +354,8 @@ def TensileBenchmarkLibraryClient(userArgs):
   csvFile = csv.reader(csvFileRaw)
 
   # column headers
-  numIndices = -1
-  for row in csvFile:
-    numIndices = len(row)
-    firstRow = row
-    break
+  rows = [row for row in csvFile]
+  numIndices = len(rows[0]) if len(rows) > 0 else 0
   header = ""
   for i in range(0, numIndices):
     sizeStr = "size%u" % i
@@ -144,15 +366,32 @@ def TensileBenchmarkLibraryClient(userArgs):
   sys.stdout.write(header) 
   sys.stdout.write("\n") 
 
-  # benchmark each problem size
-  for row in [firstRow]:
-    (gflopList, msList) = BenchmarkProblemSize(libraryClientCommand, row)
-    PrintStats(header, row, gflopList, msList)
+  # resume after the sizes an earlier run finished
+  outputFile = None
+  if outputPath is not None:
+    completed = readCompletedSizes(outputPath, numIndices)
+    rows = [row for row in rows \
+        if tuple([int(size) for size in row]) not in completed]
+    if len(completed) > 0:
+      sys.stderr.write("Resuming %s: %u sizes done, %u to go\n" \
+          % (outputPath, len(completed), len(rows)))
+    newOutput = not os.path.exists(outputPath) \
+        or os.path.getsize(outputPath) == 0
+    outputFile = open(outputPath, "a")
+    if newOutput:
+      outputFile.write(header + "\n")
+      outputFile.flush()
 
   # benchmark each problem size
-  for row in csvFile:
-    (gflopList, msList) = BenchmarkProblemSize(libraryClientCommand, row)
-    PrintStats(header, row, gflopList, msList)
+  scheduler = BenchmarkScheduler(libraryClientCommand, devices, server, \
+      retries, header, outputFile)
+  failed = scheduler.run(rows)
+  if outputFile is not None:
+    outputFile.close()
+  for row in failed:
+    sys.stderr.write("Failed size: %s\n" % ",".join([size.strip() \
+        for size in row]))
+  return failed
 
 def median(lst):
   sortedList = sorted(lst)
@@ -173,7 +412,8 @@ def stddev(lst):
 
 # installed "tensileBenchmarkLibraryClient" command
 def main():
-  TensileBenchmarkLibraryClient(sys.argv[1:])
+  if TensileBenchmarkLibraryClient(sys.argv[1:]):
+    exit(-1)
 
 if __name__ == "__main__":
   main()
@@ -19,9 +19,12 @@
 # CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 ################################################################################
 # This script only gets called by CMake
-from Common import globalParameters, HR, print1, print2, printExit, ensurePath, CHeader, CMakeHeader, assignGlobalParameters, ProgressBar
+from Common import globalParameters, HR, RunContext, print1, print2, printExit, ensurePath, CHeader, CMakeHeader, assignGlobalParameters, ProgressBar
 from Common import writeSolutionAssertionCheckHeader,writeSolutionAssertionChecksForSolution
 from SolutionStructs import Solution
+from SolutionMemo import saveSolutionMemo
+from Trace import Span, workerEvents, addEvents, writeTrace
+from JobServer import Job, getJobServer, workerJobs, addJobs, reportJobs
 import YAMLIO
 from SolutionWriter import SolutionWriter
 from KernelWriterSource import KernelWriterSource
@@ -44,9 +47,10 @@ def processKernelSource(kernel, kernelWriterSource, kernelWriterAssembly):
     # get kernel name
     kernelName = kernelWriter.getKernelName(kernel)
     #sys.stderr.write("kernel:%s\n"% kernelName)
-    (err, src) = kernelWriter.getSourceFileString(kernel)
+    with Span("GenerateKernel", "Stage", {"Kernel": kernelName}):
+      (err, src) = kernelWriter.getSourceFileString(kernel)
 
-    header = kernelWriter.getHeaderFileString(kernel)
+      header = kernelWriter.getHeaderFileString(kernel)
 
     return (err, src, header, kernelName)
 
@@ -65,15 +69,19 @@ def processKernelSourceChunk(kernels,
 
     for ki in range(kiStart, kiStop):
       kernel = kernels[ki]
-      results.append (processKernelSource(kernel, kernelWriterSource, kernelWriterAssembly)) # returns err, src, header, kernelName
+      with Job(getJobServer(), "GenerateKernel"):
+        results.append (processKernelSource(kernel, kernelWriterSource, kernelWriterAssembly)) # returns err, src, header, kernelName
 
+    # worker processes also hand back the spans they traced and jobs they ran
     if pipe != None:
-      pipe.send(results)
+      pipe.send((results, workerEvents(), workerJobs()))
 
 
 # create and prepare the assembly directory  - called ONCE per output dir:
-def prepAsm():
-  asmPath = ensurePath(os.path.join(globalParameters["WorkingPath"], "assembly") )
+def prepAsm(context=None):
+  if context is None:
+    context = RunContext()
+  asmPath = ensurePath(context.path("assembly"))
   assemblerFileName = os.path.join(asmPath, \
       "asm.%s"%("bat" if os.name=="nt" else "sh"))
   assemblerFile = open(assemblerFileName, "w")
@@ -92,14 +100,29 @@ def prepAsm():
     assemblerFile.write("${ASM} -target amdgcn--amdhsa $f.o -o $f.co\n")
   assemblerFile.close()
   os.chmod(assemblerFileName, 0777)
+  return asmPath
+
+################################################################################
+# Write Hashed Names
+# side table from hashed symbols back to readable names, for logs/debugging
+################################################################################
+def writeHashedNames(outputPath, solutions, kernels):
+  hashedNaming = Solution.getHashedNaming(solutions)
+  hashedNaming.update(Solution.getHashedNaming(kernels))
+  hashedNamesFile = open(os.path.join(outputPath, "HashedNames.txt"), "w")
+  for hashedName in sorted(hashedNaming):
+    hashedNamesFile.write("%s %s\n" % (hashedName, hashedNaming[hashedName]))
+  hashedNamesFile.close()
 
 ################################################################################
 # Write Solutions and Kernels for BenchmarkClient or LibraryClient
 ################################################################################
 def writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
-    solutionWriter, kernelWriterSource, kernelWriterAssembly):
+    solutionWriter, kernelWriterSource, kernelWriterAssembly, context=None):
   start = time.time()
   print1("# Writing Kernels...")
+  if globalParameters["HashedNames"]:
+    writeHashedNames(outputPath, solutions, kernels)
   if not globalParameters["MergeFiles"]:
     ensurePath(os.path.join(outputPath, "Solutions"))
     ensurePath(os.path.join(outputPath, "Kernels"))
@@ -136,7 +159,9 @@ def writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
 
   kernelsWithBuildErrs = {}
 
-  prepAsm()
+  asmPath = prepAsm(context)
+  kernelWriterSource.asmPath = asmPath
+  kernelWriterAssembly.asmPath = asmPath
 
   if globalParameters["CpuThreads"] == 0:
     cpus = 0
@@ -146,6 +171,11 @@ def writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
            else globalParameters["CpuThreads"]
   else: #! CodeFromFiles is not thread-safe since code merged into same file
     cpus = 1
+  # created before forking so the workers share its tokens, which bound how
+  # many kernels generate at once
+  jobServer = getJobServer()
+  if jobServer and cpus > jobServer.tokens:
+    cpus = jobServer.tokens
 
   workPerCpu = max(10, (len(kernels)+cpus-1)/cpus) if cpus else 1
   print "# Launching kernel compilation processes (cpus=%u kernelsPerCpu=%u)" % (cpus, workPerCpu)
@@ -183,7 +213,9 @@ def writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
   someError = 0
   for (t,kiStart,kiStop,parentConn) in threads:
     try:
-      results = parentConn.recv()
+      (results, events, jobs) = parentConn.recv()
+      addEvents(events)
+      addJobs(jobs)
     except EOFError as pipeErr:
       print  "*** warning: process", t, "returned pipe EOF",t,pipeErr
 
@@ -1020,10 +1052,18 @@ def TensileCreateLibrary():
       action="store_true")
   argParser.add_argument("--no-short-file-names", dest="ShortNames", \
       action="store_false")
+  argParser.add_argument("--hashed-names", dest="HashedNames", \
+      action="store_true", help="name solutions and kernels by digests")
+  argParser.add_argument("--no-hashed-names", dest="HashedNames", \
+      action="store_false")
   argParser.add_argument("--library-print-debug", dest="LibraryPrintDebug", \
       action="store_true")
   argParser.add_argument("--no-library-print-debug", dest="LibraryPrintDebug", \
       action="store_false")
+  argParser.add_argument("--solution-memo", dest="SolutionMemoPath", \
+      default=None, help="directory memoizing derived solution parameters")
+  argParser.add_argument("--trace", dest="Trace", action="store_true", \
+      help="write Trace.json of where library creation spends its time")
   args = argParser.parse_args()
 
   logicPath = args.LogicPath
@@ -1034,7 +1074,10 @@ def TensileCreateLibrary():
   arguments["RuntimeLanguage"] = args.RuntimeLanguage
   arguments["MergeFiles"] = args.MergeFiles
   arguments["ShortNames"] = args.ShortNames
+  arguments["HashedNames"] = args.HashedNames
   arguments["LibraryPrintDebug"] = args.LibraryPrintDebug
+  arguments["SolutionMemoPath"] = args.SolutionMemoPath
+  arguments["Trace"] = args.Trace
   arguments["CodeFromFiles"] = False
   assignGlobalParameters(arguments)
 
@@ -1052,6 +1095,8 @@ def TensileCreateLibrary():
   ##############################################################################
   # Parse config files
   ##############################################################################
+  runSpan = Span("TensileCreateLibrary").begin()
+  readSpan = Span("ReadLogic").begin()
   solutions = []
   logicData = {} # keys are problemTypes, values are schedules
   for logicFileName in logicFiles:
@@ -1065,6 +1110,8 @@ def TensileCreateLibrary():
     for solution in solutionsForSchedule:
       if solution not in solutions:
         solutions.append(solution)
+  saveSolutionMemo()
+  readSpan.end()
 
   # create solution writer and kernel writer
   kernels = []
@@ -1098,12 +1145,14 @@ def TensileCreateLibrary():
       kernelMinNaming, kernelSerialNaming)
 
   # write solutions and kernels
-  writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
-      solutionWriter, kernelWriterSource, kernelWriterAssembly)
+  with Span("WriteSolutionsAndKernels"):
+    writeSolutionsAndKernels(outputPath, solutions, kernels, kernelsBetaOnly, \
+        solutionWriter, kernelWriterSource, kernelWriterAssembly)
 
   libraryStaticFiles = [
       "SolutionMapper.h",
       "TensileTypes.h",
+      "HostRuntime.h",
       "KernelHeader.h",
       "SolutionHelper.cpp",
       "SolutionHelper.h",
@@ -1115,7 +1164,11 @@ def TensileCreateLibrary():
   writeCMake(outputPath, solutions, kernels, libraryStaticFiles, clientName )
 
   # write logic
-  writeLogic(outputPath, logicData, solutionWriter)
+  with Span("WriteLogic"):
+    writeLogic(outputPath, logicData, solutionWriter)
+  runSpan.end()
+  reportJobs()
+  writeTrace(outputPath)
   print1("# Tensile Library Writer DONE")
   print1(HR)
   print1("")
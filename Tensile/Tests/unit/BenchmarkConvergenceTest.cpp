@@ -0,0 +1,108 @@
+// CPU unit test for the client benchmark stopping rule in Source/BenchmarkConvergence.h
+// built and run by test_benchmark_convergence.py
+
+#include "BenchmarkConvergence.h"
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+
+int numFailures = 0;
+
+#define CHECK(cond) \
+  do { \
+    if (!(cond)) { \
+      printf("FAILED line %d: %s\n", __LINE__, #cond); \
+      numFailures++; \
+    } \
+  } while (0)
+
+int main() {
+  // running statistics match the closed form
+  {
+    TensileBenchmarkConvergence c(0.02, 1000.0, 3, 100);
+    double samples[] = { 2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0 };
+    for (unsigned int i = 0; i < 8; i++) c.addSample(samples[i]);
+    CHECK(c.numSamples() == 8);
+    CHECK(std::fabs(c.mean() - 5.0) < 1e-12);
+    CHECK(std::fabs(c.variance() - 32.0/7.0) < 1e-12);
+    double expected = 2.365 * std::sqrt(32.0/7.0) / std::sqrt(8.0) / 5.0;
+    CHECK(std::fabs(c.relativeConfidenceInterval() - expected) < 1e-12);
+  }
+
+  // constant samples converge as soon as minSamples is reached
+  {
+    TensileBenchmarkConvergence c(0.02, 1000.0, 3, 100);
+    c.addSample(10.0);
+    CHECK(!c.done(0.0));
+    c.addSample(10.0);
+    CHECK(!c.done(0.0));
+    c.addSample(10.0);
+    CHECK(c.converged());
+    CHECK(c.done(0.0));
+    CHECK(c.relativeConfidenceInterval() == 0.0);
+  }
+
+  // minSamples below 2 is raised to 2 since one sample has no interval
+  {
+    TensileBenchmarkConvergence c(0.02, 1000.0, 0, 100);
+    c.addSample(10.0);
+    CHECK(!c.done(0.0));
+    c.addSample(10.0);
+    CHECK(c.done(0.0));
+  }
+
+  // noisy samples keep sampling until the interval shrinks below target
+  {
+    TensileBenchmarkConvergence c(0.05, 1e9, 3, 100000);
+    unsigned int n = 0;
+    while (!c.done(0.0)) {
+      c.addSample((n % 2) ? 9.0 : 11.0);
+      n++;
+    }
+    CHECK(c.converged());
+    CHECK(c.relativeConfidenceInterval() <= 0.05);
+    CHECK(n > 3);
+    // one fewer sample would not have converged
+    TensileBenchmarkConvergence d(0.05, 1e9, 3, 100000);
+    for (unsigned int i = 0; i < n-1; i++) d.addSample((i % 2) ? 9.0 : 11.0);
+    CHECK(!d.converged());
+  }
+
+  // sample cap
+  {
+    TensileBenchmarkConvergence c(1e-9, 1e9, 3, 5);
+    unsigned int n = 0;
+    while (!c.done(0.0)) {
+      c.addSample((n % 2) ? 1.0 : 100.0);
+      n++;
+    }
+    CHECK(n == 5);
+    CHECK(!c.converged());
+  }
+
+  // time cap, but never before the first sample
+  {
+    TensileBenchmarkConvergence c(1e-9, 50.0, 3, 100);
+    CHECK(!c.done(1000.0));
+    c.addSample(1.0);
+    CHECK(!c.done(49.0));
+    CHECK(c.done(50.0));
+  }
+
+  // student-t values approach the normal quantile
+  {
+    CHECK(std::fabs(tensileStudentT95(1) - 12.706) < 1e-9);
+    CHECK(std::fabs(tensileStudentT95(30) - 2.042) < 1e-9);
+    CHECK(std::fabs(tensileStudentT95(40) - 2.021) < 2e-3);
+    CHECK(std::fabs(tensileStudentT95(120) - 1.980) < 2e-3);
+    CHECK(tensileStudentT95(1000) > 1.959964);
+    CHECK(tensileStudentT95(1000) < tensileStudentT95(31));
+  }
+
+  if (numFailures) {
+    printf("%d check(s) failed\n", numFailures);
+    return EXIT_FAILURE;
+  }
+  printf("PASSED\n");
+  return EXIT_SUCCESS;
+}
@@ -0,0 +1,37 @@
+// CPU unit test for the binary problem sizes reader in Source/ProblemSizesFile.h
+// built and run by test_problem_sizes_file.py; prints the file contents as text
+
+#include "ProblemSizesFile.h"
+#include <cstdio>
+#include <cstdlib>
+
+int main(int argc, char *argv[]) {
+  if (argc < 2) {
+    printf("usage: %s ProblemSizes.bin\n", argv[0]);
+    return EXIT_FAILURE;
+  }
+  TensileProblemSizesFile file;
+  if (!file.open(argv[1])) {
+    printf("ERROR %s\n", file.error().c_str());
+    return EXIT_FAILURE;
+  }
+  printf("NumIndices %u\n", file.numIndices());
+  printf("NumProblems %llu\n", static_cast<unsigned long long>(file.numProblems()));
+  printf("MaxSizes %llu %llu %llu\n",
+      static_cast<unsigned long long>(file.maxSizeC()),
+      static_cast<unsigned long long>(file.maxSizeA()),
+      static_cast<unsigned long long>(file.maxSizeB()));
+  printf("MinStrides");
+  for (unsigned int i = 0; i < file.numIndices(); i++) {
+    printf(" %u", file.minStrides()[i]);
+  }
+  printf("\n");
+  for (unsigned long long p = 0; p < file.numProblems(); p++) {
+    const unsigned int *sizes = file.problem(p);
+    for (unsigned int i = 0; i < file.numIndices(); i++) {
+      printf(i ? " %u" : "%u", sizes[i]);
+    }
+    printf("\n");
+  }
+  return EXIT_SUCCESS;
+}
@@ -0,0 +1,174 @@
+// CPU unit test comparing the blocked, multithreaded reference in
+// Source/ReferenceCPU.h against the naive walk; built and run by
+// test_reference_cpu.py for the host only runtime
+
+#include "ReferenceCPU.h"
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+
+int numFailures = 0;
+
+struct Contraction {
+  const char *name;
+  unsigned int totalIndices;
+  unsigned int numIndicesC;
+  unsigned int numIndicesAB;
+  std::vector<unsigned int> sizes;
+  std::vector<unsigned int> minStrides;
+  std::vector<unsigned int> indexAssignmentsA;
+  std::vector<unsigned int> indexAssignmentsB;
+};
+
+// elements spanned by a tensor whose indices are laid out like the reference
+size_t tensorElements(const Contraction &c, const unsigned int *indices,
+    unsigned int numIndices) {
+  size_t elements = 1;
+  for (unsigned int i = 0; i < numIndices; i++) {
+    elements *= std::max(c.sizes[indices[i]], c.minStrides[indices[i]]);
+  }
+  return elements;
+}
+
+template< typename Type >
+void fill(std::vector<Type> &data) {
+  for (size_t i = 0; i < data.size(); i++) {
+    data[i] = static_cast<Type>((rand()%7) - 3);
+  }
+}
+
+template< typename Type, typename DestType >
+TensileStatus reference(bool naive, const Contraction &c, DestType *dataC,
+    const Type *dataA, const Type *dataB, size_t validationStride,
+    bool useHighPrecisionAccumulate, unsigned int numThreads) {
+  const unsigned int noStride = std::numeric_limits<unsigned int>::max();
+  DestType alpha = static_cast<DestType>(2);
+  DestType beta = static_cast<DestType>(-1);
+  if (naive) {
+    return tensileReferenceCPUNaive<Type, DestType>(dataC, dataA, dataB,
+        noStride, noStride, noStride, alpha, beta, c.totalIndices,
+        c.sizes.data(), c.minStrides.data(), c.numIndicesC, c.numIndicesAB,
+        c.indexAssignmentsA.data(), c.indexAssignmentsB.data(), false, false,
+        validationStride, useHighPrecisionAccumulate);
+  }
+  return tensileReferenceCPU<Type, DestType>(dataC, dataA, dataB,
+      noStride, noStride, noStride, alpha, beta, c.totalIndices,
+      c.sizes.data(), c.minStrides.data(), c.numIndicesC, c.numIndicesAB,
+      c.indexAssignmentsA.data(), c.indexAssignmentsB.data(), false, false,
+      validationStride, useHighPrecisionAccumulate, numThreads);
+}
+
+// the blocked reference matches the naive one bit for bit
+template< typename Type, typename DestType >
+void check(const Contraction &c, size_t validationStride,
+    bool useHighPrecisionAccumulate, unsigned int numThreads) {
+  std::vector<unsigned int> indicesC;
+  for (unsigned int i = 0; i < c.numIndicesC; i++) {
+    indicesC.push_back(i);
+  }
+  std::vector<Type> dataA(tensorElements(c, c.indexAssignmentsA.data(),
+      c.numIndicesAB));
+  std::vector<Type> dataB(tensorElements(c, c.indexAssignmentsB.data(),
+      c.numIndicesAB));
+  std::vector<DestType> naiveC(tensorElements(c, indicesC.data(),
+      c.numIndicesC));
+  fill(dataA);
+  fill(dataB);
+  fill(naiveC);
+  std::vector<DestType> blockedC(naiveC);
+
+  reference<Type, DestType>(true, c, naiveC.data(), dataA.data(),
+      dataB.data(), validationStride, useHighPrecisionAccumulate, 0);
+  TensileStatus status = reference<Type, DestType>(false, c, blockedC.data(),
+      dataA.data(), dataB.data(), validationStride,
+      useHighPrecisionAccumulate, numThreads);
+  bool equal = status == tensileStatusSuccess && memcmp(naiveC.data(),
+      blockedC.data(), naiveC.size()*sizeof(DestType)) == 0;
+  if (!equal) {
+    printf("FAILED %s validationStride=%zu threads=%u\n", c.name,
+        validationStride, numThreads);
+    numFailures++;
+  }
+}
+
+template< typename Type, typename DestType >
+void checkAll(const Contraction &c, bool useHighPrecisionAccumulate=false) {
+  unsigned int threads[] = { 1, 3, 8 };
+  size_t validationStrides[] = { 1, 7, 101 };
+  for (unsigned int t = 0; t < 3; t++) {
+    for (unsigned int v = 0; v < 3; v++) {
+      check<Type, DestType>(c, validationStrides[v],
+          useHighPrecisionAccumulate, threads[t]);
+    }
+  }
+}
+
+// milliseconds each reference takes for one problem
+template< typename Type >
+void timeReferences(const Contraction &c, size_t validationStride) {
+  std::vector<unsigned int> indicesC;
+  for (unsigned int i = 0; i < c.numIndicesC; i++) {
+    indicesC.push_back(i);
+  }
+  std::vector<Type> dataA(tensorElements(c, c.indexAssignmentsA.data(),
+      c.numIndicesAB));
+  std::vector<Type> dataB(tensorElements(c, c.indexAssignmentsB.data(),
+      c.numIndicesAB));
+  std::vector<Type> dataC(tensorElements(c, indicesC.data(), c.numIndicesC));
+  fill(dataA);
+  fill(dataB);
+  double ms[2];
+  for (unsigned int naive = 0; naive < 2; naive++) {
+    auto start = std::chrono::steady_clock::now();
+    reference<Type, Type>(naive == 1, c, dataC.data(), dataA.data(),
+        dataB.data(), validationStride, false, 0);
+    ms[naive] = std::chrono::duration<double, std::milli>(
+        std::chrono::steady_clock::now() - start).count();
+  }
+  printf("TIME %s validationStride=%zu naive %.1f ms blocked %.1f ms (%u threads)\n",
+      c.name, validationStride, ms[1], ms[0],
+      std::max(1u, std::thread::hardware_concurrency()));
+}
+
+int main(int argc, char *argv[]) {
+  // Cijk_Ailk_Bjlk: sizes not multiples of the tile, summation not of the block
+  Contraction gemm = { "Cijk_Ailk_Bjlk", 4, 3, 3, { 37, 29, 3, 300 },
+      { 0, 0, 0, 0 }, { 0, 3, 2 }, { 1, 3, 2 } };
+  checkAll<float, float>(gemm);
+  checkAll<double, double>(gemm);
+
+  // Cijk_Alik_Bljk with padded leading dimensions
+  Contraction padded = { "Cijk_Alik_Bljk", 4, 3, 3, { 20, 35, 2, 17 },
+      { 24, 40, 0, 19 }, { 3, 0, 2 }, { 1, 3, 2 } };
+  checkAll<float, float>(padded);
+
+  // two summation indices, free index 1 in A and a batch index in both
+  Contraction twoSums = { "Cijk_AmjlK_BiklM", 5, 3, 4, { 9, 21, 3, 5, 6 },
+      { 0, 0, 0, 0, 0 }, { 4, 1, 3, 2 }, { 0, 3, 2, 4 } };
+  checkAll<float, float>(twoSums);
+
+  // one free index: a dot product per batch
+  Contraction dot = { "Ci_Aij_Bij", 2, 1, 2, { 50, 77 }, { 0, 0 },
+      { 0, 1 }, { 0, 1 } };
+  checkAll<double, double>(dot);
+
+#ifdef Tensile_ENABLE_HALF
+  // half accumulating in float
+  checkAll<TensileHalf, TensileHalf>(gemm, true);
+#endif
+
+  if (argc > 1) {
+    Contraction large = { "Cijk_Ailk_Bjlk", 4, 3, 3, { 256, 256, 1, 256 },
+        { 0, 0, 0, 0 }, { 0, 3, 2 }, { 1, 3, 2 } };
+    timeReferences<float>(large, 1);
+    timeReferences<float>(large, 131);
+  }
+
+  if (numFailures) {
+    printf("%d checks FAILED\n", numFailures);
+    return 1;
+  }
+  printf("PASSED\n");
+  return 0;
+}
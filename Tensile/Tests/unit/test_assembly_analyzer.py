@@ -0,0 +1,143 @@
+from Tensile.AssemblyAnalyzer import analyzeAssembly, analyzeKernel, \
+    getOccupancy
+from Tensile.Common import globalParameters
+from Tensile.KernelWriterAssembly import KernelWriterAssembly
+from Tensile.RegisterPoolBenchmark import captureTraces
+
+kernelHeader = """
+.hsa_code_object_isa 9, 0, 0, "AMD", "AMDGPU"
+.amdgpu_hsa_kernel TestKernel
+TestKernel:
+.amd_kernel_code_t
+  workitem_vgpr_count = %u // vgprs
+  wavefront_sgpr_count = %u // sgprs
+  workgroup_group_segment_byte_size = %u // lds bytes
+.end_amd_kernel_code_t
+"""
+
+kernelBody = """
+/* v[100] in a comment is ignored */
+.set vgprValuC, 0
+.set vgprValuA, 16
+.set sgprSrdA, 8
+.macro _v_add_co_u32 dst, cc, src0, src1, dpp=
+   v_add_u32 \\dst, \\cc, \\src0, \\src1 \\dpp
+.endm
+.macro MAC_2x2 vgprA
+v_mac_f32 v[vgprValuC+0], v[\\vgprA+0], v[\\vgprA+2]
+v_mac_f32 v[vgprValuC+3], v[\\vgprA+1], v[\\vgprA+3] // v[200]
+.endm
+.macro UNUSED
+v_mov_b32 v250, 0
+.endm
+label_0001:
+MAC_2x2 vgprValuA
+_v_add_co_u32 v[vgprValuA+4], vcc, 0x4, v5
+s_load_dwordx4 s[sgprSrdA:sgprSrdA+3], s[0:1], 0x0
+ds_read_b128 v[vgprValuA:vgprValuA+3], v20 offset:256
+.if 0
+v_mov_b32 v240, 0
+.else
+s_mov_b32 s30, 0
+.endif
+s_waitcnt lgkmcnt(0)
+s_cbranch_scc1 label_0001
+"""
+
+def test_assembly_analyzer_parse():
+ text = kernelHeader % (24, 32, 4096) + kernelBody
+ resources = analyzeAssembly(text)
+ assert resources.errors == []
+ assert resources.kernelName == "TestKernel"
+ assert resources.isa == (9,0,0)
+ assert resources.declaredVgprs() == 24
+ assert resources.declaredSgprs() == 32
+ assert resources.ldsBytes() == 4096
+ assert resources.vgprHighWater == 21
+ assert resources.sgprHighWater == 31
+ assert resources.instructionCounts == { "v_mac_f32": 2, "v_add_u32": 1, \
+     "s_load_dwordx4": 1, "ds_read_b128": 1, "s_mov_b32": 1, "s_waitcnt": 1, \
+     "s_cbranch_scc1": 1 }
+ counts = resources.categoryCounts()
+ assert counts["VALU"] == 3
+ assert counts["SMEM"] == 1
+ assert counts["LDS"] == 1
+ assert counts["SALU"] == 1
+ assert counts["Control"] == 1
+ assert counts["Branch"] == 1
+ assert resources.check(256) == []
+
+def test_assembly_analyzer_check():
+ # declares fewer registers than it uses
+ resources = analyzeAssembly(kernelHeader % (16, 32, 0) + kernelBody)
+ problems = resources.check(256)
+ assert len(problems) == 1
+ assert "uses 21 vgprs but declares 16" in problems[0]
+
+ resources = analyzeAssembly(kernelHeader % (24, 32, 4096) + kernelBody \
+     + "v_mov_b32 v[vgprUnknown], 0\n")
+ assert len(resources.errors) == 1
+ assert len(resources.check(256)) == 1
+
+ resources = analyzeAssembly(kernelHeader % (24, 32, 16000) + kernelBody)
+ assert resources.occupancy(256) == (4, "LDS")
+ assert resources.check(256, 4) == []
+ assert "occupancy 4 < 5" in resources.check(256, 5)[0]
+
+ resources = analyzeAssembly(kernelHeader % (300, 32, 0) + kernelBody)
+ assert "300 vgprs > 256" in resources.check(256)[0]
+
+def test_assembly_analyzer_occupancy():
+ # matches the vgpr table KernelWriterAssembly uses for 256-thread groups
+ vgprOccupancy = KernelWriterAssembly([], []).vgprOccupancy
+ for vgprs in range(1, 257):
+   (waves, limiter) = getOccupancy((9,0,0), 256, vgprs, 16, 0)
+   assert waves == vgprOccupancy[vgprs]
+ # 1024 threads need 4 waves on every simd
+ assert getOccupancy((9,0,0), 1024, 64, 16, 0) == (4, "Vgprs")
+ assert getOccupancy((9,0,0), 1024, 65, 16, 0)[0] == 0
+ # sgprs: 78+2 -> 80 fits 10 waves, 94+2 -> 96 fits 8
+ assert getOccupancy((9,0,0), 256, 24, 78, 0)[0] == 10
+ assert getOccupancy((9,0,0), 256, 24, 94, 0) == (8, "Sgprs")
+ assert getOccupancy((9,0,0), 256, 24, 101, 0)[0] == 0
+ # lds allocated in 512-byte granules
+ assert getOccupancy((9,0,0), 256, 24, 16, 16384) == (4, "LDS")
+ assert getOccupancy((9,0,0), 256, 24, 16, 16385) == (3, "LDS")
+ # small groups are limited by the work-group slots
+ assert getOccupancy((9,0,0), 64, 24, 16, 0) == (4, "WorkGroups")
+
+def test_assembly_analyzer_generated_kernels():
+ captureTraces() # sets up global parameters for kernel generation
+ from Tensile.RegisterPoolBenchmark import benchmarkProblemTypes, \
+     benchmarkKernelParameters
+ from Tensile.Common import defaultSolution, defaultBenchmarkCommonParameters
+ from Tensile.SolutionStructs import ProblemType, Solution
+ priorIsa = globalParameters["CurrentISA"]
+ globalParameters["CurrentISA"] = (9,0,0)
+ try:
+   numKernels = 0
+   for problemTypeConfig in benchmarkProblemTypes:
+     for overrides in benchmarkKernelParameters:
+       state = {}
+       for parameterDict in defaultBenchmarkCommonParameters:
+         for key in parameterDict:
+           state[key] = parameterDict[key][0]
+       state.update(defaultSolution)
+       state.update(overrides)
+       state["ProblemType"] = ProblemType(problemTypeConfig)
+       state["KernelLanguage"] = "Assembly"
+       state["ISA"] = (9,0,0)
+       solution = Solution(state)
+       if not solution["Valid"]:
+         continue
+       (resources, problems) = analyzeKernel(solution.getKernels()[0])
+       assert problems == []
+       assert resources.errors == []
+       assert 0 < resources.vgprHighWater <= resources.declaredVgprs()
+       assert 0 < resources.sgprHighWater <= resources.declaredSgprs()
+       assert resources.ldsBytes() > 0
+       assert resources.categoryCounts()["VMEM"] > 0
+       numKernels += 1
+   assert numKernels > 0
+ finally:
+   globalParameters["CurrentISA"] = priorIsa
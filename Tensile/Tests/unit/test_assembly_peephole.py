@@ -0,0 +1,161 @@
+from Tensile.AssemblyPeephole import peepholeAssembly, peepholeReport
+from Tensile.AssemblyAnalyzer import analyzeAssembly, generateAssembly
+from Tensile.Common import globalParameters
+from Tensile.RegisterPoolBenchmark import captureTraces
+
+header = """
+.set sgprStrides, 20
+.set sgprBeta, 24
+.set vgprSerial, 0
+.macro MAC_2x1
+v_mac_f32 v[vgprSerial+8], v4, v5
+v_mac_f32 v[vgprSerial+9], v6, v5
+.endm
+.macro _v_add_co_u32 dst, cc, src0, src1, dpp=
+   v_add_co_u32 \\dst, \\cc, \\src0, \\src1 \\dpp
+.endm
+.macro LOAD_A vgprDst
+ds_read_b32 v[\\vgprDst], v1 offset:0
+.endm
+"""
+
+def optimize(body):
+ (text, stats) = peepholeAssembly(header + body)
+ code = [line.split("//")[0].strip() for line in text[len(header):].split("\n")]
+ return ([line for line in code if line and not line.startswith("/*")], stats)
+
+def test_assembly_peephole_identity_fold():
+ (code, stats) = optimize("""
+s_mul_i32 s10, s[sgprStrides+0], 1  // stride
+s_lshl_b32 s10, s10, 0x3            // *= bpe
+v_lshrrev_b32 v2, 0, v[vgprSerial]
+""")
+ assert code == ["s_lshl_b32 s10, s[sgprStrides+0], 0x3", \
+     "v_mov_b32 v2, v[vgprSerial]"]
+ assert stats["IdentityOp"] == 2
+ assert stats["FoldMove"] == 1
+ assert stats["Removed"] == 1
+
+def test_assembly_peephole_fold_move():
+ (code, stats) = optimize("""
+s_mov_b32 s30, s[sgprBeta+0]
+s_or_b32 s30, s[sgprBeta+1], s30
+v_mov_b32 v3, v7
+_v_add_co_u32 v3, vcc, 4, v3
+""")
+ assert code == ["s_or_b32 s30, s[sgprBeta+1], s[sgprBeta+0]", \
+     "_v_add_co_u32 v3, vcc, 4, v7"]
+ assert stats["FoldMove"] == 2
+ # destination still read later, not overwritten, read as part of a range,
+ # second literal, or a vgpr source for a valu
+ for body in [ \
+     "s_mov_b32 s30, s1\ns_or_b32 s31, s30, s2\n", \
+     "s_mov_b32 s30, s1\ns_lshl_b64 s[30:31], s[30:31], 1\n", \
+     "s_mov_b32 s30, 0x1234\ns_add_u32 s30, s30, 0x5678\n", \
+     "v_mov_b32 v3, s1\nv_add_f32 v3, v3, v4\n", \
+     "v_mov_b32 v3, v7\nv_mac_f32 v3, v3, v4\n" ]:
+   (code, stats) = optimize(body)
+   assert stats["Removed"] == 0
+   assert len(code) == 2
+
+def test_assembly_peephole_self_move():
+ (code, stats) = optimize("""
+v_mov_b32 v[vgprSerial+2], v2
+s_mov_b64 s[20:21], s[sgprStrides:sgprStrides+1]
+s_mov_b32 s20, s21
+""")
+ assert code == ["s_mov_b32 s20, s21"]
+ assert stats["SelfMove"] == 2
+
+def test_assembly_peephole_dead_move():
+ (code, stats) = optimize("""
+v_mov_b32 v4, 0
+v_mov_b32 v6, 1.0
+v_mov_b32 v4, v5
+v_add_f32 v7, v4, v6
+""")
+ assert code == ["v_mov_b32 v6, 1.0", "v_mov_b32 v4, v5", "v_add_f32 v7, v4, v6"]
+ assert stats["DeadMove"] == 1
+ # read in between (directly or by a macro), partly overwritten, a new
+ # block or an exec change
+ for body in [ \
+     "v_mov_b32 v4, 0\nv_add_f32 v7, v4, v6\nv_mov_b32 v4, v5\n", \
+     "v_mov_b32 v4, 0\nMAC_2x1\nv_mov_b32 v4, v5\n", \
+     "v_mov_b32 v4, 0\nv_mac_f32 v4, v5, v6\n", \
+     "v_mov_b32 v4, 0\nLOAD_A 4\nv_mov_b32 v4, v5\n", \
+     "v_mov_b32 v4, 0\nlabel_0001:\nv_mov_b32 v4, v5\n", \
+     "v_mov_b32 v4, 0\nv_cmpx_lt_u32 vcc, v1, v2\nv_mov_b32 v4, v5\n", \
+     "s_mov_b64 s[20:21], 0\ns_mov_b32 s20, 1\n" ]:
+   (code, stats) = optimize(body)
+   assert stats["Removed"] == 0
+
+def test_assembly_peephole_merge_waitcnt():
+ (code, stats) = optimize("""
+s_waitcnt lgkmcnt(4) // wait for local read
+/* local write */
+s_waitcnt vmcnt(0)   // wait for global read
+s_waitcnt lgkmcnt(2)
+""")
+ assert code == ["s_waitcnt lgkmcnt(2) & vmcnt(0)"]
+ assert stats["MergeWaitcnt"] == 2
+ (code, stats) = optimize("s_waitcnt lgkmcnt(0)\ns_barrier\ns_waitcnt lgkmcnt(0)\n")
+ assert stats["Removed"] == 0
+
+def test_assembly_peephole_redundant_waitcnt():
+ (code, stats) = optimize("""
+s_waitcnt lgkmcnt(0) & vmcnt(2)
+MAC_2x1
+buffer_load_dword v10, v1, s[12:15], 0, offen offset:0
+s_waitcnt lgkmcnt(1)
+MAC_2x1
+s_waitcnt vmcnt(2)
+""")
+ assert code == ["s_waitcnt lgkmcnt(0) & vmcnt(2)", "MAC_2x1", \
+     "buffer_load_dword v10, v1, s[12:15], 0, offen offset:0", "MAC_2x1", \
+     "s_waitcnt vmcnt(2)"]
+ assert stats["RedundantWaitcnt"] == 1
+ # lds read issued by a macro
+ (code, stats) = optimize("s_waitcnt lgkmcnt(0)\nLOAD_A 10\ns_waitcnt lgkmcnt(0)\n")
+ assert stats["Removed"] == 0
+ assert "Peephole k: 3 -> 3 instructions" == peepholeReport("k", stats)
+
+def test_assembly_peephole_generated_kernels():
+ captureTraces() # sets up global parameters for kernel generation
+ from Tensile.RegisterPoolBenchmark import benchmarkProblemTypes, \
+     benchmarkKernelParameters
+ from Tensile.Common import defaultSolution, defaultBenchmarkCommonParameters
+ from Tensile.SolutionStructs import ProblemType, Solution
+ priorIsa = globalParameters["CurrentISA"]
+ globalParameters["CurrentISA"] = (9,0,0)
+ try:
+   numRemoved = 0
+   for problemTypeConfig in benchmarkProblemTypes:
+     for overrides in benchmarkKernelParameters:
+       state = {}
+       for parameterDict in defaultBenchmarkCommonParameters:
+         for key in parameterDict:
+           state[key] = parameterDict[key][0]
+       state.update(defaultSolution)
+       state.update(overrides)
+       state["ProblemType"] = ProblemType(problemTypeConfig)
+       state["KernelLanguage"] = "Assembly"
+       state["ISA"] = (9,0,0)
+       solution = Solution(state)
+       if not solution["Valid"]:
+         continue
+       (error, text) = generateAssembly(solution.getKernels()[0])
+       (optimizedText, stats) = peepholeAssembly(text)
+       resources = analyzeAssembly(text)
+       optimizedResources = analyzeAssembly(optimizedText)
+       assert optimizedResources.errors == []
+       assert stats["Instructions"] == resources.numInstructions()
+       assert optimizedResources.numInstructions() \
+           == resources.numInstructions() - stats["Removed"]
+       assert optimizedResources.vgprHighWater <= resources.vgprHighWater
+       assert optimizedResources.sgprHighWater <= resources.sgprHighWater
+       assert optimizedResources.codeProperties == resources.codeProperties
+       numRemoved += stats["Removed"]
+   # every kernel ors the two halves of beta through a temporary
+   assert numRemoved > 0
+ finally:
+   globalParameters["CurrentISA"] = priorIsa
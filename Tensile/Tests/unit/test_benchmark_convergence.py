@@ -0,0 +1,16 @@
+import os
+import subprocess
+import pytest
+import Tensile.Tensile as Tensile
+from Tensile.Common import globalParameters, locateExe
+
+def test_benchmark_convergence_cpu(tmpdir):
+ compiler = locateExe("/usr/bin", "g++")
+ if compiler is None:
+   pytest.skip("no host c++ compiler")
+ source = Tensile.TensileTestPath("unit/BenchmarkConvergenceTest.cpp")
+ exe = os.path.join(tmpdir.strpath, "BenchmarkConvergenceTest")
+ subprocess.check_call([compiler, "-std=c++11", "-Wall", \
+     "-I", globalParameters["SourcePath"], source, "-o", exe])
+ output = subprocess.check_output([exe])
+ assert "PASSED" in output
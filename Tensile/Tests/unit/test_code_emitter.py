@@ -0,0 +1,33 @@
+from StringIO import StringIO
+from Tensile.KernelWriter import CodeEmitter
+
+def test_code_emitter_append():
+ kStr = CodeEmitter()
+ kStr += "a\n"
+ kStr += ""
+ kStr += "b\n"
+ inner = CodeEmitter("c\n")
+ inner += "d\n"
+ kStr += inner
+ assert kStr.getvalue() == "a\nb\nc\nd\n"
+ assert str(kStr) == "a\nb\nc\nd\n"
+ assert len(kStr) == 8
+ assert CodeEmitter().getvalue() == ""
+
+def test_code_emitter_insert():
+ kStr = CodeEmitter("prefix\n")
+ mark = kStr.mark()
+ kStr += "body\n"
+ kStr += "suffix\n"
+ kStr.insert(mark, "signature\n")
+ assert kStr.getvalue() == "prefix\nsignature\nbody\nsuffix\n"
+
+def test_code_emitter_write():
+ kStr = CodeEmitter()
+ for i in range(0, 1000):
+   kStr += "v_mov_b32 v%u, 0\n" % i
+ outputFile = StringIO()
+ kStr.writeTo(outputFile)
+ assert outputFile.getvalue() == kStr.getvalue()
+ assert outputFile.getvalue() \
+     == "".join(["v_mov_b32 v%u, 0\n" % i for i in range(0, 1000)])
@@ -0,0 +1,85 @@
+import os
+import yaml
+from Tensile.CompareRuns import CompareRuns, Comparison, readRun
+
+problemType = {"OperationType": "GEMM", "DataType": "s", "TransposeA": False, \
+    "TransposeB": True, "UseBeta": True, "Batched": True}
+
+def state(macroTile):
+ return {"ProblemType": problemType, "MacroTile0": macroTile, \
+     "MacroTile1": macroTile, "SolutionIndex": 0}
+
+# sizes: {size: [(gflops, relativeCI) per macro tile]}
+def writeBenchmarkData(path, macroTiles, sizes):
+ os.makedirs(path)
+ with open(os.path.join(path, "Cijk_Ailk_Bjlk_SB_00.yaml"), "w") as f:
+   yaml.safe_dump([{"MinimumRequiredVersion": "4.2.0"}, \
+       {"ProblemSizes": [{"Exact": list(s)} for s in sizes]}] \
+       + [state(mt) for mt in macroTiles], f)
+ names = ["MT%u" % mt for mt in macroTiles]
+ with open(os.path.join(path, "Cijk_Ailk_Bjlk_SB_00.csv"), "w") as f:
+   f.write("GFlops, SizeI, SizeJ, SizeK, SizeL, TotalFlops, %s, %s\n" \
+       % (", ".join(names), ", ".join(["RelativeCI_" + n for n in names])))
+   for (size, results) in sorted(sizes.items()):
+     f.write("0, %s, 0, %s, %s\n" % (", ".join(map(str, size)), \
+         ", ".join([str(g) for (g, ci) in results]), \
+         ", ".join([str(ci) for (g, ci) in results])))
+ return path
+
+def writeLogic(path, macroTiles, exactLogic):
+ os.makedirs(path)
+ states = [dict(state(mt), SolutionNameMin="MT%u" % mt, SolutionIndex=i) \
+     for (i, mt) in enumerate(macroTiles)]
+ with open(os.path.join(path, "vega10_Cijk_Ailk_Bjlk_SB.yaml"), "w") as f:
+   yaml.safe_dump([{"MinimumRequiredVersion": "4.2.0"}, "vega10", "gfx900", \
+       ["Device 6863"], problemType, states, [0, 1, 2, 3], exactLogic, \
+       [[-1, [[-1, [[-1, [[-1, 0]]]]]]]]], f)
+ return path
+
+def test_compare_benchmark_data(tmpdir, capsys):
+ path = str(tmpdir)
+ baseline = writeBenchmarkData(os.path.join(path, "old"), [64, 128], {
+     (512, 512, 1, 512): [(1000.0, 0.01), (2000.0, 0.01)],
+     (1024, 1024, 1, 1024): [(3000.0, 0.01), (4000.0, 0.10)],
+     (256, 256, 1, 256): [(500.0, 0.01), (400.0, 0.01)],
+     (128, 128, 1, 128): [(100.0, 0.01), (90.0, 0.01)]})
+ # solutions in another order; 512 slows beyond noise, 1024 within its CI,
+ # 256 changes winner and 128 is gone
+ candidate = writeBenchmarkData(os.path.join(path, "new"), [128, 64], {
+     (512, 512, 1, 512): [(1800.0, 0.01), (1000.0, 0.01)],
+     (1024, 1024, 1, 1024): [(3700.0, 0.10), (3000.0, 0.01)],
+     (256, 256, 1, 256): [(600.0, 0.01), (450.0, 0.01)],
+     (2048, 2048, 1, 2048): [(5000.0, 0.01), (4000.0, 0.01)]})
+ comparison = Comparison(readRun([baseline]), readRun([candidate]), 0.02)
+ sizes = dict([(s.size[0], s) for s in comparison.sizes])
+ assert sorted(sizes) == [256, 512, 1024]
+ assert (comparison.baselineOnly, comparison.candidateOnly) == (1, 1)
+ assert sizes[512].significant and abs(sizes[512].speedup - 0.9) < 1e-9
+ assert not sizes[1024].significant
+ assert sizes[256].significant and sizes[256].winnerChanged
+ assert not sizes[512].winnerChanged
+ assert [s.size[0] for s in comparison.regressions(0.05)] == [512]
+ assert comparison.regressions(0.15) == []
+ # MT128 slower on 512 and faster on 256, MT64 slower on 256
+ assert (comparison.numSolutionPairs, comparison.numSolutionsSlower, \
+     comparison.numSolutionsFaster) == (6, 2, 1)
+ assert comparison.librarySpeedup() < 1
+
+ assert CompareRuns([baseline, candidate, "--threshold", "0.05", "--csv", \
+     os.path.join(path, "compare.csv")]) == 1
+ output = capsys.readouterr()[0]
+ assert "Winners changed: 1" in output and "FAILED" in output
+ assert len(open(os.path.join(path, "compare.csv")).readlines()) == 4
+ assert CompareRuns([baseline, candidate, "--threshold", "0.2"]) == 0
+
+def test_compare_library_logic(tmpdir, capsys):
+ path = str(tmpdir)
+ baseline = writeLogic(os.path.join(path, "old"), [64, 128], \
+     [[[64, 64, 1, 64], [0, 100.0]], [[128, 128, 1, 128], [1, 200.0]]])
+ candidate = writeLogic(os.path.join(path, "new"), [128, 64], \
+     [[[64, 64, 1, 64], [0, 101.0]], [[128, 128, 1, 128], [0, 201.0]]])
+ comparison = Comparison(readRun([baseline]), readRun([candidate]), 0.02)
+ assert [s.significant for s in comparison.sizes] == [False, False]
+ assert [s.winnerChanged for s in comparison.sizes] == [True, False]
+ assert CompareRuns([baseline, candidate]) == 0
+ assert "PASSED" in capsys.readouterr()[0]
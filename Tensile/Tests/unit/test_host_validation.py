@@ -0,0 +1,94 @@
+import os
+import pytest
+from Tensile.Common import globalParameters, locateExe, defaultSolution, \
+    defaultBenchmarkCommonParameters
+from Tensile.HostValidation import validateOnHost, runHostValidation, \
+    reportHostValidation
+from Tensile.RegisterPoolBenchmark import captureTraces
+from Tensile.SolutionStructs import Solution
+
+def solutionConfig(overrides, dataType="s"):
+ state = {}
+ for parameterDict in defaultBenchmarkCommonParameters:
+   for key in parameterDict:
+     state[key] = parameterDict[key][0]
+ state.update(defaultSolution)
+ state.update(overrides)
+ state["ProblemType"] = {"OperationType": "GEMM", "DataType": dataType, \
+     "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True}
+ state["KernelLanguage"] = "Source"
+ return state
+
+configs = [
+   ({"ThreadTile": [ 4, 4 ], "WorkGroup": [ 8, 8, 1 ], "DepthU": 8, \
+       "EdgeType": "ShiftPtr"}, "s"),
+   # atomic accumulation after the beta-only kernel
+   ({"ThreadTile": [ 4, 4 ], "WorkGroup": [ 8, 8, 1 ], "DepthU": 16, \
+       "GlobalSplitU": 2, "EdgeType": "ShiftPtr"}, "s"),
+   # local split u reduces through lds
+   ({"ThreadTile": [ 2, 2 ], "WorkGroup": [ 8, 8, 2 ], "DepthU": 16, \
+       "PrefetchGlobalRead": False, "EdgeType": "ShiftPtr"}, "s"),
+   ({"ThreadTile": [ 4, 2 ], "WorkGroup": [ 16, 8, 1 ], "DepthU": 8, \
+       "VectorWidth": 1, "EdgeType": "Branch"}, "s"),
+   ({"ThreadTile": [ 2, 2 ], "WorkGroup": [ 8, 8, 1 ], "DepthU": 8, \
+       "EdgeType": "ShiftPtr"}, "d"),
+   ]
+
+# edges in every dimension, batches and a single element
+problemSizes = [(64, 64, 1, 64), (33, 17, 2, 40), (1, 1, 1, 1)]
+
+def test_host_validation(tmpdir, capsys):
+ if locateExe("/usr/bin", "g++") is None or locateExe("/usr/bin", "make") is None:
+   pytest.skip("no host c++ compiler or make")
+ captureTraces() # sets up global parameters for solutions
+ path = str(tmpdir)
+ solutions = [Solution(solutionConfig(c, t)) for (c, t) in configs]
+ assert all([s["Valid"] for s in solutions])
+ # the writers take HIP and split files from the run context, not globals
+ priorParameters = (globalParameters["RuntimeLanguage"], \
+     globalParameters["MergeFiles"])
+ globalParameters["RuntimeLanguage"] = "OCL"
+ globalParameters["MergeFiles"] = True
+ try:
+   results = validateOnHost(path, solutions, problemSizes)
+   assert (globalParameters["RuntimeLanguage"], \
+       globalParameters["MergeFiles"]) == ("OCL", True)
+ finally:
+   (globalParameters["RuntimeLanguage"], globalParameters["MergeFiles"]) \
+       = priorParameters
+ assert len(results) == len(configs)
+ assert all([r.built for r in results])
+ assert [(r.numPassed, r.numFailed) for r in results] \
+     == [(len(problemSizes), 0)] * len(configs)
+
+ # without its barriers a work-item reads lds its neighbours have not written
+ kernelFileName = [f for f in os.listdir(path) \
+     if "_K1_" in f and f.endswith(".cpp") and "Validate_" not in f][0]
+ kernelFileName = os.path.join(path, kernelFileName)
+ source = open(kernelFileName).read()
+ assert "__syncthreads();" in source
+ with open(kernelFileName, "w") as f:
+   f.write(source.replace("__syncthreads();", ";"))
+ solutionNames = [r.solutionName for r in results]
+ results = runHostValidation(path, solutionNames)
+ assert all([r.built for r in results])
+ assert not all([r.passed() for r in results])
+
+ # a kernel that does not compile fails its solutions' build, not the others
+ with open(kernelFileName, "a") as f:
+   f.write("not c++\n")
+ results = runHostValidation(path, solutionNames)
+ notBuilt = [r for r in results if not r.built]
+ assert len(notBuilt) == 1 and not notBuilt[0].completed
+ assert [r.passed() for r in results if r.built] == [True] * (len(configs) - 1)
+ capsys.readouterr()
+ reportHostValidation(path, results)
+ output = capsys.readouterr()[0]
+ assert "%s: FAILED to build" % notBuilt[0].solutionName in output
+ assert "not c++" in output # the make output
+
+ # make failing before it builds anything
+ with open(os.path.join(path, "Makefile"), "w") as f:
+   f.write("all:\n\tfalse\n")
+ results = runHostValidation(path, solutionNames)
+ assert [r.built for r in results] == [False] * len(configs)
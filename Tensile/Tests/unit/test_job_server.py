@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+import multiprocessing
+import pytest
+from distutils.spawn import find_executable
+from Tensile.JobServer import JobServer
+
+# logs when it ran, taking extra tokens from the jobserver in MAKEFLAGS like
+# a make -j would
+fakeTool = """
+import os, re, sys, time
+(logFileName, seconds, extraTokens) = (sys.argv[1], float(sys.argv[2]), int(sys.argv[3]))
+(readFd, writeFd) = [int(fd) for fd in \\
+    re.search(r"--jobserver-auth=(\\d+),(\\d+)", os.environ["MAKEFLAGS"]).groups()]
+tokens = [os.read(readFd, 1) for i in range(0, extraTokens)]
+start = time.time()
+time.sleep(seconds)
+end = time.time()
+for token in tokens:
+  os.write(writeFd, token)
+with open(logFileName, "a") as log:
+  log.write("%f %f %u\\n" % (start, end, 1 + extraTokens))
+"""
+
+def fakeCommand(path, seconds, extraTokens=0):
+ fileName = os.path.join(path, "tool.py")
+ if not os.path.exists(fileName):
+   with open(fileName, "w") as f:
+     f.write(fakeTool)
+ return [sys.executable, fileName, os.path.join(path, "log.txt"), \
+     str(seconds), str(extraTokens)]
+
+# most tokens the logged tool runs held at once
+def peakTokens(path):
+ runs = [[float(x) for x in line.split()] \
+     for line in open(os.path.join(path, "log.txt"))]
+ edges = sorted([(start, tokens) for (start, end, tokens) in runs] \
+     + [(end, -tokens) for (start, end, tokens) in runs])
+ (held, peak) = (0, 0)
+ for (t, change) in edges:
+   held += change
+   peak = max(peak, held)
+ return (len(runs), peak)
+
+def runAll(server, commands):
+ threads = [threading.Thread(target=server.run, args=(c, "Fake")) \
+     for c in commands]
+ for thread in threads:
+   thread.start()
+ for thread in threads:
+   thread.join()
+
+def test_tokens_bound_jobs(tmpdir):
+ path = str(tmpdir)
+ server = JobServer(2)
+ runAll(server, [fakeCommand(path, 0.1) for i in range(0, 6)])
+ assert peakTokens(path) == (6, 2)
+ (utilization, peak) = server.utilization()
+ assert peak == 2 and utilization > 0.5
+ (count, running, waiting) = server.summarize()["Fake"]
+ assert count == 6 and running >= 0.6 and waiting > 0
+
+def test_children_share_tokens(tmpdir):
+ path = str(tmpdir)
+ # each tool runs with the token of its job and takes one more from the
+ # pipe, so of 3 tokens only one tool has both at a time
+ server = JobServer(3)
+ runAll(server, [fakeCommand(path, 0.1, 1) for i in range(0, 2)])
+ assert peakTokens(path) == (2, 2)
+ # all tokens came back
+ assert [server.readToken() for i in range(0, 3)] == ["+"] * 3
+
+def test_nested_jobs_reuse_token(tmpdir):
+ path = str(tmpdir)
+ server = JobServer(1)
+ with server.job("GenerateKernel"):
+   assert server.run(fakeCommand(path, 0.01), "Assemble") == 0
+ summary = server.summarize()
+ assert summary["GenerateKernel"][0] == 1 and summary["Assemble"][0] == 1
+ assert server.utilization()[1] == 1
+
+def test_join_make_job_server():
+ server = JobServer(3)
+ joined = JobServer.fromMakeFlags(" -j3 " + server.makeFlags[3:])
+ assert (joined.readFd, joined.writeFd) == (server.readFd, server.writeFd)
+ assert joined.tokens == 3
+ # the token make started Tensile with is used before the pipe's
+ assert not joined.acquire() and joined.local.token is None
+ joined.release()
+ assert JobServer.fromMakeFlags("-j4") is None
+
+def test_forked_workers_share_make_tokens(tmpdir):
+ path = str(tmpdir)
+ # make -j3 keeps one token for the Tensile it starts and puts 2 in the pipe
+ (readFd, writeFd) = os.pipe()
+ os.write(writeFd, "++")
+ joined = JobServer.fromMakeFlags("-j3 --jobserver-auth=%u,%u" \
+     % (readFd, writeFd))
+ # like the code generation workers; the parent keeps its implicit token
+ workers = [multiprocessing.Process(target=joined.run, \
+     args=(fakeCommand(path, 0.2), "Fake")) for i in range(0, 4)]
+ for worker in workers:
+   worker.start()
+ for worker in workers:
+   worker.join()
+ assert [w.exitcode for w in workers] == [0] * 4
+ assert peakTokens(path) == (4, 2)
+ assert not joined.acquire() and joined.local.token is None
+ joined.release()
+
+@pytest.mark.skipif(find_executable("make") is None, reason="needs make")
+def test_make_uses_job_server(tmpdir):
+ path = str(tmpdir)
+ with open(os.path.join(path, "Makefile"), "w") as f:
+   f.write("all: a b c d\n")
+   for target in "abcd":
+     f.write("%s:\n\t@%s\n" % (target, " ".join(fakeCommand(path, 0.1))))
+ server = JobServer(4)
+ assert server.run(["make", "-s", "-C", path], "Build") == 0
+ assert peakTokens(path) == (4, 4)
+ os.remove(os.path.join(path, "log.txt"))
+ server = JobServer(2)
+ assert server.run(["make", "-s", "-C", path], "Build") == 0
+ assert peakTokens(path) == (4, 2)
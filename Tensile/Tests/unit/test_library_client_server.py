@@ -0,0 +1,169 @@
+import os
+import sys
+import pytest
+from Tensile.TensileBenchmarkLibraryClient import TensileBenchmarkLibraryClient, \
+    LibraryClientServer, BenchmarkError
+
+# speaks the library client --server protocol, logging its pid and device per
+# problem; crashes the first time it sees a size listed in argv[2]
+standInServer = """
+import os, sys, json, time
+assert sys.argv[-2:] == ["--server", "-"]
+log = open(sys.argv[1], "a")
+crashSizes = sys.argv[2].split(",") if len(sys.argv) > 4 else []
+device = sys.argv[sys.argv.index("--device-idx")+1] \\
+    if "--device-idx" in sys.argv else "-"
+problemIdx = 0
+for line in iter(sys.stdin.readline, ""):
+  tokens = line.split()
+  if not tokens or tokens[0].startswith("#"):
+    continue
+  if tokens[0] == "quit":
+    break
+  sizes = [int(size) for size in tokens[1:]]
+  crashFileName = sys.argv[1] + ".%u" % sizes[0]
+  if str(sizes[0]) in crashSizes and not os.path.exists(crashFileName):
+    open(crashFileName, "w").close()
+    sys.exit(1)
+  time.sleep(0.02)
+  log.write("%u %s\\n" % (os.getpid(), device))
+  log.flush()
+  sys.stdout.write("Initializing 1 MBytes...\\n")
+  gflops = [1.0] + [float(sizes[0] + i) for i in range(0, 3)]
+  print(json.dumps({"problem": problemIdx, "sizes": sizes, \\
+      "solution": "Cijk_Ailk_Bjlk_SB_MT64x64", "valid": True, \\
+      "gflops": gflops, "ms": [2.0*g for g in gflops], "apiUs": [1.0]*4}))
+  sys.stdout.flush()
+  problemIdx += 1
+"""
+
+# answers one problem, then exits like a server that crashed between problems
+oneShotServer = """
+import sys, json
+line = sys.stdin.readline()
+sizes = [int(size) for size in line.split()[1:]]
+print(json.dumps({"sizes": sizes, "gflops": [1.0, 2.0, 2.0], \\
+    "ms": [1.0, 2.0, 2.0]}))
+"""
+
+# answers 256 with the inf a C++ stream prints and 512 with a null time, then
+# waits for the next request like the real server
+nonFiniteServer = """
+import sys, json
+for line in iter(sys.stdin.readline, ""):
+  sizes = [int(size) for size in line.split()[1:]]
+  if sizes[0] == 256:
+    print('{"sizes": [256], "gflops": [inf, inf, inf], "ms": [0, 0, 0]}')
+  else:
+    ms = [None if sizes[0] == 512 else 1.0] * 3
+    print(json.dumps({"sizes": sizes, "gflops": [1.0, 2.0, 2.0], "ms": ms}))
+  sys.stdout.flush()
+"""
+
+def writeSizes(path, sizes):
+ sizesFileName = os.path.join(path, "sizes.csv")
+ with open(sizesFileName, "w") as f:
+   for size in sizes:
+     f.write("%u, %u, 1, 64\n" % (size, size))
+ return sizesFileName
+
+def serverCommand(path):
+ serverFileName = os.path.join(path, "server.py")
+ with open(serverFileName, "w") as f:
+   f.write(standInServer)
+ return [sys.executable, serverFileName, os.path.join(path, "log.txt")]
+
+def readLog(path):
+ return [line.split() for line in open(os.path.join(path, "log.txt"))]
+
+def test_library_client_server(tmpdir, capsys):
+ path = str(tmpdir)
+ sizesFileName = writeSizes(path, [128, 256, 512])
+ assert TensileBenchmarkLibraryClient(["--server", sizesFileName] \
+     + serverCommand(path)) == []
+ pids = [pid for (pid, device) in readLog(path)]
+ assert len(pids) == 3 and len(set(pids)) == 1
+ rows = [line.split(",") for line in capsys.readouterr()[0].splitlines() \
+     if line.startswith("   ")]
+ assert [int(row[0]) for row in rows] == [128, 256, 512]
+ # median and mean exclude the warmup sample
+ assert [float(row[4]) for row in rows] == [129.0, 257.0, 513.0]
+ assert [float(row[5]) for row in rows] == [258.0, 514.0, 1026.0]
+
+def test_library_client_devices(tmpdir, capsys):
+ path = str(tmpdir)
+ sizes = [64, 512, 128, 1024, 256, 32]
+ sizesFileName = writeSizes(path, sizes)
+ outputFileName = os.path.join(path, "results.csv")
+ # 256 crashes its server once and is retried
+ command = serverCommand(path) + ["256"]
+ assert TensileBenchmarkLibraryClient(["--server", "--devices", "0,1", \
+     "--output", outputFileName, sizesFileName] + command) == []
+ log = readLog(path)
+ assert len(log) == len(sizes)
+ assert set([device for (pid, device) in log]) == set(["0", "1"])
+ lines = open(outputFileName).read().splitlines()
+ assert lines[0].split()[0] == "size0,"
+ assert sorted([int(line.split(",")[0]) for line in lines[1:]]) \
+     == sorted(sizes)
+
+ # resume benchmarks only what the output does not have yet
+ writeSizes(path, sizes + [2048])
+ assert TensileBenchmarkLibraryClient(["--server", "--devices", "0,1", \
+     "--output", outputFileName, sizesFileName] + command) == []
+ assert len(readLog(path)) == len(sizes) + 1
+ lines = open(outputFileName).read().splitlines()
+ assert len(lines) == len(sizes) + 2
+ assert int(lines[-1].split(",")[0]) == 2048
+
+def test_library_client_retries(tmpdir, capsys):
+ path = str(tmpdir)
+ sizesFileName = writeSizes(path, [128, 256])
+ command = serverCommand(path) + ["256"]
+ failed = TensileBenchmarkLibraryClient(["--server", "--retries", "0", \
+     sizesFileName] + command)
+ assert [int(row[0]) for row in failed] == [256]
+ assert len(readLog(path)) == 1
+
+def oneShotCommand(path):
+ serverFileName = os.path.join(path, "oneshot.py")
+ with open(serverFileName, "w") as f:
+   f.write(oneShotServer)
+ return [sys.executable, serverFileName]
+
+def test_library_client_server_exits(tmpdir, capsys):
+ path = str(tmpdir)
+ command = " ".join(oneShotCommand(path))
+ server = LibraryClientServer(command)
+ assert server.benchmark(["128", "128", "1", "64"]) == ([2.0, 2.0], [2.0, 2.0])
+ server.process.wait()
+ with pytest.raises(BenchmarkError):
+   server.benchmark(["256", "256", "1", "64"])
+ server.kill()
+
+ # each size after the first one of a server fails and restarts it
+ sizesFileName = writeSizes(path, [128, 256, 512])
+ outputFileName = os.path.join(path, "results.csv")
+ failed = TensileBenchmarkLibraryClient(["--server", "--retries", "0", \
+     "--output", outputFileName, sizesFileName] + oneShotCommand(path))
+ assert [int(row[0]) for row in failed] == [256]
+ lines = open(outputFileName).read().splitlines()
+ assert sorted([int(line.split(",")[0]) for line in lines[1:]]) == [128, 512]
+
+ # retried on a restarted server the rest completes
+ assert TensileBenchmarkLibraryClient(["--server", "--output", \
+     outputFileName, sizesFileName] + oneShotCommand(path)) == []
+ lines = open(outputFileName).read().splitlines()
+ assert sorted([int(line.split(",")[0]) for line in lines[1:]]) \
+     == [128, 256, 512]
+
+def test_library_client_non_finite(tmpdir, capsys):
+ path = str(tmpdir)
+ serverFileName = os.path.join(path, "nonfinite.py")
+ with open(serverFileName, "w") as f:
+   f.write(nonFiniteServer)
+ sizesFileName = writeSizes(path, [128, 256, 512])
+ # fail instead of waiting for another answer
+ failed = TensileBenchmarkLibraryClient(["--server", "--retries", "0", \
+     sizesFileName, sys.executable, serverFileName])
+ assert sorted([int(row[0]) for row in failed]) == [256, 512]
@@ -0,0 +1,70 @@
+import os
+import imp
+import sys
+
+mergePath = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname( \
+    os.path.realpath(__file__)))), "Utilities", "merge_rocblas_yaml_files.py")
+merge = imp.load_source("merge_rocblas_yaml_files", mergePath)
+
+def solution(index, macroTile):
+ return {"SolutionIndex": index, "SolutionNameMin": "MT%u_%u" % (index, macroTile), \
+     "MacroTile0": macroTile, "ProblemType": {"DataType": 0, "Batched": True}}
+
+def libraryLogic(solutions, exactLogic, rangeLogic=None):
+ logic = merge.LibraryLogic()
+ logic.versionString = "4.2.0"
+ logic.scheduleName = "vega10"
+ logic.architectureName = "gfx900"
+ logic.deviceNames = ["Device 6863"]
+ logic.problemType = {"OperationType": "GEMM"}
+ logic.solutionStates = solutions
+ logic.indexOrder = [0, 1, 2, 3]
+ logic.exactLogic = exactLogic
+ logic.rangeLogic = rangeLogic
+ return logic
+
+def original():
+ return libraryLogic([solution(0, 32), solution(1, 64), solution(2, 128)], \
+     [[[64, 64, 1, 64], [1, 10.0]], [[128, 128, 1, 128], [2, 20.0]], \
+     [[256, 256, 1, 256], [2, 30.0]]], \
+     [[-1, [[-1, [[-1, [[-1, 0]]]]]]]])
+
+def exact():
+ # 128 is the original's solution 2 under another index, 256 is new
+ return libraryLogic([solution(0, 256), solution(1, 128)], \
+     [[[128, 128, 1, 128], [0, 25.0]], [[256, 256, 1, 256], [1, 31.0]], \
+     [[512, 512, 1, 512], [0, 40.0]]])
+
+def test_merge_logic():
+ merged = merge.MergeTensileLogicFiles(original(), exact())
+ assert [s["MacroTile0"] for s in merged.solutionStates] == [32, 64, 128, 256]
+ assert [s["SolutionIndex"] for s in merged.solutionStates] == [0, 1, 2, 3]
+ assert merged.exactLogic == [[[64, 64, 1, 64], [1, 10.0]], \
+     [[128, 128, 1, 128], [3, 25.0]], [[256, 256, 1, 256], [2, 31.0]], \
+     [[512, 512, 1, 512], [3, 40.0]]]
+ assert merged.rangeLogic == original().rangeLogic
+
+def test_merge_logic_drop_unused():
+ logic = original()
+ logic.rangeLogic = None
+ merged = merge.MergeTensileLogicFiles(logic, exact(), True)
+ assert [s["MacroTile0"] for s in merged.solutionStates] == [64, 128, 256]
+ assert [e[1][0] for e in merged.exactLogic] == [0, 2, 1, 2]
+ # solution 0 still wins the range logic
+ merged = merge.MergeTensileLogicFiles(original(), exact(), True)
+ assert [s["MacroTile0"] for s in merged.solutionStates] == [32, 64, 128, 256]
+
+def test_merge_logic_files(tmpdir, monkeypatch):
+ paths = [os.path.join(str(tmpdir), d) for d in ["orig", "exact", "out"]]
+ for path in paths[:2]:
+   os.makedirs(path)
+ for name in ["a.yaml", "b.yaml"]:
+   original().writeLibraryLogic(os.path.join(paths[0], name))
+   exact().writeLibraryLogic(os.path.join(paths[1], name))
+ monkeypatch.setattr(sys, "argv", ["merge", "--jobs", "2", \
+     "--drop-unused-solutions"] + paths)
+ merge.RunMergeTensileLogicFiles()
+ for name in ["a.yaml", "b.yaml"]:
+   merged = merge.LibraryLogic(os.path.join(paths[2], name))
+   assert len(merged.solutionStates) == 4
+   assert merged.exactLogic[1] == [[128, 128, 1, 128], [3, 25.0]]
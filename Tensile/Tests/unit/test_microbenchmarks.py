@@ -0,0 +1,41 @@
+import os
+import json
+from Tensile.Microbenchmarks import microbenchmarks, runMicrobenchmarks, \
+    compareResults, writeBaseline, defaultThreshold
+
+def results(scale, normalized):
+ return {"Scale": scale, "Benchmarks": dict([(name, {"Items": 1, \
+     "Seconds": value, "PerItemUs": value, "Normalized": value}) \
+     for (name, value) in normalized.items()])}
+
+def test_run_microbenchmarks():
+ names = [benchmark[0] for benchmark in microbenchmarks]
+ measured = runMicrobenchmarks(names, 0.02, 1)
+ assert measured["Scale"] == 0.02
+ assert sorted(measured["Benchmarks"]) == sorted(names)
+ for result in measured["Benchmarks"].values():
+   assert result["Items"] > 0 and result["Seconds"] > 0
+   assert result["Normalized"] > 0
+
+def test_compare_results():
+ baseline = results(1.0, {"A": 1.0, "B": 1.0, "C": 1.0, "Gone": 1.0})
+ baseline["Benchmarks"]["C"]["Threshold"] = 2.0
+ measured = results(1.0, {"A": 1.5, "B": 0.5, "C": 2.5, "New": 1.0})
+ assert compareResults(measured, results(2.0, {"A": 1.0})) == []
+ verdicts = dict([(c[0], c[3]) for c in compareResults(measured, baseline)])
+ assert verdicts == {"A": "REGRESSED", "B": "improved", "C": "ok"}
+ verdicts = dict([(c[0], c[3]) \
+     for c in compareResults(measured, baseline, 0.6)])
+ assert verdicts == {"A": "ok", "B": "ok", "C": "REGRESSED"}
+
+def test_write_baseline(tmpdir):
+ fileName = os.path.join(str(tmpdir), "baseline.json")
+ writeBaseline(fileName, results(1.0, {"A": 1.0}))
+ baseline = json.load(open(fileName))
+ baseline["Benchmarks"]["A"]["Threshold"] = 0.75
+ json.dump(baseline, open(fileName, "w"))
+ writeBaseline(fileName, results(1.0, {"A": 2.0, "B": 1.0}))
+ baseline = json.load(open(fileName))
+ assert baseline["Benchmarks"]["A"] == {"Items": 1, "Seconds": 2.0, \
+     "PerItemUs": 2.0, "Normalized": 2.0, "Threshold": 0.75}
+ assert baseline["Benchmarks"]["B"]["Threshold"] == defaultThreshold
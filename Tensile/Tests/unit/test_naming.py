@@ -0,0 +1,144 @@
+import random
+import itertools
+from Tensile.Common import validParameters
+from Tensile.SolutionStructs import Solution
+
+# the quadratic naming engines the cached ones replaced
+def legacyMinNaming(objs):
+ keys = list(objs[0].keys())
+ requiredParameters = {}
+ for key in keys:
+   if len(objs) == 1:
+     if key in validParameters:
+       requiredParameters[key] = False
+     continue
+   required = False
+   if key in validParameters:
+     for i in range(1, len(objs)):
+       if objs[0][key] != objs[i][key]:
+         required = True
+         break
+   requiredParameters[key] = required
+ for key in ["ProblemType", "MacroTile0", "MacroTile1", "DepthU"]:
+   requiredParameters[key] = False
+ requiredParameters["Kernel"] = True
+ return requiredParameters
+
+def legacyNameMin(state, requiredParameters):
+ name = "%s_MT%03ux%03ux%02u_" % (str(state["ProblemType"]), \
+     state["MacroTile0"], state["MacroTile1"], state["DepthU"])
+ parts = []
+ for key in sorted(state.keys()):
+   if key in requiredParameters and requiredParameters[key]:
+     parts.append("%s%s" % (''.join([c for c in key if not c.islower()]), \
+         Solution.getParameterValueAbbreviation(state[key])))
+ return name + "_".join(parts)
+
+def legacySerialNaming(objs):
+ data = {}
+ for obj in objs:
+   for paramName in sorted(obj.keys()):
+     if paramName in validParameters:
+       if paramName not in data:
+         data[paramName] = []
+       if obj[paramName] not in data[paramName]:
+         data[paramName].append(obj[paramName])
+ maxObjs = 1
+ for paramName in data:
+   data[paramName] = sorted(data[paramName])
+   maxObjs *= len(data[paramName])
+ return [data, len(str(maxObjs))]
+
+def legacyNameSerial(state, serialNaming):
+ (data, numDigits) = serialNaming
+ serial = 0
+ multiplier = 1
+ for paramName in sorted(state.keys()):
+   if paramName in validParameters:
+     serial += data[paramName].index(state[paramName]) * multiplier
+     multiplier *= len(data[paramName])
+ return "K%0*u" % (numDigits, serial)
+
+# kernel states with list, bool, negative, string and constant parameters
+def kernels(numKernels):
+ choices = [[[4, 4], [8, 4], [2, 8], [6, 6]], [[16, 16, 1], [8, 8, 4]], \
+     [8, 16, 32], [1, 2, 3, 4], [-1, 1, 8, 0], [True, False], \
+     ["Assembly", "Source"], ["ShiftPtr", "Branch"], [1, 2, 4], [-1, 0, 1]]
+ names = ["ThreadTile", "WorkGroup", "DepthU", "GlobalSplitU", \
+     "WorkGroupMapping", "PrefetchGlobalRead", "KernelLanguage", \
+     "EdgeType", "VectorWidth", "LdsPadA"]
+ configs = list(itertools.product(*choices))
+ random.Random(numKernels).shuffle(configs)
+ states = []
+ for i in range(0, numKernels):
+   state = dict(zip(names, configs[i % len(configs)]))
+   state["ProblemType"] = "Cijk_Ailk_Bljk_SB"
+   state["MacroTile0"] = state["ThreadTile"][0] * state["WorkGroup"][0]
+   state["MacroTile1"] = state["ThreadTile"][1] * state["WorkGroup"][1]
+   state["LoopTail"] = True
+   state["Kernel"] = True
+   state["Index"] = i # not a valid parameter, never named
+   states.append(state)
+ return states
+
+def check(states, sample):
+ minNaming = Solution.getMinNaming(states)
+ assert minNaming == legacyMinNaming(states)
+ serialNaming = Solution.getSerialNaming(states)
+ legacySerial = legacySerialNaming(states)
+ assert serialNaming[0:2] == legacySerial
+ for state in states[::sample]:
+   assert Solution.getNameMin(state, minNaming) \
+       == legacyNameMin(state, minNaming)
+   assert Solution.getNameSerial(state, serialNaming) \
+       == legacyNameSerial(state, legacySerial)
+   assert Solution.getNameFull(state) \
+       == legacyNameMin(state, dict.fromkeys(validParameters, True))
+
+def test_naming_matches_legacy():
+ for numKernels in [1, 2, 100, 5000]:
+   check(kernels(numKernels), 1)
+
+def test_naming_50k_kernels():
+ states = kernels(50000)
+ check(states, 97)
+ minNaming = Solution.getMinNaming(states)
+ serialNaming = Solution.getSerialNaming(states)
+ unique = 4 * 2 * 3 * 4 * 4 * 2 * 2 * 2 * 3 * 3 # distinct configs
+ assert len(set([Solution.getNameMin(s, minNaming) for s in states])) \
+     == unique
+ assert len(set([Solution.getNameSerial(s, serialNaming) \
+     for s in states])) == unique
+
+def test_hashed_names(tmpdir, monkeypatch):
+ import os
+ import re
+ import pytest
+ from Tensile.Common import globalParameters
+ from Tensile.KernelWriterSource import KernelWriterSource
+ from Tensile.TensileCreateLibrary import writeHashedNames
+ states = kernels(5000)
+ hashedNaming = Solution.getHashedNaming(states)
+ assert len(hashedNaming) == len(states)
+ for state in states[:10]:
+   hashedName = Solution.getNameHashed(state)
+   assert re.match("^K[0-9a-f]{16}$", hashedName)
+   assert hashedNaming[hashedName] == Solution.getNameFull(state)
+ # stable: the digest of the full name alone
+ assert Solution.getNameHashed(dict(states[0])) \
+     == Solution.getNameHashed(states[0])
+ monkeypatch.setitem(globalParameters, "HashedNames", True)
+ kernelWriter = KernelWriterSource(Solution.getMinNaming(states), None)
+ assert kernelWriter.getKernelName(states[1]) \
+     == Solution.getNameHashed(states[1])
+ writeHashedNames(str(tmpdir), [], states[:3])
+ lines = open(os.path.join(str(tmpdir), "HashedNames.txt")).readlines()
+ assert sorted(lines) == lines and len(lines) == 3
+ assert lines[0].split() == [lines[0].split()[0], \
+     hashedNaming[lines[0].split()[0]]]
+ # one hex digit cannot name 5000 kernels
+ monkeypatch.setattr(Solution, "hashedNameDigits", 1)
+ with pytest.raises(SystemExit):
+   Solution.getHashedNaming(states)
+ assert Solution.getHashedNaming(states[:1] * 2) \
+     == {Solution.getNameHashed(states[0]): Solution.getNameFull(states[0])}
@@ -0,0 +1,113 @@
+import os
+import pytest
+from Tensile.Common import globalParameters
+from Tensile.PerformanceModel import PerformanceModel, RooflineModel, \
+    getPerformanceModel, pruneSolutions, readBenchmarkSamples, winnerRetention
+from Tensile.RegisterPoolBenchmark import captureTraces
+import Tensile.YAMLIO as YAMLIO
+
+def makeSolutions(kernelParameters, dataType="s"):
+ captureTraces() # sets up global parameters for solutions
+ from Tensile.Common import defaultSolution, defaultBenchmarkCommonParameters
+ from Tensile.SolutionStructs import ProblemType, Solution
+ priorIsa = globalParameters["CurrentISA"]
+ globalParameters["CurrentISA"] = (9,0,0)
+ try:
+   solutions = []
+   for overrides in kernelParameters:
+     state = {}
+     for parameterDict in defaultBenchmarkCommonParameters:
+       for key in parameterDict:
+         state[key] = parameterDict[key][0]
+     state.update(defaultSolution)
+     state.update(overrides)
+     state["ProblemType"] = ProblemType({"OperationType": "GEMM", \
+         "DataType": dataType, "TransposeA": False, "TransposeB": True, \
+         "UseBeta": True, "Batched": True})
+     state["KernelLanguage"] = "Assembly"
+     state["ISA"] = (9,0,0)
+     solution = Solution(state)
+     assert solution["Valid"]
+     solutions.append(solution)
+   return solutions
+ finally:
+   globalParameters["CurrentISA"] = priorIsa
+
+kernelParameters = [
+   {"ThreadTile": [ 8, 8 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 8},
+   {"ThreadTile": [ 4, 4 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 16},
+   {"ThreadTile": [ 2, 2 ], "WorkGroup": [ 8, 8, 1 ], "DepthU": 16},
+   {"ThreadTile": [ 4, 4 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 16, \
+       "GlobalSplitU": 4},
+   ]
+
+def test_performance_model_predict():
+ (mt128, mt64, mt16, gsu) = makeSolutions(kernelParameters)
+ model = RooflineModel((9,0,0))
+ # large square problems run near peak on the big tile
+ peak = 64 * 64 * 1.5e9 * 2 / 1.0e9
+ big = model.predict(mt128, (4096, 4096, 1, 4096))
+ assert 0.7 * peak < big <= peak
+ assert big > model.predict(mt64, (4096, 4096, 1, 4096)) \
+     > model.predict(mt16, (4096, 4096, 1, 4096))
+ # one more row wastes most of a row of 128x128 tiles
+ assert model.predict(mt128, (4097, 4096, 1, 4096)) < 0.99 * big
+ # small problems don't fill the CUs with big tiles
+ assert model.predict(mt64, (256, 256, 1, 256)) \
+     > model.predict(mt128, (256, 256, 1, 256))
+ # deep, narrow problems need the summation split over work-groups
+ assert model.predict(gsu, (64, 64, 1, 65536)) \
+     > 2 * model.predict(mt64, (64, 64, 1, 65536))
+ # double precision runs at 1/16 rate on gfx900
+ (dgemm,) = makeSolutions(kernelParameters[:1], "d")
+ assert model.predict(dgemm, (4096, 4096, 1, 4096)) < big / 8
+
+def test_performance_model_prune():
+ solutions = makeSolutions(kernelParameters)
+ model = getPerformanceModel("Roofline", (9,0,0))
+ sizes = [(4096, 4096, 1, 4096)]
+ assert pruneSolutions(model, solutions, sizes, 0) == [solutions[0]]
+ assert pruneSolutions(model, solutions, sizes, 1) == solutions
+ # a size that favours each tile keeps both
+ sizes.append((256, 256, 1, 256))
+ kept = pruneSolutions(model, solutions, sizes, 0)
+ assert solutions[0] in kept
+ assert solutions[2] not in kept
+ assert len(kept) == 2
+ # models implement predict
+ with pytest.raises(TypeError):
+   PerformanceModel((9,0,0))
+
+def test_performance_model_calibrate(tmpdir):
+ from Tensile.SolutionStructs import ProblemSizes
+ solutions = makeSolutions(kernelParameters)
+ problemSizes = ProblemSizes(solutions[0]["ProblemType"], \
+     [{"Range": [[256, 768, 4096], 0, [1], [256, 3840, 4096]]}])
+ # measurements from a device reaching 60% of peak
+ truth = RooflineModel((9,0,0), {"ComputeEfficiency": 0.6, \
+     "MemoryEfficiency": 2.0, "OccupancyForPeak": 3})
+ dataFileName = os.path.join(str(tmpdir), "Cijk_Ailk_Bjlk_SB_00.csv")
+ with open(dataFileName, "w") as dataFile:
+   dataFile.write("GFlops, SizeI, SizeJ, SizeK, SizeL, TotalFlops, %s\n" \
+       % ", ".join(["s%u" % i for i in range(0, len(solutions))]))
+   for problemIdx in range(0, len(problemSizes.sizes)):
+     size = problemSizes.sizes[problemIdx]
+     gflops = [truth.predict(s, size) for s in solutions]
+     dataFile.write("%u, %s, %u, %s\n" % (problemIdx, \
+         ", ".join([str(v) for v in size]), 2*size[0]*size[1]*size[3], \
+         ", ".join(["%f" % g for g in gflops])))
+ for solution in solutions:
+   solution["ISA"] = list(solution["ISA"]) # safe yaml has no tuples
+ YAMLIO.writeSolutions(os.path.splitext(dataFileName)[0] + ".yaml", \
+     problemSizes, [solutions])
+
+ samples = readBenchmarkSamples(dataFileName)
+ assert len(samples) == len(problemSizes.sizes) * len(solutions)
+ model = RooflineModel((9,0,0))
+ parameters = model.calibrate(samples)
+ assert abs(parameters["ComputeEfficiency"] - 0.6) < 0.01
+ assert parameters["MemoryEfficiency"] == 2.0
+ assert parameters["OccupancyForPeak"] == 3
+ assert winnerRetention(model, samples, 0) == 1.0
+ for (solution, size, gflops) in samples:
+   assert abs(model.predict(solution, size) - gflops) < 0.001 * gflops + 0.01
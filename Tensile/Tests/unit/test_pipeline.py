@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+from Tensile.Pipeline import DeviceRun, PipelineExecutor
+
+# simulated client: logs when it held the device, exits with its argument
+fakeClient = "import sys, time; start = time.time(); time.sleep(0.15); " \
+    "open(sys.argv[1], 'a').write('%f %f\\n' % (start, time.time())); " \
+    "sys.exit(int(sys.argv[2]))"
+
+# logs when the executor saw the client finish, in order with the prepares
+class LoggedRun(DeviceRun):
+
+ def __init__(self, command, order, tag):
+   DeviceRun.__init__(self, command)
+   self.order = order
+   self.tag = tag
+
+ def finish(self):
+   self.order.append(("finish",) + self.tag)
+   return DeviceRun.finish(self)
+
+# size group of two steps; step 1 needs the winner (return code) of step 0
+def sizeGroup(path, groupIdx, events, order):
+ winner = None
+ for step in range(0, 2):
+   events.append((groupIdx, step, "prepare", time.time(), winner))
+   order.append(("prepare", groupIdx, step))
+   time.sleep(0.05) # generate and build
+   winner = yield LoggedRun([sys.executable, "-c", fakeClient, \
+       os.path.join(path, "device.txt"), str(10 * groupIdx + step)], \
+       order, (groupIdx, step))
+ yield (groupIdx, winner)
+
+def runGroups(path, depth):
+ events = []
+ order = []
+ finished = []
+ executor = PipelineExecutor(depth)
+ results = executor.run([sizeGroup(path, g, events, order) \
+     for g in range(0, 3)], lambda idx, result: finished.append(idx))
+ runs = sorted([[float(t) for t in line.split()] \
+     for line in open(os.path.join(path, "device.txt"))])
+ os.remove(os.path.join(path, "device.txt"))
+ assert results == [(0, 1), (1, 11), (2, 21)]
+ assert sorted(finished) == [0, 1, 2]
+ assert executor.numRuns == len(runs) == 6
+ # the device runs one client at a time
+ for i in range(1, len(runs)):
+   assert runs[i][0] >= runs[i-1][1]
+ # every step starts from the winner of the step before it
+ assert sorted([(g, s, w) for (g, s, p, t, w) in events]) \
+     == [(0, 0, None), (0, 1, 0), (1, 0, None), (1, 1, 10), \
+     (2, 0, None), (2, 1, 20)]
+ assert 0 < executor.deviceBusy <= executor.elapsed
+ return (executor, events, order)
+
+def test_pipeline(tmpdir):
+ path = str(tmpdir)
+ (sequential, events, order) = runGroups(path, 0)
+ # one group at a time
+ assert [(g, s) for (g, s, p, t, w) in events] \
+     == [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)]
+ assert order.index(("prepare", 1, 0)) > order.index(("finish", 0, 1))
+ (pipelined, events, order) = runGroups(path, 1)
+ # group 1 prepares while the first client run of group 0 is on the device;
+ # ordered by the executor's thread, so no wall clock margins
+ assert [(g, s) for (g, s, p, t, w) in events][:2] == [(0, 0), (1, 0)]
+ assert order.index(("prepare", 1, 0)) < order.index(("finish", 0, 0))
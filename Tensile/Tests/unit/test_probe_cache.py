@@ -0,0 +1,58 @@
+import os
+import stat
+from copy import deepcopy
+from Tensile.Common import globalParameters, assignGlobalParameters
+
+def writeTool(path, script):
+ with open(path, "w") as toolFile:
+   toolFile.write("#!/bin/sh\n" + script)
+ os.chmod(path, stat.S_IRWXU)
+
+def test_probe_cache(tmpdir):
+ binPath = os.path.join(str(tmpdir), "bin")
+ cachePath = os.path.join(str(tmpdir), "cache")
+ logPath = os.path.join(str(tmpdir), "calls")
+ os.mkdir(binPath)
+ # an assembler accepting everything and an enumerator finding a gfx900
+ writeTool(os.path.join(binPath, "hcc"), "echo hcc >> %s\ncat > /dev/null\n" \
+     % logPath)
+ writeTool(os.path.join(binPath, "rocm_agent_enumerator"), \
+     "echo enumerator >> %s\necho gfx000\necho gfx900\n" % logPath)
+ priorGlobals = deepcopy(globalParameters)
+ priorPath = os.environ["PATH"]
+ os.environ["PATH"] = binPath + os.pathsep + priorPath
+ def numCalls():
+   if not os.path.exists(logPath):
+     return 0
+   return len(open(logPath).readlines())
+ try:
+   config = {"ProbeCachePath": cachePath}
+   assignGlobalParameters(config)
+   assert globalParameters["CurrentISA"] == (9,0,0)
+   assert globalParameters["AsmCaps"][(9,0,6)]["HasAddLshl"] == 1
+   coldCalls = numCalls()
+   assert coldCalls == 1 + 5*len(globalParameters["SupportedISA"])
+   probes = deepcopy((globalParameters["AsmCaps"], globalParameters["HccVersion"]))
+
+   # warm start: same results without running anything
+   globalParameters["CurrentISA"] = (0,0,0)
+   globalParameters["AsmCaps"] = {}
+   assignGlobalParameters(config)
+   assert numCalls() == coldCalls
+   assert globalParameters["CurrentISA"] == (9,0,0)
+   assert (globalParameters["AsmCaps"], globalParameters["HccVersion"]) == probes
+
+   # a changed assembler is probed again
+   os.utime(os.path.join(binPath, "hcc"), (1, 1))
+   globalParameters["CurrentISA"] = (0,0,0)
+   assignGlobalParameters(config)
+   assert numCalls() == 2*coldCalls
+
+   # no cache path probes every time
+   globalParameters["CurrentISA"] = (0,0,0)
+   assignGlobalParameters({"ProbeCachePath": None})
+   assert numCalls() == 3*coldCalls
+ finally:
+   os.environ["PATH"] = priorPath
+   globalParameters.clear()
+   globalParameters.update(priorGlobals)
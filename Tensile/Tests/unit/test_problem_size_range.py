@@ -0,0 +1,75 @@
+import itertools
+from Tensile.SolutionStructs import ProblemType, ProblemSizes
+
+problemType = ProblemType({"OperationType": "GEMM", "DataType": "s", \
+    "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True})
+
+# every size of a range config, listed the direct way
+def listSizes(config):
+ values = []
+ for dim in config:
+   if isinstance(dim, list):
+     (start, increment, stride, stop) = {1: lambda d: [d[0], 1, 0, d[0]], \
+         2: lambda d: [d[0], d[0], 0, d[1]], 3: lambda d: d[0:2] + [0, d[2]], \
+         4: lambda d: d}[len(dim)](dim)
+     values.append([])
+     while start <= stop:
+       values[-1].append(start)
+       start += increment
+       increment += stride
+   else:
+     values.append(dim)
+ sized = [v for v in values if isinstance(v, list)]
+ sizes = set()
+ for product in itertools.product(*sized):
+   size = []
+   sizedIdx = 0
+   for v in values:
+     if isinstance(v, list):
+       size.append(product[sizedIdx])
+       sizedIdx += 1
+     else: # mapped to an earlier index
+       size.append(size[v])
+   sizes.add(tuple(size))
+ return sizes
+
+def test_problem_sizes_match_enumeration():
+ configs = [ \
+     [[{"Range": [[16, 16, 0, 40], 0, [2, 3], [8, 8, 8, 100]]}]], \
+     [[{"Range": [[16, 1, 1, 48], [32], [1, 1, 0, 3], 0]}, \
+       {"Range": [[16, 16, 0, 48], [32], [2], [16]]}, \
+       {"Exact": [32, 32, 2, 16]}, {"MinStride": [64, 0, 0, 0]}]], \
+     [[{"Range": [[7], [5, 10], [1, 2], 0]}]], \
+     [[{"Exact": [7, 8, 1, 9]}, {"Exact": [7, 8, 1, 9]}, \
+       {"Exact": [1, 2, 1, 3]}]]]
+ for (config,) in configs:
+   problemSizes = ProblemSizes(problemType, config)
+   expected = set()
+   for dictionary in config:
+     if "Range" in dictionary:
+       expected.update(listSizes(dictionary["Range"]))
+     elif "Exact" in dictionary:
+       expected.add(tuple(dictionary["Exact"]))
+   assert problemSizes.sizes == sorted(expected)
+   assert len(problemSizes) == len(expected)
+   strides = [0, 0, 0, 0]
+   for dictionary in config:
+     strides = dictionary.get("MinStride", strides)
+   extents = [max([max(strides[i], s[i]) for s in expected]) \
+       for i in range(0, 4)]
+   assert problemSizes.maxC == extents[0] * extents[1] * extents[2]
+   assert problemSizes.maxA == extents[0] * extents[3] * extents[2]
+   assert problemSizes.maxB == extents[1] * extents[3] * extents[2]
+ # ranges still enumerate with the first sized index fastest
+ sizeRange = ProblemSizes(problemType, configs[2][0]).ranges[0]
+ assert sizeRange.problemSizes == [(7, 5, 1, 7), (7, 10, 1, 7), \
+     (7, 5, 2, 7), (7, 10, 2, 7)]
+
+def test_problem_sizes_stay_symbolic():
+ sizeRange = [16, 16, 0, 16*10000]
+ problemSizes = ProblemSizes(problemType, \
+     [{"Range": [sizeRange, sizeRange, [1, 1, 0, 64], sizeRange]}])
+ assert len(problemSizes) == 64 * 10000**3
+ assert problemSizes.maxC == 160000 * 160000 * 64
+ first = list(itertools.islice(problemSizes, 3))
+ assert first == [(16, 16, 1, 16), (16, 16, 1, 32), (16, 16, 1, 48)]
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import pytest
+import Tensile.Tensile as Tensile
+from Tensile.Common import globalParameters, locateExe
+from Tensile.SolutionStructs import ProblemType, ProblemSizes
+from Tensile.ClientWriter import writeProblemSizesFile
+
+def test_problem_sizes_file_roundtrip(tmpdir):
+ compiler = locateExe("/usr/bin", "g++")
+ if compiler is None:
+   pytest.skip("no host c++ compiler")
+ problemType = ProblemType({"OperationType": "GEMM", "DataType": "s", \
+     "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True})
+ # more rows than one write chunk, plus an exact size and min strides
+ problemSizes = ProblemSizes(problemType, [ \
+     {"Range": [ [1, 1, 70], 0, [1, 1, 70], [256] ]}, \
+     {"Exact": [ 1000, 900, 3, 77 ]}, \
+     {"MinStride": [ 0, 0, 0, 512 ]} ])
+ assert problemSizes.totalProblemSizes > 4096
+
+ fileName = os.path.join(tmpdir.strpath, "ProblemSizes.bin")
+ writeProblemSizesFile(fileName, problemSizes, problemType["TotalIndices"])
+ assert os.path.getsize(fileName) == 48 + 4*4*(1+problemSizes.totalProblemSizes)
+
+ source = Tensile.TensileTestPath("unit/ProblemSizesFileTest.cpp")
+ exe = os.path.join(tmpdir.strpath, "ProblemSizesFileTest")
+ subprocess.check_call([compiler, "-std=c++11", "-Wall", \
+     "-I", globalParameters["SourcePath"], source, "-o", exe])
+ output = subprocess.check_output([exe, fileName]).splitlines()
+
+ assert output[0] == "NumIndices 4"
+ assert output[1] == "NumProblems %u" % problemSizes.totalProblemSizes
+ assert output[2] == "MaxSizes %u %u %u" \
+     % (problemSizes.maxC, problemSizes.maxA, problemSizes.maxB)
+ assert output[3] == "MinStrides 0 0 0 512"
+ rows = [ " ".join([str(s) for s in size]) for size in problemSizes.sizes ]
+ assert output[4:] == rows
+
+def test_problem_sizes_file_rejects_truncated(tmpdir):
+ compiler = locateExe("/usr/bin", "g++")
+ if compiler is None:
+   pytest.skip("no host c++ compiler")
+ problemType = ProblemType({"OperationType": "GEMM", "DataType": "s", \
+     "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True})
+ problemSizes = ProblemSizes(problemType, [ {"Exact": [ 64, 64, 1, 64 ]} ])
+ fileName = os.path.join(tmpdir.strpath, "ProblemSizes.bin")
+ writeProblemSizesFile(fileName, problemSizes, problemType["TotalIndices"])
+ data = open(fileName, "rb").read()
+ open(fileName, "wb").write(data[:-4])
+
+ source = Tensile.TensileTestPath("unit/ProblemSizesFileTest.cpp")
+ exe = os.path.join(tmpdir.strpath, "ProblemSizesFileTest")
+ subprocess.check_call([compiler, "-std=c++11", "-Wall", \
+     "-I", globalParameters["SourcePath"], source, "-o", exe])
+ process = subprocess.Popen([exe, fileName], stdout=subprocess.PIPE)
+ output = process.communicate()[0]
+ assert process.returncode != 0
+ assert "truncated" in output
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import pytest
+import Tensile.Tensile as Tensile
+from Tensile.Common import globalParameters, locateExe
+
+def test_reference_cpu(tmpdir):
+ compiler = locateExe("/usr/bin", "g++")
+ if compiler is None:
+   pytest.skip("no host c++ compiler")
+ source = Tensile.TensileTestPath("unit/ReferenceCPUTest.cpp")
+ exe = os.path.join(tmpdir.strpath, "ReferenceCPUTest")
+ # the half cases need a compiler and target with _Float16
+ probe = os.path.join(tmpdir.strpath, "half.cpp")
+ with open(probe, "w") as f:
+   f.write("_Float16 half = 1;\n")
+ enableHalf = subprocess.call([compiler, "-c", probe, "-o", \
+     os.path.join(tmpdir.strpath, "half.o")]) == 0
+ subprocess.check_call([compiler, "-std=c++11", "-Wall", "-pthread", \
+     "-DTensile_RUNTIME_LANGUAGE_HOST=1"] \
+     + (["-DTensile_ENABLE_HALF"] if enableHalf else []) + [ \
+     "-I", globalParameters["SourcePath"], source, \
+     os.path.join(globalParameters["SourcePath"], "MathTemplates.cpp"), \
+     "-o", exe])
+ output = subprocess.check_output([exe])
+ assert "PASSED" in output
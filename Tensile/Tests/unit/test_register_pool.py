@@ -0,0 +1,133 @@
+import random
+from Tensile.KernelWriterAssembly import RegisterPool
+from Tensile.RegisterPoolBenchmark import LegacyRegisterPool, captureTraces, \
+    replayTrace, makeLegacyPool, makeFirstFitPool, makeBestFitPool
+
+# random operations, driven by a legacy pool so checkIns match real blocks
+def randomTrace(seed, numOps):
+ rng = random.Random(seed)
+ size = rng.randint(0, 64)
+ trace = [("init", size, "v")]
+ legacyPool = LegacyRegisterPool(size, "v")
+ checkedOut = []
+ for i in range(0, numOps):
+   r = rng.random()
+   if i == 0 or r > 0.95:
+     op = ("add", rng.randint(0, 80 if i else 8), rng.randint(1, 48 if i else 8))
+     legacyPool.add(op[1], op[2])
+   elif r > 0.9 and legacyPool.size() >= 12:
+     op = ("remove", rng.randint(0, 8), rng.randint(1, 4))
+     legacyPool.remove(op[1], op[2])
+   elif r > 0.5 and checkedOut:
+     op = ("checkIn", checkedOut.pop(rng.randrange(len(checkedOut))))
+     legacyPool.checkIn(op[1])
+   else:
+     size = rng.choice([1, 1, 2, 3, 4, 8])
+     alignment = rng.choice([1, 1, 2, 4])
+     start = legacyPool.checkOutAligned(size, alignment)
+     op = ("checkOut", size, alignment, False, start)
+     checkedOut.append(start)
+   trace.append(op)
+ return trace
+
+def assertSamePools(legacyPool, pool):
+ assert legacyPool.statusList() == list(pool.status)
+ assert legacyPool.available() == pool.available()
+ assert legacyPool.availableBlock() == pool.availableBlock()
+ assert legacyPool.checkOutSize == pool.checkOutSize
+
+def test_register_pool_first_fit_matches_kernel_traces():
+ traces = captureTraces()
+ assert len(traces) > 0
+ assert sum([len(trace) for trace in traces]) > 1000
+ for trace in traces:
+   (legacyPool, legacyDifferent) = replayTrace(trace, makeLegacyPool)
+   (pool, different) = replayTrace(trace, makeFirstFitPool)
+   assert legacyDifferent == 0
+   assert different == 0
+   assertSamePools(legacyPool, pool)
+   # best fit may choose other registers but needs no more of them here
+   (bestFitPool, _) = replayTrace(trace, makeBestFitPool)
+   assert bestFitPool.size() <= pool.size()
+   assert bestFitPool.stats()["InUse"] == pool.stats()["InUse"]
+
+def test_register_pool_first_fit_matches_random_traces():
+ for seed in range(0, 40):
+   trace = randomTrace(seed, 60)
+   (legacyPool, _) = replayTrace(trace, makeLegacyPool)
+   (pool, different) = replayTrace(trace, makeFirstFitPool)
+   assert different == 0
+   assertSamePools(legacyPool, pool)
+
+def test_register_pool_overflow_matches_legacy():
+ # original overflow scan never looks at register 0
+ for (size, available, request, alignment) in [ \
+     (0, [], 2, 1), (1, [0], 2, 1), (4, [0, 1, 2, 3], 6, 1), \
+     (6, [3, 4, 5], 4, 4), (6, [1, 2], 3, 8), (5, [0, 4], 3, 2) ]:
+   legacyPool = LegacyRegisterPool(size, "v")
+   pool = RegisterPool(size, "v")
+   for i in available:
+     legacyPool.add(i, 1)
+     pool.add(i, 1)
+   assert legacyPool.checkOutAligned(request, alignment) \
+       == pool.checkOutAligned(request, alignment)
+   assertSamePools(legacyPool, pool)
+   assert pool.stats()["Overflows"] == 1
+
+def test_register_pool_best_fit():
+ pool = RegisterPool(16, "v", 0, RegisterPool.policyBestFit)
+ pool.add(0, 16)
+ blocks = [pool.checkOut(1) for i in range(0, 16)]
+ # free blocks of 4 @ 0, 2 @ 6 and 3 @ 10
+ for i in range(0, 4) + [6, 7, 10, 11, 12]:
+   pool.checkIn(blocks[i])
+ assert pool.checkOut(2) == 6
+ assert pool.checkOut(3) == 10
+ assert pool.checkOut(4) == 0
+
+ firstFit = RegisterPool(16, "v")
+ firstFit.add(0, 16)
+ blocks = [firstFit.checkOut(1) for i in range(0, 16)]
+ for i in range(0, 4) + [6, 7, 10, 11, 12]:
+   firstFit.checkIn(blocks[i])
+ assert firstFit.checkOut(2) == 0
+
+def test_register_pool_stats():
+ pool = RegisterPool(12, "v")
+ pool.add(0, 12)
+ a = pool.checkOut(4)
+ pool.checkOut(2)
+ pool.checkOut(6)
+ pool.checkIn(a)
+ stats = pool.stats()
+ assert stats["Available"] == 4
+ assert stats["LargestBlock"] == 4
+ assert stats["FreeBlocks"] == 1
+ assert stats["Fragmentation"] == 0.0
+ assert stats["PeakInUse"] == 12
+ assert stats["InUse"] == 8
+ assert stats["CheckOuts"] == 3
+
+ b = pool.checkOutAligned(1, 2)
+ assert b == 0
+ pool.checkIn(6)
+ stats = pool.stats()
+ # free: 1..3 and 6..11
+ assert stats["Available"] == 9
+ assert stats["LargestBlock"] == 6
+ assert stats["FreeBlocks"] == 2
+ assert abs(stats["Fragmentation"] - (1.0 - 6.0/9.0)) < 1e-12
+
+def test_register_pool_trace_log():
+ log = []
+ RegisterPool.traceLog = log
+ try:
+   pool = RegisterPool(4, "s")
+   pool.add(0, 4)
+   start = pool.checkOutAligned(2, 2)
+   pool.checkIn(start)
+ finally:
+   RegisterPool.traceLog = None
+ assert log == [[("init", 4, "s"), ("add", 0, 4), \
+     ("checkOut", 2, 2, False, 0), ("checkIn", 0)]]
+ assert RegisterPool(4, "s").trace is None
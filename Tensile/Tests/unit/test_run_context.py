@@ -0,0 +1,46 @@
+import os
+import threading
+from Tensile.Common import globalParameters, RunContext, pushWorkingPath, \
+    popWorkingPath
+from Tensile.ClientWriter import writeRunScript
+
+def test_run_context(tmpdir):
+ priorWorkingPath = globalParameters["WorkingPath"]
+ try:
+   globalParameters["WorkingPath"] = str(tmpdir)
+   context = RunContext()
+   group = context.child("Group").override(EnableHalf=True)
+   step = group.child("Step")
+   assert os.path.isdir(step.workingPath)
+   assert step["WorkingPath"] == os.path.join(str(tmpdir), "Group", "Step")
+   assert step.parent().workingPath == group.workingPath
+   assert step["EnableHalf"] and not context["EnableHalf"]
+   assert step["PrintLevel"] == globalParameters["PrintLevel"]
+   assert RunContext(device=1).device == 1
+   # contexts never write through to the global state
+   assert globalParameters["WorkingPath"] == str(tmpdir)
+   assert not globalParameters["EnableHalf"]
+
+   pushWorkingPath("Group")
+   pushWorkingPath("Other")
+   assert globalParameters["WorkingPath"] == group.path("Other")
+   popWorkingPath()
+   popWorkingPath()
+   assert globalParameters["WorkingPath"] == str(tmpdir)
+ finally:
+   globalParameters["WorkingPath"] = priorWorkingPath
+
+def test_concurrent_run_scripts(tmpdir):
+ contexts = [RunContext(str(tmpdir), device=device).child("build%u" % device) \
+     for device in range(0, 2)]
+ contexts[1] = contexts[1].override(EnableHalf=True)
+ threads = [threading.Thread(target=writeRunScript, \
+     args=(c.workingPath, None, True, None, c)) for c in contexts]
+ for thread in threads:
+   thread.start()
+ for thread in threads:
+   thread.join()
+ for (device, context) in enumerate(contexts):
+   runScript = open(context.path("run.sh")).read()
+   assert "--device-idx %u" % device in runScript
+   assert ("-DTensile_ENABLE_HALF=ON" in runScript) == (device == 1)
@@ -0,0 +1,94 @@
+import os
+import cPickle
+import Tensile.SolutionMemo as SolutionMemo
+from Tensile.AssemblyAnalyzer import validKernelResources
+from Tensile.Common import globalParameters, defaultSolution, \
+    defaultBenchmarkCommonParameters
+from Tensile.RegisterPoolBenchmark import captureTraces
+from Tensile.SolutionStructs import Solution
+
+def solutionConfig(overrides):
+ state = {}
+ for parameterDict in defaultBenchmarkCommonParameters:
+   for key in parameterDict:
+     state[key] = parameterDict[key][0]
+ state.update(defaultSolution)
+ state.update(overrides)
+ state["ProblemType"] = {"OperationType": "GEMM", "DataType": "s", \
+     "TransposeA": False, "TransposeB": True, "UseBeta": True, "Batched": True}
+ state["KernelLanguage"] = "Assembly"
+ state["ISA"] = (9,0,0)
+ return state
+
+configs = [
+   {"ThreadTile": [ 8, 8 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 8},
+   {"ThreadTile": [ 4, 4 ], "WorkGroup": [ 16, 16, 1 ], "DepthU": 16, \
+       "GlobalSplitU": 2},
+   # more threads than elements in the macro tile
+   {"ThreadTile": [ 1, 1 ], "WorkGroup": [ 16, 16, 4 ], "DepthU": 16},
+   ]
+
+def test_solution_memo(tmpdir):
+ captureTraces() # sets up global parameters for solutions
+ priorIsa = globalParameters["CurrentISA"]
+ globalParameters["CurrentISA"] = (9,0,0)
+ path = os.path.join(str(tmpdir), "memo")
+ try:
+   derived = [Solution(solutionConfig(c)) for c in configs]
+   assert [s["Valid"] for s in derived] == [True, True, False]
+
+   globalParameters["SolutionMemoPath"] = path
+   SolutionMemo.currentMemo = None
+   first = [Solution(solutionConfig(c)) for c in configs]
+   memo = SolutionMemo.getSolutionMemo()
+   assert (memo.numHits, memo.numMisses) == (0, 3)
+   SolutionMemo.saveSolutionMemo()
+   assert os.listdir(path) == [os.path.basename(memo.fileName)]
+
+   # a later run reads the derivations back
+   SolutionMemo.currentMemo = None
+   second = [Solution(solutionConfig(c)) for c in configs]
+   memo = SolutionMemo.getSolutionMemo()
+   assert (memo.numHits, memo.numMisses) == (3, 0)
+   for i in range(0, len(configs)):
+     assert first[i].state == derived[i].state
+     assert second[i].state == derived[i].state
+   rejections = [cPickle.loads(e)[1] for e in memo.entries.values()]
+   assert sorted(rejections)[:2] == [None, None]
+   assert "NumThreads" in sorted(rejections)[2]
+
+   # kernel resource analysis verdicts, which also depend on the writers
+   assert validKernelResources(second[0])
+   assert memo.numHits == 3
+   SolutionMemo.saveSolutionMemo()
+   SolutionMemo.currentMemo = None
+   third = Solution(solutionConfig(configs[0]))
+   assert validKernelResources(third)
+   assert SolutionMemo.getSolutionMemo().numHits == 2
+   memo.writerVersion = "changed"
+   assert memo.getResources(third) is None
+
+   # globals the derivation reads are part of the key
+   priorMaxLDS = globalParameters["MaxLDS"]
+   globalParameters["MaxLDS"] = 1024
+   try:
+     assert not Solution(solutionConfig(configs[0]))["Valid"]
+   finally:
+     globalParameters["MaxLDS"] = priorMaxLDS
+
+   # a different SolutionStructs.py starts a new memo
+   SolutionMemo.currentMemo = None
+   priorVersion = SolutionMemo.solutionStructsVersion
+   SolutionMemo.solutionStructsVersion = lambda: "0" * 40
+   try:
+     Solution(solutionConfig(configs[0]))
+     memo = SolutionMemo.getSolutionMemo()
+     assert (memo.numHits, memo.numMisses) == (0, 1)
+     SolutionMemo.saveSolutionMemo()
+     assert os.listdir(path) == ["SolutionMemo-%s.pickle" % ("0" * 16)]
+   finally:
+     SolutionMemo.solutionStructsVersion = priorVersion
+ finally:
+   globalParameters["SolutionMemoPath"] = None
+   SolutionMemo.currentMemo = None
+   globalParameters["CurrentISA"] = priorIsa
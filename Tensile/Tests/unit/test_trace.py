@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import multiprocessing
+import Tensile.Trace as Trace
+from Tensile.Common import globalParameters
+
+def worker(pipe):
+ with Trace.Span("GenerateKernel"):
+   time.sleep(0.01)
+ pipe.send(Trace.workerEvents())
+
+def test_trace(tmpdir):
+ priorTrace = globalParameters["Trace"]
+ priorEvents = Trace.traceEvents[:]
+ del Trace.traceEvents[:]
+ try:
+   globalParameters["Trace"] = False
+   with Trace.Span("Disabled"):
+     pass
+   assert Trace.traceEvents == []
+   assert Trace.writeTrace(str(tmpdir)) is None
+
+   globalParameters["Trace"] = True
+   with Trace.Span("Tensile"):
+     with Trace.Span("Enumerate"):
+       time.sleep(0.02)
+     parentConn, child = multiprocessing.Pipe()
+     process = multiprocessing.Process(target=worker, args=(child,))
+     process.start()
+     Trace.addEvents(parentConn.recv())
+     process.join()
+     # phases of a run script
+     path = str(tmpdir)
+     start = Trace.now() - 15000 # within the 30ms traced so far
+     with open(os.path.join(path, Trace.runScriptMarkersFileName), "w") as f:
+       for (phase, offset) in [("CMakeBuild", 0), ("Client", 5000), \
+           ("End", 15000)]:
+         f.write("%s %u\n" % (phase, (start + offset) * 1000))
+     Trace.addRunScriptSpans(path)
+     assert not os.path.exists(os.path.join(path, \
+         Trace.runScriptMarkersFileName))
+
+   events = dict([(e["name"], e) for e in Trace.traceEvents])
+   assert sorted(events) == ["CMakeBuild", "Client", "Enumerate", \
+       "GenerateKernel", "Tensile"]
+   assert events["GenerateKernel"]["pid"] == process.pid
+   assert events["Tensile"]["pid"] == os.getpid()
+   assert events["Client"]["dur"] == 10000
+
+   summary = Trace.summarize(Trace.traceEvents)
+   (count, inclusive, exclusive) = summary[("Stage", "Tensile")]
+   assert count == 1
+   assert exclusive == inclusive - events["Enumerate"]["dur"] \
+       - events["CMakeBuild"]["dur"] - events["Client"]["dur"]
+   assert summary[("Stage", "GenerateKernel")][2] \
+       == events["GenerateKernel"]["dur"]
+
+   traceFileName = Trace.writeTrace(path)
+   trace = json.load(open(traceFileName))
+   complete = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+   metadata = [e for e in trace["traceEvents"] if e["ph"] == "M"]
+   assert len(complete) == 5
+   assert sorted([e["args"]["name"] for e in metadata]) \
+       == ["Tensile", "Worker %u" % process.pid]
+   assert "Enumerate" in Trace.summaryTable(Trace.traceEvents)
+ finally:
+   globalParameters["Trace"] = priorTrace
+   Trace.traceEvents[:] = priorEvents
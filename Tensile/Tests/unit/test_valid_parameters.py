@@ -0,0 +1,33 @@
+from Tensile.Common import validParameters, validRange, validPairs
+from Tensile.ValidParametersBenchmark import legacyValidParameters, \
+    lazyParameterNames, compareTables, configParameters
+
+def test_valid_parameters_match_legacy():
+ legacy = legacyValidParameters()
+ assert compareTables(legacy, validParameters) == []
+ for name in lazyParameterNames:
+   assert len(validParameters[name]) == len(legacy[name])
+   assert len(repr(validParameters[name])) < 120
+
+def test_valid_values():
+ depthUs = validRange(-16, 512+1, 0, 2)
+ assert list(depthUs)[14:18] == [-2, -1, 2, 3]
+ assert 0 not in depthUs and 1 not in depthUs and 512 in depthUs
+ assert 8.0 in depthUs and 8.5 not in depthUs
+ assert "8" not in depthUs and None not in depthUs and [8] not in depthUs
+ tiles = validPairs([1, 2, 4])
+ assert [2, 4] in tiles and (2, 4) not in tiles and [2, 4, 1] not in tiles
+ assert [[2, 4]] not in tiles and len(tiles) == 9
+ workGroups = validParameters["WorkGroup"]
+ assert [16, 16, 1] in workGroups and [8, 8, 4] in workGroups
+ assert [16, 16, 3] not in workGroups and [0, 64, 1] not in workGroups
+ assert [32, 64, 1] not in workGroups and [3, 7, 1] not in workGroups
+
+def test_valid_parameters_configs():
+ import os
+ testsPath = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+ parameters = configParameters([testsPath])
+ assert len(parameters) > 0
+ for (name, value) in parameters:
+   if name in lazyParameterNames:
+     assert value in validParameters[name], (name, value)
@@ -0,0 +1,185 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# Trace
+# - with globalParameters["Trace"], Span records where a run spends its time
+#   as complete events of the Chrome trace format (chrome://tracing, Perfetto)
+# - spans nest by time within each process; kernel writer worker processes
+#   hand theirs back to the parent with workerEvents()/addEvents()
+# - run scripts drop timestamped markers (runScriptMarker) so the CMake
+#   configure, build and client phases of one subprocess become spans too
+# - writeTrace() writes Trace.json and prints a summary table per span name
+################################################################################
+import os
+import json
+import time
+
+from Common import globalParameters, print1, printWarning, HR
+
+traceEvents = [] # complete events recorded by this process and its workers
+tracePid = os.getpid() # the process which writes the trace
+
+def now():
+  return int(time.time() * 1000000)
+
+def recordSpan(name, category, start, duration, args=None, pid=None):
+  event = {"name": name, "cat": category, "ph": "X", "ts": start, \
+      "dur": duration, "pid": os.getpid() if pid is None else pid, "tid": 0}
+  if args:
+    event["args"] = args
+  traceEvents.append(event)
+
+
+################################################################################
+# Span
+# with Span("Enumerate"): ... records the block when tracing is enabled;
+# begin() and end() bracket stages too long to indent under a with
+################################################################################
+class Span:
+
+  def __init__(self, name, category="Stage", args=None):
+    self.name = name
+    self.category = category
+    self.args = args
+
+  def begin(self):
+    self.start = now()
+    return self
+
+  # tracing may be switched on by the config this span is reading
+  def end(self):
+    if globalParameters["Trace"]:
+      recordSpan(self.name, self.category, self.start, now() - self.start, \
+          self.args)
+
+  def __enter__(self):
+    return self.begin()
+
+  def __exit__(self, excType, excValue, traceback):
+    self.end()
+    return False
+
+
+################################################################################
+# Workers
+################################################################################
+# events a forked worker recorded, to send to the parent
+def workerEvents():
+  if not globalParameters["Trace"]:
+    return []
+  pid = os.getpid()
+  return [event for event in traceEvents if event["pid"] == pid]
+
+def addEvents(events):
+  traceEvents.extend(events)
+
+
+################################################################################
+# Run Script Markers
+# each marker closes the phase begun by the previous one
+################################################################################
+runScriptMarkersFileName = "TraceMarkers.txt"
+
+def runScriptMarker(runScriptFile, phaseName):
+  if globalParameters["Trace"] and os.name != "nt":
+    runScriptFile.write("echo \"%s $(date +%%s%%N)\" >> %s\n" \
+        % (phaseName, runScriptMarkersFileName))
+
+def addRunScriptSpans(path, pid=None):
+  markersFileName = os.path.join(path, runScriptMarkersFileName)
+  if not os.path.exists(markersFileName):
+    return
+  markers = []
+  with open(markersFileName, "r") as markersFile:
+    for line in markersFile:
+      fields = line.split()
+      if len(fields) == 2 and fields[1].isdigit():
+        markers.append((fields[0], int(fields[1]) / 1000))
+  os.remove(markersFileName)
+  for i in range(0, len(markers)-1):
+    (phaseName, start) = markers[i]
+    recordSpan(phaseName, "Subprocess", start, markers[i+1][1] - start, \
+        None, pid)
+
+
+################################################################################
+# Summary
+# per span name: count, inclusive time and self time (minus nested spans)
+################################################################################
+def summarize(events):
+  summary = {}
+  byThread = {}
+  for event in events:
+    byThread.setdefault((event["pid"], event["tid"]), []).append(event)
+  for threadEvents in byThread.values():
+    threadEvents.sort(key=lambda e: (e["ts"], -e["dur"]))
+    stack = [] # [event, time of nested spans]
+    for event in threadEvents + [None]:
+      while stack and (event is None \
+          or event["ts"] >= stack[-1][0]["ts"] + stack[-1][0]["dur"]):
+        (parent, nested) = stack.pop()
+        entry = summary.setdefault((parent["cat"], parent["name"]), \
+            [0, 0, 0])
+        entry[0] += 1
+        entry[1] += parent["dur"]
+        entry[2] += parent["dur"] - nested
+        if stack:
+          stack[-1][1] += parent["dur"]
+      if event is not None:
+        stack.append([event, 0])
+  return summary
+
+def summaryTable(events):
+  summary = summarize(events)
+  total = max([e["ts"] + e["dur"] for e in events]) \
+      - min([e["ts"] for e in events]) if events else 0
+  s = "# %-11s %-28s %8s %12s %12s %7s\n" \
+      % ("Category", "Span", "Count", "Total(s)", "Self(s)", "Self%")
+  for (key, (count, inclusive, exclusive)) in sorted(summary.items(), \
+      key=lambda item: -item[1][2]):
+    s += "# %-11s %-28s %8u %12.3f %12.3f %6.1f%%\n" % (key[0], key[1], \
+        count, inclusive/1e6, exclusive/1e6, \
+        100.0*exclusive/total if total else 0)
+  return s
+
+
+################################################################################
+# Write Trace
+################################################################################
+def writeTrace(path):
+  if not globalParameters["Trace"]:
+    return None
+  metadata = []
+  for pid in sorted(set([event["pid"] for event in traceEvents])):
+    metadata.append({"name": "process_name", "ph": "M", "pid": pid, \
+        "tid": 0, "args": {"name": "Tensile" if pid == tracePid \
+        else "Worker %u" % pid}})
+  traceFileName = os.path.join(path, "Trace.json")
+  try:
+    with open(traceFileName, "w") as traceFile:
+      json.dump({"traceEvents": metadata + traceEvents, \
+          "displayTimeUnit": "ms"}, traceFile)
+  except IOError:
+    printWarning("Cannot write trace %s" % traceFileName)
+    return None
+  print1(HR)
+  print1("# Trace: %s" % traceFileName)
+  print1(summaryTable(traceEvents) + HR)
+  return traceFileName
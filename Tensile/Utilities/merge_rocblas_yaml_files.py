@@ -9,6 +9,7 @@
 import os
 import sys
 import argparse
+import multiprocessing
 
 HR = "################################################################################"
 
@@ -32,6 +33,9 @@ except ImportError:
 
 #import YAMLIO
 
+# libyaml parses large logic files many times faster when available
+yamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 def ensurePath( path ):
   if not os.path.exists(path):
     os.makedirs(path)
@@ -50,7 +54,7 @@ class LibraryLogic:
         stream = open(filename, "r")
       except IOError:
         printExit("Cannot open file: %s" % filename )
-      data = yaml.load(stream, yaml.SafeLoader)
+      data = yaml.load(stream, yamlLoader)
 
       self.__set_versionString(data[0]["MinimumRequiredVersion"])
       self.__set_scheduleName(data[1])
@@ -186,7 +190,8 @@ class LibraryLogic:
     if self.exactLogic is not None:
       data.append(self.exactLogic)
     
-    if self.rangeLogic is not None:
+    # logic files end with the range logic even when it is null
+    if data:
       data.append(self.rangeLogic)
 
     if not data:
@@ -200,50 +205,76 @@ class LibraryLogic:
         printExit("Cannot open file: %s" % filename)
 
 
-def MergeTensileLogicFiles(origionalLibraryLogic, exactLibraryLogic):
+################################################################################
+# Solution Key
+# hashable form of a solution which is equal exactly when the solutions are,
+# ignoring the fields which only number or name it within its logic file
+################################################################################
+solutionKeyIgnoredFields = ["SolutionIndex", "SolutionNameMin"]
+
+def freeze(value):
+  if isinstance(value, dict):
+    return tuple(sorted([(k, freeze(v)) for (k, v) in value.items()]))
+  if isinstance(value, list):
+    return ("list",) + tuple([freeze(v) for v in value])
+  return value
+
+def solutionKey(solution):
+  return freeze(dict([(k, v) for (k, v) in solution.items() \
+      if k not in solutionKeyIgnoredFields]))
+
+# indices of the solutions the range logic selects
+def rangeLogicSolutions(depth, numIndices, rangeLogic, indices):
+  for rule in rangeLogic:
+    if depth == numIndices-1:
+      indices.add(rule[1])
+    else:
+      rangeLogicSolutions(depth+1, numIndices, rule[1], indices)
+  return indices
+
+def remapRangeLogic(depth, numIndices, rangeLogic, mapping):
+  for rule in rangeLogic:
+    if depth == numIndices-1:
+      rule[1] = mapping[rule[1]]
+    else:
+      remapRangeLogic(depth+1, numIndices, rule[1], mapping)
+
+
+def MergeTensileLogicFiles(origionalLibraryLogic, exactLibraryLogic, \
+    dropUnusedSolutions=False):
   
   mergedLibraryLogic = LibraryLogic()
 
   solutionList = origionalLibraryLogic.solutionStates
   solutionListExact = exactLibraryLogic.solutionStates
 
-  newSolutionOffset = len(solutionList)
+  # first index of each distinct solution in the origional configuration
+  solutionIndices = {}
+  for idxOrg in range(0, len(solutionList)):
+    key = solutionKey(solutionList[idxOrg])
+    if key not in solutionIndices:
+      solutionIndices[key] = idxOrg
 
-  filterdSolutionExactList = []
+  mergedSolutionList = list(solutionList)
   replicationMapping = {}
-  idx = 0
-  idxMapping = newSolutionOffset
 
   # construct the mappings from the old exact kernal configurations
   # to their definitions in the merged files
-  for solution in solutionListExact:
-    if solution in solutionList:
-      # if solution exists in the origional configuration the
-      # its placement in the merged kernel configurations list
-      # gets mapped to the pre-existing configuration
-      idxOrg = solutionList.index(solution)
-      replicationMapping[idx] = idxOrg
-    else:
-      filterdSolutionExactList.append(solution)
+  for idx in range(0, len(solutionListExact)):
+    key = solutionKey(solutionListExact[idx])
+    if key not in solutionIndices:
       # if the solution does not exist in the origional configurations
-      # it gets mapped to the new offset
-      replicationMapping[idx] = idxMapping
-      idxMapping += 1
-
-    idx += 1
-
-  mergedSolutionList = []
-  for solution in solutionList:
-    mergedSolutionList.append(solution)
-  
-  for solution in solutionListExact:
-    mergedSolutionList.append(solution)
+      # it gets appended at the end of the merged configurations
+      solutionIndices[key] = len(mergedSolutionList)
+      mergedSolutionList.append(solutionListExact[idx])
+    # if solution exists in the origional configuration the
+    # its placement in the merged kernel configurations list
+    # gets mapped to the pre-existing configuration
+    replicationMapping[idx] = solutionIndices[key]
 
   exactLogic = origionalLibraryLogic.exactLogic
   exactLogicExact = exactLibraryLogic.exactLogic
 
-  filteredExactLogicExact = []
-  
   # use the mapping from above to remap the exact logic
   # in the merged file
   for exact in exactLogicExact:
@@ -252,22 +283,48 @@ def MergeTensileLogicFiles(origionalLibraryLogic, exactLibraryLogic):
     # kernel configuration
     kernelIndex = exact[1][0]
     
-    if replicationMapping.has_key(kernelIndex):
+    if kernelIndex in replicationMapping:
       exact[1][0] = replicationMapping[kernelIndex]
-    
-    filteredExactLogicExact.append(exact)
 
-
-  sizeList, _ = zip(*exactLogicExact)
+  # sizes in the exact file replace those in the origional
+  sizes = set([tuple(logicMapping[0]) for logicMapping in exactLogicExact])
 
   mergedExactLogic = []
   for logicMapping in exactLogic:
-    if logicMapping[0] not in sizeList:
+    if tuple(logicMapping[0]) not in sizes:
       mergedExactLogic.append(logicMapping)
 
   for logicMapping in exactLogicExact:
     mergedExactLogic.append(logicMapping)
 
+  rangeLogic = origionalLibraryLogic.rangeLogic
+
+  if dropUnusedSolutions:
+    # keep only the solutions which still win a size or a range
+    used = set([logicMapping[1][0] for logicMapping in mergedExactLogic])
+    numIndices = len(origionalLibraryLogic.indexOrder)
+    if rangeLogic is not None:
+      rangeLogicSolutions(0, numIndices, rangeLogic, used)
+    usedSolutionMapping = {}
+    usedSolutionList = []
+    for idx in range(0, len(mergedSolutionList)):
+      if idx in used:
+        usedSolutionMapping[idx] = len(usedSolutionList)
+        usedSolutionList.append(mergedSolutionList[idx])
+    print ("dropping %u of %u solutions which win no size" \
+        % (len(mergedSolutionList) - len(usedSolutionList), \
+        len(mergedSolutionList)))
+    for logicMapping in mergedExactLogic:
+      logicMapping[1][0] = usedSolutionMapping[logicMapping[1][0]]
+    if rangeLogic is not None:
+      remapRangeLogic(0, numIndices, rangeLogic, usedSolutionMapping)
+    mergedSolutionList = usedSolutionList
+
+  # number the solutions by their place in the merged file
+  for idx in range(0, len(mergedSolutionList)):
+    if "SolutionIndex" in mergedSolutionList[idx]:
+      mergedSolutionList[idx]["SolutionIndex"] = idx
+
   mergedLibraryLogic.versionString = origionalLibraryLogic.versionString
   mergedLibraryLogic.scheduleName = origionalLibraryLogic.scheduleName
   mergedLibraryLogic.architectureName = origionalLibraryLogic.architectureName
@@ -276,12 +333,13 @@ def MergeTensileLogicFiles(origionalLibraryLogic, exactLibraryLogic):
   mergedLibraryLogic.solutionStates = mergedSolutionList
   mergedLibraryLogic.indexOrder = origionalLibraryLogic.indexOrder
   mergedLibraryLogic.exactLogic = mergedExactLogic
-  mergedLibraryLogic.rangeLogic  = origionalLibraryLogic.rangeLogic
+  mergedLibraryLogic.rangeLogic  = rangeLogic
 
   return mergedLibraryLogic
 
 
-def ProcessMergeLogicFile(exactFileName, origionalFileName, outputFileName):
+def ProcessMergeLogicFile(exactFileName, origionalFileName, outputFileName, \
+    dropUnusedSolutions=False):
   
   _, fileName = os.path.split(exactFileName)
 
@@ -290,10 +348,19 @@ def ProcessMergeLogicFile(exactFileName, origionalFileName, outputFileName):
   libraryLogic = LibraryLogic(origionalFileName)
   libraryLogicExact = LibraryLogic(exactFileName)
 
-  mergedLibraryLogic = MergeTensileLogicFiles(libraryLogic,libraryLogicExact)
+  mergedLibraryLogic = MergeTensileLogicFiles(libraryLogic,libraryLogicExact, \
+      dropUnusedSolutions)
 
   mergedLibraryLogic.writeLibraryLogic(outputFileName)
 
+# pool worker: merge one pair of files, reporting instead of raising errors
+def ProcessMergeLogicFileJob(job):
+  try:
+    ProcessMergeLogicFile(*job)
+  except Exception as ex:
+    print("Exception: {0}".format(ex))
+  sys.stdout.flush()
+
 def RunMergeTensileLogicFiles():
 
   print ""
@@ -310,6 +377,10 @@ def RunMergeTensileLogicFiles():
   argParser.add_argument("OrigionalLogicPath", help="Path to the origional LibraryLogic.yaml input files.")
   argParser.add_argument("ExactLogicPath", help="Path to the exact LibraryLogic.yaml input files.")
   argParser.add_argument("OutputPath", help="Where to write library files?")
+  argParser.add_argument("-j", "--jobs", type=int, default=-1, \
+      help="Files to merge in parallel; 0=serially, -1=nproc")
+  argParser.add_argument("--drop-unused-solutions", action="store_true", \
+      help="Drop solutions which win no size or range after merging")
 
   args = argParser.parse_args()
 
@@ -333,6 +404,7 @@ def RunMergeTensileLogicFiles():
   #for logicFile in logicFiles:
   #  print1("#   %s" % logicFile)
 
+  jobs = []
   for exactLogicFilePath in exactLogicFiles:
     _, fileName = os.path.split(exactLogicFilePath)
     #print1("#   %s" % fileName)
@@ -341,14 +413,22 @@ def RunMergeTensileLogicFiles():
     if os.path.isfile(origionalLogicFilePath):
       
       outputLogicFilePath = os.path.join(outputPath, fileName)
-
-      try:
-        ProcessMergeLogicFile(exactLogicFilePath, origionalLogicFilePath, outputLogicFilePath)
-      except Exception as ex:
-        print("Exception: {0}".format(ex))
+      jobs.append((exactLogicFilePath, origionalLogicFilePath, \
+          outputLogicFilePath, args.drop_unused_solutions))
 
     else:
       print ("# file does not exist in origional directory " + origionalLogicFilePath)
+
+  numProcesses = multiprocessing.cpu_count() if args.jobs < 0 else args.jobs
+  numProcesses = min(numProcesses, len(jobs))
+  if numProcesses <= 1:
+    for job in jobs:
+      ProcessMergeLogicFileJob(job)
+  else:
+    pool = multiprocessing.Pool(numProcesses)
+    pool.map(ProcessMergeLogicFileJob, jobs, 1)
+    pool.close()
+    pool.join()
     
 
 ################################################################################
@@ -0,0 +1,215 @@
+################################################################################
+# Copyright (C) 2016 Advanced Micro Devices, Inc. All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell cop-
+# ies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IM-
+# PLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNE-
+# CTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+################################################################################
+# ValidParameters Microbenchmark
+# - times importing Common and building the parameter tables it used to
+#   enumerate eagerly (LegacyValidParameters) against the lazy ValidValues
+# - times validating the solution parameters of the benchmark configs the
+#   way BenchmarkStructs does, against both
+# - checks both give the same answer for every legacy value and for values
+#   just outside each domain
+################################################################################
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+from Common import globalParameters, validParameters, HR
+import YAMLIO
+
+
+################################################################################
+# Legacy Valid Parameters
+# the tables as Common built them at import before they became ValidValues
+################################################################################
+def legacyValidParameters():
+  validWorkGroups = []
+  for numThreads in range(64, 1025, 64):
+    for nsg in [ 1, 2, 4, 8, 16, 32, 64, 96, 128, 256 ]:
+      for sg0 in range(1, numThreads/nsg+1):
+        sg1 = numThreads/nsg/sg0
+        if sg0*sg1*nsg == numThreads:
+            workGroup = [sg0, sg1, nsg]
+            validWorkGroups.append(workGroup)
+  validThreadTileSides = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]
+  validThreadTiles = []
+  for i in validThreadTileSides:
+    for j in validThreadTileSides:
+      validThreadTiles.append([i, j])
+  validMacroTileSides = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 6, 12, 24, 48, 96, 192, 384, 768 ]
+  validMacroTiles = []
+  depthUs = range(-16, 0)
+  depthUs.extend(range(2,512+1,1))
+  for i in validMacroTileSides:
+    for j in validMacroTileSides:
+      validMacroTiles.append([i, j])
+
+  legacy = dict(validParameters)
+  legacy.update({
+      "GlobalSplitU":             range(1, 1024+1),
+      "WorkGroupMapping":         range(-1024,1024+1),
+      "MaxOccupancy":             range(1, 40+1),
+      "WorkGroup":                validWorkGroups,
+      "ThreadTile":               validThreadTiles,
+      "MacroTile":                validMacroTiles,
+      "MacroTileShapeMin":        range(1, 256+1),
+      "MacroTileShapeMax":        range(1, 256+1),
+      "NumLoadsCoalescedA":       range(-1, 64+1),
+      "NumLoadsCoalescedB":       range(-1, 64+1),
+      "DepthU":                   depthUs,
+      "PerformanceSyncLocation":  range(-1, 16*16+1),
+      "PerformanceWaitLocation":  range(-1, 16*16+1),
+      })
+  return legacy
+
+lazyParameterNames = [ "GlobalSplitU", "WorkGroupMapping", "MaxOccupancy", \
+    "WorkGroup", "ThreadTile", "MacroTile", "MacroTileShapeMin", \
+    "MacroTileShapeMax", "NumLoadsCoalescedA", "NumLoadsCoalescedB", "DepthU", \
+    "PerformanceSyncLocation", "PerformanceWaitLocation" ]
+
+
+################################################################################
+# Compare
+# values on which the legacy and lazy tables disagree
+################################################################################
+def probeValues(legacyValues):
+  probes = []
+  for value in legacyValues:
+    probes.append(value)
+    if isinstance(value, list):
+      probes.append([v+1 for v in value])
+      probes.append([v-1 for v in value])
+      probes.append(value + [1])
+      probes.append(tuple(value))
+    else:
+      probes += [value-1, value+1]
+  probes += [None, "1", 1.5, True, False, [], 0, -2000, 2000]
+  return probes
+
+def compareTables(legacy, lazy):
+  mismatches = []
+  for name in lazyParameterNames:
+    if list(lazy[name]) != legacy[name]:
+      mismatches.append((name, "enumeration"))
+    for value in probeValues(legacy[name]):
+      if (value in legacy[name]) != (value in lazy[name]):
+        mismatches.append((name, value))
+  return mismatches
+
+
+################################################################################
+# Config Parameters
+# every (name, value) the benchmark configs request
+################################################################################
+def configParameters(paths):
+  parameters = []
+  for path in paths:
+    for (root, dirs, fileNames) in os.walk(path):
+      for fileName in sorted(fileNames):
+        if os.path.splitext(fileName)[1] != ".yaml":
+          continue
+        try:
+          config = YAMLIO.readConfig(os.path.join(root, fileName))
+        except Exception:
+          continue
+        if not isinstance(config, dict) or "BenchmarkProblems" not in config:
+          continue
+        for problemTypeGroup in config["BenchmarkProblems"]:
+          for group in problemTypeGroup[1:]:
+            for section in ["BenchmarkCommonParameters", "ForkParameters", \
+                "BenchmarkForkParameters", "BenchmarkJoinParameters"]:
+              for paramDict in group.get(section) or []:
+                for name in paramDict:
+                  if name in validParameters:
+                    for value in paramDict[name]:
+                      parameters.append((name, value))
+  return parameters
+
+def timeValidation(parameters, table, numRepeats):
+  bestTime = None
+  for repeat in range(0, numRepeats):
+    startTime = time.time()
+    for (name, value) in parameters:
+      if value not in table[name]:
+        break
+    elapsed = time.time() - startTime
+    bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+  return bestTime
+
+def timeImport(numRepeats):
+  bestTime = None
+  for repeat in range(0, numRepeats):
+    output = subprocess.check_output([sys.executable, "-c", \
+        "import time; startTime = time.time(); import Common; " \
+        "print time.time() - startTime"], cwd=globalParameters["ScriptPath"])
+    elapsed = float(output.split()[-1])
+    bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+  return bestTime
+
+
+################################################################################
+# Main
+################################################################################
+def ValidParametersBenchmark(userArgs):
+  argParser = argparse.ArgumentParser( \
+      description="time building and checking the valid solution parameters")
+  argParser.add_argument("--repeats", type=int, default=5, \
+      help="report the best of this many repeats")
+  argParser.add_argument("paths", nargs="*", \
+      help="directories of benchmark configs; default Tensile/Configs and Tests")
+  args = argParser.parse_args(userArgs)
+  paths = args.paths if args.paths else [ \
+      os.path.join(globalParameters["ScriptPath"], "Configs"), \
+      os.path.join(globalParameters["ScriptPath"], "Tests") ]
+
+  mismatches = compareTables(legacyValidParameters(), validParameters)
+  if mismatches:
+    for (name, value) in mismatches[:20]:
+      print "MISMATCH %s: %s" % (name, value)
+    return 1
+
+  bestLegacyBuild = None
+  for repeat in range(0, args.repeats):
+    startTime = time.time()
+    legacy = legacyValidParameters()
+    elapsed = time.time() - startTime
+    bestLegacyBuild = elapsed if bestLegacyBuild is None \
+        else min(bestLegacyBuild, elapsed)
+  parameters = configParameters(paths)
+
+  print HR
+  print "# %u config parameter values from %s" \
+      % (len(parameters), ", ".join(paths))
+  print "# %-26s %12s" % ("", "ms")
+  print "# %-26s %12.3f" % ("import Common", 1000*timeImport(args.repeats))
+  print "# %-26s %12.3f" % ("legacy tables build", 1000*bestLegacyBuild)
+  print "# %-26s %12.3f" % ("legacy validation", \
+      1000*timeValidation(parameters, legacy, args.repeats))
+  print "# %-26s %12.3f" % ("lazy validation", \
+      1000*timeValidation(parameters, validParameters, args.repeats))
+  print HR
+  return 0
+
+def main():
+  sys.exit(ValidParametersBenchmark(sys.argv[1:]))
+
+if __name__ == "__main__":
+  main()
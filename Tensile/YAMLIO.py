@@ -41,6 +41,14 @@ def readConfig( filename ):
   stream.close()
   return config
 
+def writeConfig( filename, config ):
+  try:
+    stream = open(filename, "w")
+  except IOError:
+    printExit("Cannot open file: %s" % filename )
+  yaml.safe_dump(config, stream, default_flow_style=False)
+  stream.close()
+
 
 ################################################################################
 # Write List of Solutions to YAML File
@@ -36,6 +36,17 @@ setup(
     # user runs a benchmark
     "tensile = Tensile.Tensile:main",
     "tensileBenchmarkLibraryClient = Tensile.TensileBenchmarkLibraryClient:main",
+    # check register, lds and occupancy of assembly kernels; peephole savings
+    "tensileAnalyzeAssembly = Tensile.AssemblyAnalyzer:main",
+    "tensileAssemblyPeephole = Tensile.AssemblyPeephole:main",
+    # fit the pruning performance model to 2_BenchmarkData
+    "tensileCalibratePerformanceModel = Tensile.PerformanceModel:main",
+    # diff two tuning runs and fail on performance regressions
+    "tensileCompareRuns = Tensile.CompareRuns:main",
+    # build source kernels of solution files for the CPU and validate them
+    "tensileHostValidation = Tensile.HostValidation:main",
+    # time the python hot paths against Tests/microbenchmark_baseline.json
+    "tensileMicrobenchmarks = Tensile.Microbenchmarks:main",
     # CMake calls this to create Tensile.lib
     "TensileCreateLibrary = Tensile.TensileCreateLibrary:TensileCreateLibrary",
     # automatic benchmarking for rocblas